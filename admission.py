@@ -0,0 +1,246 @@
+"""Admission control for the WSGI app.
+
+Each worker process admits at most ``ADMISSION_MAX_IN_FLIGHT`` requests at
+once. Further requests wait in a queue per route class and are rejected with
+``503`` and ``Retry-After`` when the queue is full or their wait runs out:
+
+- ``write`` – anything but GET/HEAD/OPTIONS (clock-ins, edits)
+- ``read`` – other GET requests
+- ``admin`` – GET requests under ``/api/admin/`` (settings, users and the
+  audit log, which dashboards poll); at most ``ADMISSION_ADMIN_MAX_IN_FLIGHT``
+  of them run at once
+
+When a slot frees up, queued writes go first, then reads, then admin polls.
+``/healthz``, ``/metrics`` and static assets bypass admission entirely.
+
+Settings come from the environment:
+
+- ``ADMISSION_MAX_IN_FLIGHT`` (default 8) concurrent requests per worker;
+  ``0`` turns admission control off
+- ``ADMISSION_ADMIN_MAX_IN_FLIGHT`` (default 2)
+- ``ADMISSION_MAX_QUEUE`` (default 32) queued requests per class
+- ``GUNICORN_THREADS`` – the worker's ``--threads`` (set by the Dockerfile).
+  A queued request holds its thread while it waits, so when this is set the
+  admitted and queued requests together are kept
+  ``ADMISSION_RESERVED_THREADS`` (default 2) threads short of it, leaving
+  those for ``/healthz`` and ``/metrics``
+- ``ADMISSION_MAX_WAIT_WRITE`` / ``_READ`` / ``_ADMIN`` (default 5, 2 and
+  0.5) seconds a request may wait for a slot
+- ``ADMISSION_RETRY_AFTER`` (default 1) seconds, sent as ``Retry-After``
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+import telemetry
+
+THREADS = int(os.getenv("GUNICORN_THREADS", "0"))
+RESERVED_THREADS = int(os.getenv("ADMISSION_RESERVED_THREADS", "2"))
+MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8"))
+if THREADS and MAX_IN_FLIGHT:
+    MAX_IN_FLIGHT = max(min(MAX_IN_FLIGHT, THREADS - RESERVED_THREADS), 1)
+ADMIN_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_ADMIN_MAX_IN_FLIGHT", "2"))
+MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+# Queued requests of all classes together; None when the thread count is unknown
+MAX_WAITING = max(THREADS - MAX_IN_FLIGHT - RESERVED_THREADS, 0) if THREADS else None
+MAX_WAIT = {
+    "write": float(os.getenv("ADMISSION_MAX_WAIT_WRITE", "5")),
+    "read": float(os.getenv("ADMISSION_MAX_WAIT_READ", "2")),
+    "admin": float(os.getenv("ADMISSION_MAX_WAIT_ADMIN", "0.5")),
+}
+RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# Highest priority first
+CLASSES = ("write", "read", "admin")
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+BYPASS_PATHS = ("/healthz", "/metrics")
+BYPASS_PREFIXES = ("/static/", "/assets/")
+ADMIN_PREFIX = "/api/admin/"
+# Route label of rejected requests in the request metrics
+SHED_ROUTE = "<shed>"
+
+ADMISSION_WAIT = telemetry.Histogram(
+    "admission_wait_seconds", "Time requests spent queued for admission.", ("class",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+SHED = telemetry.Counter(
+    "admission_rejected_total", "Requests turned away with 503.", ("class", "reason")
+)
+
+
+def classify(environ: dict) -> Optional[str]:
+    """Return the route class of a request, or None when it bypasses admission."""
+    path = environ.get("SCRIPT_NAME", "") + environ.get("PATH_INFO", "")
+    if path in BYPASS_PATHS or path.startswith(BYPASS_PREFIXES):
+        return None
+    if environ.get("REQUEST_METHOD", "GET").upper() not in READ_METHODS:
+        return "write"
+    if path.startswith(ADMIN_PREFIX):
+        return "admin"
+    return "read"
+
+
+class Limiter:
+    """Counting gate with per-class queues served in priority order."""
+
+    def __init__(self, max_in_flight: int, class_limits: Dict[str, int] | None = None,
+                 max_queue: int = MAX_QUEUE, max_waiting: int | None = None) -> None:
+        self.max_in_flight = max_in_flight
+        self.class_limits = class_limits or {}
+        self.max_queue = max_queue
+        self.max_waiting = max_waiting
+        self._cond = threading.Condition()
+        self._in_flight: Dict[str, int] = {c: 0 for c in CLASSES}
+        self._queues: Dict[str, Deque[object]] = {c: deque() for c in CLASSES}
+
+    def _has_room(self, cls: str) -> bool:
+        if sum(self._in_flight.values()) >= self.max_in_flight:
+            return False
+        limit = self.class_limits.get(cls)
+        return limit is None or self._in_flight[cls] < limit
+
+    def _is_next(self, cls: str, ticket: object | None) -> bool:
+        """True when `cls` (holding `ticket`, if queued) may take a free slot.
+
+        Queued requests of higher classes go first, unless their own class
+        limit holds them back.
+        """
+        for other in CLASSES:
+            queue = self._queues[other]
+            if other == cls:
+                return not queue or queue[0] is ticket
+            if queue and self._has_room(other):
+                return False
+        return True
+
+    def acquire(self, cls: str, timeout: float) -> Tuple[bool, str]:
+        """Wait up to `timeout` seconds for a slot.
+
+        Returns ``(admitted, reason)``; `reason` is ``"queue_full"`` or
+        ``"timeout"`` when the request was turned away.
+        """
+        with self._cond:
+            if self._has_room(cls) and self._is_next(cls, None):
+                self._in_flight[cls] += 1
+                return True, ""
+            queue = self._queues[cls]
+            full = len(queue) >= self.max_queue or (
+                self.max_waiting is not None
+                and sum(len(q) for q in self._queues.values()) >= self.max_waiting
+            )
+            if full or timeout <= 0:
+                return False, "queue_full" if timeout > 0 else "timeout"
+            ticket = object()
+            queue.append(ticket)
+            deadline = time.monotonic() + timeout
+            try:
+                while True:
+                    if self._has_room(cls) and self._is_next(cls, ticket):
+                        self._in_flight[cls] += 1
+                        return True, ""
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False, "timeout"
+                    self._cond.wait(remaining)
+            finally:
+                queue.remove(ticket)
+                # Whoever is now first in line may be able to go
+                self._cond.notify_all()
+
+    def release(self, cls: str) -> None:
+        with self._cond:
+            self._in_flight[cls] -= 1
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """Return ``{class: (in flight, queued)}``."""
+        with self._cond:
+            return {c: (self._in_flight[c], len(self._queues[c])) for c in CLASSES}
+
+
+class AdmissionMiddleware:
+    """Admit WSGI requests through a :class:`Limiter`; shed the rest with 503."""
+
+    def __init__(self, app: Callable, max_in_flight: int = MAX_IN_FLIGHT,
+                 admin_max_in_flight: int = ADMIN_MAX_IN_FLIGHT, max_queue: int = MAX_QUEUE,
+                 max_wait: Dict[str, float] | None = None, retry_after: int = RETRY_AFTER,
+                 max_waiting: int | None = MAX_WAITING) -> None:
+        self.app = app
+        self.enabled = max_in_flight > 0
+        self.limiter = Limiter(max_in_flight, {"admin": admin_max_in_flight}, max_queue, max_waiting)
+        self.max_wait = {**MAX_WAIT, **(max_wait or {})}
+        self.retry_after = retry_after
+        _limiters.append(self.limiter)
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        cls = classify(environ) if self.enabled else None
+        if cls is None:
+            return self.app(environ, start_response)
+
+        start = time.perf_counter()
+        admitted, reason = self.limiter.acquire(cls, self.max_wait[cls])
+        ADMISSION_WAIT.observe((cls,), time.perf_counter() - start)
+        if not admitted:
+            SHED.inc((cls, reason))
+            telemetry.set_route(SHED_ROUTE)
+            start_response(
+                "503 Service Unavailable",
+                [("Content-Type", "text/plain"), ("Retry-After", str(self.retry_after))],
+            )
+            return [b"Server busy, retry shortly"]
+
+        try:
+            body = self.app(environ, start_response)
+        except BaseException:
+            self.limiter.release(cls)
+            raise
+        return _ReleasingIterator(body, lambda: self.limiter.release(cls))
+
+
+class _ReleasingIterator:
+    """Hold the admission slot until the response body is sent or closed."""
+
+    def __init__(self, body: Iterable[bytes], release: Callable[[], None]) -> None:
+        self._body = body
+        self._release = release
+
+    def _done(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            yield from self._body
+        finally:
+            self._done()
+
+    def close(self) -> None:
+        try:
+            close = getattr(self._body, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._done()
+
+
+_limiters: list = []
+
+
+def _occupancy() -> Dict[Tuple[str, ...], float]:
+    values: Dict[Tuple[str, ...], float] = {}
+    for limiter in _limiters:
+        for cls, (in_flight, queued) in limiter.snapshot().items():
+            values[(cls, "in_flight")] = values.get((cls, "in_flight"), 0) + in_flight
+            values[(cls, "queued")] = values.get((cls, "queued"), 0) + queued
+    return values
+
+
+telemetry.Gauge(
+    "admission_requests", "Requests admitted and waiting, by route class.",
+    ("class", "state"), callback=_occupancy,
+)
@@ -0,0 +1,68 @@
+"""index admin_logs, add employee_id and the archive table"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# Actions whose data starts with "<employee>:"
+EMPLOYEE_ACTIONS = (
+    'clockin', 'clockout', 'startbreak', 'endbreak', 'startextra', 'endextra',
+    'payout', 'advance', 'order', 'create_event',
+    'record_cash', 'record_orders', 'record_payout', 'record_advance',
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table('admin_logs'):
+        op.create_table(
+            'admin_logs',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('action', sa.String(100), nullable=False),
+            sa.Column('data', sa.Text),
+            sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False,
+                      server_default=sa.text('now()')),
+        )
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('admin_logs')}
+    if 'employee_id' not in columns:
+        op.add_column('admin_logs', sa.Column('employee_id', sa.String(100)))
+        # Entries written before the column existed carry the employee in data
+        op.execute(
+            sa.text(
+                "UPDATE admin_logs SET employee_id = split_part(data, ':', 1) "
+                "WHERE employee_id IS NULL AND action IN :actions AND data LIKE '%:%'"
+            ).bindparams(sa.bindparam('actions', EMPLOYEE_ACTIONS, expanding=True))
+        )
+    indexes = {i['name'] for i in sa.inspect(bind).get_indexes('admin_logs')}
+    for name, cols in (
+        ('ix_admin_logs_created_at_id', ['created_at', 'id']),
+        ('ix_admin_logs_employee_created_at', ['employee_id', 'created_at']),
+        ('ix_admin_logs_action_created_at', ['action', 'created_at']),
+    ):
+        if name not in indexes:
+            op.create_index(name, 'admin_logs', cols)
+    if not inspector.has_table('admin_logs_archive'):
+        op.create_table(
+            'admin_logs_archive',
+            sa.Column('id', sa.Integer, primary_key=True, autoincrement=False),
+            sa.Column('action', sa.String(100), nullable=False),
+            sa.Column('data', sa.Text),
+            sa.Column('employee_id', sa.String(100)),
+            sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False),
+            sa.Column('archived_at', sa.TIMESTAMP(timezone=True)),
+        )
+        op.create_index('ix_admin_logs_archive_created_at', 'admin_logs_archive', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_admin_logs_archive_created_at', table_name='admin_logs_archive')
+    op.drop_table('admin_logs_archive')
+    op.drop_index('ix_admin_logs_action_created_at', table_name='admin_logs')
+    op.drop_index('ix_admin_logs_employee_created_at', table_name='admin_logs')
+    op.drop_index('ix_admin_logs_created_at_id', table_name='admin_logs')
+    op.drop_column('admin_logs', 'employee_id')
@@ -0,0 +1,60 @@
+"""payroll runs and immutable per-employee snapshots"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('payroll_runs'):
+        return  # created by create_schema() before this migration ran
+    op.create_table(
+        'payroll_runs',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('month', sa.String(7), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True)),
+        sa.Column('employees', sa.Integer, nullable=False),
+        sa.Column('workers', sa.Integer, nullable=False),
+        sa.Column('rules', postgresql.JSON, nullable=False),
+    )
+    op.create_index('ix_payroll_runs_month', 'payroll_runs', ['month'])
+    op.create_table(
+        'payroll_snapshots',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('run_id', sa.Integer, sa.ForeignKey('payroll_runs.id'), nullable=False),
+        sa.Column('month', sa.String(7), nullable=False),
+        sa.Column('employee_id', sa.String(100), nullable=False),
+        *(sa.Column(name, sa.Float, nullable=False) for name in (
+            'total_hours', 'total_extra', 'total_penalty', 'net_time',
+        )),
+        sa.Column('present_days', sa.Integer, nullable=False),
+        sa.Column('incomplete_days', sa.Integer, nullable=False),
+        sa.Column('payout', sa.Float, nullable=False),
+        sa.Column('advance', sa.Float, nullable=False),
+        sa.Column('orders_count', sa.Integer, nullable=False),
+        sa.Column('orders_total', sa.Float, nullable=False),
+        sa.Column('balance', sa.Float, nullable=False),
+        sa.Column('details', postgresql.JSON, nullable=False),
+        sa.UniqueConstraint('run_id', 'employee_id'),
+    )
+    op.execute(
+        "CREATE OR REPLACE FUNCTION payroll_immutable() RETURNS trigger AS $$ "
+        "BEGIN RAISE EXCEPTION '% rows are immutable', TG_TABLE_NAME; END $$ LANGUAGE plpgsql"
+    )
+    for table in ('payroll_runs', 'payroll_snapshots'):
+        op.execute(
+            f"CREATE TRIGGER {table}_immutable BEFORE UPDATE OR DELETE ON {table} "
+            "FOR EACH ROW EXECUTE FUNCTION payroll_immutable()"
+        )
+
+
+def downgrade():
+    op.drop_table('payroll_snapshots')
+    op.drop_table('payroll_runs')
+    op.execute("DROP FUNCTION IF EXISTS payroll_immutable()")
@@ -0,0 +1,63 @@
+"""daily attendance rollups for team analytics, and an events timestamp index"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'ix_events_timestamp' not in {i['name'] for i in inspector.get_indexes('events')}:
+        op.create_index('ix_events_timestamp', 'events', ['timestamp'])
+    if not inspector.has_table('attendance_daily'):
+        op.create_table(
+            'attendance_daily',
+            sa.Column('employee_id', sa.String(100), primary_key=True),
+            sa.Column('day', sa.Date, primary_key=True),
+            sa.Column('month', sa.String(7), nullable=False),
+            sa.Column('worked_seconds', sa.Float, nullable=False),
+            sa.Column('flags', sa.SmallInteger, nullable=False),
+        )
+        op.create_index('ix_attendance_daily_day_employee', 'attendance_daily', ['day', 'employee_id'])
+    if not inspector.has_table('attendance_rollups'):
+        op.create_table(
+            'attendance_rollups',
+            sa.Column('employee_id', sa.String(100), primary_key=True),
+            sa.Column('month', sa.String(7), primary_key=True),
+            sa.Column('starts_at', sa.TIMESTAMP(timezone=True), nullable=False),
+            sa.Column('ends_at', sa.TIMESTAMP(timezone=True), nullable=False),
+            sa.Column('computed_at', sa.TIMESTAMP(timezone=True)),
+        )
+    op.execute(
+        "CREATE OR REPLACE FUNCTION attendance_rollup_invalidate() RETURNS trigger AS $$ "
+        "BEGIN "
+        "IF TG_OP <> 'INSERT' THEN "
+        "PERFORM pg_advisory_xact_lock_shared(hashtext('attendance_rollup:' || OLD.employee_id)); "
+        "DELETE FROM attendance_rollups WHERE employee_id = OLD.employee_id "
+        "AND starts_at <= OLD.timestamp AND ends_at > OLD.timestamp; "
+        "END IF; "
+        "IF TG_OP <> 'DELETE' THEN "
+        "PERFORM pg_advisory_xact_lock_shared(hashtext('attendance_rollup:' || NEW.employee_id)); "
+        "DELETE FROM attendance_rollups WHERE employee_id = NEW.employee_id "
+        "AND starts_at <= NEW.timestamp AND ends_at > NEW.timestamp; "
+        "END IF; "
+        "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql"
+    )
+    op.execute("DROP TRIGGER IF EXISTS events_rollup_invalidate ON events")
+    op.execute(
+        "CREATE TRIGGER events_rollup_invalidate AFTER INSERT OR UPDATE OR DELETE ON events "
+        "FOR EACH ROW EXECUTE FUNCTION attendance_rollup_invalidate()"
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS events_rollup_invalidate ON events")
+    op.execute("DROP FUNCTION IF EXISTS attendance_rollup_invalidate()")
+    op.drop_table('attendance_rollups')
+    op.drop_table('attendance_daily')
+    op.drop_index('ix_events_timestamp', table_name='events')
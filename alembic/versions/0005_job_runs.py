@@ -0,0 +1,32 @@
+"""job_runs: one row per slot of a scheduled job"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('job_runs'):
+        return  # created by create_schema() before this migration ran
+    op.create_table(
+        'job_runs',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('job', sa.String(100), nullable=False),
+        sa.Column('scheduled_for', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('started_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('finished_at', sa.TIMESTAMP(timezone=True)),
+        sa.Column('duration_seconds', sa.Float),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('detail', sa.Text),
+        sa.Column('instance', sa.String(200), nullable=False),
+        sa.UniqueConstraint('job', 'scheduled_for'),
+    )
+
+
+def downgrade():
+    op.drop_table('job_runs')
@@ -0,0 +1,120 @@
+"""range-partition events by local month"""
+
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+# The partitioning as of this revision (api/partitions.py maintains it);
+# months are local to ATTENDANCE_TZ
+TZ = os.getenv('ATTENDANCE_TZ', 'UTC')
+AHEAD = int(os.getenv('EVENT_PARTITIONS_AHEAD', '3'))
+CREATE_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION events_create_partition(part text, lo timestamptz, hi timestamptz) "
+    "RETURNS boolean AS $$ "
+    "BEGIN "
+    "PERFORM pg_advisory_xact_lock(hashtext('events_create_partition')); "
+    "IF to_regclass(part) IS NOT NULL THEN RETURN false; END IF; "
+    "LOCK TABLE events_default IN ACCESS EXCLUSIVE MODE; "
+    "EXECUTE format('CREATE TABLE %I (LIKE events INCLUDING DEFAULTS)', part); "
+    "EXECUTE format('WITH moved AS (DELETE FROM events_default WHERE timestamp >= %L AND timestamp < %L "
+    "RETURNING *) INSERT INTO %I SELECT * FROM moved', lo, hi, part); "
+    "EXECUTE format('ALTER TABLE events ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi); "
+    "RETURN true; "
+    "END $$ LANGUAGE plpgsql"
+)
+CREATE_DEFAULT = "CREATE TABLE IF NOT EXISTS events_default PARTITION OF events DEFAULT"
+_TRIGGER = (
+    "CREATE TRIGGER events_rollup_invalidate AFTER INSERT OR UPDATE OR DELETE ON events "
+    "FOR EACH ROW EXECUTE FUNCTION attendance_rollup_invalidate()"
+)
+
+
+def _rename_indexes(bind, table, suffix):
+    inspector = sa.inspect(bind)
+    names = [i['name'] for i in inspector.get_indexes(table)]
+    names.append(inspector.get_pk_constraint(table)['name'])
+    for name in filter(None, names):
+        op.execute(f'ALTER INDEX "{name}" RENAME TO "{name}{suffix}"')
+
+
+def _copy(bind, source, target):
+    columns = ', '.join(f'"{c["name"]}"' for c in sa.inspect(bind).get_columns(source))
+    op.execute(f'INSERT INTO {target} ({columns}) SELECT {columns} FROM {source}')
+
+
+def _months_ahead():
+    today = datetime.now(ZoneInfo(TZ)).date()
+    year, month = today.year, today.month
+    months = []
+    for _ in range(AHEAD + 1):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = year + (month == 12), month % 12 + 1
+    return months
+
+
+def _create_partitions(bind, months):
+    bind.execute(sa.text(CREATE_FUNCTION))
+    bind.execute(sa.text(CREATE_DEFAULT))
+    tz = ZoneInfo(TZ)
+    for month in months:
+        year, m = map(int, month.split('-'))
+        bind.execute(sa.text("SELECT events_create_partition(:part, :lo, :hi)"), {
+            "part": f"events_{year:04d}_{m:02d}",
+            "lo": datetime(year, m, 1, tzinfo=tz),
+            "hi": datetime(year + (m == 12), m % 12 + 1, 1, tzinfo=tz),
+        })
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.scalar(sa.text("SELECT relkind FROM pg_class WHERE oid = 'events'::regclass")) == 'p':
+        return  # created partitioned by create_schema() before this migration ran
+    sequence = bind.scalar(sa.text("SELECT pg_get_serial_sequence('events', 'id')"))
+    op.execute("LOCK TABLE events IN ACCESS EXCLUSIVE MODE")
+    op.execute("ALTER TABLE events RENAME TO events_unpartitioned")
+    _rename_indexes(bind, 'events_unpartitioned', '_unpartitioned')
+
+    op.execute(
+        "CREATE TABLE events (LIKE events_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)"
+    )
+    op.execute("ALTER TABLE events ADD PRIMARY KEY (id, timestamp)")
+    op.create_index('ix_events_employee_id', 'events', ['employee_id'])
+    op.create_index('ix_events_timestamp', 'events', ['timestamp'])
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY events.id")
+
+    result = bind.execute(
+        sa.text(
+            "SELECT DISTINCT to_char(timestamp AT TIME ZONE :tz, 'YYYY-MM') FROM events_unpartitioned"
+        ),
+        {"tz": TZ},
+    )
+    months = sorted({r[0] for r in result} | set(_months_ahead()))
+    _create_partitions(bind, months)
+    _copy(bind, 'events_unpartitioned', 'events')
+    op.execute("DROP TABLE events_unpartitioned")
+    op.execute(_TRIGGER)
+
+
+def downgrade():
+    bind = op.get_bind()
+    sequence = bind.scalar(sa.text("SELECT pg_get_serial_sequence('events', 'id')"))
+    op.execute("CREATE TABLE events_plain (LIKE events INCLUDING DEFAULTS)")
+    _copy(bind, 'events', 'events_plain')
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY events_plain.id")
+    op.execute("DROP TABLE events")
+    op.execute("DROP FUNCTION IF EXISTS events_create_partition(text, timestamptz, timestamptz)")
+    op.execute("ALTER TABLE events_plain RENAME TO events")
+    op.execute("ALTER TABLE events ADD PRIMARY KEY (id)")
+    op.create_index('ix_events_employee_id', 'events', ['employee_id'])
+    op.create_index('ix_events_timestamp', 'events', ['timestamp'])
+    op.execute(_TRIGGER)
@@ -0,0 +1,149 @@
+"""employee_status: each employee's current state, maintained by triggers on events;
+ix_events_employee_timestamp replaces ix_events_employee_id"""
+
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# The functions and triggers as of this revision (api/status.py installs the
+# current ones); days are local to ATTENDANCE_TZ
+TZ = os.getenv('ATTENDANCE_TZ', 'UTC').replace("'", "''")
+STATUS_REPLAY_DAYS = 7
+LOCAL_DAY = f"(ev.timestamp AT TIME ZONE '{TZ}')::date"
+
+REPLAY_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION employee_status_replay(emp text, rebuild boolean) "
+    "RETURNS void AS $$ "
+    "DECLARE "
+    "s employee_status%ROWTYPE; "
+    "ev record; "
+    "latest timestamptz; "
+    "after timestamptz; "
+    "next_state text; "
+    "seg_end timestamptz; "
+    "BEGIN "
+    "PERFORM pg_advisory_xact_lock(hashtext('employee_status:' || emp)); "
+    "SELECT * INTO s FROM employee_status WHERE employee_id = emp; "
+    "IF rebuild OR NOT FOUND THEN "
+    "SELECT max(timestamp) INTO latest FROM events WHERE employee_id = emp; "
+    "IF latest IS NULL THEN DELETE FROM employee_status WHERE employee_id = emp; RETURN; END IF; "
+    "s := NULL; s.employee_id := emp; s.state := 'off'; s.worked_seconds := 0; "
+    f"after := (((latest AT TIME ZONE '{TZ}')::date - {STATUS_REPLAY_DAYS})::timestamp "
+    f"AT TIME ZONE '{TZ}') - interval '1 microsecond'; "
+    "ELSE after := s.last_event_at; "
+    "END IF; "
+    "FOR ev IN SELECT timestamp, kind FROM events "
+    "WHERE employee_id = emp AND timestamp > after ORDER BY timestamp, id LOOP "
+    f"IF s.day IS DISTINCT FROM {LOCAL_DAY} THEN "
+    f"s.day := {LOCAL_DAY}; s.worked_seconds := 0; "
+    "END IF; "
+    "next_state := s.state; seg_end := NULL; "
+    "IF ev.kind IN ('clockin', 'in') AND s.state = 'off' THEN "
+    "next_state := 'working'; s.segment_start := ev.timestamp; "
+    "ELSIF ev.kind = 'startbreak' AND s.state = 'working' AND s.segment_start IS NOT NULL THEN "
+    "next_state := 'break'; seg_end := ev.timestamp; "
+    "ELSIF ev.kind = 'endbreak' AND s.state = 'break' THEN "
+    "next_state := 'working'; s.segment_start := ev.timestamp; "
+    "ELSIF ev.kind IN ('clockout', 'out') AND s.segment_start IS NOT NULL THEN "
+    "IF s.state = 'working' THEN seg_end := ev.timestamp; END IF; "
+    "next_state := 'off'; "
+    "END IF; "
+    "IF seg_end IS NOT NULL THEN "
+    "s.worked_seconds := s.worked_seconds + greatest(0, extract(epoch FROM "
+    f"least(seg_end, (s.day + 1)::timestamp AT TIME ZONE '{TZ}') "
+    f"- greatest(s.segment_start, s.day::timestamp AT TIME ZONE '{TZ}'))); "
+    "END IF; "
+    "IF next_state = 'off' THEN s.segment_start := NULL; END IF; "
+    "IF next_state <> s.state THEN s.since := ev.timestamp; END IF; "
+    "s.state := next_state; s.last_event_at := ev.timestamp; s.last_kind := ev.kind; "
+    "END LOOP; "
+    "IF s.last_event_at IS NULL THEN RETURN; END IF; "
+    "INSERT INTO employee_status VALUES (s.*) ON CONFLICT (employee_id) DO UPDATE SET "
+    "state = EXCLUDED.state, since = EXCLUDED.since, segment_start = EXCLUDED.segment_start, "
+    "day = EXCLUDED.day, worked_seconds = EXCLUDED.worked_seconds, "
+    "last_event_at = EXCLUDED.last_event_at, last_kind = EXCLUDED.last_kind; "
+    "END $$ LANGUAGE plpgsql"
+)
+TRIGGER_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION employee_status_on_events() RETURNS trigger AS $$ "
+    "DECLARE emp text; first_ts timestamptz; "
+    "BEGIN "
+    "IF TG_OP = 'INSERT' THEN "
+    "FOR emp, first_ts IN SELECT employee_id, min(timestamp) FROM new_rows "
+    "GROUP BY employee_id ORDER BY employee_id LOOP "
+    "PERFORM employee_status_replay(emp, NOT EXISTS (SELECT 1 FROM employee_status "
+    "WHERE employee_id = emp AND last_event_at < first_ts)); "
+    "END LOOP; "
+    "ELSIF TG_OP = 'UPDATE' THEN "
+    "FOR emp IN SELECT employee_id FROM old_rows UNION SELECT employee_id FROM new_rows ORDER BY 1 LOOP "
+    "PERFORM employee_status_replay(emp, true); "
+    "END LOOP; "
+    "ELSE "
+    "FOR emp IN SELECT DISTINCT employee_id FROM old_rows ORDER BY 1 LOOP "
+    "PERFORM employee_status_replay(emp, true); "
+    "END LOOP; "
+    "END IF; "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql"
+)
+TRIGGERS = {
+    'events_status_insert': "AFTER INSERT ON events REFERENCING NEW TABLE AS new_rows",
+    'events_status_update': "AFTER UPDATE ON events REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    'events_status_delete': "AFTER DELETE ON events REFERENCING OLD TABLE AS old_rows",
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    indexes = {i['name'] for i in inspector.get_indexes('events')}
+    if 'ix_events_employee_timestamp' not in indexes:
+        op.create_index('ix_events_employee_timestamp', 'events', ['employee_id', 'timestamp'])
+    if 'ix_events_employee_id' in indexes:
+        op.drop_index('ix_events_employee_id', table_name='events')
+    if not inspector.has_table('employee_status'):
+        op.create_table(
+            'employee_status',
+            sa.Column('employee_id', sa.String(100), primary_key=True),
+            sa.Column('state', sa.String(10), nullable=False),
+            sa.Column('since', sa.TIMESTAMP(timezone=True)),
+            sa.Column('segment_start', sa.TIMESTAMP(timezone=True)),
+            sa.Column('day', sa.Date),
+            sa.Column('worked_seconds', sa.Float, nullable=False),
+            sa.Column('last_event_at', sa.TIMESTAMP(timezone=True)),
+            sa.Column('last_kind', sa.String(50)),
+        )
+    op.execute(REPLAY_FUNCTION)
+    op.execute(TRIGGER_FUNCTION)
+    for name, timing in TRIGGERS.items():
+        # create_schema() may have created them already
+        op.execute(
+            "DO $$ BEGIN "
+            f"IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{name}' "
+            "AND tgrelid = 'events'::regclass) THEN "
+            f"CREATE TRIGGER {name} {timing} "
+            "FOR EACH STATEMENT EXECUTE FUNCTION employee_status_on_events(); "
+            "END IF; "
+            "END $$"
+        )
+    # Employees without events in the replay window start out "off"
+    op.execute(
+        "SELECT employee_status_replay(employee_id, true) FROM ("
+        "SELECT DISTINCT employee_id FROM events "
+        f"WHERE timestamp >= now() - interval '{STATUS_REPLAY_DAYS + 1} days') e"
+    )
+
+
+def downgrade():
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON events")
+    op.execute("DROP FUNCTION IF EXISTS employee_status_on_events()")
+    op.execute("DROP FUNCTION IF EXISTS employee_status_replay(text, boolean)")
+    op.drop_table('employee_status')
+    op.create_index('ix_events_employee_id', 'events', ['employee_id'])
+    op.drop_index('ix_events_employee_timestamp', table_name='events')
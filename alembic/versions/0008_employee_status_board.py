@@ -0,0 +1,104 @@
+"""employee_status.first_in_at and updated_at, for /dashboard/now"""
+
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+# employee_status_replay() as of this revision (api/status.py installs the
+# current one): it records first_in_at and updated_at, and empties the row
+# of an employee without events instead of deleting it, so the board's
+# delta sync sees the change
+TZ = os.getenv('ATTENDANCE_TZ', 'UTC').replace("'", "''")
+STATUS_REPLAY_DAYS = 7
+LOCAL_DAY = f"(ev.timestamp AT TIME ZONE '{TZ}')::date"
+
+REPLAY_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION employee_status_replay(emp text, rebuild boolean) "
+    "RETURNS void AS $$ "
+    "DECLARE "
+    "s employee_status%ROWTYPE; "
+    "ev record; "
+    "latest timestamptz; "
+    "after timestamptz; "
+    "next_state text; "
+    "seg_end timestamptz; "
+    "BEGIN "
+    "PERFORM pg_advisory_xact_lock(hashtext('employee_status:' || emp)); "
+    "SELECT * INTO s FROM employee_status WHERE employee_id = emp; "
+    "IF rebuild OR NOT FOUND THEN "
+    "SELECT max(timestamp) INTO latest FROM events WHERE employee_id = emp; "
+    "IF latest IS NULL THEN "
+    "UPDATE employee_status SET state = 'off', since = NULL, segment_start = NULL, day = NULL, "
+    "worked_seconds = 0, last_event_at = NULL, last_kind = NULL, first_in_at = NULL, "
+    "updated_at = clock_timestamp() WHERE employee_id = emp; "
+    "RETURN; "
+    "END IF; "
+    "s := NULL; s.employee_id := emp; s.state := 'off'; s.worked_seconds := 0; "
+    f"after := (((latest AT TIME ZONE '{TZ}')::date - {STATUS_REPLAY_DAYS})::timestamp "
+    f"AT TIME ZONE '{TZ}') - interval '1 microsecond'; "
+    "ELSE after := s.last_event_at; "
+    "END IF; "
+    "FOR ev IN SELECT timestamp, kind FROM events "
+    "WHERE employee_id = emp AND timestamp > after ORDER BY timestamp, id LOOP "
+    f"IF s.day IS DISTINCT FROM {LOCAL_DAY} THEN "
+    f"s.day := {LOCAL_DAY}; s.worked_seconds := 0; s.first_in_at := NULL; "
+    "END IF; "
+    "next_state := s.state; seg_end := NULL; "
+    "IF ev.kind IN ('clockin', 'in') AND s.state = 'off' THEN "
+    "next_state := 'working'; s.segment_start := ev.timestamp; "
+    "s.first_in_at := coalesce(s.first_in_at, ev.timestamp); "
+    "ELSIF ev.kind = 'startbreak' AND s.state = 'working' AND s.segment_start IS NOT NULL THEN "
+    "next_state := 'break'; seg_end := ev.timestamp; "
+    "ELSIF ev.kind = 'endbreak' AND s.state = 'break' THEN "
+    "next_state := 'working'; s.segment_start := ev.timestamp; "
+    "ELSIF ev.kind IN ('clockout', 'out') AND s.segment_start IS NOT NULL THEN "
+    "IF s.state = 'working' THEN seg_end := ev.timestamp; END IF; "
+    "next_state := 'off'; "
+    "END IF; "
+    "IF seg_end IS NOT NULL THEN "
+    "s.worked_seconds := s.worked_seconds + greatest(0, extract(epoch FROM "
+    f"least(seg_end, (s.day + 1)::timestamp AT TIME ZONE '{TZ}') "
+    f"- greatest(s.segment_start, s.day::timestamp AT TIME ZONE '{TZ}'))); "
+    "END IF; "
+    "IF next_state = 'off' THEN s.segment_start := NULL; END IF; "
+    "IF next_state <> s.state THEN s.since := ev.timestamp; END IF; "
+    "s.state := next_state; s.last_event_at := ev.timestamp; s.last_kind := ev.kind; "
+    "END LOOP; "
+    "IF s.last_event_at IS NULL THEN RETURN; END IF; "
+    "s.updated_at := clock_timestamp(); "
+    "INSERT INTO employee_status VALUES (s.*) ON CONFLICT (employee_id) DO UPDATE SET "
+    "state = EXCLUDED.state, since = EXCLUDED.since, segment_start = EXCLUDED.segment_start, "
+    "day = EXCLUDED.day, worked_seconds = EXCLUDED.worked_seconds, "
+    "last_event_at = EXCLUDED.last_event_at, last_kind = EXCLUDED.last_kind, "
+    "first_in_at = EXCLUDED.first_in_at, updated_at = EXCLUDED.updated_at; "
+    "END $$ LANGUAGE plpgsql"
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {c['name'] for c in inspector.get_columns('employee_status')}
+    # create_schema() may have created them already
+    for name in ('first_in_at', 'updated_at'):
+        if name not in columns:
+            op.add_column('employee_status', sa.Column(name, sa.TIMESTAMP(timezone=True)))
+    if 'ix_employee_status_updated_at' not in {i['name'] for i in inspector.get_indexes('employee_status')}:
+        op.create_index('ix_employee_status_updated_at', 'employee_status', ['updated_at'])
+    op.execute(REPLAY_FUNCTION)
+    op.execute("SELECT employee_status_replay(employee_id, true) FROM employee_status")
+
+
+def downgrade():
+    # the previous function, which does not write the columns
+    previous = op.get_context().script.get_revision(down_revision).module
+    op.execute(previous.REPLAY_FUNCTION)
+    op.execute("DELETE FROM employee_status WHERE last_event_at IS NULL")
+    op.drop_index('ix_employee_status_updated_at', table_name='employee_status')
+    op.drop_column('employee_status', 'updated_at')
+    op.drop_column('employee_status', 'first_in_at')
@@ -0,0 +1,75 @@
+"""summary_changes: edits of closed months, for every worker's summary cache"""
+
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+# The trigger as of this revision (api/summary_cache.py installs the current
+# one); months are found in ATTENDANCE_TZ
+TZ = os.getenv('ATTENDANCE_TZ', 'UTC').replace("'", "''")
+MONTH = f"to_char(timestamp AT TIME ZONE '{TZ}', 'YYYY-MM')"
+CLOSED = f"timestamp < date_trunc('month', now() AT TIME ZONE '{TZ}') AT TIME ZONE '{TZ}'"
+
+
+def _record(rows):
+    return (
+        "INSERT INTO summary_changes (employee_id, month, kind, changed_at) "
+        "SELECT e, m, 'attendance', clock_timestamp() "
+        f"FROM (SELECT DISTINCT employee_id, {MONTH} FROM {rows} WHERE {CLOSED}) AS t (e, m) "
+        "ON CONFLICT (employee_id, month, kind) DO UPDATE SET changed_at = EXCLUDED.changed_at; "
+    )
+
+
+FUNCTION = (
+    "CREATE OR REPLACE FUNCTION summary_changes_on_events() RETURNS trigger AS $$ "
+    "BEGIN "
+    f"IF TG_OP <> 'INSERT' THEN {_record('old_rows')}END IF; "
+    f"IF TG_OP <> 'DELETE' THEN {_record('new_rows')}END IF; "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql"
+)
+TRIGGERS = {
+    'events_summary_insert': "AFTER INSERT ON events REFERENCING NEW TABLE AS new_rows",
+    'events_summary_update': "AFTER UPDATE ON events REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    'events_summary_delete': "AFTER DELETE ON events REFERENCING OLD TABLE AS old_rows",
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # create_schema() may have created the table before this migration ran,
+    # but its triggers went with the events table 0006 replaced
+    if not inspector.has_table('summary_changes'):
+        op.create_table(
+            'summary_changes',
+            sa.Column('employee_id', sa.String(100), primary_key=True),
+            sa.Column('month', sa.String(7), primary_key=True),
+            sa.Column('kind', sa.String(20), primary_key=True),
+            sa.Column('changed_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        )
+        op.create_index('ix_summary_changes_changed_at', 'summary_changes', ['changed_at'])
+    op.execute(FUNCTION)
+    for name, timing in TRIGGERS.items():
+        op.execute(
+            "DO $$ BEGIN "
+            f"IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{name}' "
+            "AND tgrelid = 'events'::regclass) THEN "
+            f"CREATE TRIGGER {name} {timing} "
+            "FOR EACH STATEMENT EXECUTE FUNCTION summary_changes_on_events(); "
+            "END IF; "
+            "END $$"
+        )
+
+
+def downgrade():
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON events")
+    op.execute("DROP FUNCTION IF EXISTS summary_changes_on_events()")
+    op.drop_index('ix_summary_changes_changed_at', table_name='summary_changes')
+    op.drop_table('summary_changes')
@@ -0,0 +1,26 @@
+"""job_runs.heartbeat_at: running jobs show they are alive"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'heartbeat_at' in {c['name'] for c in inspector.get_columns('job_runs')}:
+        return  # created by create_schema() before this migration ran
+    op.add_column('job_runs', sa.Column('heartbeat_at', sa.TIMESTAMP(timezone=True)))
+    # runs claimed under the old scheme held their transaction open; any row
+    # still running now was left by a process that died
+    op.execute(
+        "UPDATE job_runs SET status = 'failed', detail = 'abandoned before heartbeats' "
+        "WHERE status = 'running'"
+    )
+
+
+def downgrade():
+    op.drop_column('job_runs', 'heartbeat_at')
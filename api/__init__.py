@@ -1,3 +1,11 @@
-from .main import app
+def __getattr__(name):
+    # Imported on first access so `from api import summary_cache` (app.py)
+    # does not pull in FastAPI and the database engine.
+    if name == "app":
+        from .main import app
+
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = ["app"]
@@ -0,0 +1,169 @@
+"""Team analytics from daily attendance rollups.
+
+``attendance_daily`` holds each employee's worked seconds and punch flags
+per local day; ``attendance_rollups`` marks the employee-months those rows
+are current for. A trigger on ``events`` drops the mark of the month an
+inserted, updated or deleted event falls in, and :func:`refresh` recomputes
+unmarked months on the next read, so a team query reads one indexed row
+per employee-day instead of every event. Extra and penalty hours depend on
+the attendance rules and are derived from the daily seconds at read time.
+
+Like ``/summary?month``, every month is computed on its own: a shift still
+open at the end of a month does not carry into the next.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import archive
+from .days import month_bounds
+from .models import AttendanceDaily, AttendanceRollup
+
+# Prefix of the advisory lock key shared with the events trigger
+LOCK_PREFIX = "attendance_rollup:"
+
+# (employee_id, day, worked seconds, flags)
+DailyRow = Tuple[str, date, float, int]
+
+
+def months_between(start: date, end: date) -> List[Tuple[int, int]]:
+    """Every (year, month) with a day in [start, end)."""
+    months: List[Tuple[int, int]] = []
+    year, month = start.year, start.month
+    while date(year, month, 1) < end:
+        months.append((year, month))
+        year, month = year + (month == 12), month % 12 + 1
+    return months
+
+
+async def _stale_employees(session: AsyncSession, key: str, start: datetime, end: datetime,
+                           arc: archive.MonthArchive | None) -> List[str]:
+    if arc is not None:
+        result = await session.execute(
+            text("SELECT employee_id FROM attendance_rollups WHERE month = :month"), {"month": key}
+        )
+        marked = {r[0] for r in result}
+        return [e for e in arc.employees if e not in marked]
+    result = await session.execute(
+        text(
+            "SELECT DISTINCT e.employee_id FROM events e "
+            "WHERE e.timestamp >= :start AND e.timestamp < :end AND NOT EXISTS ("
+            "SELECT 1 FROM attendance_rollups r WHERE r.employee_id = e.employee_id AND r.month = :month)"
+        ),
+        {"start": start, "end": end, "month": key},
+    )
+    return sorted(r[0] for r in result)
+
+
+async def _month_days(session: AsyncSession, year: int, month: int, employees: Sequence[str],
+                      arc: archive.MonthArchive | None) -> List[DailyRow]:
+    """Compute the daily rows of `employees` for one month."""
+    from .main import _month_accumulator
+
+    accs = {e: _month_accumulator(year, month) for e in employees}
+    if arc is not None:
+        for employee_id in employees:
+            accs[employee_id].feed_series(arc.series(employee_id))
+    else:
+        start, end = month_bounds(year, month)
+        result = await session.execute(
+            text(
+                "SELECT employee_id, timestamp, kind FROM events "
+                "WHERE employee_id = ANY(:employees) AND timestamp >= :start AND timestamp < :end "
+                "ORDER BY employee_id, timestamp"
+            ),
+            {"employees": list(employees), "start": start, "end": end},
+        )
+        for employee_id, ts, kind in result:
+            accs[employee_id].feed(ts, kind)
+
+    first = date(year, month, 1)
+    rows: List[DailyRow] = []
+    for employee_id, acc in accs.items():
+        for idx, (seconds, flags) in enumerate(zip(acc.seconds, acc.flags)):
+            if seconds or flags:
+                rows.append((employee_id, first + timedelta(days=idx), seconds, flags))
+    return rows
+
+
+async def refresh(session: AsyncSession, months: Iterable[Tuple[int, int]]) -> List[DailyRow]:
+    """Bring the rollups of `months` up to date and commit.
+
+    Employee-months a writer is still changing are computed but not stored;
+    their daily rows are returned so the caller can include them.
+    """
+    unstored: List[DailyRow] = []
+    for year, month in months:
+        key = f"{year:04d}-{month:02d}"
+        start, end = month_bounds(year, month)
+        arc = archive.open_month(key)
+        stale = await _stale_employees(session, key, start, end, arc)
+        if not stale:
+            continue
+        # Never wait on the trigger's shared locks: whoever holds one is
+        # about to invalidate the month again anyway
+        result = await session.execute(
+            text(
+                "SELECT e FROM unnest(CAST(:employees AS text[])) e "
+                "WHERE pg_try_advisory_xact_lock(hashtext(:prefix || e))"
+            ),
+            {"employees": stale, "prefix": LOCK_PREFIX},
+        )
+        locked = {r[0] for r in result}
+        rows = await _month_days(session, year, month, stale, arc)
+        unstored.extend(r for r in rows if r[0] not in locked)
+        if not locked:
+            continue
+        await session.execute(
+            text("DELETE FROM attendance_daily WHERE month = :month AND employee_id = ANY(:employees)"),
+            {"month": key, "employees": sorted(locked)},
+        )
+        stored = [
+            {"employee_id": e, "day": d, "month": key, "worked_seconds": s, "flags": f}
+            for e, d, s, f in rows if e in locked
+        ]
+        if stored:
+            await session.execute(pg_insert(AttendanceDaily), stored)
+        now = datetime.now(timezone.utc)
+        marks = pg_insert(AttendanceRollup).values([
+            {"employee_id": e, "month": key, "starts_at": start, "ends_at": end, "computed_at": now}
+            for e in sorted(locked)
+        ])
+        await session.execute(
+            marks.on_conflict_do_update(
+                index_elements=["employee_id", "month"], set_={"computed_at": now}
+            )
+        )
+    await session.commit()
+    return unstored
+
+
+async def daily_rows(session: AsyncSession, start: date, end: date) -> List[DailyRow]:
+    """Return current daily rows for [start, end), refreshing stale months first."""
+    extra = await refresh(session, months_between(start, end))
+    result = await session.execute(
+        text(
+            "SELECT d.employee_id, d.day, d.worked_seconds, d.flags FROM attendance_daily d "
+            "JOIN attendance_rollups r ON r.employee_id = d.employee_id AND r.month = d.month "
+            "WHERE d.day >= :start AND d.day < :end"
+        ),
+        {"start": start, "end": end},
+    )
+    rows = [tuple(r) for r in result]
+    rows.extend(r for r in extra if start <= r[1] < end)
+    return rows
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """Linear-interpolated `p`-th percentile (0-100) of sorted `values`."""
+    if not values:
+        return 0.0
+    pos = (len(values) - 1) * p / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
@@ -0,0 +1,432 @@
+"""Columnar archive files for closed months of events.
+
+Closed months are never edited, so they can be moved out of ``events`` into
+one file per month in ``EVENT_ARCHIVE_DIR`` (unset disables archiving; the
+directory must be durable storage shared by every instance, since a frozen
+month exists nowhere else; see the README). Reads of an archived month go
+to the file, which is memory-mapped and sliced without copying. Open months,
+and months nobody archived, still come from the table. Freezing a month
+drops its ``events`` partition (see api/partitions.py) rather than deleting
+its rows; thawing creates it again.
+
+File layout (little-endian)::
+
+    header   magic "ATTARC01", metadata length (u32), padding (u32), rows (u64)
+    metadata JSON: month, bounds, employee and kind dictionaries, the row
+             range of each employee and the offset of each column
+    columns  id (i64), employee code (u32), timestamp (i64 epoch micros),
+             kind code (u8), created_at and updated_at (i64 epoch micros,
+             NULL_TIME when unknown), by_time (u32 row order by timestamp)
+
+Rows are sorted by employee then timestamp, so one employee's month is a
+contiguous slice. Archived months are read-only: the API answers writes to
+them with 409 until the month is thawed.
+
+    python -m api.archive freeze --month 2024-01   # or --before 2024-06
+    python -m api.archive thaw --month 2024-01
+    python -m api.archive list
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import dbconn
+
+from . import partitions, summary_cache
+from .days import ATTENDANCE_TZ, month_bounds
+from .series import EventSeries
+
+ARCHIVE_DIR = os.getenv("EVENT_ARCHIVE_DIR") or None
+
+MAGIC = b"ATTARC01"
+_HEADER = struct.Struct("<8sIIQ")
+# created_at/updated_at of rows that had none
+NULL_TIME = -(2 ** 63)
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+# column name -> array typecode
+_COLUMNS = (
+    ("id", "q"),
+    ("employee", "I"),
+    ("timestamp", "q"),
+    ("kind", "B"),
+    ("created_at", "q"),
+    ("updated_at", "q"),
+    ("by_time", "I"),
+)
+
+
+class ArchivedMonthError(Exception):
+    """Raised on writes to an archived month."""
+
+
+def _micros(value: datetime | None) -> int:
+    if value is None:
+        return NULL_TIME
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _datetime(micros: int) -> datetime | None:
+    if micros == NULL_TIME:
+        return None
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+def _isoformat(micros: int) -> str | None:
+    if micros == NULL_TIME:
+        return None
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+def path_for(month: str) -> str:
+    return os.path.join(ARCHIVE_DIR or ".", f"events-{month}.arc")
+
+
+class MonthArchive:
+    """Read-only view of one archive file.
+
+    Columns are memoryviews over the mapped file; slicing them copies
+    nothing, so reading one employee touches only that employee's pages.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, meta_len, _, self.rows = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an event archive")
+        meta = json.loads(self._map[_HEADER.size:_HEADER.size + meta_len])
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {meta['byteorder']}-endian machine")
+        self.path = path
+        self.month: str = meta["month"]
+        self.employees: List[str] = meta["employees"]
+        self.kinds: List[str] = meta["kinds"]
+        self._codes = {e: i for i, e in enumerate(self.employees)}
+        self._ranges: List[Tuple[int, int]] = [tuple(r) for r in meta["ranges"]]
+        view = memoryview(self._map)
+        for name, typecode in _COLUMNS:
+            offset = meta["columns"][name]
+            size = array(typecode).itemsize
+            setattr(self, name, view[offset:offset + self.rows * size].cast(typecode))
+
+    def span(self, employee_id: str) -> Tuple[int, int]:
+        """Row range [start, end) of `employee_id`; empty when absent."""
+        code = self._codes.get(employee_id)
+        return self._ranges[code] if code is not None else (0, 0)
+
+    def series(self, employee_id: str) -> EventSeries:
+        """Return one employee's events as a series viewing the mapped file."""
+        a, b = self.span(employee_id)
+        return EventSeries(self.timestamp[a:b], self.kind[a:b], self.kinds)
+
+    def event_dicts(self, employee_id: str | None = None) -> Iterator[Dict[str, object]]:
+        """Yield events in the shape of ``GET /events``, ordered by timestamp."""
+        if employee_id is not None:
+            a, b = self.span(employee_id)
+            order = range(b - a)
+        else:
+            a, b = 0, self.rows
+            order = self.by_time
+        # one bulk conversion per column beats indexing the views row by row
+        ids, emps, stamps, kinds, created, updated = (
+            getattr(self, name)[a:b].tolist()
+            for name in ("id", "employee", "timestamp", "kind", "created_at", "updated_at")
+        )
+        employees, kind_names = self.employees, self.kinds
+        for row in order:
+            yield {
+                "id": ids[row],
+                "employee_id": employees[emps[row]],
+                "kind": kind_names[kinds[row]],
+                "timestamp": _isoformat(stamps[row]),
+                "created_at": _isoformat(created[row]),
+                "updated_at": _isoformat(updated[row]),
+            }
+
+
+_open: Dict[str, Tuple[Tuple[int, int], MonthArchive]] = {}
+_open_lock = Lock()
+
+
+def open_month(month: str) -> Optional[MonthArchive]:
+    """Return the archive of `month`, or None when it is not archived."""
+    if ARCHIVE_DIR is None:
+        return None
+    path = path_for(month)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _open.pop(path, None)
+        return None
+    key = (st.st_ino, st.st_mtime_ns)
+    with _open_lock:
+        cached = _open.get(path)
+        if cached is None or cached[0] != key:
+            # a replaced file gets a new mapping; views of the old one stay valid
+            cached = _open[path] = (key, MonthArchive(path))
+        return cached[1]
+
+
+def is_archived(month: str) -> bool:
+    return ARCHIVE_DIR is not None and os.path.exists(path_for(month))
+
+
+def check_writable(*timestamps: datetime | None) -> None:
+    """Raise :class:`ArchivedMonthError` if any timestamp is in an archived month."""
+    if ARCHIVE_DIR is None:
+        return
+    for ts in timestamps:
+        if ts is not None:
+            month = summary_cache.month_key(ts.astimezone(ATTENDANCE_TZ))
+            if is_archived(month):
+                raise ArchivedMonthError(f"{month} is archived; thaw it to edit events")
+
+
+def split_range(start: datetime, end: datetime) -> List[Tuple[datetime, datetime, Optional[MonthArchive]]]:
+    """Split [start, end) into pieces read from one archive or from the table.
+
+    Consecutive months that are not archived are merged into one piece with
+    no archive, so they can be read with a single query.
+    """
+    if ARCHIVE_DIR is None or start >= end:
+        return [(start, end, None)]
+    pieces: List[Tuple[datetime, datetime, Optional[MonthArchive]]] = []
+    local = start.astimezone(ATTENDANCE_TZ)
+    year, m = local.year, local.month
+    while True:
+        lo, hi = month_bounds(year, m)
+        if lo >= end:
+            break
+        lo, hi = max(lo, start), min(hi, end)
+        arc = open_month(f"{year:04d}-{m:02d}")
+        if arc is None and pieces and pieces[-1][2] is None:
+            pieces[-1] = (pieces[-1][0], hi, None)
+        else:
+            pieces.append((lo, hi, arc))
+        year, m = year + (m == 12), m % 12 + 1
+    return pieces
+
+
+def archived_months() -> List[str]:
+    if ARCHIVE_DIR is None or not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(
+        name[len("events-"):-len(".arc")] for name in os.listdir(ARCHIVE_DIR)
+        if name.startswith("events-") and name.endswith(".arc")
+    )
+
+
+# ---------------------------------------------------------------------------
+# Writing
+# ---------------------------------------------------------------------------
+
+def write_file(path: str, month: str, rows: List[Tuple[int, str, datetime, str, datetime | None, datetime | None]]) -> None:
+    """Write (id, employee_id, timestamp, kind, created_at, updated_at) rows to `path`."""
+    rows = sorted(rows, key=lambda r: (r[1], r[2], r[0]))
+    employees = sorted({r[1] for r in rows})
+    kinds = sorted({r[3] for r in rows})
+    if len(kinds) > 255:
+        raise ValueError("too many distinct event kinds for a u8 code")
+    emp_code = {e: i for i, e in enumerate(employees)}
+    kind_code = {k: i for i, k in enumerate(kinds)}
+
+    columns = {
+        "id": array("q", (r[0] for r in rows)),
+        "employee": array("I", (emp_code[r[1]] for r in rows)),
+        "timestamp": array("q", (_micros(r[2]) for r in rows)),
+        "kind": array("B", (kind_code[r[3]] for r in rows)),
+        "created_at": array("q", (_micros(r[4]) for r in rows)),
+        "updated_at": array("q", (_micros(r[5]) for r in rows)),
+    }
+    ts = columns["timestamp"]
+    columns["by_time"] = array("I", sorted(range(len(rows)), key=lambda i: (ts[i], rows[i][0])))
+    ranges = [[0, 0] for _ in employees]
+    for i, r in enumerate(rows):
+        span = ranges[emp_code[r[1]]]
+        if span[1] == 0:
+            span[0] = i
+        span[1] = i + 1
+
+    year, m = map(int, month.split("-"))
+    start, end = month_bounds(year, m)
+    meta = {
+        "month": month,
+        "bounds": [start.isoformat(), end.isoformat()],
+        "byteorder": sys.byteorder,
+        "employees": employees,
+        "kinds": kinds,
+        "ranges": ranges,
+        "columns": {},
+    }
+    # Column offsets depend on the metadata length, which depends on the
+    # offsets; reserve room generously and pad
+    meta_len = len(json.dumps(meta).encode()) + 40 * len(columns) + 64
+    offset = _pad(_HEADER.size + meta_len)
+    for name, _ in _COLUMNS:
+        meta["columns"][name] = offset
+        offset = _pad(offset + len(columns[name]) * columns[name].itemsize)
+    encoded = json.dumps(meta).encode().ljust(meta_len)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, meta_len, 0, len(rows)))
+        f.write(encoded)
+        for name, _ in _COLUMNS:
+            f.seek(meta["columns"][name])
+            f.write(columns[name].tobytes())
+        f.truncate(max(offset, f.tell()))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _pad(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def freeze(month: str, database_url: str | None = None) -> int:
+    """Move a closed month's events into its archive file; return the row count."""
+    if ARCHIVE_DIR is None:
+        raise RuntimeError("EVENT_ARCHIVE_DIR is not set")
+    year, m = map(int, month.split("-"))
+    if not summary_cache.is_closed(year, m, ATTENDANCE_TZ):
+        raise ValueError(f"{month} is not closed yet")
+    if is_archived(month):
+        raise ValueError(f"{month} is already archived")
+    _check_archive_dir()
+    start, end = month_bounds(year, m)
+    path = path_for(month)
+    part = partitions.partition_name(month)
+    pool = dbconn.SyncPool(dbconn.sync_url(database_url or dbconn.database_url()), name="archive", size=1)
+    written = False
+    try:
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                # the month gets its own partition (taking any rows out of
+                # events_default), which is then read whole and dropped
+                cur.execute(
+                    "SELECT events_create_partition(%(part)s, %(lo)s, %(hi)s)", partitions.partition_args(month)
+                )
+                cur.execute(f"LOCK TABLE {part} IN SHARE MODE")
+                cur.execute(f"SELECT id, employee_id, timestamp, kind, created_at, updated_at FROM {part}")
+                rows = cur.fetchall()
+                cur.execute(
+                    "SELECT count(*) FROM events WHERE timestamp >= %s AND timestamp < %s", (start, end)
+                )
+                if cur.fetchone()[0] != len(rows) or not all(start <= r[2] < end for r in rows):
+                    raise RuntimeError(f"partition {part} does not match the bounds of {month}")
+                write_file(path, month, rows)
+                written = True
+                _verify_file(path, rows)
+                # From here on the API refuses writes to the month
+                cur.execute(f"DROP TABLE {part}")
+        # committed: the file is now the only copy
+        return len(rows)
+    except BaseException:
+        # the partition is still there (the drop rolled back with the rest)
+        if written:
+            os.unlink(path)
+        raise
+    finally:
+        pool.closeall()
+
+
+def _check_archive_dir() -> None:
+    """Refuse to freeze unless ``EVENT_ARCHIVE_DIR`` is an existing absolute directory.
+
+    Freezing leaves the file as the only copy of the month, so the directory
+    must be durable storage every instance mounts (see the README). It is
+    not created here: a volume that failed to mount would otherwise be
+    replaced by a directory on the instance's own, discarded, disk.
+    """
+    if not os.path.isabs(ARCHIVE_DIR) or not os.path.isdir(ARCHIVE_DIR):
+        raise RuntimeError(f"EVENT_ARCHIVE_DIR {ARCHIVE_DIR!r} must be an existing absolute directory")
+
+
+def _verify_file(path: str, rows) -> None:
+    """Read `path` back and check it holds exactly `rows`, before they are dropped."""
+    arc = MonthArchive(path)
+    if arc.rows != len(rows) or sorted(arc.id.tolist()) != sorted(r[0] for r in rows):
+        raise RuntimeError(f"{path} does not match the rows it was written from")
+
+
+def thaw(month: str, database_url: str | None = None) -> int:
+    """Put an archived month back into ``events`` and remove its file."""
+    arc = open_month(month)
+    if arc is None:
+        raise ValueError(f"{month} is not archived")
+    rows = [
+        (arc.id[i], arc.employees[arc.employee[i]], _datetime(arc.timestamp[i]),
+         arc.kinds[arc.kind[i]], _datetime(arc.created_at[i]), _datetime(arc.updated_at[i]))
+        for i in range(arc.rows)
+    ]
+    from psycopg2.extras import execute_values
+
+    pool = dbconn.SyncPool(dbconn.sync_url(database_url or dbconn.database_url()), name="archive", size=1)
+    try:
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT events_create_partition(%(part)s, %(lo)s, %(hi)s)", partitions.partition_args(month)
+                )
+                execute_values(
+                    cur,
+                    "INSERT INTO events (id, employee_id, timestamp, kind, created_at, updated_at) "
+                    "VALUES %s ON CONFLICT (id, timestamp) DO NOTHING",
+                    rows,
+                    page_size=1000,
+                )
+    finally:
+        pool.closeall()
+    # only once the rows are committed; until then the file is their only copy
+    os.unlink(arc.path)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m api.archive", description="Archive closed months of events.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_freeze = sub.add_parser("freeze", help="archive a closed month")
+    group = p_freeze.add_mutually_exclusive_group(required=True)
+    group.add_argument("--month", help="YYYY-MM")
+    group.add_argument("--before", help="archive every closed month before this YYYY-MM")
+    p_thaw = sub.add_parser("thaw", help="move an archived month back into the table")
+    p_thaw.add_argument("--month", required=True)
+    sub.add_parser("list", help="list archived months")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name in archived_months():
+            arc = open_month(name)
+            print(f"{name}  {arc.rows} events  {len(arc.employees)} employees")
+    elif args.command == "thaw":
+        print(f"restored {thaw(args.month)} events for {args.month}")
+    elif args.month:
+        print(f"archived {freeze(args.month)} events for {args.month}")
+    else:
+        months = []
+        pool = dbconn.SyncPool(dbconn.sync_url(dbconn.database_url()), name="archive", size=1)
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT min(timestamp) FROM events")
+                first = cur.fetchone()[0]
+        pool.closeall()
+        if first is not None:
+            local = first.astimezone(ATTENDANCE_TZ)
+            year, m = local.year, local.month
+            while f"{year:04d}-{m:02d}" < args.before and summary_cache.is_closed(year, m, ATTENDANCE_TZ):
+                months.append(f"{year:04d}-{m:02d}")
+                year, m = year + (m == 12), m % 12 + 1
+        for month in months:
+            if not is_archived(month):
+                print(f"archived {freeze(month)} events for {month}")
@@ -0,0 +1,102 @@
+"""Audit log paging and retention.
+
+``admin_logs`` is read newest first with keyset cursors so a page costs
+the same however long the history is. Rows older than
+``ADMIN_LOG_RETENTION_DAYS`` are moved to ``admin_logs_archive`` (or
+dropped when ``ADMIN_LOG_ARCHIVE=0``) by :func:`prune`, run on a schedule
+with ``python -m api.audit``.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# 0 keeps the audit log forever
+ADMIN_LOG_RETENTION_DAYS = int(os.getenv("ADMIN_LOG_RETENTION_DAYS", "0"))
+ADMIN_LOG_ARCHIVE = os.getenv("ADMIN_LOG_ARCHIVE", "1") != "0"
+PRUNE_BATCH_SIZE = 5000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def encode_cursor(created_at: datetime, log_id: int) -> str:
+    """Opaque position of a row in newest-first order."""
+    delta = created_at - _EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return f"{micros}.{log_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    micros, log_id = cursor.split(".", 1)
+    return _EPOCH + timedelta(microseconds=int(micros)), int(log_id)
+
+
+_ARCHIVE_BATCH = text(
+    """
+    WITH moved AS (
+        DELETE FROM admin_logs
+        WHERE id IN (
+            SELECT id FROM admin_logs WHERE created_at < :cutoff
+            ORDER BY created_at LIMIT :batch
+        )
+        RETURNING id, action, data, employee_id, created_at
+    )
+    INSERT INTO admin_logs_archive (id, action, data, employee_id, created_at, archived_at)
+    SELECT id, action, data, employee_id, created_at, now() FROM moved
+    """
+)
+_DELETE_BATCH = text(
+    """
+    DELETE FROM admin_logs
+    WHERE id IN (
+        SELECT id FROM admin_logs WHERE created_at < :cutoff
+        ORDER BY created_at LIMIT :batch
+    )
+    """
+)
+
+
+async def prune(
+    session: AsyncSession,
+    retention_days: int = ADMIN_LOG_RETENTION_DAYS,
+    archive: bool = ADMIN_LOG_ARCHIVE,
+    batch_size: int = PRUNE_BATCH_SIZE,
+    now: datetime | None = None,
+) -> int:
+    """Move (or delete) audit rows older than `retention_days`.
+
+    Works in committed batches so locks stay short; returns the number of
+    rows removed from admin_logs.
+    """
+    if retention_days <= 0:
+        return 0
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+    stmt = _ARCHIVE_BATCH if archive else _DELETE_BATCH
+    total = 0
+    while True:
+        result = await session.execute(stmt, {"cutoff": cutoff, "batch": batch_size})
+        await session.commit()
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
+
+
+async def _main(retention_days: int, archive: bool) -> int:
+    from .models import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        return await prune(session, retention_days, archive)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m api.audit", description="Apply audit log retention.")
+    parser.add_argument("--retention-days", type=int, default=ADMIN_LOG_RETENTION_DAYS)
+    parser.add_argument("--no-archive", action="store_true", help="delete instead of archiving")
+    args = parser.parse_args()
+    removed = asyncio.run(_main(args.retention_days, ADMIN_LOG_ARCHIVE and not args.no_archive))
+    print(f"removed {removed} audit rows")
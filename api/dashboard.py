@@ -0,0 +1,110 @@
+"""Today's workforce board behind ``GET /dashboard/now``.
+
+Each worker keeps every employee's ``employee_status`` row (see
+api/status.py) in memory. The board is loaded on first use and then
+synced at most every ``DASHBOARD_REFRESH_SEC`` seconds by reading only
+the rows the events triggers rewrote since the last sync
+(``employee_status.updated_at``), so writes made through any worker,
+job or instance show up within that interval and a poll is a
+dictionary walk, not a month of events.
+
+``updated_at`` is taken while the writing transaction runs, so a row can
+commit after a later sync has moved past it; syncs re-read the last
+``SYNC_OVERLAP_SEC`` seconds to pick those up.
+
+Clock-ins after ``DASHBOARD_LATE_AFTER`` (``HH:MM`` local time, default
+09:15) count as late. A shift opened on an earlier day that is still
+open is reported as an open shift.
+"""
+from __future__ import annotations
+
+import os
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import status
+from .days import ATTENDANCE_TZ, local_date
+
+DASHBOARD_REFRESH_SEC = float(os.getenv("DASHBOARD_REFRESH_SEC", "2"))
+LATE_AFTER = dt_time.fromisoformat(os.getenv("DASHBOARD_LATE_AFTER", "09:15"))
+SYNC_OVERLAP_SEC = 30.0
+
+_COLUMNS = f"employee_id, {status.COLUMNS}, first_in_at, updated_at"
+_LOAD = text(f"SELECT {_COLUMNS} FROM employee_status")
+_CHANGED = text(f"SELECT {_COLUMNS} FROM employee_status WHERE updated_at > :since")
+
+
+class Board:
+    """The ``employee_status`` rows of one worker, kept current by :meth:`sync`."""
+
+    __slots__ = ("rows", "watermark", "checked_at")
+
+    def __init__(self) -> None:
+        self.rows: Dict[str, object] = {}
+        # newest updated_at seen; None until the first load
+        self.watermark: Optional[datetime] = None
+        self.checked_at = 0.0
+
+    def apply(self, rows) -> None:
+        for row in rows:
+            if row.last_event_at is None:
+                self.rows.pop(row.employee_id, None)
+            else:
+                self.rows[row.employee_id] = row
+            if row.updated_at is not None and (self.watermark is None or row.updated_at > self.watermark):
+                self.watermark = row.updated_at
+
+    async def sync(self, session: AsyncSession, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and self.checked_at and now - self.checked_at < DASHBOARD_REFRESH_SEC:
+            return
+        if self.watermark is None:
+            result = await session.execute(_LOAD)
+            self.rows.clear()
+        else:
+            since = self.watermark - timedelta(seconds=SYNC_OVERLAP_SEC)
+            result = await session.execute(_CHANGED, {"since": since})
+        self.apply(result)
+        self.checked_at = now
+
+    def snapshot(self, now: datetime | None = None) -> Dict[str, object]:
+        """Counts and per-employee state for today."""
+        now = now or datetime.now(timezone.utc)
+        today = local_date(now)
+        employees: List[Dict[str, object]] = []
+        counts = dict.fromkeys(
+            ("working", "on_break", "clocked_out", "absent", "late", "open_shifts"), 0
+        )
+        for employee_id in sorted(self.rows):
+            row = self.rows[employee_id]
+            entry = status.view(employee_id, row, now)
+            del entry["as_of"]
+            first_in = row.first_in_at if row.day == today else None
+            entry["first_in_at"] = first_in.isoformat() if first_in else None
+            entry["late"] = first_in is not None and first_in.astimezone(ATTENDANCE_TZ).time() > LATE_AFTER
+            entry["open_shift"] = row.state != "off" and row.day is not None and row.day < today
+            employees.append(entry)
+            if row.state == "working":
+                counts["working"] += 1
+            elif row.state == "break":
+                counts["on_break"] += 1
+            elif first_in is not None:
+                counts["clocked_out"] += 1
+            else:
+                counts["absent"] += 1
+            counts["late"] += entry["late"]
+            counts["open_shifts"] += entry["open_shift"]
+        return {
+            "as_of": now.isoformat(),
+            "day": today.isoformat(),
+            "late_after": LATE_AFTER.isoformat("minutes"),
+            "counts": {"employees": len(employees), **counts},
+            "employees": employees,
+        }
+
+
+board = Board()
@@ -0,0 +1,109 @@
+"""Local-day bucketing for attendance summaries.
+
+Staff think in local days, so summaries bucket time by midnights in
+``ATTENDANCE_TZ`` (an IANA zone name, ``UTC`` by default) rather than by
+UTC dates. Day lengths follow the zone's DST transitions.
+"""
+from __future__ import annotations
+
+import calendar
+import os
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Iterator, List, Tuple
+from zoneinfo import ZoneInfo
+
+ATTENDANCE_TZ: tzinfo = ZoneInfo(os.getenv("ATTENDANCE_TZ", "UTC"))
+
+
+def local_midnight(day: date, tz: tzinfo | None = None) -> datetime:
+    """Return the first instant of `day` in `tz` as an aware datetime."""
+    return datetime.combine(day, time(0), tzinfo=tz or ATTENDANCE_TZ)
+
+
+def local_date(ts: datetime, tz: tzinfo | None = None) -> date:
+    return ts.astimezone(tz or ATTENDANCE_TZ).date()
+
+
+def month_bounds(year: int, month: int, tz: tzinfo | None = None) -> Tuple[datetime, datetime]:
+    """Return the [start, end) instants of a local calendar month."""
+    start = local_midnight(date(year, month, 1), tz)
+    end = local_midnight(date(year + (month == 12), month % 12 + 1, 1), tz)
+    return start, end
+
+
+def parse_bound(value: str, tz: tzinfo | None = None) -> datetime:
+    """Parse an ISO date/datetime; naive values are read as local time."""
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz or ATTENDANCE_TZ)
+    return dt
+
+
+class DayIndex:
+    """Sorted epoch boundaries of `num_days` consecutive local days.
+
+    Built once per requested range; timestamps are assigned to days by
+    binary search instead of walking midnight by midnight.
+    """
+
+    __slots__ = ("first_day", "num_days", "tz", "bounds")
+
+    def __init__(self, first_day: date, num_days: int, tz: tzinfo | None = None) -> None:
+        self.first_day = first_day
+        self.num_days = max(num_days, 0)
+        self.tz = tz or ATTENDANCE_TZ
+        self.bounds: List[float] = [
+            local_midnight(first_day + timedelta(days=i), self.tz).timestamp()
+            for i in range(self.num_days + 1)
+        ]
+
+    @classmethod
+    def for_month(cls, year: int, month: int, tz: tzinfo | None = None) -> "DayIndex":
+        return _cached_index(date(year, month, 1), calendar.monthrange(year, month)[1], tz or ATTENDANCE_TZ)
+
+    @classmethod
+    def for_range(cls, start: datetime, end: datetime, tz: tzinfo | None = None) -> "DayIndex":
+        first = local_date(start, tz)
+        return _cached_index(first, (local_date(end, tz) - first).days, tz or ATTENDANCE_TZ)
+
+    @property
+    def start(self) -> datetime:
+        return datetime.fromtimestamp(self.bounds[0], timezone.utc)
+
+    @property
+    def end(self) -> datetime:
+        return datetime.fromtimestamp(self.bounds[-1], timezone.utc)
+
+    def index(self, ts: datetime | float) -> int:
+        """Return the day index of `ts`, or -1 when it falls outside the range.
+
+        `ts` may be an aware datetime or an epoch timestamp.
+        """
+        if isinstance(ts, datetime):
+            ts = ts.timestamp()
+        idx = bisect_right(self.bounds, ts) - 1
+        return idx if 0 <= idx < self.num_days else -1
+
+    def split(self, start: datetime | float, end: datetime | float) -> Iterator[Tuple[int, float]]:
+        """Yield (day index, seconds) for the in-range parts of [start, end)."""
+        if isinstance(start, datetime):
+            start, end = start.timestamp(), end.timestamp()
+        bounds = self.bounds
+        a = max(start, bounds[0])
+        b = min(end, bounds[-1])
+        if a >= b:
+            return
+        first = bisect_right(bounds, a) - 1
+        last = bisect_right(bounds, b) - 1
+        for idx in range(first, min(last, self.num_days - 1) + 1):
+            seconds = min(b, bounds[idx + 1]) - max(a, bounds[idx])
+            if seconds > 0:
+                yield idx, seconds
+
+
+@lru_cache(maxsize=256)
+def _cached_index(first_day: date, num_days: int, tz: tzinfo) -> DayIndex:
+    # DayIndex is never mutated after construction, so instances are shared
+    return DayIndex(first_day, num_days, tz)
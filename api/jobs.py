@@ -0,0 +1,156 @@
+"""The scheduled jobs of the API; see api/scheduler.py.
+
+- ``partitions`` creates the coming months' ``events`` partitions and those
+  of months found in the default partition (``api.partitions``)
+- ``rollup`` refreshes the attendance rollups of this and last month, so
+  ``/analytics/team`` rarely has to recompute on read
+- ``retention`` applies the audit log retention (``api.audit.prune``) and
+  drops ``job_runs`` rows older than ``JOB_RUN_RETENTION_DAYS``
+- ``payroll`` snapshots last month's payroll on the 1st (``api.payroll``)
+- ``auto_clockout`` closes shifts left open for ``AUTO_CLOCKOUT_AFTER_HOURS``
+  (only registered when that is set)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from . import analytics, archive, audit, partitions, payroll, summary_cache
+from .days import ATTENDANCE_TZ, local_date
+from .scheduler import Job, SessionFactory, job_schedule
+
+JOB_RUN_RETENTION_DAYS = int(os.getenv("JOB_RUN_RETENTION_DAYS", "90"))
+# 0 leaves open shifts alone
+AUTO_CLOCKOUT_AFTER_HOURS = float(os.getenv("AUTO_CLOCKOUT_AFTER_HOURS", "0"))
+# How far back auto_clockout looks for open shifts
+AUTO_CLOCKOUT_LOOKBACK_DAYS = 7
+
+
+async def create_partitions(sessions: SessionFactory) -> Optional[str]:
+    async with sessions() as session:
+        months = sorted(set(partitions.months_ahead()) | set(await partitions.stray_months(session)))
+        created = await partitions.ensure(session, months)
+    return f"created {', '.join(created)}" if created else None
+
+
+async def rollup(sessions: SessionFactory) -> Optional[str]:
+    today = datetime.now(ATTENDANCE_TZ).date()
+    previous = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+    async with sessions() as session:
+        unstored = await analytics.refresh(
+            session, analytics.months_between(previous, today + timedelta(days=1))
+        )
+    if unstored:
+        return f"{len({r[0] for r in unstored})} employees busy, left for the next run"
+    return None
+
+
+async def retention(sessions: SessionFactory) -> Optional[str]:
+    async with sessions() as session:
+        removed = await audit.prune(session)
+        result = await session.execute(
+            text("DELETE FROM job_runs WHERE scheduled_for < :cutoff AND status <> 'running'"),
+            {"cutoff": datetime.now(timezone.utc) - timedelta(days=JOB_RUN_RETENTION_DAYS)},
+        )
+        await session.commit()
+    return f"removed {removed} audit rows, {result.rowcount} job runs"
+
+
+async def payroll_snapshot(sessions: SessionFactory) -> Optional[str]:
+    month = payroll.previous_month(datetime.now(ATTENDANCE_TZ).date())
+    # run_payroll is blocking and may start worker processes
+    run_id = await asyncio.to_thread(payroll.run_payroll, month)
+    return f"payroll run {run_id} for {month}"
+
+
+# Adds the clock-out only while the shift is still the employee's latest event
+_AUTO_CLOCKOUT = text(
+    "INSERT INTO events (employee_id, kind, timestamp, created_at, updated_at) "
+    "SELECT CAST(:employee_id AS varchar), 'clockout', :timestamp, now(), now() "
+    "WHERE NOT EXISTS (SELECT 1 FROM events WHERE employee_id = :employee_id AND timestamp > :last) "
+    "RETURNING id"
+)
+
+
+async def auto_clockout(sessions: SessionFactory, now: datetime | None = None) -> Optional[str]:
+    """Clock out employees whose shift has been open too long.
+
+    The clock-out is placed a normal work day after the shift started (but
+    not before its last event, nor in the future) and logged as
+    ``auto_clockout`` so an admin can correct it.
+    """
+    from . import main
+
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(hours=AUTO_CLOCKOUT_AFTER_HOURS)
+    since = now - timedelta(days=AUTO_CLOCKOUT_LOOKBACK_DAYS)
+    async with sessions() as session:
+        await main._refresh_settings(session)
+        result = await session.execute(
+            text(
+                "SELECT DISTINCT ON (employee_id) employee_id, timestamp, kind FROM events "
+                "WHERE timestamp >= :since ORDER BY employee_id, timestamp DESC"
+            ),
+            {"since": since},
+        )
+        last = {e: ts for e, ts, kind in result if kind not in main.OUT_KINDS and ts < cutoff}
+        if not last:
+            return None
+        result = await session.execute(
+            text(
+                "SELECT employee_id, max(timestamp) FROM events WHERE employee_id = ANY(:employees) "
+                "AND kind = ANY(:kinds) AND timestamp >= :since GROUP BY employee_id"
+            ),
+            {"employees": sorted(last), "kinds": sorted(main.IN_KINDS), "since": since},
+        )
+        started = dict(result.all())
+
+        closed: List[tuple] = []
+        for employee_id, last_ts in sorted(last.items()):
+            start = started.get(employee_id, last_ts)
+            ts = min(max(start + timedelta(hours=main.WORK_DAY_HOURS), last_ts), now)
+            if archive.is_archived(summary_cache.month_key(local_date(ts))):
+                continue
+            inserted = await session.scalar(
+                _AUTO_CLOCKOUT, {"employee_id": employee_id, "timestamp": ts, "last": last_ts}
+            )
+            if inserted is not None:
+                closed.append((employee_id, ts))
+        if closed:
+            await session.execute(
+                text(
+                    "INSERT INTO admin_logs (action, data, employee_id, created_at) "
+                    "VALUES ('auto_clockout', :data, :employee_id, now())"
+                ),
+                [{"data": f"{e}:{ts.isoformat()}", "employee_id": e} for e, ts in closed],
+            )
+        await session.commit()
+    for employee_id, ts in closed:
+        summary_cache.invalidate(employee_id, local_date(ts), "attendance")
+    return f"closed {len(closed)} shifts" if closed else None
+
+
+def _jobs() -> List[Job]:
+    defaults = [
+        ("partitions", "0 2 * * *", create_partitions, "Create upcoming events partitions"),
+        ("rollup", "*/15 * * * *", rollup, "Refresh attendance rollups of this and last month"),
+        ("retention", "30 3 * * *", retention, "Audit log and job run retention"),
+        ("payroll", "0 4 1 * *", payroll_snapshot, "Snapshot last month's payroll"),
+    ]
+    if AUTO_CLOCKOUT_AFTER_HOURS > 0:
+        defaults.append(
+            ("auto_clockout", "5 * * * *", auto_clockout, "Clock out shifts left open by a missed clock-out")
+        )
+    jobs = []
+    for name, default, func, description in defaults:
+        schedule = job_schedule(name, default)
+        if schedule is not None:
+            jobs.append(Job(name, schedule, func, description))
+    return jobs
+
+
+JOBS: List[Job] = _jobs()
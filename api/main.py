@@ -1,23 +1,48 @@
 from __future__ import annotations
-from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Dict, Tuple
+from datetime import datetime, timedelta, timezone
+import bisect
+import heapq
+import json
+import math
+import os
+import time
+from typing import AsyncIterator, Iterable, List, Optional, Dict, Tuple, TypeVar
 import calendar
 
-from fastapi import FastAPI, HTTPException, Depends, Query, Body
-from pydantic import BaseModel
-from sqlalchemy import select, update, delete, insert, func, and_
+from fastapi import FastAPI, HTTPException, Depends, Query, Body, Request, Response
+from pydantic import BaseModel, Field
+from sqlalchemy import select, update, delete, insert, func, and_, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.ext.asyncio import AsyncSession
-
+from sqlalchemy.types import Integer, Text
+from starlette.concurrency import run_in_threadpool
+
+import db
+import dbconn
+from compression import AsgiCompressionMiddleware
+from ledger import parse_row, table_name, totals as ledger_totals
+from telemetry import AsgiMetricsMiddleware
+from . import analytics, archive, audit, dashboard, jobs, scheduler, status, summary_cache
+from .days import ATTENDANCE_TZ, DayIndex, local_date, local_midnight, month_bounds, parse_bound
+from .series import EventSeries
 from .models import (
     Event,
     Setting,
     AdminUser,
     AdminLog,
+    PayrollRun,
+    PayrollSnapshot,
+    JobRun,
     AsyncSessionLocal,
-    init_models,
+    DATABASE_URL,
+    ReadSessionLocal,
 )
 
 app = FastAPI()
+# Added first so the metrics middleware times compression too
+app.add_middleware(AsgiCompressionMiddleware)
+app.add_middleware(AsgiMetricsMiddleware)
 
 # ---------------------------------------------------------------------------
 # Attendance calculation settings
@@ -29,28 +54,116 @@ GRACE_PERIOD_MIN = 20
 # Penalty added to missing time in minutes
 UNDER_TIME_PENALTY_MIN = 15
 
-@app.on_event("startup")
-async def on_startup() -> None:
-    await init_models()
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(Setting))
-        rows = result.scalars().all()
-        for row in rows:
-            if row.key == "WORK_DAY_HOURS":
-                global WORK_DAY_HOURS
-                WORK_DAY_HOURS = float(row.value)
-            elif row.key == "GRACE_PERIOD_MIN":
-                global GRACE_PERIOD_MIN
-                GRACE_PERIOD_MIN = float(row.value)
-            elif row.key == "UNDER_TIME_PENALTY_MIN":
-                global UNDER_TIME_PENALTY_MIN
-                UNDER_TIME_PENALTY_MIN = float(row.value)
+_DEFAULT_RULES = {
+    "WORK_DAY_HOURS": WORK_DAY_HOURS,
+    "GRACE_PERIOD_MIN": GRACE_PERIOD_MIN,
+    "UNDER_TIME_PENALTY_MIN": UNDER_TIME_PENALTY_MIN,
+}
+
+# ---------------------------------------------------------------------------
+# Settings cache shared across workers
+# ---------------------------------------------------------------------------
+# Every write to the settings table bumps the counter stored under this key.
+# Workers compare it with the version they loaded at most once every
+# SETTINGS_REFRESH_SEC seconds and reload the rules when it moved, so a
+# change made through any worker or instance applies everywhere within
+# that interval without a settings query per request.
+SETTINGS_VERSION_KEY = "_settings_version"
+SETTINGS_REFRESH_SEC = float(os.getenv("SETTINGS_REFRESH_SEC", "2"))
+
+_settings_version: int | None = None
+_settings_checked_at = 0.0
+
+
+def _apply_settings(values: Dict[str, str]) -> None:
+    global WORK_DAY_HOURS, GRACE_PERIOD_MIN, UNDER_TIME_PENALTY_MIN
+    rules = dict(_DEFAULT_RULES)
+    for key in rules:
+        if key in values:
+            rules[key] = float(values[key])
+    WORK_DAY_HOURS = rules["WORK_DAY_HOURS"]
+    GRACE_PERIOD_MIN = rules["GRACE_PERIOD_MIN"]
+    UNDER_TIME_PENALTY_MIN = rules["UNDER_TIME_PENALTY_MIN"]
+
+
+async def _refresh_settings(session: AsyncSession, force: bool = False) -> None:
+    """Reload the calculation rules if another worker changed them."""
+    global _settings_version, _settings_checked_at
+    now = time.monotonic()
+    if (
+        not force
+        and _settings_version is not None
+        and now - _settings_checked_at < SETTINGS_REFRESH_SEC
+    ):
+        return
+    _settings_checked_at = now
+    stored = await session.scalar(
+        select(Setting.value).where(Setting.key == SETTINGS_VERSION_KEY)
+    )
+    version = int(stored or 0)
+    if version == _settings_version:
+        return
+    if session.info.get("replica") and _settings_version is not None and version < _settings_version:
+        return  # the replica has not caught up with a change we already loaded
+    result = await session.execute(select(Setting))
+    _apply_settings({row.key: row.value for row in result.scalars()})
+    _settings_version = version
+    # summaries computed under the previous rules are no longer valid
+    summary_cache.clear()
+
+
+# The schema is created once per deployment (see api/schema.py) and the rules
+# load on first use through _refresh_settings; startup only starts the job
+# scheduler, which connects on its own thread.
+_scheduler: scheduler.Scheduler | None = None
+
+
+async def _start_scheduler() -> None:
+    global _scheduler
+    if scheduler.ENABLED and _scheduler is None:
+        _scheduler = scheduler.Scheduler(jobs.JOBS, DATABASE_URL)
+        _scheduler.start()
+
+
+async def _stop_scheduler() -> None:
+    global _scheduler
+    if _scheduler is not None:
+        await run_in_threadpool(_scheduler.stop)
+        _scheduler = None
+
+
+app.add_event_handler("startup", _start_scheduler)
+app.add_event_handler("shutdown", _stop_scheduler)
+
 
 async def get_session() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
 
 
+async def get_read_session(request: Request) -> AsyncSession:
+    """Session for read-only endpoints: the replica when one is configured.
+
+    Requests sending ``X-Read-Your-Writes: 1`` read from the primary so they
+    see writes the replica may not have applied yet.
+    """
+    factory = AsyncSessionLocal if dbconn.wants_primary(request.headers) else ReadSessionLocal
+    async with factory() as session:
+        yield session
+
+
+def _cache_settle(session: AsyncSession) -> float:
+    """How long after a write replica reads of the same month stay uncached."""
+    return dbconn.REPLICA_MAX_LAG_SEC if session.info.get("replica") else 0.0
+
+
+def _ensure_writable(*timestamps: datetime | None) -> None:
+    try:
+        archive.check_writable(*timestamps)
+    except archive.ArchivedMonthError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+
 class EventPayload(BaseModel):
     employee_id: str
     kind: str
@@ -76,6 +189,7 @@ async def create_event(
         timestamp = payload.timestamp
     if employee_id is None or kind is None or timestamp is None:
         raise HTTPException(status_code=422, detail="employee_id, kind and timestamp required")
+    _ensure_writable(timestamp)
     event = Event(
         employee_id=employee_id,
         kind=kind,
@@ -84,47 +198,99 @@ async def create_event(
     session.add(event)
     await session.commit()
     await session.refresh(event)
+    summary_cache.invalidate(employee_id, local_date(timestamp), "attendance")
     await session.execute(
-        insert(AdminLog).values(action="create_event", data=f"{employee_id}:{kind}")
+        insert(AdminLog).values(
+            action="create_event", data=f"{employee_id}:{kind}", employee_id=employee_id
+        )
     )
     await session.commit()
     return {"id": event.id}
 
-@app.get("/events", response_model=List[dict])
-async def list_events(
-    employee_id: Optional[str] = Query(None),
-    month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
-    session: AsyncSession = Depends(get_session),
-):
+def _event_to_dict(e: Event) -> Dict[str, object]:
+    return {
+        "id": e.id,
+        "employee_id": e.employee_id,
+        "kind": e.kind,
+        "timestamp": e.timestamp.isoformat(),
+        "created_at": e.created_at.isoformat() if e.created_at else None,
+        "updated_at": e.updated_at.isoformat() if e.updated_at else None,
+    }
+
+
+def _list_events_stmt(employee_id: Optional[str], month: Optional[str]):
+    # the month bounds are the partition bounds, so a month reads one partition
     stmt = select(Event)
     conditions = []
     if employee_id:
         conditions.append(Event.employee_id == employee_id)
     if month:
         year, m = map(int, month.split("-"))
-        start = datetime(year, m, 1, tzinfo=timezone.utc)
-        if m == 12:
-            end = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
-        else:
-            end = datetime(year, m + 1, 1, tzinfo=timezone.utc)
+        start, end = month_bounds(year, m)
         conditions.append(and_(Event.timestamp >= start, Event.timestamp < end))
     if conditions:
         stmt = stmt.where(*conditions)
-    stmt = stmt.order_by(Event.timestamp)
-    result = await session.execute(stmt)
-    rows = result.scalars().all()
-    events = [
-        {
-            "id": e.id,
-            "employee_id": e.employee_id,
-            "kind": e.kind,
-            "timestamp": e.timestamp.isoformat(),
-            "created_at": e.created_at.isoformat() if e.created_at else None,
-            "updated_at": e.updated_at.isoformat() if e.updated_at else None,
-        }
-        for e in rows
-    ]
-    return events
+    return stmt.order_by(Event.timestamp)
+
+
+@app.get("/events", response_model=List[dict])
+async def list_events(
+    employee_id: Optional[str] = Query(None),
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    session: AsyncSession = Depends(get_read_session),
+):
+    if month:
+        arc = archive.open_month(month)
+        if arc is not None:
+            return list(arc.event_dicts(employee_id or None))
+    result = await session.execute(_list_events_stmt(employee_id, month))
+    rows = [_event_to_dict(e) for e in result.scalars().all()]
+    if month:
+        return rows
+    archived = [archive.open_month(k) for k in archive.archived_months()]
+    if not any(archived):
+        return rows
+    sources = [arc.event_dicts(employee_id or None) for arc in archived if arc is not None]
+    return list(heapq.merge(rows, *sources, key=lambda e: datetime.fromisoformat(e["timestamp"])))
+
+@app.get("/status/{employee_id}", response_model=dict)
+async def employee_status(
+    employee_id: str,
+    timeline: bool = Query(False, description="Include today's events"),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Current state (off, working or break), time in it and seconds worked today.
+
+    Read from the ``employee_status`` row the events trigger maintains, so
+    it costs one primary key lookup; ``timeline`` adds today's events.
+    """
+    now = datetime.now(timezone.utc)
+    result = await status.read(session, employee_id, now)
+    if timeline:
+        today = local_date(now)
+        rows = await session.execute(
+            select(Event)
+            .where(
+                Event.employee_id == employee_id,
+                Event.timestamp >= local_midnight(today),
+                Event.timestamp < local_midnight(today + timedelta(days=1)),
+            )
+            .order_by(Event.timestamp)
+        )
+        result["events"] = [_event_to_dict(e) for e in rows.scalars().all()]
+    return result
+
+@app.get("/dashboard/now", response_model=dict)
+async def dashboard_now(session: AsyncSession = Depends(get_session)):
+    """Today's counts and every employee's current state.
+
+    Served from this worker's in-memory board, which reads only the
+    ``employee_status`` rows changed since its last sync (at most every
+    ``DASHBOARD_REFRESH_SEC``). Reads the primary so replica lag cannot
+    hide a change from the sync.
+    """
+    await dashboard.board.sync(session)
+    return dashboard.board.snapshot()
 
 @app.patch("/events/{event_id}", response_model=dict)
 async def update_event(
@@ -137,6 +303,8 @@ async def update_event(
     event = result.scalar_one_or_none()
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
+    _ensure_writable(event.timestamp, payload.timestamp)
+    summary_cache.invalidate(event.employee_id, local_date(event.timestamp), "attendance")
     if payload.employee_id is not None:
         event.employee_id = payload.employee_id
     if payload.kind is not None:
@@ -145,26 +313,125 @@ async def update_event(
         event.timestamp = payload.timestamp
     await session.commit()
     await session.refresh(event)
+    summary_cache.invalidate(event.employee_id, local_date(event.timestamp), "attendance")
     await session.execute(
-        insert(AdminLog).values(action="update_event", data=str(event_id))
+        insert(AdminLog).values(
+            action="update_event", data=str(event_id), employee_id=event.employee_id
+        )
     )
     await session.commit()
     return {"id": event.id}
 
 @app.delete("/events/{event_id}", response_model=dict)
 async def delete_event(event_id: int, session: AsyncSession = Depends(get_session)):
-    stmt = delete(Event).where(Event.id == event_id)
+    stmt = (
+        delete(Event)
+        .where(Event.id == event_id)
+        .returning(Event.employee_id, Event.timestamp)
+    )
     result = await session.execute(stmt)
-    if result.rowcount == 0:
+    deleted = result.first()
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Event not found")
+    try:
+        _ensure_writable(deleted.timestamp)
+    except HTTPException:
+        await session.rollback()
+        raise
     await session.commit()
+    summary_cache.invalidate(deleted.employee_id, local_date(deleted.timestamp), "attendance")
     await session.execute(
-        insert(AdminLog).values(action="delete_event", data=str(event_id))
+        insert(AdminLog).values(
+            action="delete_event", data=str(event_id), employee_id=deleted.employee_id
+        )
     )
     await session.commit()
     return {"ok": True}
 
 
+class BulkEventUpdate(EventUpdate):
+    id: int
+
+
+class BulkEventEdit(BaseModel):
+    employee_id: str
+    month: str = Field(pattern=r"^\d{4}-\d{2}$")
+    create: List[EventPayload] = []
+    update: List[BulkEventUpdate] = []
+    delete: List[int] = []
+
+
+# Most creates, updates and deletes accepted by one /events/bulk request
+MAX_BULK_OPS = 500
+
+
+@app.post("/events/bulk", response_model=dict)
+async def bulk_edit_events(payload: BulkEventEdit, session: AsyncSession = Depends(get_session)):
+    """Apply creates, updates and deletes in one transaction.
+
+    Writes one audit entry for the batch and returns the new event ids (in
+    request order) with the recomputed summary of `employee_id` for `month`,
+    so the editor needs no follow-up reads.
+    """
+    if len(payload.create) + len(payload.update) + len(payload.delete) > MAX_BULK_OPS:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_BULK_OPS} operations")
+    update_ids = [u.id for u in payload.update]
+    ids = set(update_ids) | set(payload.delete)
+    if len(ids) != len(update_ids) + len(payload.delete):
+        raise HTTPException(status_code=422, detail="each event may be updated or deleted once")
+    _ensure_writable(*(c.timestamp for c in payload.create), *(u.timestamp for u in payload.update))
+
+    existing: Dict[int, Event] = {}
+    if ids:
+        result = await session.execute(select(Event).where(Event.id.in_(ids)).with_for_update())
+        existing = {e.id: e for e in result.scalars()}
+    missing = sorted(ids - existing.keys())
+    if missing:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail=f"Events not found: {missing}")
+    try:
+        _ensure_writable(*(e.timestamp for e in existing.values()))
+    except HTTPException:
+        await session.rollback()
+        raise
+
+    touched = {(e.employee_id, local_date(e.timestamp)) for e in existing.values()}
+    for change in payload.update:
+        event = existing[change.id]
+        if change.employee_id is not None:
+            event.employee_id = change.employee_id
+        if change.kind is not None:
+            event.kind = change.kind
+        if change.timestamp is not None:
+            event.timestamp = change.timestamp
+        touched.add((event.employee_id, local_date(event.timestamp)))
+    if payload.delete:
+        await session.execute(
+            delete(Event).where(Event.id.in_(payload.delete)).execution_options(synchronize_session=False)
+        )
+    created = [Event(employee_id=c.employee_id, kind=c.kind, timestamp=c.timestamp) for c in payload.create]
+    session.add_all(created)
+    await session.flush()
+    touched.update((e.employee_id, local_date(e.timestamp)) for e in created)
+    session.add(AdminLog(
+        action="bulk_edit_events",
+        data=json.dumps({
+            "create": [e.id for e in created], "update": update_ids, "delete": payload.delete,
+        }),
+        employee_id=payload.employee_id,
+    ))
+    await session.commit()
+    for employee_id, day in touched:
+        summary_cache.invalidate(employee_id, day, "attendance")
+
+    return {
+        "created": [e.id for e in created],
+        "updated": len(payload.update),
+        "deleted": len(payload.delete),
+        "summary": await _summarize(session, payload.employee_id, payload.month),
+    }
+
+
 def _compute_metrics_from_seconds(seconds: float) -> Dict[str, float]:
     """Return worked, extra, penalty and net hours for the given seconds."""
 
@@ -196,165 +463,226 @@ def _compute_metrics_from_seconds(seconds: float) -> Dict[str, float]:
     }
 
 
-def _extract_work_segments(events: List[Event]) -> List[Tuple[datetime, datetime]]:
-    """Return continuous work segments from ordered events."""
-    events.sort(key=lambda e: e.timestamp)
-    segments: List[Tuple[datetime, datetime]] = []
-    state = "off"
-    start: datetime | None = None
-
-    for ev in events:
-        k = ev.kind
-        if k in {"clockin", "in"} and state == "off":
-            state = "working"
-            start = ev.timestamp
-        elif k == "startbreak" and state == "working" and start is not None:
-            segments.append((start, ev.timestamp))
-            state = "break"
-        elif k == "endbreak" and state == "break":
-            state = "working"
-            start = ev.timestamp
-        elif k in {"clockout", "out"} and start is not None:
-            if state == "working":
-                segments.append((start, ev.timestamp))
-            state = "off"
-            start = None
+# Rows fetched per round trip when streaming events from the server-side cursor
+STREAM_CHUNK_SIZE = 1000
+
+IN_KINDS = frozenset({"clockin", "in"})
+OUT_KINDS = frozenset({"clockout", "out"})
+
+# Per-day flag bits collected by _DayAccumulator
+_SEEN_IN = 1
+_SEEN_OUT = 2
+_SEEN_ANY = 4
+
+
+class _SegmentTracker:
+    """Work/break state machine turning ordered events into work segments.
+
+    Timestamps are opaque to the tracker: datetimes and epoch seconds both work.
+    """
+
+    __slots__ = ("state", "start")
+
+    def __init__(self) -> None:
+        self.state = "off"
+        self.start = None
+
+    def feed(self, ts, kind: str):
+        """Advance the state and return the (start, end) closed by this event, if any."""
+        segment = None
+        if kind in IN_KINDS and self.state == "off":
+            self.state = "working"
+            self.start = ts
+        elif kind == "startbreak" and self.state == "working" and self.start is not None:
+            segment = (self.start, ts)
+            self.state = "break"
+        elif kind == "endbreak" and self.state == "break":
+            self.state = "working"
+            self.start = ts
+        elif kind in OUT_KINDS and self.start is not None:
+            if self.state == "working":
+                segment = (self.start, ts)
+            self.state = "off"
+            self.start = None
+        return segment
+
+
+# a timestamp: datetime or epoch seconds
+_T = TypeVar("_T")
 
+
+def _segments(pairs: Iterable[Tuple[_T, str]]) -> List[Tuple[_T, _T]]:
+    tracker = _SegmentTracker()
+    segments: List[Tuple[_T, _T]] = []
+    for ts, kind in pairs:
+        segment = tracker.feed(ts, kind)
+        if segment is not None:
+            segments.append(segment)
     return segments
 
 
-def _summarize_events(events: List[Event], year: int, month: int) -> Dict[str, object]:
-    days_in_month = calendar.monthrange(year, month)[1]
-    hours_per_day: Dict[str, float] = {str(d): 0.0 for d in range(1, days_in_month + 1)}
-    extras_per_day: Dict[str, float] = {str(d): 0.0 for d in range(1, days_in_month + 1)}
-    penalties_per_day: Dict[str, float] = {str(d): 0.0 for d in range(1, days_in_month + 1)}
-    net_per_day: Dict[str, float] = {str(d): 0.0 for d in range(1, days_in_month + 1)}
-    present_days = set()
-    incomplete_days = 0
-
-    by_day: Dict[int, Dict[str, bool]] = {d: {"in": False, "out": False, "any": False} for d in range(1, days_in_month + 1)}
-    for ev in events:
-        if ev.timestamp.month != month or ev.timestamp.year != year:
-            continue
-        d = ev.timestamp.day
-        if ev.kind in {"clockin", "in"}:
-            by_day[d]["in"] = True
-        if ev.kind in {"clockout", "out"}:
-            by_day[d]["out"] = True
-        by_day[d]["any"] = True
-
-    segments = _extract_work_segments(events)
-    daily_seconds: Dict[int, float] = {d: 0.0 for d in range(1, days_in_month + 1)}
-
-    for start, end in segments:
-        cur = start
-        while cur.date() != end.date():
-            midnight = datetime.combine(cur.date(), datetime.min.time(), tzinfo=cur.tzinfo) + timedelta(days=1)
-            seconds = (midnight - cur).total_seconds()
-            if cur.month == month:
-                daily_seconds[cur.day] += seconds
-            cur = midnight
-        if cur.month == month:
-            daily_seconds[cur.day] += (end - cur).total_seconds()
-
-    for day, secs in daily_seconds.items():
-        metrics = _compute_metrics_from_seconds(secs)
-        if metrics["worked_hours"] > 0:
-            present_days.add(day)
-        hours_per_day[str(day)] = round(metrics["worked_hours"], 2)
-        extras_per_day[str(day)] = round(metrics["extra_hours"], 2)
-        penalties_per_day[str(day)] = round(metrics["penalty_hours"], 2)
-        net_per_day[str(day)] = round(metrics["net_hours"], 2)
-
-    for info in by_day.values():
-        if info["any"] and not (info["in"] and info["out"]):
-            incomplete_days += 1
-
-    attendance_rate = len(present_days) / days_in_month if days_in_month else 0
-    total_hours = round(sum(hours_per_day.values()), 2)
-    total_extra = round(sum(extras_per_day.values()), 2)
-    total_penalty = round(sum(penalties_per_day.values()), 2)
-    net_time = round(total_extra - total_penalty, 2)
-    return {
-        "attendance_rate": attendance_rate,
-        "hours_per_day": hours_per_day,
-        "total_hours": total_hours,
-        "extra_per_day": extras_per_day,
-        "penalty_per_day": penalties_per_day,
-        "net_per_day": net_per_day,
-        "total_extra": total_extra,
-        "total_penalty": total_penalty,
-        "net_time": net_time,
-        "incomplete_days": incomplete_days,
-    }
+def _extract_work_segments(events: Iterable[Event]) -> List[Tuple[datetime, datetime]]:
+    """Return continuous work segments from events ordered by timestamp."""
+    return _segments((ev.timestamp, ev.kind) for ev in events)
+
+
+def _series_work_segments(series: EventSeries) -> List[Tuple[float, float]]:
+    """Return the work segments of `series` in epoch seconds."""
+    return _segments(series)
+
+
+class _DayAccumulator:
+    """Fold ordered (timestamp, kind) rows straight into per-day totals.
+
+    Only the work state and one counter per day are kept, so memory does
+    not depend on how many events are fed.
+    """
+
+    def __init__(self, days: DayIndex) -> None:
+        self.days = days
+        self.num_days = days.num_days
+        self.seconds = [0.0] * days.num_days
+        self.flags = bytearray(days.num_days)
+        self.tracker = _SegmentTracker()
+        # bounds and index of the day the previous row fell in; rows arrive
+        # in order, so most lookups skip the binary search
+        self._day = -1
+        self._lo = self._hi = 0.0
+
+    def feed(self, ts: datetime, kind: str) -> None:
+        # work in epoch seconds so each row is converted only once
+        self.feed_epoch(ts.timestamp(), kind)
+
+    def feed_epoch(self, t: float, kind: str) -> None:
+        if not self._lo <= t < self._hi:
+            self._day = idx = self.days.index(t)
+            if idx >= 0:
+                self._lo, self._hi = self.days.bounds[idx], self.days.bounds[idx + 1]
+            else:
+                self._lo = self._hi = t
+        idx = self._day
+        if idx >= 0:
+            flags = _SEEN_ANY
+            if kind in IN_KINDS:
+                flags |= _SEEN_IN
+            if kind in OUT_KINDS:
+                flags |= _SEEN_OUT
+            self.flags[idx] |= flags
+        segment = self.tracker.feed(t, kind)
+        if segment is not None:
+            start = segment[0]
+            if idx >= 0 and start >= self._lo:
+                self.seconds[idx] += t - start
+            else:
+                self._add_segment(start, t)
+
+    def feed_events(self, events: Iterable[Event] | EventSeries) -> "_DayAccumulator":
+        if isinstance(events, EventSeries):
+            return self.feed_series(events)
+        for ev in events:
+            self.feed(ev.timestamp, ev.kind)
+        return self
+
+    def feed_series(self, series: EventSeries) -> "_DayAccumulator":
+        feed = self.feed_epoch
+        for t, kind in series:
+            feed(t, kind)
+        return self
+
+    def _add_segment(self, start: float, end: float) -> None:
+        for idx, seconds in self.days.split(start, end):
+            self.seconds[idx] += seconds
+
+    def summary(self) -> Dict[str, object]:
+        hours_per_day: Dict[str, float] = {}
+        extras_per_day: Dict[str, float] = {}
+        penalties_per_day: Dict[str, float] = {}
+        net_per_day: Dict[str, float] = {}
+        present_days = 0
+        for idx, secs in enumerate(self.seconds):
+            key = str(idx + 1)
+            metrics = _compute_metrics_from_seconds(secs)
+            if metrics["worked_hours"] > 0:
+                present_days += 1
+            hours_per_day[key] = round(metrics["worked_hours"], 2)
+            extras_per_day[key] = round(metrics["extra_hours"], 2)
+            penalties_per_day[key] = round(metrics["penalty_hours"], 2)
+            net_per_day[key] = round(metrics["net_hours"], 2)
+
+        complete = _SEEN_ANY | _SEEN_IN | _SEEN_OUT
+        incomplete_days = sum(1 for f in self.flags if f & _SEEN_ANY and f != complete)
+
+        attendance_rate = present_days / self.num_days if self.num_days else 0
+        total_hours = round(sum(hours_per_day.values()), 2)
+        total_extra = round(sum(extras_per_day.values()), 2)
+        total_penalty = round(sum(penalties_per_day.values()), 2)
+        net_time = round(total_extra - total_penalty, 2)
+        return {
+            "attendance_rate": attendance_rate,
+            "hours_per_day": hours_per_day,
+            "total_hours": total_hours,
+            "extra_per_day": extras_per_day,
+            "penalty_per_day": penalties_per_day,
+            "net_per_day": net_per_day,
+            "total_extra": total_extra,
+            "total_penalty": total_penalty,
+            "net_time": net_time,
+            "incomplete_days": incomplete_days,
+        }
 
 
-def _summarize_range(events: List[Event], start: datetime, end: datetime) -> Dict[str, object]:
-    """Summarize events between arbitrary start and end datetimes."""
-    num_days = (end.date() - start.date()).days
-    hours_per_day: Dict[str, float] = {str(d + 1): 0.0 for d in range(num_days)}
-    extras_per_day: Dict[str, float] = {str(d + 1): 0.0 for d in range(num_days)}
-    penalties_per_day: Dict[str, float] = {str(d + 1): 0.0 for d in range(num_days)}
-    net_per_day: Dict[str, float] = {str(d + 1): 0.0 for d in range(num_days)}
-    present_days = set()
-    incomplete_days = 0
-
-    by_day: Dict[int, Dict[str, bool]] = {d + 1: {"in": False, "out": False, "any": False} for d in range(num_days)}
-    for ev in events:
-        idx = (ev.timestamp.date() - start.date()).days
-        if 0 <= idx < num_days:
-            if ev.kind in {"clockin", "in"}:
-                by_day[idx + 1]["in"] = True
-            if ev.kind in {"clockout", "out"}:
-                by_day[idx + 1]["out"] = True
-            by_day[idx + 1]["any"] = True
-
-    segments = _extract_work_segments(events)
-    daily_seconds: Dict[int, float] = {d + 1: 0.0 for d in range(num_days)}
-
-    for start_seg, end_seg in segments:
-        cur = start_seg
-        while cur.date() != end_seg.date():
-            midnight = datetime.combine(cur.date(), datetime.min.time(), tzinfo=cur.tzinfo) + timedelta(days=1)
-            seconds = (midnight - cur).total_seconds()
-            day_index = (cur.date() - start.date()).days
-            if 0 <= day_index < num_days:
-                daily_seconds[day_index + 1] += seconds
-            cur = midnight
-        day_index = (cur.date() - start.date()).days
-        if 0 <= day_index < num_days:
-            daily_seconds[day_index + 1] += (end_seg - cur).total_seconds()
-
-    for idx, secs in daily_seconds.items():
-        metrics = _compute_metrics_from_seconds(secs)
-        if metrics["worked_hours"] > 0:
-            present_days.add(idx)
-        hours_per_day[str(idx)] = round(metrics["worked_hours"], 2)
-        extras_per_day[str(idx)] = round(metrics["extra_hours"], 2)
-        penalties_per_day[str(idx)] = round(metrics["penalty_hours"], 2)
-        net_per_day[str(idx)] = round(metrics["net_hours"], 2)
-
-    for info in by_day.values():
-        if info["any"] and not (info["in"] and info["out"]):
-            incomplete_days += 1
-
-    attendance_rate = len(present_days) / num_days if num_days else 0
-    total_hours = round(sum(hours_per_day.values()), 2)
-    total_extra = round(sum(extras_per_day.values()), 2)
-    total_penalty = round(sum(penalties_per_day.values()), 2)
-    net_time = round(total_extra - total_penalty, 2)
-    return {
-        "attendance_rate": attendance_rate,
-        "hours_per_day": hours_per_day,
-        "total_hours": total_hours,
-        "extra_per_day": extras_per_day,
-        "penalty_per_day": penalties_per_day,
-        "net_per_day": net_per_day,
-        "total_extra": total_extra,
-        "total_penalty": total_penalty,
-        "net_time": net_time,
-        "incomplete_days": incomplete_days,
-    }
+def _month_accumulator(year: int, month: int) -> _DayAccumulator:
+    return _DayAccumulator(DayIndex.for_month(year, month))
+
+
+def _range_accumulator(start: datetime, end: datetime) -> _DayAccumulator:
+    return _DayAccumulator(DayIndex.for_range(start, end))
+
+
+def _summarize_events(events: Iterable[Event] | EventSeries, year: int, month: int) -> Dict[str, object]:
+    """Summarize ordered events for one calendar month."""
+    return _month_accumulator(year, month).feed_events(events).summary()
+
+
+def _summarize_range(events: Iterable[Event] | EventSeries, start: datetime, end: datetime) -> Dict[str, object]:
+    """Summarize ordered events between arbitrary start and end datetimes."""
+    return _range_accumulator(start, end).feed_events(events).summary()
+
+
+def _event_rows_stmt(employee_id: str, start: datetime, end: datetime):
+    return (
+        select(Event.timestamp, Event.kind)
+        .where(
+            Event.employee_id == employee_id,
+            Event.timestamp >= start,
+            Event.timestamp < end,
+        )
+        .order_by(Event.timestamp)
+    )
+
+
+async def _stream_event_rows(
+    session: AsyncSession, employee_id: str, start: datetime, end: datetime
+) -> AsyncIterator[Tuple[datetime, str]]:
+    """Yield (timestamp, kind) rows in timestamp order from a server-side cursor."""
+    stmt = _event_rows_stmt(employee_id, start, end).execution_options(yield_per=STREAM_CHUNK_SIZE)
+    result = await session.stream(stmt)
+    async for chunk in result.partitions():
+        for row in chunk:
+            yield row
+
+
+async def _event_epochs(
+    session: AsyncSession, employee_id: str, start: datetime, end: datetime
+) -> AsyncIterator[Tuple[float, str]]:
+    """Yield (epoch seconds, kind) in timestamp order, reading archived months from their files."""
+    for lo, hi, arc in archive.split_range(start, end):
+        if arc is not None:
+            for row in arc.series(employee_id).between(lo.timestamp(), hi.timestamp()):
+                yield row
+        else:
+            async for ts, kind in _stream_event_rows(session, employee_id, lo, hi):
+                yield ts.timestamp(), kind
 
 
 @app.get("/summary", response_model=dict)
@@ -363,37 +691,296 @@ async def get_summary(
     month: str | None = Query(None, pattern=r"^\d{4}-\d{2}$"),
     start: str | None = Query(None),
     end: str | None = Query(None),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
 ):
+    return await _summarize(session, employee_id, month, start, end)
+
+
+async def _summarize(
+    session: AsyncSession, employee_id: str, month: str | None,
+    start: str | None = None, end: str | None = None,
+) -> Dict[str, object]:
+    await _refresh_settings(session)
+    await summary_cache.refresh(session)
+    generation = summary_cache.generation()
+    closed = False
     if month:
         year, m = map(int, month.split("-"))
-        start_dt = datetime(year, m, 1, tzinfo=timezone.utc)
-        end_month = m + 1 if m < 12 else 1
-        end_year = year if m < 12 else year + 1
-        end_dt = datetime(end_year, end_month, 1, tzinfo=timezone.utc)
+        closed = summary_cache.is_closed(year, m, ATTENDANCE_TZ)
+        if closed:
+            cached = summary_cache.get("attendance", employee_id, month)
+            if cached is not None:
+                return cached
+        start_dt, end_dt = month_bounds(year, m)
+        acc = _month_accumulator(year, m)
     elif start and end:
-        start_dt = datetime.fromisoformat(start).replace(tzinfo=timezone.utc)
-        end_dt = datetime.fromisoformat(end).replace(tzinfo=timezone.utc)
+        start_dt = parse_bound(start)
+        end_dt = parse_bound(end)
+        acc = _range_accumulator(start_dt, end_dt)
     else:
         raise HTTPException(status_code=400, detail="month or start/end required")
 
-    stmt = (
-        select(Event)
-        .where(
-            Event.employee_id == employee_id,
-            Event.timestamp >= start_dt,
-            Event.timestamp < end_dt,
+    async for t, kind in _event_epochs(session, employee_id, start_dt, end_dt):
+        acc.feed_epoch(t, kind)
+    summary = acc.summary()
+    if closed:
+        summary_cache.put(
+            "attendance", employee_id, month, summary, generation, _cache_settle(session)
         )
-        .order_by(Event.timestamp)
+    return summary
+
+
+# Longest span, in months, accepted by /summary/period
+MAX_PERIOD_MONTHS = 24
+
+
+def _month_span(start: str, end: str) -> List[Tuple[int, int]]:
+    """Return every (year, month) from `start` to `end` inclusive."""
+    year, month = map(int, start.split("-"))
+    last = tuple(map(int, end.split("-")))
+    months: List[Tuple[int, int]] = []
+    while (year, month) <= last:
+        months.append((year, month))
+        year, month = year + (month == 12), month % 12 + 1
+    return months
+
+
+async def _load_ledger(
+    session: AsyncSession, employee_id: str, start: datetime, end: datetime
+) -> List[Dict[str, object]]:
+    """Return parsed legacy ledger rows (payout, advance, orders) in a range."""
+    store = db.embedded_ledger()
+    if store is not None:
+        rows = await run_in_threadpool(store.month, employee_id, start.date(), end.date())
+        return [parse_row(*row) for row in rows]
+    stmt = text(
+        f'SELECT day, cash, orders, payout, advance FROM "{table_name(employee_id)}" '
+        "WHERE day >= :start AND day < :end ORDER BY day"
     )
-    result = await session.execute(stmt)
-    events = result.scalars().all()
+    try:
+        result = await session.execute(stmt, {"start": start.date(), "end": end.date()})
+    except ProgrammingError:
+        # the legacy table is only created on the employee's first write
+        await session.rollback()
+        return []
+    return [parse_row(*row) for row in result.all()]
 
-    if month:
-        summary = _summarize_events(events, start_dt.year, start_dt.month)
-    else:
-        summary = _summarize_range(events, start_dt, end_dt)
-    return summary
+
+@app.get("/summary/period", response_model=dict)
+async def get_period_summary(
+    employee_id: str = Query(...),
+    start: str = Query(..., pattern=r"^\d{4}-\d{2}$"),
+    end: str = Query(..., pattern=r"^\d{4}-\d{2}$"),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Return per-month and total attendance and payout figures for a span.
+
+    Events and ledger rows for the months not already cached are each read
+    with a single query; closed months are served from the cache.
+    """
+    await _refresh_settings(session)
+    await summary_cache.refresh(session)
+    generation = summary_cache.generation()
+    months = _month_span(start, end)
+    if not months:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if len(months) > MAX_PERIOD_MONTHS:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_PERIOD_MONTHS} months")
+
+    keys = [summary_cache.month_key(datetime(y, m, 1)) for y, m in months]
+    attendance = {k: summary_cache.get("attendance", employee_id, k) for k in keys}
+    ledger = {k: summary_cache.get("ledger", employee_id, k) for k in keys}
+
+    missing = [(k, ym) for k, ym in zip(keys, months) if attendance[k] is None]
+    if missing:
+        span_start = month_bounds(*missing[0][1])[0]
+        span_end = month_bounds(*missing[-1][1])[1]
+        accs = {k: _month_accumulator(y, m) for k, (y, m) in missing}
+        # missing months need not be adjacent; find each row's month by its start
+        starts = [month_bounds(y, m)[0].timestamp() for _, (y, m) in missing]
+        ends = [month_bounds(y, m)[1].timestamp() for _, (y, m) in missing]
+        ordered = [accs[k] for k, _ in missing]
+        async for t, kind in _event_epochs(session, employee_id, span_start, span_end):
+            i = bisect.bisect_right(starts, t) - 1
+            if i >= 0 and t < ends[i]:
+                ordered[i].feed_epoch(t, kind)
+        for k, (y, m) in missing:
+            attendance[k] = accs[k].summary()
+            if summary_cache.is_closed(y, m, ATTENDANCE_TZ):
+                summary_cache.put(
+                    "attendance", employee_id, k, attendance[k], generation, _cache_settle(session)
+                )
+
+    missing = [(k, ym) for k, ym in zip(keys, months) if ledger[k] is None]
+    if missing:
+        span_start = month_bounds(*missing[0][1])[0]
+        span_end = month_bounds(*missing[-1][1])[1]
+        by_month = {}
+        for row in await _load_ledger(session, employee_id, span_start, span_end):
+            by_month.setdefault(row["date"][:7], []).append(row)
+        for k, (y, m) in missing:
+            entries = by_month.get(k, [])
+            ledger[k] = {"entries": entries, **ledger_totals(entries)}
+            if summary_cache.is_closed(y, m, ATTENDANCE_TZ):
+                summary_cache.put("ledger", employee_id, k, ledger[k], generation, _cache_settle(session))
+
+    per_month = []
+    days = 0
+    present = 0
+    for k, (y, m) in zip(keys, months):
+        summary = attendance[k]
+        days += calendar.monthrange(y, m)[1]
+        present += sum(1 for h in summary["hours_per_day"].values() if h > 0)
+        per_month.append({"month": k, **summary, **ledger[k]})
+
+    totals = ledger_totals(e for k in keys for e in ledger[k]["entries"])
+    totals.update(
+        {
+            "attendance_rate": present / days if days else 0,
+            "present_days": present,
+            "total_hours": round(sum(attendance[k]["total_hours"] for k in keys), 2),
+            "total_extra": round(sum(attendance[k]["total_extra"] for k in keys), 2),
+            "total_penalty": round(sum(attendance[k]["total_penalty"] for k in keys), 2),
+            "incomplete_days": sum(attendance[k]["incomplete_days"] for k in keys),
+        }
+    )
+    totals["net_time"] = round(totals["total_extra"] - totals["total_penalty"], 2)
+    return {
+        "employee_id": employee_id,
+        "start": keys[0],
+        "end": keys[-1],
+        "months": per_month,
+        "totals": totals,
+    }
+
+
+TEAM_RANK_FIELDS = ("total_hours", "net_time", "attendance_rate", "present_days")
+
+
+@app.get("/analytics/team", response_model=dict)
+async def get_team_analytics(
+    start: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    end: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    rank_by: str = Query("total_hours"),
+    session: AsyncSession = Depends(get_session),
+):
+    """Per-employee totals, averages and rankings over [start, end).
+
+    Served from the daily rollups (see api/analytics.py), which this request
+    refreshes when events changed, hence the primary session.
+    """
+    if rank_by not in TEAM_RANK_FIELDS:
+        raise HTTPException(status_code=400, detail=f"rank_by must be one of {', '.join(TEAM_RANK_FIELDS)}")
+    first, last = datetime.fromisoformat(start).date(), datetime.fromisoformat(end).date()
+    num_days = (last - first).days
+    if num_days <= 0:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if len(analytics.months_between(first, last)) > MAX_PERIOD_MONTHS:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_PERIOD_MONTHS} months")
+    await _refresh_settings(session)
+
+    totals: Dict[str, Dict[str, float]] = {}
+    complete = _SEEN_ANY | _SEEN_IN | _SEEN_OUT
+    for employee_id, _, seconds, flags in await analytics.daily_rows(session, first, last):
+        metrics = _compute_metrics_from_seconds(seconds)
+        t = totals.setdefault(employee_id, dict.fromkeys(
+            ("total_hours", "total_extra", "total_penalty", "present_days", "incomplete_days"), 0
+        ))
+        # rounded per day like /summary, so the figures agree
+        t["total_hours"] += round(metrics["worked_hours"], 2)
+        t["total_extra"] += round(metrics["extra_hours"], 2)
+        t["total_penalty"] += round(metrics["penalty_hours"], 2)
+        t["present_days"] += metrics["worked_hours"] > 0
+        t["incomplete_days"] += bool(flags & _SEEN_ANY and flags != complete)
+
+    employees = []
+    for employee_id, t in totals.items():
+        present = t["present_days"]
+        employees.append({
+            "employee_id": employee_id,
+            "total_hours": round(t["total_hours"], 2),
+            "total_extra": round(t["total_extra"], 2),
+            "total_penalty": round(t["total_penalty"], 2),
+            "net_time": round(t["total_extra"] - t["total_penalty"], 2),
+            "present_days": present,
+            "incomplete_days": t["incomplete_days"],
+            "attendance_rate": present / num_days,
+            "avg_extra_hours": round(t["total_extra"] / present, 2) if present else 0.0,
+            "avg_penalty_hours": round(t["total_penalty"] / present, 2) if present else 0.0,
+        })
+    employees.sort(key=lambda e: (-e[rank_by], e["employee_id"]))
+    ranked = sorted(e[rank_by] for e in employees)
+    for rank, e in enumerate(employees, 1):
+        e["rank"] = rank
+        # share of the team at or below this employee
+        e["percentile"] = round(100 * bisect.bisect_right(ranked, e[rank_by]) / len(ranked), 1)
+
+    hours = sorted(e["total_hours"] for e in employees)
+    return {
+        "start": first.isoformat(),
+        "end": last.isoformat(),
+        "days": num_days,
+        "rank_by": rank_by,
+        "employees": employees,
+        "team": {
+            "employees": len(employees),
+            "total_hours": round(sum(hours), 2),
+            "p25_hours": round(analytics.percentile(hours, 25), 2),
+            "median_hours": round(analytics.percentile(hours, 50), 2),
+            "p75_hours": round(analytics.percentile(hours, 75), 2),
+            "p90_hours": round(analytics.percentile(hours, 90), 2),
+            "attendance_rate": (
+                sum(e["attendance_rate"] for e in employees) / len(employees) if employees else 0
+            ),
+        },
+    }
+
+
+@app.get("/payroll", response_model=dict)
+async def get_payroll(
+    month: str = Query(..., pattern=r"^\d{4}-\d{2}$"),
+    run_id: Optional[int] = Query(None),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Return a stored payroll run for `month`, the newest unless `run_id` is given.
+
+    Runs are written by ``python -m api.payroll``; 404 when there is none.
+    """
+    stmt = select(PayrollRun).where(PayrollRun.month == month)
+    if run_id is not None:
+        stmt = stmt.where(PayrollRun.id == run_id)
+    run = await session.scalar(stmt.order_by(PayrollRun.id.desc()).limit(1))
+    if run is None:
+        raise HTTPException(status_code=404, detail="No payroll snapshot for this month")
+    result = await session.execute(
+        select(PayrollSnapshot)
+        .where(PayrollSnapshot.run_id == run.id)
+        .order_by(PayrollSnapshot.employee_id)
+    )
+    return {
+        "run_id": run.id,
+        "month": run.month,
+        "created_at": run.created_at.isoformat(),
+        "rules": run.rules,
+        "employees": [
+            {
+                "employee_id": s.employee_id,
+                "total_hours": s.total_hours,
+                "total_extra": s.total_extra,
+                "total_penalty": s.total_penalty,
+                "net_time": s.net_time,
+                "present_days": s.present_days,
+                "incomplete_days": s.incomplete_days,
+                "payout": s.payout,
+                "advance": s.advance,
+                "orders_count": s.orders_count,
+                "orders_total": s.orders_total,
+                "balance": s.balance,
+                **s.details,
+            }
+            for s in result.scalars()
+        ],
+    }
 
 
 class SettingPayload(BaseModel):
@@ -408,13 +995,14 @@ class UserPayload(BaseModel):
 class LogPayload(BaseModel):
     action: str
     data: Optional[str] | None = None
+    employee_id: Optional[str] = None
 
 
 @app.get("/admin/settings", response_model=dict)
-async def get_settings(session: AsyncSession = Depends(get_session)):
+async def get_settings(session: AsyncSession = Depends(get_read_session)):
     result = await session.execute(select(Setting))
     rows = result.scalars().all()
-    data = {row.key: row.value for row in rows}
+    data = {row.key: row.value for row in rows if row.key != SETTINGS_VERSION_KEY}
     data.setdefault("WORK_DAY_HOURS", str(WORK_DAY_HOURS))
     data.setdefault("GRACE_PERIOD_MIN", str(GRACE_PERIOD_MIN))
     data.setdefault("UNDER_TIME_PENALTY_MIN", str(UNDER_TIME_PENALTY_MIN))
@@ -423,25 +1011,34 @@ async def get_settings(session: AsyncSession = Depends(get_session)):
 
 @app.post("/admin/settings", response_model=dict)
 async def set_setting(payload: SettingPayload, session: AsyncSession = Depends(get_session)):
+    if payload.key == SETTINGS_VERSION_KEY:
+        raise HTTPException(status_code=400, detail="reserved key")
+    if payload.key in _DEFAULT_RULES:
+        # every worker parses the rules on its next refresh, so a bad value
+        # must not reach the table
+        try:
+            number = float(payload.value)
+        except ValueError:
+            number = math.nan
+        if not math.isfinite(number) or number < 0:
+            raise HTTPException(status_code=400, detail=f"{payload.key} must be a non-negative number")
     stmt = update(Setting).where(Setting.key == payload.key).values(value=payload.value)
     result = await session.execute(stmt)
     if result.rowcount == 0:
         session.add(Setting(key=payload.key, value=payload.value))
+    bump = pg_insert(Setting).values(key=SETTINGS_VERSION_KEY, value="1")
+    bump = bump.on_conflict_do_update(
+        index_elements=[Setting.key],
+        set_={"value": func.cast(func.cast(Setting.value, Integer) + 1, Text)},
+    )
+    await session.execute(bump)
     await session.commit()
-    if payload.key == "WORK_DAY_HOURS":
-        global WORK_DAY_HOURS
-        WORK_DAY_HOURS = float(payload.value)
-    elif payload.key == "GRACE_PERIOD_MIN":
-        global GRACE_PERIOD_MIN
-        GRACE_PERIOD_MIN = float(payload.value)
-    elif payload.key == "UNDER_TIME_PENALTY_MIN":
-        global UNDER_TIME_PENALTY_MIN
-        UNDER_TIME_PENALTY_MIN = float(payload.value)
+    await _refresh_settings(session, force=True)
     return {"ok": True}
 
 
 @app.get("/admin/users", response_model=List[dict])
-async def list_admins(session: AsyncSession = Depends(get_session)):
+async def list_admins(session: AsyncSession = Depends(get_read_session)):
     result = await session.execute(select(AdminUser))
     users = result.scalars().all()
     return [{"id": u.id, "username": u.username} for u in users]
@@ -466,17 +1063,56 @@ async def delete_admin(user_id: int, session: AsyncSession = Depends(get_session
     return {"ok": True}
 
 
+MAX_LOG_PAGE = 500
+
+
 @app.get("/admin/logs", response_model=List[dict])
-async def list_logs(session: AsyncSession = Depends(get_session)):
-    result = await session.execute(
-        select(AdminLog).order_by(AdminLog.created_at.desc()).limit(100)
+async def list_logs(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_LOG_PAGE),
+    cursor: Optional[str] = Query(None, pattern=r"^-?\d+\.\d+$"),
+    action: Optional[str] = Query(None),
+    employee_id: Optional[str] = Query(None),
+    since: Optional[str] = Query(None),
+    until: Optional[str] = Query(None),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Return audit entries newest first, one keyset page at a time.
+
+    When more entries match, the cursor for the next page is sent in the
+    ``X-Next-Cursor`` header.
+    """
+    conditions = []
+    if action:
+        conditions.append(AdminLog.action == action)
+    if employee_id:
+        conditions.append(AdminLog.employee_id == employee_id)
+    try:
+        if since:
+            conditions.append(AdminLog.created_at >= parse_bound(since))
+        if until:
+            conditions.append(AdminLog.created_at < parse_bound(until))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid since/until")
+    if cursor:
+        conditions.append(tuple_(AdminLog.created_at, AdminLog.id) < audit.decode_cursor(cursor))
+    stmt = (
+        select(AdminLog)
+        .where(*conditions)
+        .order_by(AdminLog.created_at.desc(), AdminLog.id.desc())
+        .limit(limit + 1)
     )
+    result = await session.execute(stmt)
     logs = result.scalars().all()
+    if len(logs) > limit:
+        logs = logs[:limit]
+        response.headers["X-Next-Cursor"] = audit.encode_cursor(logs[-1].created_at, logs[-1].id)
     return [
         {
             "id": l.id,
             "action": l.action,
             "data": l.data,
+            "employee_id": l.employee_id,
             "created_at": l.created_at.isoformat(),
         }
         for l in logs
@@ -485,11 +1121,49 @@ async def list_logs(session: AsyncSession = Depends(get_session)):
 
 @app.post("/admin/logs", response_model=dict)
 async def create_log(payload: LogPayload, session: AsyncSession = Depends(get_session)):
-    log = AdminLog(action=payload.action, data=payload.data)
+    log = AdminLog(action=payload.action, data=payload.data, employee_id=payload.employee_id)
     session.add(log)
     await session.commit()
     await session.refresh(log)
     return {"id": log.id}
 
+def _job(name: str) -> scheduler.Job:
+    for job in jobs.JOBS:
+        if job.name == name:
+            return job
+    raise HTTPException(status_code=404, detail=f"no job {name!r}")
+
+
+@app.get("/admin/jobs", response_model=List[dict])
+async def list_jobs(session: AsyncSession = Depends(get_session)):
+    next_runs = _scheduler.next_runs if _scheduler is not None else None
+    return await scheduler.job_status(session, jobs.JOBS, next_runs)
+
+
+@app.get("/admin/jobs/{name}/runs", response_model=List[dict])
+async def list_job_runs(
+    name: str,
+    limit: int = Query(50, ge=1, le=MAX_LOG_PAGE),
+    session: AsyncSession = Depends(get_session),
+):
+    _job(name)
+    result = await session.execute(
+        select(JobRun).where(JobRun.job == name).order_by(JobRun.scheduled_for.desc()).limit(limit)
+    )
+    return [scheduler.run_to_dict(r) for r in result.scalars()]
+
+
+@app.post("/admin/jobs/{name}/run", response_model=dict)
+async def trigger_job(name: str):
+    """Run a job now, e.g. from an external cron when instances are scaled to zero."""
+    job = _job(name)
+    slot = datetime.now(timezone.utc).replace(microsecond=0)
+    outcome = await scheduler.run_job(job, slot, AsyncSessionLocal)
+    if outcome == "skipped":
+        raise HTTPException(status_code=409, detail=f"job {name!r} is already running")
+    if outcome == "failed":
+        raise HTTPException(status_code=500, detail=f"job {name!r} failed; see /admin/jobs/{name}/runs")
+    return {"job": name, "scheduled_for": slot.isoformat(), "status": outcome}
+
 # Expose app for uvicorn/gunicorn
 __all__ = ["app"]
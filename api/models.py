@@ -1,37 +1,62 @@
 from __future__ import annotations
-import os
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
-from sqlalchemy import String, Integer, DateTime, Text
-from sqlalchemy.ext.asyncio import AsyncAttrs, create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy import (
+    DDL, JSON, Date, Float, ForeignKey, SmallInteger, String, Integer, DateTime, Text, Index,
+    UniqueConstraint, event,
+)
+from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
-DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("SUPABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL or SUPABASE_URL environment variable not set")
+import dbconn
 
-# convert sync postgres url to async if needed
-if DATABASE_URL.startswith("postgresql://") and not DATABASE_URL.startswith("postgresql+asyncpg://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+from . import partitions, status, summary_cache
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+DATABASE_URL = dbconn.async_url(dbconn.database_url())
+
+engine = dbconn.create_engine_async(DATABASE_URL)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
+# Read-only endpoints use the replica when DATABASE_READ_URL is set
+READ_DATABASE_URL = dbconn.read_database_url()
+if READ_DATABASE_URL:
+    read_engine = dbconn.create_engine_async(dbconn.async_url(READ_DATABASE_URL), name="asyncpg_read")
+    ReadSessionLocal = async_sessionmaker(read_engine, expire_on_commit=False, info={"replica": True})
+else:
+    read_engine = engine
+    ReadSessionLocal = AsyncSessionLocal
+
 class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 class Event(Base):
+    """An attendance punch; the table is partitioned by month, see api/partitions.py."""
+
     __tablename__ = "events"
+    # (employee_id, timestamp) finds an employee's latest events; see api/status.py
+    __table_args__ = (
+        Index("ix_events_employee_timestamp", "employee_id", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    employee_id: Mapped[str] = mapped_column(String(100), nullable=False, index=True)
+    # the partition key has to be part of the primary key
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    employee_id: Mapped[str] = mapped_column(String(100), nullable=False)
     kind: Mapped[str] = mapped_column(String(50), nullable=False)
-    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+def _create_event_partitions(target, connection, **kw) -> None:
+    if connection.dialect.name == "postgresql":
+        partitions.install(connection)
+
+
+event.listen(Event.__table__, "after_create", _create_event_partitions)
+
+
 class Setting(Base):
     __tablename__ = "settings"
 
@@ -39,6 +64,18 @@ class Setting(Base):
     value: Mapped[str] = mapped_column(Text, nullable=False)
 
 
+class SummaryChange(Base):
+    """Last edit of an employee's closed month; see api/summary_cache.py."""
+
+    __tablename__ = "summary_changes"
+
+    employee_id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    month: Mapped[str] = mapped_column(String(7), primary_key=True)
+    # attendance or ledger
+    kind: Mapped[str] = mapped_column(String(20), primary_key=True)
+    changed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+
 class AdminUser(Base):
     __tablename__ = "admin_users"
 
@@ -48,12 +85,210 @@ class AdminUser(Base):
 
 class AdminLog(Base):
     __tablename__ = "admin_logs"
+    # Newest-first keyset pages, optionally narrowed by employee or action
+    __table_args__ = (
+        Index("ix_admin_logs_created_at_id", "created_at", "id"),
+        Index("ix_admin_logs_employee_created_at", "employee_id", "created_at"),
+        Index("ix_admin_logs_action_created_at", "action", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     action: Mapped[str] = mapped_column(String(100), nullable=False)
     data: Mapped[str] = mapped_column(Text, nullable=True)
+    employee_id: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
 
+
+class AdminLogArchive(Base):
+    """Audit rows moved out of admin_logs by the retention job."""
+
+    __tablename__ = "admin_logs_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    action: Mapped[str] = mapped_column(String(100), nullable=False)
+    data: Mapped[str] = mapped_column(Text, nullable=True)
+    employee_id: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+class PayrollRun(Base):
+    """One run of the payroll job for a month; see api/payroll.py."""
+
+    __tablename__ = "payroll_runs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    month: Mapped[str] = mapped_column(String(7), nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    employees: Mapped[int] = mapped_column(Integer, nullable=False)
+    workers: Mapped[int] = mapped_column(Integer, nullable=False)
+    # attendance rules the run was computed with
+    rules: Mapped[dict] = mapped_column(JSON, nullable=False)
+
+
+class PayrollSnapshot(Base):
+    """An employee's attendance and ledger totals for a month, as computed by one run."""
+
+    __tablename__ = "payroll_snapshots"
+    __table_args__ = (UniqueConstraint("run_id", "employee_id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    run_id: Mapped[int] = mapped_column(ForeignKey("payroll_runs.id"), nullable=False)
+    month: Mapped[str] = mapped_column(String(7), nullable=False)
+    employee_id: Mapped[str] = mapped_column(String(100), nullable=False)
+    total_hours: Mapped[float] = mapped_column(Float, nullable=False)
+    total_extra: Mapped[float] = mapped_column(Float, nullable=False)
+    total_penalty: Mapped[float] = mapped_column(Float, nullable=False)
+    net_time: Mapped[float] = mapped_column(Float, nullable=False)
+    present_days: Mapped[int] = mapped_column(Integer, nullable=False)
+    incomplete_days: Mapped[int] = mapped_column(Integer, nullable=False)
+    payout: Mapped[float] = mapped_column(Float, nullable=False)
+    advance: Mapped[float] = mapped_column(Float, nullable=False)
+    orders_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    orders_total: Mapped[float] = mapped_column(Float, nullable=False)
+    balance: Mapped[float] = mapped_column(Float, nullable=False)
+    # hours_per_day and the parsed ledger entries
+    details: Mapped[dict] = mapped_column(JSON, nullable=False)
+
+
+# Payroll rows are never changed once written; a new run adds new rows
+PAYROLL_IMMUTABLE_FUNCTION = DDL(
+    "CREATE OR REPLACE FUNCTION payroll_immutable() RETURNS trigger AS $$ "
+    "BEGIN RAISE EXCEPTION '%% rows are immutable', TG_TABLE_NAME; END $$ LANGUAGE plpgsql"
+)
+event.listen(
+    PayrollRun.__table__, "after_create",
+    PAYROLL_IMMUTABLE_FUNCTION.execute_if(dialect="postgresql"),
+)
+for _table in (PayrollRun.__table__, PayrollSnapshot.__table__):
+    event.listen(
+        _table, "after_create",
+        DDL(
+            f"CREATE TRIGGER {_table.name}_immutable BEFORE UPDATE OR DELETE ON {_table.name} "
+            "FOR EACH ROW EXECUTE FUNCTION payroll_immutable()"
+        ).execute_if(dialect="postgresql"),
+    )
+
+
+class AttendanceDaily(Base):
+    """Worked seconds and punch flags of one employee-day; see api/analytics.py."""
+
+    __tablename__ = "attendance_daily"
+    # Team-wide range scans
+    __table_args__ = (Index("ix_attendance_daily_day_employee", "day", "employee_id"),)
+
+    employee_id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    month: Mapped[str] = mapped_column(String(7), nullable=False)
+    worked_seconds: Mapped[float] = mapped_column(Float, nullable=False)
+    flags: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+
+
+class AttendanceRollup(Base):
+    """Marks an employee-month whose attendance_daily rows are current."""
+
+    __tablename__ = "attendance_rollups"
+
+    employee_id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    month: Mapped[str] = mapped_column(String(7), primary_key=True)
+    # the month's bounds, so the events trigger can match raw timestamps
+    starts_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    ends_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    computed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+# Any write to events drops the rollup mark of the month it touches. The
+# shared advisory lock makes analytics.refresh() wait for (or skip) writers
+# that are still in flight.
+ROLLUP_INVALIDATE_FUNCTION = DDL(
+    "CREATE OR REPLACE FUNCTION attendance_rollup_invalidate() RETURNS trigger AS $$ "
+    "BEGIN "
+    "IF TG_OP <> 'INSERT' THEN "
+    "PERFORM pg_advisory_xact_lock_shared(hashtext('attendance_rollup:' || OLD.employee_id)); "
+    "DELETE FROM attendance_rollups WHERE employee_id = OLD.employee_id "
+    "AND starts_at <= OLD.timestamp AND ends_at > OLD.timestamp; "
+    "END IF; "
+    "IF TG_OP <> 'DELETE' THEN "
+    "PERFORM pg_advisory_xact_lock_shared(hashtext('attendance_rollup:' || NEW.employee_id)); "
+    "DELETE FROM attendance_rollups WHERE employee_id = NEW.employee_id "
+    "AND starts_at <= NEW.timestamp AND ends_at > NEW.timestamp; "
+    "END IF; "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql"
+)
+ROLLUP_INVALIDATE_TRIGGER = DDL(
+    "DO $$ BEGIN "
+    "IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'events_rollup_invalidate' "
+    "AND tgrelid = 'events'::regclass) THEN "
+    "CREATE TRIGGER events_rollup_invalidate AFTER INSERT OR UPDATE OR DELETE ON events "
+    "FOR EACH ROW EXECUTE FUNCTION attendance_rollup_invalidate(); "
+    "END IF; "
+    "END $$"
+)
+# On the metadata, because events is created after the attendance_* tables
+for _ddl in (ROLLUP_INVALIDATE_FUNCTION, ROLLUP_INVALIDATE_TRIGGER):
+    event.listen(Base.metadata, "after_create", _ddl.execute_if(dialect="postgresql"))
+
+
+class JobRun(Base):
+    """One slot of a scheduled job; see api/scheduler.py."""
+
+    __tablename__ = "job_runs"
+    # claiming a slot inserts this row, so a slot runs once across processes
+    __table_args__ = (UniqueConstraint("job", "scheduled_for"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    job: Mapped[str] = mapped_column(String(100), nullable=False)
+    scheduled_for: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # refreshed while the run is in progress
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    duration_seconds: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    # running, ok or failed
+    status: Mapped[str] = mapped_column(String(20), nullable=False)
+    # what the job reported, or the error of a failed run
+    detail: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    instance: Mapped[str] = mapped_column(String(200), nullable=False)
+
+
+class EmployeeStatus(Base):
+    """An employee's current state, maintained by a trigger; see api/status.py."""
+
+    __tablename__ = "employee_status"
+
+    employee_id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    # off, working or break
+    state: Mapped[str] = mapped_column(String(10), nullable=False)
+    since: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # start of the open work segment
+    segment_start: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # local day of last_event_at, and the seconds worked on it up to that event
+    day: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    worked_seconds: Mapped[float] = mapped_column(Float, nullable=False)
+    last_event_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_kind: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+    # first clock-in on `day`
+    first_in_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # when the trigger last wrote the row; /dashboard/now syncs from it
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
+
+
+def _create_status_trigger(target, connection, **kw) -> None:
+    if connection.dialect.name == "postgresql":
+        status.install(connection)
+
+
+event.listen(Base.metadata, "after_create", _create_status_trigger)
+
+
+def _create_summary_triggers(target, connection, **kw) -> None:
+    if connection.dialect.name == "postgresql":
+        summary_cache.install(connection)
+
+
+event.listen(Base.metadata, "after_create", _create_summary_triggers)
+
+
 async def init_models() -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -0,0 +1,119 @@
+"""Monthly range partitions of ``events``.
+
+``events`` is partitioned by ``timestamp``, one partition per local calendar
+month (``ATTENDANCE_TZ``, the same bounds as :func:`api.days.month_bounds`)
+named ``events_YYYY_MM``, plus ``events_default`` for rows no partition
+covers. A month query (``/events?month``, summaries, payroll, rollups) then
+reads a single partition, and archiving a month drops its partition instead
+of deleting its rows (see api/archive.py).
+
+``events_create_partition()`` creates a month's partition and moves the
+month's rows out of ``events_default`` first, so it also works after rows
+have landed there. The ``partitions`` job keeps the next
+``EVENT_PARTITIONS_AHEAD`` months created and picks up months found in the
+default partition. Changing ``ATTENDANCE_TZ`` later leaves existing bounds
+alone, so set it before the first migration.
+"""
+from __future__ import annotations
+
+import os
+from datetime import date, datetime
+from typing import Dict, List, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .days import ATTENDANCE_TZ, month_bounds
+
+PARTITIONS_AHEAD = int(os.getenv("EVENT_PARTITIONS_AHEAD", "3"))
+DEFAULT_PARTITION = "events_default"
+
+CREATE_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION events_create_partition(part text, lo timestamptz, hi timestamptz) "
+    "RETURNS boolean AS $$ "
+    "BEGIN "
+    "PERFORM pg_advisory_xact_lock(hashtext('events_create_partition')); "
+    "IF to_regclass(part) IS NOT NULL THEN RETURN false; END IF; "
+    "LOCK TABLE events_default IN ACCESS EXCLUSIVE MODE; "
+    "EXECUTE format('CREATE TABLE %I (LIKE events INCLUDING DEFAULTS)', part); "
+    "EXECUTE format('WITH moved AS (DELETE FROM events_default WHERE timestamp >= %L AND timestamp < %L "
+    "RETURNING *) INSERT INTO %I SELECT * FROM moved', lo, hi, part); "
+    "EXECUTE format('ALTER TABLE events ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi); "
+    "RETURN true; "
+    "END $$ LANGUAGE plpgsql"
+)
+CREATE_DEFAULT = f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF events DEFAULT"
+
+
+def partition_name(month: str) -> str:
+    year, m = map(int, month.split("-"))
+    return f"events_{year:04d}_{m:02d}"
+
+
+def partition_args(month: str) -> Dict[str, object]:
+    """Parameters of ``events_create_partition`` for `month` (YYYY-MM)."""
+    year, m = map(int, month.split("-"))
+    lo, hi = month_bounds(year, m)
+    return {"part": partition_name(month), "lo": lo, "hi": hi}
+
+
+def months_ahead(today: date | None = None, ahead: int = PARTITIONS_AHEAD) -> List[str]:
+    """This month and the next `ahead` months."""
+    today = today or datetime.now(ATTENDANCE_TZ).date()
+    year, month = today.year, today.month
+    months = []
+    for _ in range(ahead + 1):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = year + (month == 12), month % 12 + 1
+    return months
+
+
+_CREATE = text("SELECT events_create_partition(:part, :lo, :hi)")
+_STRAY = text(
+    f"SELECT DISTINCT to_char(timestamp AT TIME ZONE :tz, 'YYYY-MM') FROM {DEFAULT_PARTITION}"
+)
+
+
+def install(connection, months: Sequence[str] | None = None) -> None:
+    """Create the function, the default partition and upcoming partitions.
+
+    `connection` is a synchronous SQLAlchemy connection, e.g. in a migration
+    or ``create_all``.
+    """
+    connection.execute(text(CREATE_FUNCTION))
+    connection.execute(text(CREATE_DEFAULT))
+    for month in months_ahead() if months is None else months:
+        connection.execute(_CREATE, partition_args(month))
+
+
+async def stray_months(session: AsyncSession) -> List[str]:
+    """Months with rows in the default partition."""
+    result = await session.execute(_STRAY, {"tz": getattr(ATTENDANCE_TZ, "key", "UTC")})
+    return sorted(r[0] for r in result)
+
+
+async def ensure(session: AsyncSession, months: Sequence[str]) -> List[str]:
+    """Create the partitions of `months` that do not exist yet and commit."""
+    created = []
+    for month in months:
+        if await session.scalar(_CREATE, partition_args(month)):
+            created.append(month)
+    await session.commit()
+    return created
+
+
+def _relations(node: dict) -> List[str]:
+    names = [node["Relation Name"]] if "Relation Name" in node else []
+    for child in node.get("Plans", ()):
+        names.extend(_relations(child))
+    return names
+
+
+async def scanned_partitions(session: AsyncSession, stmt) -> List[str]:
+    """Tables the planner reads for `stmt`, from EXPLAIN; the query is not run."""
+    conn = await session.connection()
+    compiled = stmt.compile(dialect=conn.dialect)
+    params = tuple(compiled.params[k] for k in compiled.positiontup)
+    result = await conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), params)
+    plan = result.scalar()
+    return sorted(set(_relations(plan[0]["Plan"])))
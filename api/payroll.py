@@ -0,0 +1,200 @@
+"""Month-end payroll snapshots.
+
+:func:`run_payroll` computes every employee's month at once: the attendance
+summary from ``events`` and the payout, advance and order totals from the
+legacy ledger tables. Employees are split into chunks that a process pool
+works through in parallel; each worker keeps its own database connection.
+The results are written as one ``payroll_runs`` row plus a
+``payroll_snapshots`` row per employee, in a single transaction. Snapshot
+rows are never updated. Re-running the job adds a new run, and
+``GET /api/payroll`` serves the newest run for a month.
+
+Run it from the command line (defaults to the previous month)::
+
+    python -m api.payroll --month 2024-05 --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, List, Sequence
+
+from psycopg2.extras import Json, execute_values
+
+import db
+import dbconn
+from ledger import parse_row, totals as ledger_totals
+
+from . import archive
+from .days import month_bounds
+
+PAYROLL_WORKERS = int(os.getenv("PAYROLL_WORKERS", str(os.cpu_count() or 1)))
+# Chunks handed to each worker; more than one evens out uneven employees
+CHUNKS_PER_WORKER = 4
+
+# Per worker process: set by _init_worker
+_pool: dbconn.SyncPool | None = None
+_ledger: db.LedgerBackend | None = None
+
+
+def previous_month(today: date | None = None) -> str:
+    today = today or date.today()
+    year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+    return f"{year:04d}-{month:02d}"
+
+
+def _init_worker(database_url: str, settings: Dict[str, str]) -> None:
+    global _pool, _ledger
+    from . import main
+
+    main._apply_settings(settings)
+    _pool = dbconn.SyncPool(dbconn.sync_url(database_url), name="payroll_worker", size=1)
+    _ledger = db.embedded_ledger() or db.PsycopgBackend(lambda read_only: _pool.connection())
+
+
+def _compute_chunk(month: str, employees: Sequence[str]) -> List[Dict[str, object]]:
+    """Return snapshot rows for `employees` (runs in a worker)."""
+    from .main import _month_accumulator
+
+    year, m = map(int, month.split("-"))
+    start, end = month_bounds(year, m)
+    accs = {e: _month_accumulator(year, m) for e in employees}
+    arc = archive.open_month(month)
+    if arc is not None:
+        for employee_id in employees:
+            accs[employee_id].feed_series(arc.series(employee_id))
+    else:
+        with _pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT employee_id, timestamp, kind FROM events "
+                    "WHERE employee_id = ANY(%s) AND timestamp >= %s AND timestamp < %s "
+                    "ORDER BY employee_id, timestamp",
+                    (list(employees), start, end),
+                )
+                for employee_id, ts, kind in cur:
+                    accs[employee_id].feed(ts, kind)
+
+    rows = []
+    for employee_id in employees:
+        summary = accs[employee_id].summary()
+        entries = [parse_row(*r) for r in _ledger.month(employee_id, start.date(), end.date())]
+        money = ledger_totals(entries)
+        rows.append({
+            "employee_id": employee_id,
+            "total_hours": summary["total_hours"],
+            "total_extra": summary["total_extra"],
+            "total_penalty": summary["total_penalty"],
+            "net_time": summary["net_time"],
+            "present_days": sum(1 for h in summary["hours_per_day"].values() if h > 0),
+            "incomplete_days": summary["incomplete_days"],
+            **money,
+            "details": {"hours_per_day": summary["hours_per_day"], "entries": entries},
+        })
+    return rows
+
+
+def _mp_context() -> multiprocessing.context.BaseContext:
+    """Start workers from a fork server that has already imported the API.
+
+    Unlike plain fork this is safe in threaded processes, and unlike spawn
+    each worker skips the imports; the server lives as long as this process.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload([__name__, f"{__package__}.main"])
+    return ctx
+
+
+def _chunks(items: Sequence[str], count: int) -> List[List[str]]:
+    size = max(1, -(-len(items) // max(count, 1)))
+    return [list(items[i:i + size]) for i in range(0, len(items), size)]
+
+
+_SNAPSHOT_COLUMNS = (
+    "employee_id", "total_hours", "total_extra", "total_penalty", "net_time", "present_days",
+    "incomplete_days", "payout", "advance", "orders_count", "orders_total", "balance",
+)
+
+
+def run_payroll(month: str, workers: int = PAYROLL_WORKERS, employees: Sequence[str] | None = None,
+                database_url: str | None = None) -> int:
+    """Compute and store payroll snapshots for `month`; return the run id.
+
+    Without `employees`, everyone with events in the month is included.
+    Archived months are read from their archive file.
+    ``workers <= 1`` computes in this process.
+    """
+    database_url = database_url or dbconn.database_url()
+    year, m = map(int, month.split("-"))
+    start, end = month_bounds(year, m)
+    pool = dbconn.SyncPool(dbconn.sync_url(database_url), name="payroll", size=1)
+    try:
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT key, value FROM settings")
+                settings = dict(cur.fetchall())
+                arc = archive.open_month(month)
+                if employees is None and arc is not None:
+                    employees = list(arc.employees)
+                elif employees is None:
+                    cur.execute(
+                        "SELECT DISTINCT employee_id FROM events "
+                        "WHERE timestamp >= %s AND timestamp < %s ORDER BY employee_id",
+                        (start, end),
+                    )
+                    employees = [r[0] for r in cur.fetchall()]
+        # no connection may be open while worker processes start
+        pool.closeall()
+
+        chunks = _chunks(employees, max(workers, 1) * CHUNKS_PER_WORKER)
+        if workers <= 1:
+            _init_worker(database_url, settings)
+            results = [_compute_chunk(month, chunk) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=_mp_context(),
+                initializer=_init_worker,
+                initargs=(database_url, settings),
+            ) as executor:
+                results = list(executor.map(_compute_chunk, [month] * len(chunks), chunks))
+
+        from .main import _DEFAULT_RULES
+
+        rules = {k: float(settings.get(k, v)) for k, v in _DEFAULT_RULES.items()}
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO payroll_runs (month, created_at, employees, workers, rules) "
+                    "VALUES (%s, now(), %s, %s, %s) RETURNING id",
+                    (month, len(employees), max(workers, 1), Json(rules)),
+                )
+                run_id = cur.fetchone()[0]
+                execute_values(
+                    cur,
+                    f"INSERT INTO payroll_snapshots (run_id, month, {', '.join(_SNAPSHOT_COLUMNS)}, details) "
+                    "VALUES %s",
+                    [
+                        (run_id, month, *(row[c] for c in _SNAPSHOT_COLUMNS), Json(row["details"]))
+                        for chunk in results for row in chunk
+                    ],
+                    page_size=500,
+                )
+        return run_id
+    finally:
+        pool.closeall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m api.payroll", description="Snapshot a month's payroll.")
+    parser.add_argument("--month", default=previous_month(), help="YYYY-MM (default: last month)")
+    parser.add_argument("--workers", type=int, default=PAYROLL_WORKERS)
+    parser.add_argument("--employee", action="append", help="limit to these employees")
+    args = parser.parse_args()
+    run = run_payroll(args.month, args.workers, args.employee)
+    print(f"payroll run {run} for {args.month}")
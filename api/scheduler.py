@@ -0,0 +1,378 @@
+"""Cron-style background jobs run by the API processes.
+
+A :class:`Job` is a coroutine function with a cron schedule (``minute hour
+day-of-month month day-of-week``, evaluated in ``ATTENDANCE_TZ``). Each API
+process runs a :class:`Scheduler` in a background thread with its own event
+loop and engine; it is started and stopped with the FastAPI app. Every
+process wakes up for every slot, and Postgres decides which one runs it.
+A run is claimed in one short transaction, under a transaction-scoped
+advisory lock on the job name (so it also holds behind a transaction-mode
+pooler, ``DB_POOLER_MODE``):
+
+- the job must have no ``running`` row, which keeps two processes from
+  running a job at the same time, and
+- the run's ``job_runs`` row, unique on (job, scheduled_for), keeps a
+  process that wakes up after the winner finished from running the slot
+  again.
+
+The claim commits before the job starts, so no connection sits idle in a
+transaction while it runs. The run then refreshes its row's
+``heartbeat_at`` every ``SCHEDULER_HEARTBEAT_SEC`` and records its outcome
+in a transaction of its own. A ``running`` row whose heartbeat stopped for
+four intervals belongs to a process that died; the next claim marks it
+``failed``. Slots missed while no process was running are not backfilled.
+Durations and outcomes go to ``job_runs`` and to the ``scheduler_job_*``
+metrics; ``GET /api/admin/jobs`` shows both.
+
+Settings come from the environment:
+
+- ``SCHEDULER_ENABLED`` (default 1) run the scheduler in this process
+- ``SCHEDULER_HEARTBEAT_SEC`` (default 30) how often a running job shows it
+  is alive
+- ``JOB_<NAME>_SCHEDULE`` overrides a job's schedule; ``off`` disables it
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Awaitable, Callable, Dict, FrozenSet, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import dbconn
+import telemetry
+
+from .days import ATTENDANCE_TZ
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("SCHEDULER_ENABLED", "1") != "0"
+# Prefix of the advisory lock key of a job
+LOCK_PREFIX = "scheduler_job:"
+# Longest sleep between clock checks, so wall-clock jumps are noticed
+MAX_SLEEP_SEC = 60.0
+# Identifies the process in job_runs
+INSTANCE = f"{socket.gethostname()}:{os.getpid()}"
+HEARTBEAT_SEC = float(os.getenv("SCHEDULER_HEARTBEAT_SEC", "30"))
+# A running row without a heartbeat for this long was abandoned
+STALE_AFTER_SEC = 4 * HEARTBEAT_SEC
+
+JOB_DURATION = telemetry.Histogram(
+    "scheduler_job_duration_seconds", "Duration of scheduled job runs.", ("job", "status"),
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0),
+)
+JOB_RUNS = telemetry.Counter(
+    "scheduler_job_runs_total",
+    "Job slots by outcome: ok, failed, or skipped when another process had it.", ("job", "status"),
+)
+JOB_LAST_SUCCESS = telemetry.Gauge(
+    "scheduler_job_last_success_timestamp_seconds", "Unix time of the last successful run.", ("job",)
+)
+
+SessionFactory = Callable[[], object]
+
+# (first, last) value of each cron field
+_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_field(spec: str, lo: int, hi: int) -> FrozenSet[int]:
+    values = set()
+    for part in spec.split(","):
+        span, _, step = part.partition("/")
+        if span == "*":
+            first, last = lo, hi
+        elif "-" in span:
+            first, last = map(int, span.split("-", 1))
+        else:
+            first = int(span)
+            last = hi if step else first
+        every = int(step) if step else 1
+        if not lo <= first <= last <= hi or every < 1:
+            raise ValueError(f"bad cron field {spec!r}")
+        values.update(range(first, last + 1, every))
+    return frozenset(values)
+
+
+class Cron:
+    """A five-field cron expression; day-of-week 0 and 7 are Sunday."""
+
+    __slots__ = ("expr", "minutes", "hours", "days", "months", "weekdays", "_any_day", "_any_weekday", "tz")
+
+    def __init__(self, expr: str, tz: tzinfo = ATTENDANCE_TZ) -> None:
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expr!r}")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _FIELDS)
+        )
+        self.weekdays = frozenset(d % 7 for d in weekdays)
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+        self.tz = tz
+
+    def _day_matches(self, t: datetime) -> bool:
+        if t.month not in self.months:
+            return False
+        dom = t.day in self.days
+        dow = (t.weekday() + 1) % 7 in self.weekdays
+        # as in cron: when both are restricted, either one matching is enough
+        if self._any_day or self._any_weekday:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, when: datetime) -> datetime:
+        """First matching minute strictly after `when`, as an aware UTC datetime."""
+        t = when.astimezone(self.tz).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t.year + 5
+        while t.year <= limit:
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t.replace(tzinfo=self.tz).astimezone(timezone.utc)
+        raise ValueError(f"cron expression never matches: {self.expr!r}")
+
+
+class Job:
+    """A named coroutine function run on a cron schedule.
+
+    `func` receives a session factory and may return a short description of
+    what it did, which is stored with the run.
+    """
+
+    __slots__ = ("name", "cron", "func", "description")
+
+    def __init__(self, name: str, schedule: str, func: Callable[[SessionFactory], Awaitable[Optional[str]]],
+                 description: str = "") -> None:
+        self.name = name
+        self.cron = Cron(schedule)
+        self.func = func
+        self.description = description
+
+
+def job_schedule(name: str, default: str) -> Optional[str]:
+    """The configured schedule of `name`, or None when it is turned off."""
+    schedule = os.getenv(f"JOB_{name.upper()}_SCHEDULE", default)
+    return None if schedule.strip().lower() == "off" else schedule
+
+
+_ABANDON = text(
+    "UPDATE job_runs SET status = 'failed', finished_at = heartbeat_at, "
+    "duration_seconds = extract(epoch FROM heartbeat_at - started_at), "
+    "detail = 'abandoned: no heartbeat from ' || instance "
+    "WHERE job = :job AND status = 'running' AND heartbeat_at < now() - make_interval(secs => :stale)"
+)
+_RUNNING = text("SELECT 1 FROM job_runs WHERE job = :job AND status = 'running' LIMIT 1")
+_CLAIM = text(
+    "INSERT INTO job_runs (job, scheduled_for, started_at, heartbeat_at, status, instance) "
+    "VALUES (:job, :slot, now(), now(), 'running', :instance) "
+    "ON CONFLICT (job, scheduled_for) DO NOTHING RETURNING id"
+)
+_HEARTBEAT = text("UPDATE job_runs SET heartbeat_at = now() WHERE id = :id")
+_FINISH = text(
+    "UPDATE job_runs SET finished_at = now(), duration_seconds = :seconds, status = :status, "
+    "detail = :detail WHERE id = :id"
+)
+
+
+async def run_job(job: Job, scheduled_for: datetime, sessions: SessionFactory,
+                  instance: str = INSTANCE) -> str:
+    """Run the `scheduled_for` slot of `job` unless another process has it.
+
+    Returns ``ok``, ``failed`` or ``skipped``. The claim, the heartbeats and
+    the outcome are each committed on their own; the job uses other sessions.
+    """
+    async with sessions() as claim:
+        locked = await claim.scalar(
+            text("SELECT pg_try_advisory_xact_lock(hashtext(:key))"), {"key": LOCK_PREFIX + job.name}
+        )
+        run_id = None
+        if locked:
+            await claim.execute(_ABANDON, {"job": job.name, "stale": STALE_AFTER_SEC})
+            if await claim.scalar(_RUNNING, {"job": job.name}) is None:
+                run_id = await claim.scalar(
+                    _CLAIM, {"job": job.name, "slot": scheduled_for, "instance": instance}
+                )
+        # releases the lock; the running row now shows the claim to everyone
+        await claim.commit()
+    if run_id is None:
+        JOB_RUNS.inc((job.name, "skipped"))
+        return "skipped"
+
+    start = time.perf_counter()
+    status = "ok"
+    heartbeat = asyncio.create_task(_heartbeat(run_id, sessions))
+    try:
+        detail = await job.func(sessions)
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("job %s failed", job.name)
+        status, detail = "failed", f"{type(exc).__name__}: {exc}"
+    except BaseException:
+        # cancelled, e.g. on shutdown: record it rather than leave it to go stale
+        await _finish(run_id, sessions, time.perf_counter() - start, "failed", "interrupted")
+        raise
+    finally:
+        heartbeat.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await heartbeat
+    seconds = time.perf_counter() - start
+    await _finish(run_id, sessions, seconds, status, detail)
+
+    JOB_DURATION.observe((job.name, status), seconds)
+    JOB_RUNS.inc((job.name, status))
+    if status == "ok":
+        JOB_LAST_SUCCESS.set((job.name,), time.time())
+    logger.info("job %s %s in %.1f s", job.name, status, seconds)
+    return status
+
+
+async def _heartbeat(run_id: int, sessions: SessionFactory) -> None:
+    while True:
+        await asyncio.sleep(HEARTBEAT_SEC)
+        try:
+            async with sessions() as session:
+                await session.execute(_HEARTBEAT, {"id": run_id})
+                await session.commit()
+        except Exception:  # noqa: BLE001
+            logger.warning("heartbeat of job run %s failed", run_id, exc_info=True)
+
+
+async def _finish(run_id: int, sessions: SessionFactory, seconds: float, status: str,
+                  detail: Optional[str]) -> None:
+    async with sessions() as session:
+        await session.execute(_FINISH, {
+            "id": run_id, "seconds": seconds, "status": status,
+            "detail": detail[:telemetry.LOG_TRUNCATE] if detail else None,
+        })
+        await session.commit()
+
+
+class Scheduler:
+    """Runs `jobs` on their schedules in a daemon thread."""
+
+    def __init__(self, jobs: Sequence[Job], database_url: str) -> None:
+        self.jobs = list(jobs)
+        self.database_url = database_url
+        # job name -> next slot, for /admin/jobs
+        self.next_runs: Dict[str, datetime] = {}
+        self._thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stop: asyncio.Event | None = None
+
+    def start(self) -> None:
+        if self._thread is not None or not self.jobs:
+            return
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._main())
+        except Exception:  # noqa: BLE001
+            logger.exception("scheduler stopped")
+
+    async def _main(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        # the request loop's engine cannot be shared with this loop
+        engine = dbconn.create_engine_async(self.database_url, name="asyncpg_scheduler")
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            await asyncio.gather(*(self._run_job(job, sessions) for job in self.jobs))
+        finally:
+            await engine.dispose()
+
+    async def _sleep_until(self, when: datetime) -> bool:
+        """Wait for `when`; return False when the scheduler is stopping."""
+        while not self._stop.is_set():
+            delay = (when - datetime.now(timezone.utc)).total_seconds()
+            if delay <= 0:
+                return True
+            try:
+                await asyncio.wait_for(self._stop.wait(), min(delay, MAX_SLEEP_SEC))
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+    async def _run_job(self, job: Job, sessions: SessionFactory) -> None:
+        while True:
+            slot = job.cron.next_after(datetime.now(timezone.utc))
+            self.next_runs[job.name] = slot
+            if not await self._sleep_until(slot):
+                return
+            try:
+                await run_job(job, slot, sessions)
+            except Exception:  # noqa: BLE001
+                # e.g. the database was unreachable; the next slot tries again
+                logger.exception("could not run job %s", job.name)
+
+
+_RECENT = text(
+    "SELECT DISTINCT ON (job) job, scheduled_for, started_at, finished_at, duration_seconds, "
+    "status, detail, instance FROM job_runs WHERE job = ANY(:jobs) "
+    "ORDER BY job, scheduled_for DESC"
+)
+_TOTALS = text(
+    "SELECT job, max(started_at) FILTER (WHERE status = 'ok'), "
+    "count(*) FILTER (WHERE status = 'failed'), avg(duration_seconds) FILTER (WHERE status = 'ok') "
+    "FROM job_runs WHERE job = ANY(:jobs) AND scheduled_for >= :since GROUP BY job"
+)
+# Window of the failure count and average duration in job_status()
+STATUS_WINDOW = timedelta(days=7)
+
+
+def run_to_dict(row) -> Dict[str, object]:
+    return {
+        "scheduled_for": row.scheduled_for.isoformat(),
+        "started_at": row.started_at.isoformat() if row.started_at else None,
+        "finished_at": row.finished_at.isoformat() if row.finished_at else None,
+        "duration_seconds": row.duration_seconds,
+        "status": row.status,
+        "detail": row.detail,
+        "instance": row.instance,
+    }
+
+
+async def job_status(session, jobs: Sequence[Job], next_runs: Dict[str, datetime] | None = None
+                     ) -> List[Dict[str, object]]:
+    """Schedule, last run and recent failures of every job."""
+    names = [job.name for job in jobs]
+    now = datetime.now(timezone.utc)
+    last = {r.job: r for r in await session.execute(_RECENT, {"jobs": names})}
+    totals = {
+        r[0]: r[1:] for r in await session.execute(_TOTALS, {"jobs": names, "since": now - STATUS_WINDOW})
+    }
+    out = []
+    for job in jobs:
+        last_ok, failures, avg = totals.get(job.name, (None, 0, None))
+        next_run = (next_runs or {}).get(job.name) or job.cron.next_after(now)
+        out.append({
+            "name": job.name,
+            "description": job.description,
+            "schedule": job.cron.expr,
+            "next_run": next_run.isoformat(),
+            "last_run": run_to_dict(last[job.name]) if job.name in last else None,
+            "last_success_at": last_ok.isoformat() if last_ok else None,
+            "failures_7d": failures,
+            "avg_duration_seconds_7d": avg,
+        })
+    return out
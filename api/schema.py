@@ -0,0 +1,63 @@
+"""Create the API tables once per deployment rather than in every worker.
+
+gunicorn.conf.py calls :func:`create_schema` in the gunicorn master before
+workers fork (disable with ``AUTO_CREATE_SCHEMA=0``); it can also be run on
+its own with ``python -m api.schema``. Alembic migrations remain the way to
+change existing tables.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Dict
+
+import telemetry
+
+
+def event_triggers(prefix: str) -> Dict[str, str]:
+    """Names and timings of statement-level triggers on ``events``.
+
+    Transition tables allow a single event per trigger, so inserts, updates
+    and deletes each get their own ``<prefix>_insert`` etc.
+    """
+    return {
+        f"{prefix}_insert": "AFTER INSERT ON events REFERENCING NEW TABLE AS new_rows",
+        f"{prefix}_update": "AFTER UPDATE ON events REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        f"{prefix}_delete": "AFTER DELETE ON events REFERENCING OLD TABLE AS old_rows",
+    }
+
+
+def statement_trigger(name: str, timing: str, function: str) -> str:
+    """SQL creating trigger `name` on ``events`` unless it exists."""
+    return (
+        "DO $$ BEGIN "
+        f"IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{name}' "
+        "AND tgrelid = 'events'::regclass) THEN "
+        f"CREATE TRIGGER {name} {timing} "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION {function}(); "
+        "END IF; "
+        "END $$"
+    )
+
+
+def create_schema() -> None:
+    """Create missing tables and indexes, then close the pool's connections.
+
+    Closing them matters in the gunicorn master: forked workers must not
+    inherit connections bound to this short-lived event loop.
+    """
+    # imported here: the models' trigger modules import this one
+    from .models import engine, init_models
+
+    async def run() -> None:
+        try:
+            await init_models()
+        finally:
+            await engine.dispose()
+
+    with telemetry.startup_phase("schema"):
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    create_schema()
+    print("schema up to date")
@@ -0,0 +1,98 @@
+"""Compact event container for the summary path.
+
+Summaries only need each event's timestamp and kind. :class:`EventSeries`
+keeps them as two parallel arrays: epoch microseconds (int64) and kind
+codes (uint8) into a list of kind names. That is 9 bytes per event instead
+of an ORM ``Event`` with its identity-map state and audit columns. A series
+can also wrap memoryviews of an archive file, so archived months are
+summarized without copying.
+"""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Codes of series loaded from the database; shared, and only ever appended to
+KIND_NAMES: List[str] = []
+_KIND_CODES: Dict[str, int] = {}
+_kinds_lock = Lock()
+
+
+def kind_code(kind: str) -> int:
+    code = _KIND_CODES.get(kind)
+    if code is None:
+        with _kinds_lock:
+            code = _KIND_CODES.get(kind)
+            if code is None:
+                if len(KIND_NAMES) >= 255:
+                    raise ValueError("too many distinct event kinds")
+                code = len(KIND_NAMES)
+                KIND_NAMES.append(kind)
+                _KIND_CODES[kind] = code
+    return code
+
+
+def to_micros(ts: datetime) -> int:
+    return round(ts.timestamp() * 1_000_000)
+
+
+class EventSeries:
+    """Timestamps and kinds of events in timestamp order."""
+
+    __slots__ = ("timestamps", "kinds", "kind_names")
+
+    def __init__(self, timestamps: Sequence[int] | None = None, kinds: Sequence[int] | None = None,
+                 kind_names: List[str] | None = None) -> None:
+        self.timestamps = array("q") if timestamps is None else timestamps
+        self.kinds = array("B") if kinds is None else kinds
+        self.kind_names = KIND_NAMES if kind_names is None else kind_names
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[datetime, str]]) -> "EventSeries":
+        """Build a series from ordered (timestamp, kind) rows, e.g. Core result tuples."""
+        series = cls()
+        series.extend(rows)
+        return series
+
+    @classmethod
+    def from_events(cls, events: Iterable[object]) -> "EventSeries":
+        """Build a series from objects with ``timestamp`` and ``kind`` attributes."""
+        return cls.from_rows((e.timestamp, e.kind) for e in events)
+
+    def extend(self, rows: Iterable[Tuple[datetime, str]]) -> None:
+        if self.kind_names is not KIND_NAMES:
+            raise TypeError("only series with the shared kind codes can grow")
+        for ts, kind in rows:
+            self.timestamps.append(to_micros(ts))
+            self.kinds.append(kind_code(kind))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __iter__(self) -> Iterator[Tuple[float, str]]:
+        """Yield (epoch seconds, kind) pairs."""
+        names = self.kind_names
+        for micros, code in zip(self.timestamps, self.kinds):
+            yield micros / 1e6, names[code]
+
+    def between(self, start: float | None = None, end: float | None = None) -> "EventSeries":
+        """Return the events with ``start <= t < end`` (epoch seconds) as a view."""
+        ts = self.timestamps
+        a = 0 if start is None else bisect_left(ts, start * 1_000_000)
+        b = len(ts) if end is None else bisect_left(ts, end * 1_000_000)
+        return EventSeries(ts[a:b], self.kinds[a:b], self.kind_names)
+
+    def datetimes(self) -> Iterator[Tuple[datetime, str]]:
+        """Yield (aware UTC datetime, kind) pairs."""
+        names = self.kind_names
+        for micros, code in zip(self.timestamps, self.kinds):
+            yield _EPOCH + timedelta(microseconds=micros), names[code]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.timestamps) * 8 + len(self.kinds)
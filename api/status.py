@@ -0,0 +1,187 @@
+"""Each employee's current work state, kept up to date by a trigger.
+
+``employee_status`` has one row per employee: the state (``off``,
+``working`` or ``break``), when it last changed, the start of the open work
+segment and the seconds worked on the local day of the latest event. The
+``events_status_*`` triggers advance the row on every write to ``events``:
+events newer than the row's latest one are applied incrementally, and any
+other insert, update or delete replays the employee's events of the last
+``STATUS_REPLAY_DAYS`` days. ``GET /status/{employee_id}`` is then one
+primary key lookup, whatever the history.
+
+The replay follows :class:`api.main._SegmentTracker` (``IN_KINDS``,
+``OUT_KINDS``, ``startbreak``, ``endbreak``) and splits segments at local
+midnights in ``ATTENDANCE_TZ`` like the summaries do. The zone is compiled
+into the function, so re-run ``python -m api.status`` after changing it.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .days import ATTENDANCE_TZ, local_date, local_midnight
+from .schema import event_triggers, statement_trigger
+
+# Mirrors api.main.IN_KINDS / OUT_KINDS
+IN_KINDS = ("clockin", "in")
+OUT_KINDS = ("clockout", "out")
+# How far back a full replay starts, before the day of the latest event
+STATUS_REPLAY_DAYS = 7
+
+
+def _sql_list(values) -> str:
+    return ", ".join(f"'{v}'" for v in values)
+
+
+def replay_function(tz_name: str) -> str:
+    tz = tz_name.replace("'", "''")
+    return (
+        "CREATE OR REPLACE FUNCTION employee_status_replay(emp text, rebuild boolean) "
+        "RETURNS void AS $$ "
+        "DECLARE "
+        "s employee_status%ROWTYPE; "
+        "ev record; "
+        "latest timestamptz; "
+        "after timestamptz; "
+        "next_state text; "
+        "seg_end timestamptz; "
+        "BEGIN "
+        "PERFORM pg_advisory_xact_lock(hashtext('employee_status:' || emp)); "
+        "SELECT * INTO s FROM employee_status WHERE employee_id = emp; "
+        "IF rebuild OR NOT FOUND THEN "
+        "SELECT max(timestamp) INTO latest FROM events WHERE employee_id = emp; "
+        # kept, emptied, so /dashboard/now's delta sync sees the change
+        "IF latest IS NULL THEN "
+        "UPDATE employee_status SET state = 'off', since = NULL, segment_start = NULL, day = NULL, "
+        "worked_seconds = 0, last_event_at = NULL, last_kind = NULL, first_in_at = NULL, "
+        "updated_at = clock_timestamp() WHERE employee_id = emp; "
+        "RETURN; "
+        "END IF; "
+        "s := NULL; s.employee_id := emp; s.state := 'off'; s.worked_seconds := 0; "
+        f"after := (((latest AT TIME ZONE '{tz}')::date - {STATUS_REPLAY_DAYS})::timestamp "
+        f"AT TIME ZONE '{tz}') - interval '1 microsecond'; "
+        "ELSE after := s.last_event_at; "
+        "END IF; "
+        "FOR ev IN SELECT timestamp, kind FROM events "
+        "WHERE employee_id = emp AND timestamp > after ORDER BY timestamp, id LOOP "
+        f"IF s.day IS DISTINCT FROM (ev.timestamp AT TIME ZONE '{tz}')::date THEN "
+        f"s.day := (ev.timestamp AT TIME ZONE '{tz}')::date; s.worked_seconds := 0; s.first_in_at := NULL; "
+        "END IF; "
+        "next_state := s.state; seg_end := NULL; "
+        f"IF ev.kind IN ({_sql_list(IN_KINDS)}) AND s.state = 'off' THEN "
+        "next_state := 'working'; s.segment_start := ev.timestamp; "
+        "s.first_in_at := coalesce(s.first_in_at, ev.timestamp); "
+        "ELSIF ev.kind = 'startbreak' AND s.state = 'working' AND s.segment_start IS NOT NULL THEN "
+        "next_state := 'break'; seg_end := ev.timestamp; "
+        "ELSIF ev.kind = 'endbreak' AND s.state = 'break' THEN "
+        "next_state := 'working'; s.segment_start := ev.timestamp; "
+        f"ELSIF ev.kind IN ({_sql_list(OUT_KINDS)}) AND s.segment_start IS NOT NULL THEN "
+        "IF s.state = 'working' THEN seg_end := ev.timestamp; END IF; "
+        "next_state := 'off'; "
+        "END IF; "
+        "IF seg_end IS NOT NULL THEN "
+        "s.worked_seconds := s.worked_seconds + greatest(0, extract(epoch FROM "
+        f"least(seg_end, (s.day + 1)::timestamp AT TIME ZONE '{tz}') "
+        f"- greatest(s.segment_start, s.day::timestamp AT TIME ZONE '{tz}'))); "
+        "END IF; "
+        "IF next_state = 'off' THEN s.segment_start := NULL; END IF; "
+        "IF next_state <> s.state THEN s.since := ev.timestamp; END IF; "
+        "s.state := next_state; s.last_event_at := ev.timestamp; s.last_kind := ev.kind; "
+        "END LOOP; "
+        "IF s.last_event_at IS NULL THEN RETURN; END IF; "
+        "s.updated_at := clock_timestamp(); "
+        "INSERT INTO employee_status VALUES (s.*) ON CONFLICT (employee_id) DO UPDATE SET "
+        "state = EXCLUDED.state, since = EXCLUDED.since, segment_start = EXCLUDED.segment_start, "
+        "day = EXCLUDED.day, worked_seconds = EXCLUDED.worked_seconds, "
+        "last_event_at = EXCLUDED.last_event_at, last_kind = EXCLUDED.last_kind, "
+        "first_in_at = EXCLUDED.first_in_at, updated_at = EXCLUDED.updated_at; "
+        "END $$ LANGUAGE plpgsql"
+    )
+
+
+# Statement-level, so a bulk write replays each employee once; employees are
+# visited in id order so concurrent writers take their locks in the same order
+TRIGGER_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION employee_status_on_events() RETURNS trigger AS $$ "
+    "DECLARE emp text; first_ts timestamptz; "
+    "BEGIN "
+    "IF TG_OP = 'INSERT' THEN "
+    "FOR emp, first_ts IN SELECT employee_id, min(timestamp) FROM new_rows "
+    "GROUP BY employee_id ORDER BY employee_id LOOP "
+    "PERFORM employee_status_replay(emp, NOT EXISTS (SELECT 1 FROM employee_status "
+    "WHERE employee_id = emp AND last_event_at < first_ts)); "
+    "END LOOP; "
+    "ELSIF TG_OP = 'UPDATE' THEN "
+    "FOR emp IN SELECT employee_id FROM old_rows UNION SELECT employee_id FROM new_rows ORDER BY 1 LOOP "
+    "PERFORM employee_status_replay(emp, true); "
+    "END LOOP; "
+    "ELSE "
+    "FOR emp IN SELECT DISTINCT employee_id FROM old_rows ORDER BY 1 LOOP "
+    "PERFORM employee_status_replay(emp, true); "
+    "END LOOP; "
+    "END IF; "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql"
+)
+TRIGGERS = event_triggers("events_status")
+
+
+def install(connection) -> None:
+    """Create or replace the functions and the trigger (synchronous connection)."""
+    connection.execute(text(replay_function(getattr(ATTENDANCE_TZ, "key", "UTC"))))
+    connection.execute(text(TRIGGER_FUNCTION))
+    for name, timing in TRIGGERS.items():
+        connection.execute(text(statement_trigger(name, timing, "employee_status_on_events")))
+
+
+COLUMNS = "state, since, segment_start, day, worked_seconds, last_event_at, last_kind"
+_READ = text(f"SELECT {COLUMNS} FROM employee_status WHERE employee_id = :employee_id")
+
+
+def view(employee_id: str, row, now: datetime) -> Dict[str, object]:
+    """The status of `row` (an ``employee_status`` row, or None) as of `now`."""
+    since: Optional[datetime] = row.since if row is not None else None
+    if row is None or row.last_event_at is None:
+        return {
+            "employee_id": employee_id, "state": "off", "since": None, "seconds_in_state": None,
+            "worked_seconds_today": 0.0, "last_kind": None, "as_of": now.isoformat(),
+        }
+    today = local_date(now)
+    worked = row.worked_seconds if row.day == today else 0.0
+    if row.state == "working" and row.segment_start is not None:
+        # the open segment counts up to now, from today's midnight at the earliest
+        start = max(row.segment_start, local_midnight(today))
+        worked += max((now - start).total_seconds(), 0.0)
+    return {
+        "employee_id": employee_id,
+        "state": row.state,
+        "since": since.isoformat() if since else None,
+        "seconds_in_state": max((now - since).total_seconds(), 0.0) if since else None,
+        "worked_seconds_today": worked,
+        "last_kind": row.last_kind,
+        "as_of": now.isoformat(),
+    }
+
+
+async def read(session: AsyncSession, employee_id: str, now: datetime | None = None) -> Dict[str, object]:
+    """Current state, time in it and seconds worked today, as of `now`."""
+    now = now or datetime.now(timezone.utc)
+    row = (await session.execute(_READ, {"employee_id": employee_id})).first()
+    return view(employee_id, row, now)
+
+
+if __name__ == "__main__":
+    from .models import engine
+
+    async def _main() -> None:
+        async with engine.begin() as conn:
+            await conn.run_sync(install)
+        await engine.dispose()
+
+    import asyncio
+
+    asyncio.run(_main())
+    print("employee_status functions updated")
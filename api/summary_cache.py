@@ -0,0 +1,238 @@
+"""In-process cache of per-month results for months that are already closed.
+
+Only months that ended before the current one are stored, so entries never
+go stale through the normal clock-in flow. Edits to past months (records
+editor, back-dated advances) must call :func:`invalidate`.
+
+Each worker and instance has its own cache, so edits of closed months are
+also recorded in ``summary_changes``: by the ``events_summary_*`` triggers
+for events, whoever writes them, and by :func:`mark_sync` for ledger rows.
+Every worker reads the changes newer than its last check at most every
+``SUMMARY_CACHE_REFRESH_SEC`` seconds (:func:`refresh`) and drops those
+entries, so an edit made anywhere is served everywhere within that
+interval. The triggers find months in ``ATTENDANCE_TZ``, compiled in like
+api/status.py's; re-run ``python -m api.summary_cache`` after changing it.
+"""
+from __future__ import annotations
+
+import os
+import time
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .days import ATTENDANCE_TZ
+from .schema import event_triggers, statement_trigger
+
+# Upper bound on cached entries; the oldest insertions are evicted first
+MAX_ENTRIES = 5000
+
+SUMMARY_CACHE_REFRESH_SEC = float(os.getenv("SUMMARY_CACHE_REFRESH_SEC", "2"))
+# changed_at is taken inside the writing transaction, which may commit after
+# a later check already ran; each check re-reads this much of the past
+SYNC_OVERLAP_SEC = 30.0
+
+_Key = Tuple[str, str, str]
+_entries: Dict[_Key, object] = {}
+_lock = Lock()
+# Bumped by clear() and invalidate(); generation() hands it out so put() can
+# drop values computed before a rules change or an edit of their month
+_generation = 0
+_cleared_at = 0
+# (employee_id, month or "*") -> (monotonic time, generation) of the last
+# invalidation, so values read before it, or from a replica that may not
+# have the edit yet, are not cached over it
+_invalidated: Dict[Tuple[str, str], Tuple[float, int]] = {}
+# Invalidation times older than this are forgotten
+INVALIDATION_MEMORY_SEC = 300.0
+
+# Newest summary_changes.changed_at seen; None until the first refresh
+_watermark: Optional[datetime] = None
+# marks inside the overlap already applied, by (employee_id, month, kind)
+_applied: Dict[_Key, datetime] = {}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_synced = False
+_checked_at = 0.0
+
+
+def month_key(value: date | datetime) -> str:
+    return f"{value.year:04d}-{value.month:02d}"
+
+
+def is_closed(year: int, month: int, tz: tzinfo = timezone.utc) -> bool:
+    """Return True when the month ended before the current month in `tz` started."""
+    now = datetime.now(tz)
+    return (year, month) < (now.year, now.month)
+
+
+def get(kind: str, employee_id: str, month: str) -> Optional[object]:
+    return _entries.get((kind, employee_id, month))
+
+
+def generation() -> int:
+    return _generation
+
+
+def put(kind: str, employee_id: str, month: str, value: object, generation: int | None = None,
+        settle: float = 0.0) -> None:
+    """Store `value`.
+
+    It is discarded if the cache was cleared, or the entry invalidated, since
+    `generation`, or if the entry was invalidated less than `settle` seconds
+    ago (pass the replica lag allowance when `value` was read from a replica).
+    """
+    with _lock:
+        if generation is not None and _cleared_at > generation:
+            return
+        now = time.monotonic()
+        for key in ((employee_id, month), (employee_id, "*")):
+            at, gen = _invalidated.get(key, (float("-inf"), -1))
+            if (generation is not None and gen > generation) or now - at < settle:
+                return
+        if len(_entries) >= MAX_ENTRIES:
+            _entries.pop(next(iter(_entries)))
+        _entries[(kind, employee_id, month)] = value
+
+
+def invalidate(employee_id: str, when: date | datetime | None = None, kind: str | None = None) -> None:
+    """Drop cached entries for `employee_id`.
+
+    `when` limits the drop to the month containing it and `kind` to one
+    kind of entry ("attendance" or "ledger").
+    """
+    global _generation
+    month = month_key(when) if when is not None else None
+    now = time.monotonic()
+    with _lock:
+        if len(_invalidated) > MAX_ENTRIES:
+            for key in [k for k, (t, _) in _invalidated.items() if now - t > INVALIDATION_MEMORY_SEC]:
+                del _invalidated[key]
+        _generation += 1
+        _invalidated[(employee_id, month or "*")] = (now, _generation)
+        for key in [
+            k for k in _entries
+            if k[1] == employee_id
+            and (month is None or k[2] == month)
+            and (kind is None or k[0] == kind)
+        ]:
+            del _entries[key]
+
+
+def clear() -> None:
+    global _generation, _cleared_at
+    with _lock:
+        _entries.clear()
+        _invalidated.clear()
+        _generation += 1
+        _cleared_at = _generation
+
+
+def changes_function(tz_name: str) -> str:
+    tz = tz_name.replace("'", "''")
+    month = f"to_char(timestamp AT TIME ZONE '{tz}', 'YYYY-MM')"
+    closed = f"timestamp < date_trunc('month', now() AT TIME ZONE '{tz}') AT TIME ZONE '{tz}'"
+
+    def record(rows: str) -> str:
+        return (
+            "INSERT INTO summary_changes (employee_id, month, kind, changed_at) "
+            "SELECT e, m, 'attendance', clock_timestamp() "
+            f"FROM (SELECT DISTINCT employee_id, {month} FROM {rows} WHERE {closed}) AS t (e, m) "
+            "ON CONFLICT (employee_id, month, kind) DO UPDATE SET changed_at = EXCLUDED.changed_at; "
+        )
+
+    return (
+        "CREATE OR REPLACE FUNCTION summary_changes_on_events() RETURNS trigger AS $$ "
+        "BEGIN "
+        f"IF TG_OP <> 'INSERT' THEN {record('old_rows')}END IF; "
+        f"IF TG_OP <> 'DELETE' THEN {record('new_rows')}END IF; "
+        "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql"
+    )
+
+
+TRIGGERS = event_triggers("events_summary")
+
+
+def install(connection) -> None:
+    """Create or replace the function and the triggers (synchronous connection)."""
+    connection.execute(text(changes_function(getattr(ATTENDANCE_TZ, "key", "UTC"))))
+    for name, timing in TRIGGERS.items():
+        connection.execute(text(statement_trigger(name, timing, "summary_changes_on_events")))
+
+
+MARK_SQL = (
+    "INSERT INTO summary_changes (employee_id, month, kind, changed_at) "
+    "VALUES (%s, %s, %s, clock_timestamp()) "
+    "ON CONFLICT (employee_id, month, kind) DO UPDATE SET changed_at = EXCLUDED.changed_at"
+)
+# Mirrors api.models.SummaryChange, whose changed_at index only the API's
+# refresh() needs (and the API schema creates)
+_CREATE_SQL = (
+    "CREATE TABLE IF NOT EXISTS summary_changes ("
+    "employee_id VARCHAR(100), month VARCHAR(7), kind VARCHAR(20), "
+    "changed_at TIMESTAMPTZ NOT NULL, PRIMARY KEY (employee_id, month, kind))"
+)
+_LATEST = text("SELECT max(changed_at) FROM summary_changes")
+_CHANGED = text("SELECT employee_id, month, kind, changed_at FROM summary_changes WHERE changed_at > :since")
+
+
+def mark_sync(connect, employee_id: str, when: date | datetime, kind: str) -> None:
+    """Record an edit of `employee_id`'s month containing `when` for the other workers.
+
+    For writes the triggers do not see, such as ledger rows. Call it once the
+    edit committed; `connect` returns a connection context manager that
+    commits on success, like ``app.db_connect``. Open months are never
+    cached, so they are not recorded.
+    """
+    if not is_closed(when.year, when.month, ATTENDANCE_TZ):
+        return
+    with connect() as conn:
+        with conn.cursor() as cur:
+            # one round trip; the Flask routes also run against databases
+            # without the API schema, like log_admin_action's admin_logs
+            cur.execute(f"{_CREATE_SQL}; {MARK_SQL}", (employee_id, month_key(when), kind))
+
+
+async def refresh(session: AsyncSession, force: bool = False) -> None:
+    """Drop the entries other workers marked as edited since the last check."""
+    global _watermark, _synced, _checked_at
+    now = time.monotonic()
+    if not force and _synced and now - _checked_at < SUMMARY_CACHE_REFRESH_SEC:
+        return
+    _checked_at = now
+    if not _synced:
+        # nothing cached yet; start from the newest mark
+        _watermark = await session.scalar(_LATEST)
+        _synced = True
+        return
+    since = _watermark - timedelta(seconds=SYNC_OVERLAP_SEC) if _watermark else _EPOCH
+    result = await session.execute(_CHANGED, {"since": since})
+    for employee_id, month, kind, changed_at in result:
+        key = (employee_id, month, kind)
+        if _applied.get(key) == changed_at:
+            continue  # seen by an earlier check inside the overlap
+        _applied[key] = changed_at
+        year, m = map(int, month.split("-"))
+        invalidate(employee_id, date(year, m, 1), kind)
+        if _watermark is None or changed_at > _watermark:
+            _watermark = changed_at
+    if _watermark is not None:
+        for key in [k for k, t in _applied.items() if t <= _watermark - timedelta(seconds=SYNC_OVERLAP_SEC)]:
+            del _applied[key]
+
+
+if __name__ == "__main__":
+    from .models import engine
+
+    async def _main() -> None:
+        async with engine.begin() as conn:
+            await conn.run_sync(install)
+        await engine.dispose()
+
+    import asyncio
+
+    asyncio.run(_main())
+    print("summary_changes triggers updated")
@@ -2,11 +2,17 @@ import datetime as dt
 import os
 import logging
 import time
-import psycopg2
-from psycopg2 import sql
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, abort, has_request_context
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
 from asgi_to_wsgi import AsgiToWsgi
+from ledger import parse_row
+from api import summary_cache
+import admission
+import compression
+import db
+import dbconn
+import profiling
+import telemetry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,32 +32,59 @@ server = Flask(
 def assets(filename: str):
     return server.send_static_file(os.path.join("assets", filename))
 
-# Mount FastAPI under /api using ASGI -> WSGI adapter
-try:
-    from api.main import app as fastapi_app
-    server.wsgi_app = DispatcherMiddleware(
-        server.wsgi_app, {"/api": AsgiToWsgi(fastapi_app)}
-    )
-except Exception:  # noqa: BLE001
-    logger.exception("Failed mounting FastAPI app")
+# Mount FastAPI under /api using ASGI -> WSGI adapter. The API module is
+# imported on the first /api request (or by the warm-up in gunicorn.conf.py),
+# so /healthz answers before the database is reachable.
+api_bridge = AsgiToWsgi("api.main:app")
+server.wsgi_app = DispatcherMiddleware(server.wsgi_app, {"/api": api_bridge})
+
+# gzip/brotli for Flask pages and assets; /api responses arrive already
+# compressed by the FastAPI app and pass through (see compression.py)
+server.wsgi_app = compression.CompressionMiddleware(server.wsgi_app)
+
+# Bound concurrent requests per worker; excess load gets a fast 503 instead
+# of queueing behind a slow database (see admission.py)
+server.wsgi_app = admission.AdmissionMiddleware(server.wsgi_app)
+
+# Profiles requests sent with the admin token, or 1 in PROFILE_SAMPLE_RATE
+# (see profiling.py); inside the metrics layer so profiles see db time
+server.wsgi_app = profiling.ProfilingMiddleware(server.wsgi_app)
+
+# Outermost layer so it times the whole request, /api included
+server.wsgi_app = telemetry.WsgiMetricsMiddleware(server.wsgi_app)
+
+
+@server.before_request
+def label_route():
+    if request.url_rule is not None:
+        telemetry.set_route(request.url_rule.rule)
 
 # --------------------------------------------------------------------
 # Database helpers
 # --------------------------------------------------------------------
-DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("SUPABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("❌  DATABASE_URL or SUPABASE_URL env-var not set!")
+DATABASE_URL = dbconn.database_url()
+_pool = dbconn.SyncPool(dbconn.sync_url(DATABASE_URL))
+# Replica for read-only routes, see DATABASE_READ_URL
+READ_DATABASE_URL = dbconn.read_database_url()
+_read_pool = (
+    dbconn.SyncPool(dbconn.sync_url(READ_DATABASE_URL), name="psycopg2_read")
+    if READ_DATABASE_URL else _pool
+)
+
 
+def db_connect(read_only: bool = False):
+    """Check out a pooled connection for a `with` block.
 
-def db_connect():
-    """Return a new database connection."""
-    url = DATABASE_URL
-    if url.startswith("postgresql+asyncpg://"):
-        url = url.replace("postgresql+asyncpg://", "postgresql://", 1)
-    return psycopg2.connect(url)
+    The transaction commits when the block succeeds and rolls back when it
+    raises; either way the connection goes back to the pool. `read_only`
+    blocks use the replica unless the request asked to read its own writes.
+    """
+    if read_only and not (has_request_context() and dbconn.wants_primary(request.headers)):
+        return _read_pool.connection()
+    return _pool.connection()
 
 
-def log_admin_action(action: str, data: str | None = None) -> None:
+def log_admin_action(action: str, data: str | None = None, employee: str | None = None) -> None:
     """Insert a record into the admin_logs table."""
     with db_connect() as conn:
         with conn.cursor() as cur:
@@ -61,50 +94,27 @@ def log_admin_action(action: str, data: str | None = None) -> None:
                     id SERIAL PRIMARY KEY,
                     action TEXT NOT NULL,
                     data TEXT,
-                    created_at TIMESTAMPTZ DEFAULT now()
+                    employee_id VARCHAR(100),
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
                 )
                 """
             )
             cur.execute(
-                "INSERT INTO admin_logs (action, data) VALUES (%s, %s)",
-                (action, data),
+                "INSERT INTO admin_logs (action, data, employee_id, created_at) "
+                "VALUES (%s, %s, %s, now())",
+                (action, data, employee),
             )
         conn.commit()
 
 
-def table_name(employee: str) -> str:
-    """Sanitize employee name for use as a table name."""
-    sanitized = "employee_" + "".join(
-        c.lower() if c.isalnum() else "_" for c in employee
-    )
-    return sanitized
+# Ledger tables live next to everything else unless LEDGER_DATABASE_URL
+# points them at an embedded database, see db.py
+ledger_store = db.embedded_ledger() or db.PsycopgBackend(db_connect)
 
 
 def ensure_employee_table(name: str) -> str:
     """Create the employee table if it doesn't already exist."""
-    tbl = table_name(name)
-    with db_connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                sql.SQL(
-                    """
-                    CREATE TABLE IF NOT EXISTS {table} (
-                        day DATE PRIMARY KEY,
-                        clockin TIMESTAMPTZ,
-                        clockout TIMESTAMPTZ,
-                        break_start TIMESTAMPTZ,
-                        break_end TIMESTAMPTZ,
-                        extra_start TIMESTAMPTZ,
-                        extra_end TIMESTAMPTZ,
-                        cash TEXT,
-                        orders TEXT,
-                        payout TEXT,
-                        advance TEXT
-                    )
-                    """
-                ).format(table=sql.Identifier(tbl))
-            )
-    return tbl
+    return ledger_store.ensure_table(name)
 
 # --------------------------------------------------------------------
 # 3.  Helpers
@@ -130,21 +140,25 @@ def record_time(employee: str, action: str, day: int):
     if action not in mapping:
         return False, f"Unknown action «{action}»"
 
-    tbl = ensure_employee_table(employee)
-    col = mapping[action]
-
-    with db_connect() as conn:
-        with conn.cursor() as cur:
-            query = sql.SQL(
-                "INSERT INTO {table} (day, {col}) VALUES (%s, %s) "
-                "ON CONFLICT(day) DO UPDATE SET {col}=EXCLUDED.{col}"
-            ).format(table=sql.Identifier(tbl), col=sql.Identifier(col))
-            cur.execute(query, (now.date(), now))
-        conn.commit()
-    log_admin_action(action, f"{employee}:{time_str}")
+    ledger_store.update(employee, now.date(), mapping[action], now)
+    log_admin_action(action, f"{employee}:{time_str}", employee)
     return True, f"{action.upper()} recorded @ {time_str}"
 
 
+def _add_advance(previous: str | None, value: str) -> str:
+    prev = 0.0
+    if previous is not None:
+        try:
+            prev = float(previous)
+        except Exception:
+            prev = 0.0
+    return str(prev + float(value))
+
+
+def _append_order(previous: str | None, value: str) -> str:
+    return f"{previous},{value}" if previous else value
+
+
 def record_value(employee: str, label: str, date: dt.date, value: str):
     """Store an arbitrary value in the row mapped by `label` for `date`."""
     mapping = {
@@ -156,47 +170,19 @@ def record_value(employee: str, label: str, date: dt.date, value: str):
     if label not in mapping:
         return False, f"Unknown label «{label}»"
 
-    tbl = ensure_employee_table(employee)
-    col = mapping[label]
-
-    with db_connect() as conn:
-        with conn.cursor() as cur:
-            if label == "advance":
-                # accumulate advances for the same day rather than overwrite
-                cur.execute(
-                    sql.SQL("SELECT {col} FROM {table} WHERE day=%s").format(
-                        table=sql.Identifier(tbl), col=sql.Identifier(col)
-                    ),
-                    (date,),
-                )
-                row = cur.fetchone()
-                prev = 0.0
-                if row and row[0] is not None:
-                    try:
-                        prev = float(row[0])
-                    except Exception:
-                        prev = 0.0
-                value = str(prev + float(value))
-            elif label == "orders":
-                # append order id and total to existing orders list
-                cur.execute(
-                    sql.SQL("SELECT {col} FROM {table} WHERE day=%s").format(
-                        table=sql.Identifier(tbl), col=sql.Identifier(col)
-                    ),
-                    (date,),
-                )
-                row = cur.fetchone()
-                if row and row[0]:
-                    value = f"{row[0]},{value}"
-
-            query = sql.SQL(
-                "INSERT INTO {table} (day, {col}) VALUES (%s, %s) "
-                "ON CONFLICT(day) DO UPDATE SET {col}=EXCLUDED.{col}"
-            ).format(table=sql.Identifier(tbl), col=sql.Identifier(col))
-            cur.execute(query, (date, str(value)))
-        conn.commit()
+    combine = None
+    if label == "advance":
+        # accumulate advances for the same day rather than overwrite
+        combine = _add_advance
+    elif label == "orders":
+        # append order id and total to existing orders list
+        combine = _append_order
+    value = ledger_store.update(employee, date, mapping[label], str(value), combine)
+    summary_cache.invalidate(employee, date, "ledger")
+    # the ledger may live in another database; marked once it has committed
+    summary_cache.mark_sync(db_connect, employee, date, "ledger")
     logger.info("Recorded %s for %s on %s: %s", label, employee, date, value)
-    log_admin_action(f"record_{label}", f"{employee}:{date}:{value}")
+    log_admin_action(f"record_{label}", f"{employee}:{date}:{value}", employee)
     return True, "OK"
 
 # --------------------------------------------------------------------
@@ -233,7 +219,7 @@ def payout():
 
     today = dt.datetime.now(dt.timezone.utc).date()
     record_value(employee, "payout", today, amount)
-    log_admin_action("payout", f"{employee}:{amount}")
+    log_admin_action("payout", f"{employee}:{amount}", employee)
     return jsonify(ok=True, msg="Payout recorded")
 
 
@@ -255,7 +241,7 @@ def advance():
         day = dt.datetime.now(dt.timezone.utc).date()
 
     record_value(employee, "advance", day, amount)
-    log_admin_action("advance", f"{employee}:{amount}:{day}")
+    log_admin_action("advance", f"{employee}:{amount}:{day}", employee)
     return jsonify(ok=True, msg="Advance recorded")
 
 
@@ -278,7 +264,7 @@ def record_order():
         day = dt.datetime.now(dt.timezone.utc).date()
 
     record_value(employee, "orders", day, f"{order_id}:{total}")
-    log_admin_action("order", f"{employee}:{order_id}:{total}:{day}")
+    log_admin_action("order", f"{employee}:{order_id}:{total}:{day}", employee)
     return jsonify(ok=True, msg="Order recorded")
 
 
@@ -299,50 +285,9 @@ def employee_data():
     end_year = year + 1 if m == 12 else year
     end = dt.date(end_year, end_month, 1)
 
-    tbl = ensure_employee_table(employee)
-    with db_connect() as conn:
-        with conn.cursor() as cur:
-            query = sql.SQL(
-                "SELECT day, cash, orders, payout, advance FROM {table} "
-                "WHERE day >= %s AND day < %s ORDER BY day"
-            ).format(table=sql.Identifier(tbl))
-            cur.execute(query, (start, end))
-            rows = cur.fetchall()
-
-    data = []
-    for day, cash, orders, payout, advance in rows:
-        orders_count = 0
-        orders_total = 0.0
-        orders_entries = []
-        if orders:
-            for part in str(orders).split(','):
-                if ':' in part:
-                    try:
-                        oid, amt_str = part.split(':', 1)
-                        amt = float(amt_str)
-                        orders_total += amt
-                        orders_count += 1
-                        orders_entries.append({"id": oid, "amount": amt})
-                    except Exception:
-                        pass
-        try:
-            payout_amt = float(payout) if payout is not None else 0.0
-        except Exception:
-            payout_amt = 0.0
-        try:
-            advance_amt = float(advance) if advance is not None else 0.0
-        except Exception:
-            advance_amt = 0.0
-        data.append(
-            {
-                "date": day.isoformat(),
-                "payout": payout_amt,
-                "advance": advance_amt,
-                "orders_count": orders_count,
-                "orders_total": orders_total,
-                "orders_entries": orders_entries,
-            }
-        )
+    rows = ledger_store.month(employee, start, end, read_only=True)
+
+    data = [parse_row(*row) for row in rows]
     return jsonify(data)
 
 
@@ -352,9 +297,54 @@ def health():
     return "OK", 200
 
 
+@server.route("/metrics")
+def metrics():
+    """Expose request, database and bridge metrics for Prometheus."""
+    return Response(telemetry.render(), content_type=telemetry.CONTENT_TYPE)
+
+
+def _require_profile_token() -> None:
+    if not profiling.TOKEN:
+        abort(404)
+    if not profiling.authorized(request.headers):
+        abort(403)
+
+
+@server.route("/profiles")
+def list_profiles():
+    """Stored request profiles, newest first (send ``X-Profile: <token>``)."""
+    _require_profile_token()
+    return jsonify(profiling.list_profiles())
+
+
+@server.route("/profiles/<profile_id>")
+def get_profile(profile_id: str):
+    """A stored profile: ``format=prof`` (pstats dump), ``text`` or ``memory``."""
+    _require_profile_token()
+    fmt = request.args.get("format", "prof")
+    if fmt not in ("prof", "text", "memory"):
+        abort(400)
+    path = profiling.profile_path(profile_id, ".mem.txt" if fmt == "memory" else ".prof")
+    if path is None:
+        abort(404)
+    if fmt == "text":
+        return Response(profiling.text_report(profile_id), content_type="text/plain; charset=utf-8")
+    with open(path, "rb") as fh:
+        data = fh.read()
+    if fmt == "memory":
+        return Response(data, content_type="text/plain; charset=utf-8")
+    return Response(
+        data, content_type="application/octet-stream",
+        headers={"Content-Disposition": f"attachment; filename={profile_id}.prof"},
+    )
+
+
+telemetry.record_startup_phase("app_import", telemetry.process_age())
+
+
 # Serve React app for any unmatched GET route
 @server.route("/<path:path>", methods=["GET"])
 def spa_catch_all(path: str):
-    if path.startswith(("api", "attendance", "payout", "advance", "record-order", "healthz")):
+    if path.startswith(("api", "attendance", "payout", "advance", "record-order", "healthz", "profiles")):
         abort(404)
     return index()
@@ -1,34 +1,123 @@
 from __future__ import annotations
 
 import asyncio
+import concurrent.futures
+import contextvars
+import importlib
+import logging
+import os
 import threading
+import time
 from http import HTTPStatus
 from typing import Iterable, Tuple, Callable, List
 
+import profiling
+import telemetry
+
+BRIDGE_MODES = ("lock", "thread")
+
+logger = logging.getLogger(__name__)
+
 
 class AsgiToWsgi:
     """Minimal ASGI-to-WSGI adapter.
 
     A single event loop is reused for all requests to avoid issues with
     database drivers that bind connections to the loop they were created on.
+
+    In ``lock`` mode (the default) each WSGI thread runs the loop itself
+    while holding a lock, so /api requests in one worker are serialized.
+    In ``thread`` mode the loop runs forever in a dedicated thread and
+    requests are submitted to it, so a threaded worker can have several
+    /api requests in flight. The mode comes from ``ASGI_BRIDGE_MODE``
+    unless given explicitly.
+
+    `app` may be an import path such as ``"api.main:app"``; it is then
+    imported, and its startup handlers run, on first use (see
+    :meth:`start`) so workers come up without touching the API or the
+    database.
     """
 
-    def __init__(self, app: Callable) -> None:
-        self.app = app
+    def __init__(self, app: Callable | str, mode: str | None = None) -> None:
+        self._target = app
+        self.app: Callable | None = None if isinstance(app, str) else app
+        self._started = False
+        self._start_lock = threading.Lock()
+        self.mode = mode or os.getenv("ASGI_BRIDGE_MODE", "lock")
+        if self.mode not in BRIDGE_MODES:
+            raise ValueError(f"Unknown ASGI bridge mode {self.mode!r}")
         self.loop = asyncio.new_event_loop()
         self._lock = threading.Lock()
-
-        # Run ASGI startup event if supported
-        if hasattr(app, "router") and hasattr(app.router, "startup"):
+        self._thread: threading.Thread | None = None
+        if self.mode == "thread":
+            self._thread = threading.Thread(
+                target=self.loop.run_forever, name="asgi-bridge", daemon=True
+            )
+            self._thread.start()
+
+    def start(self) -> bool:
+        """Import the app and run its startup handlers, once.
+
+        Returns False when that failed; the next call tries again.
+        """
+        if self._started:
+            return True
+        with self._start_lock:
+            if self._started:
+                return True
             try:
-                self.loop.run_until_complete(app.router.startup())
+                if self.app is None:
+                    module, _, attr = str(self._target).partition(":")
+                    with telemetry.startup_phase("api_import"):
+                        self.app = getattr(importlib.import_module(module), attr or "app")
+                router = getattr(self.app, "router", None)
+                if router is not None and hasattr(router, "startup"):
+                    with telemetry.startup_phase("asgi_startup"):
+                        self._run(router.startup())
             except Exception:  # noqa: BLE001
-                # Don't prevent application startup on error but log
-                import logging
+                logger.exception("ASGI startup failed")
+                return False
+            self._started = True
+            return True
+
+    def _run(self, coro) -> None:
+        """Run `coro` on the bridge loop and wait for it."""
+        if self._thread is None:
+            wait_start = time.perf_counter()
+            with self._lock:
+                telemetry.observe_lock_wait(time.perf_counter() - wait_start)
+                self.loop.run_until_complete(coro)
+            return
+
+        # a profiled request's task runs on the loop thread, out of reach
+        # of the profiler in this one
+        coro = profiling.wrap(coro)
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def _done(task: asyncio.Task) -> None:
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
 
-                logging.getLogger(__name__).exception("ASGI startup failed")
+        def _start() -> None:
+            self.loop.create_task(coro).add_done_callback(_done)
+
+        # The task inherits the caller's context so the request scope
+        # opened by the WSGI middleware still sees /api statements.
+        self.loop.call_soon_threadsafe(_start, context=contextvars.copy_context())
+        future.result()
 
     def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        if not self.start():
+            start_response(
+                "503 Service Unavailable",
+                [("Content-Type", "text/plain"), ("Retry-After", "1")],
+            )
+            return [b"API is starting, retry shortly"]
+
         method = environ.get("REQUEST_METHOD", "GET")
         path = environ.get("PATH_INFO", "")
         query_string = environ.get("QUERY_STRING", "").encode("latin1")
@@ -61,6 +150,7 @@ class AsgiToWsgi:
             "scheme": scheme,
             "path": path,
             "raw_path": path.encode("utf8"),
+            "root_path": environ.get("SCRIPT_NAME", ""),
             "query_string": query_string,
             "headers": headers,
             "server": server,
@@ -92,8 +182,7 @@ class AsgiToWsgi:
         async def run_app() -> None:
             await self.app(scope, receive, send)
 
-        with self._lock:
-            self.loop.run_until_complete(run_app())
+        self._run(run_app())
 
         status_line = f"{response_status} {HTTPStatus(response_status).phrase}"
         start_response(status_line, response_headers)
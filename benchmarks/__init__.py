@@ -0,0 +1,4 @@
+"""Benchmark suite for the attendance computation and API hot paths.
+
+Run ``python -m benchmarks --help`` for usage.
+"""
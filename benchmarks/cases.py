@@ -0,0 +1,459 @@
+"""Benchmark cases for the attendance computation and API hot paths."""
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import date, timedelta
+
+from .harness import Context, case
+from .workload import money_rows
+
+
+def _first_month(ctx: Context):
+    return ctx.workload.months[0]
+
+
+def _month_str(year: int, month: int) -> str:
+    return f"{year:04d}-{month:02d}"
+
+
+# --------------------------------------------------------------------------
+# Pure computation
+# --------------------------------------------------------------------------
+
+@case("extract_work_segments.month")
+def _segments_month(ctx: Context):
+    from api.main import _extract_work_segments
+
+    year, month = _first_month(ctx)
+    events = ctx.workload.for_month(ctx.workload.employees[0], year, month)
+    return lambda: _extract_work_segments(events)
+
+
+@case("summarize_events.month")
+def _summarize_month(ctx: Context):
+    from api.main import _summarize_events
+
+    year, month = _first_month(ctx)
+    events = ctx.workload.for_month(ctx.workload.employees[0], year, month)
+    return lambda: _summarize_events(events, year, month)
+
+
+@case("summarize_series.month")
+def _summarize_series_month(ctx: Context):
+    from api.main import _summarize_events
+    from api.series import EventSeries
+
+    year, month = _first_month(ctx)
+    series = EventSeries.from_events(ctx.workload.for_month(ctx.workload.employees[0], year, month))
+    return lambda: _summarize_events(series, year, month)
+
+
+# Building a month of events: hydrated ORM instances vs. parallel arrays.
+# Compare "peak KiB" per event between the two.
+def _month_rows(ctx: Context):
+    year, month = _first_month(ctx)
+    return [
+        (e.employee_id, e.kind, e.timestamp)
+        for e in ctx.workload.events
+        if e.timestamp.year == year and e.timestamp.month == month
+    ]
+
+
+@case("event_container.orm_month")
+def _orm_month(ctx: Context):
+    from api.models import Event
+
+    rows = _month_rows(ctx)
+    return lambda: [Event(employee_id=e, kind=k, timestamp=t) for e, k, t in rows]
+
+
+@case("event_container.series_month")
+def _series_month(ctx: Context):
+    from api.series import EventSeries
+
+    rows = [(t, k) for _, k, t in _month_rows(ctx)]
+    return lambda: EventSeries.from_rows(rows)
+
+
+@case("summarize_events.all_employees")
+def _summarize_all(ctx: Context):
+    from api.main import _summarize_events
+
+    year, month = _first_month(ctx)
+    per_emp = [ctx.workload.for_month(e, year, month) for e in ctx.workload.employees]
+
+    def run():
+        for events in per_emp:
+            _summarize_events(events, year, month)
+
+    return run
+
+
+@case("summarize_range.full_span")
+def _summarize_span(ctx: Context):
+    from datetime import datetime, timezone
+
+    from api.main import _summarize_range
+
+    events = ctx.workload.for_employee(ctx.workload.employees[0])
+    (y0, m0), (y1, m1) = ctx.workload.months[0], ctx.workload.months[-1]
+    start = datetime(y0, m0, 1, tzinfo=timezone.utc)
+    end = datetime(y1 + (m1 == 12), m1 % 12 + 1, 1, tzinfo=timezone.utc)
+    return lambda: _summarize_range(events, start, end)
+
+
+@case("list_events.serialize_month")
+def _serialize_month(ctx: Context):
+    from api.main import _event_to_dict
+
+    year, month = _first_month(ctx)
+    events = [
+        e for e in ctx.workload.events
+        if e.timestamp.year == year and e.timestamp.month == month
+    ]
+    return lambda: [_event_to_dict(e) for e in events]
+
+
+def _archived_month(ctx: Context):
+    """Write the first month of the workload to an archive file and open it."""
+    if "archive" in ctx.state:
+        return ctx.state["archive"]
+    from api import archive
+
+    year, month = _first_month(ctx)
+    rows = [
+        (i, e.employee_id, e.timestamp, e.kind, e.created_at, e.updated_at)
+        for i, e in enumerate(ctx.workload.events)
+        if e.timestamp.year == year and e.timestamp.month == month
+    ]
+    path = os.path.join(tempfile.mkdtemp(prefix="archive-bench-"), f"{_month_str(year, month)}.arc")
+    archive.write_file(path, _month_str(year, month), rows)
+    ctx.state["archive"] = archive.MonthArchive(path)
+    return ctx.state["archive"]
+
+
+@case("summarize_archive.month")
+def _summarize_archive_month(ctx: Context):
+    from api.main import _month_accumulator
+
+    year, month = _first_month(ctx)
+    arc = _archived_month(ctx)
+    employee = ctx.workload.employees[0]
+
+    def run():
+        return _month_accumulator(year, month).feed_series(arc.series(employee)).summary()
+
+    return run
+
+
+@case("list_events.archive_month")
+def _archive_events_month(ctx: Context):
+    arc = _archived_month(ctx)
+    return lambda: list(arc.event_dicts())
+
+
+# --------------------------------------------------------------------------
+# Endpoints, served through Flask and the ASGI bridge like in production
+# --------------------------------------------------------------------------
+
+def _client(ctx: Context):
+    """Return a Flask test client backed by a seeded database."""
+    if "client" in ctx.state:
+        return ctx.state["client"]
+    import app as app_module
+    from api.schema import create_schema
+
+    logging.getLogger(app_module.__name__).setLevel(logging.WARNING)
+    create_schema()
+    with app_module.db_connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM events WHERE employee_id LIKE 'emp%'")
+            for name in (ctx.workload.employees[0], "bench-ledger"):
+                cur.execute(f'DROP TABLE IF EXISTS "{app_module.table_name(name)}"')
+            cur.executemany(
+                "INSERT INTO events (employee_id, kind, timestamp, created_at, updated_at) "
+                "VALUES (%s, %s, %s, now(), now())",
+                [(e.employee_id, e.kind, e.timestamp) for e in ctx.workload.events],
+            )
+        conn.commit()
+    app_module.ledger_store.refresh()
+    for day, label, value in money_rows(ctx.workload)[ctx.workload.employees[0]]:
+        app_module.record_value(
+            ctx.workload.employees[0], label, date.fromisoformat(day),
+            f"B{day}:{value}" if label == "orders" else value,
+        )
+    ctx.state["client"] = app_module.server.test_client()
+    return ctx.state["client"]
+
+
+def _get(client, url: str, headers=None, **params):
+    def run():
+        resp = client.get(url, query_string=params, headers=headers)
+        assert resp.status_code == 200, resp.status_code
+        return resp.data
+
+    return run
+
+
+@case("GET /api/events?month", group="endpoint", needs_db=True)
+def _ep_events_month(ctx: Context):
+    return _get(_client(ctx), "/api/events", month=_month_str(*_first_month(ctx)))
+
+
+@case("GET /api/events?month (gzip)", group="endpoint", needs_db=True)
+def _ep_events_month_gzip(ctx: Context):
+    return _get(
+        _client(ctx), "/api/events", headers={"Accept-Encoding": "gzip"},
+        month=_month_str(*_first_month(ctx)),
+    )
+
+
+@case("GET /api/events?employee_id&month", group="endpoint", needs_db=True)
+def _ep_events_employee(ctx: Context):
+    return _get(
+        _client(ctx),
+        "/api/events",
+        employee_id=ctx.workload.employees[0],
+        month=_month_str(*_first_month(ctx)),
+    )
+
+
+@case("GET /api/status/{employee_id}", group="endpoint", needs_db=True)
+def _ep_status(ctx: Context):
+    return _get(_client(ctx), f"/api/status/{ctx.workload.employees[0]}")
+
+
+@case("GET /api/dashboard/now", group="endpoint", needs_db=True)
+def _ep_dashboard_now(ctx: Context):
+    return _get(_client(ctx), "/api/dashboard/now")
+
+
+@case("GET /api/summary?month", group="endpoint", needs_db=True)
+def _ep_summary_month(ctx: Context):
+    return _get(
+        _client(ctx),
+        "/api/summary",
+        employee_id=ctx.workload.employees[0],
+        month=_month_str(*_first_month(ctx)),
+    )
+
+
+@case("GET /api/summary?start&end", group="endpoint", needs_db=True)
+def _ep_summary_range(ctx: Context):
+    (y0, m0), (y1, m1) = ctx.workload.months[0], ctx.workload.months[-1]
+    end = date(y1 + (m1 == 12), m1 % 12 + 1, 1)
+    return _get(
+        _client(ctx),
+        "/api/summary",
+        employee_id=ctx.workload.employees[0],
+        start=date(y0, m0, 1).isoformat(),
+        end=end.isoformat(),
+    )
+
+
+def _span_dates(ctx: Context):
+    (y0, m0), (y1, m1) = ctx.workload.months[0], ctx.workload.months[-1]
+    return date(y0, m0, 1).isoformat(), date(y1 + (m1 == 12), m1 % 12 + 1, 1).isoformat()
+
+
+@case("GET /api/analytics/team", group="endpoint", needs_db=True)
+def _ep_team_analytics(ctx: Context):
+    start, end = _span_dates(ctx)
+    return _get(_client(ctx), "/api/analytics/team", start=start, end=end)
+
+
+@case("GET /api/summary?start&end x all employees", group="endpoint", needs_db=True)
+def _ep_summary_all_employees(ctx: Context):
+    """What the performance view needed before /analytics/team: one call per employee."""
+    client = _client(ctx)
+    start, end = _span_dates(ctx)
+    calls = [_get(client, "/api/summary", employee_id=e, start=start, end=end) for e in ctx.workload.employees]
+
+    def run():
+        for call in calls:
+            call()
+
+    return run
+
+
+@case("GET /employee-data", group="endpoint", needs_db=True)
+def _ep_employee_data(ctx: Context):
+    return _get(
+        _client(ctx),
+        "/employee-data",
+        employee=ctx.workload.employees[0],
+        month=_month_str(*_first_month(ctx)),
+    )
+
+
+def _post_cycle(client, url: str, payload: dict, days: int = 3650):
+    """POST `payload` to `url`, rotating the date so rows don't grow unbounded."""
+    dates = itertools.cycle(
+        (date(2000, 1, 1) + timedelta(days=i)).isoformat() for i in range(days)
+    )
+
+    def run():
+        resp = client.post(url, json={**payload, "date": next(dates)})
+        assert resp.status_code == 200, resp.status_code
+
+    return run
+
+
+@case("POST /advance (record_value)", group="endpoint", needs_db=True)
+def _ep_advance(ctx: Context):
+    return _post_cycle(_client(ctx), "/advance", {"employee": "bench-ledger", "amount": 10})
+
+
+@case("POST /record-order (record_value)", group="endpoint", needs_db=True)
+def _ep_record_order(ctx: Context):
+    return _post_cycle(
+        _client(ctx),
+        "/record-order",
+        {"employee": "bench-ledger", "order_id": "B1", "total": 25},
+    )
+
+
+@case("GET /api/summary/period", group="endpoint", needs_db=True)
+def _ep_summary_period(ctx: Context):
+    return _get(
+        _client(ctx),
+        "/api/summary/period",
+        employee_id=ctx.workload.employees[0],
+        start=_month_str(*ctx.workload.months[0]),
+        end=_month_str(*ctx.workload.months[-1]),
+    )
+
+
+# --------------------------------------------------------------------------
+# Payroll job: every employee's month, with a growing process pool
+# --------------------------------------------------------------------------
+
+def _payroll(workers: int):
+    def setup(ctx: Context):
+        from api.payroll import run_payroll
+
+        _client(ctx)  # schema and seed data
+        month = _month_str(*_first_month(ctx))
+        return lambda: run_payroll(month, workers)
+
+    return setup
+
+
+for _workers in (1, 2, 4):
+    case(f"payroll.month.workers={_workers}", group="payroll", needs_db=True, repeat=3)(
+        _payroll(_workers)
+    )
+
+
+# --------------------------------------------------------------------------
+# Ledger storage backends: the same workload on embedded SQLite and Postgres
+# --------------------------------------------------------------------------
+
+_LEDGER_EMPLOYEE = "bench-backend"
+
+
+def _ledger_store(ctx: Context, backend: str):
+    """Return a ledger backend seeded with one employee's money rows."""
+    key = f"ledger:{backend}"
+    if key in ctx.state:
+        return ctx.state[key]
+    import db
+    import dbconn
+    from sqlalchemy import create_engine
+
+    if backend == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(prefix="ledger-bench-"), "ledger.db")
+        store = db.SqlAlchemyBackend(create_engine(f"sqlite:///{path}"))
+    else:
+        pool = dbconn.SyncPool(dbconn.sync_url(dbconn.database_url()), name="bench_ledger")
+        store = db.PsycopgBackend(lambda read_only: pool.connection())
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP TABLE IF EXISTS "{db.table_name(_LEDGER_EMPLOYEE)}"')
+    for day, label, value in money_rows(ctx.workload)[ctx.workload.employees[0]]:
+        store.update(_LEDGER_EMPLOYEE, date.fromisoformat(day), label, str(value))
+    ctx.state[key] = store
+    return store
+
+
+def _add(previous, value):
+    return str(float(previous or 0) + float(value))
+
+
+def _ledger_update(ctx: Context, backend: str):
+    store = _ledger_store(ctx, backend)
+    days = itertools.cycle(date(2000, 1, 1) + timedelta(days=i) for i in range(3650))
+    return lambda: store.update(_LEDGER_EMPLOYEE, next(days), "advance", "10", _add)
+
+
+def _ledger_month(ctx: Context, backend: str):
+    store = _ledger_store(ctx, backend)
+    year, month = _first_month(ctx)
+    start = date(year, month, 1)
+    end = date(year + (month == 12), month % 12 + 1, 1)
+
+    def run():
+        assert store.month(_LEDGER_EMPLOYEE, start, end)
+
+    return run
+
+
+@case("ledger.sqlite.update", group="storage")
+def _ledger_sqlite_update(ctx: Context):
+    return _ledger_update(ctx, "sqlite")
+
+
+@case("ledger.sqlite.month", group="storage")
+def _ledger_sqlite_month(ctx: Context):
+    return _ledger_month(ctx, "sqlite")
+
+
+@case("ledger.postgres.update", group="storage", needs_db=True)
+def _ledger_postgres_update(ctx: Context):
+    return _ledger_update(ctx, "postgres")
+
+
+@case("ledger.postgres.month", group="storage", needs_db=True)
+def _ledger_postgres_month(ctx: Context):
+    return _ledger_month(ctx, "postgres")
+
+
+# --------------------------------------------------------------------------
+# Cold start: a fresh interpreter imports app.py and serves one request
+# --------------------------------------------------------------------------
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_COLD_START = """
+import app
+resp = app.server.test_client().get({path!r})
+assert resp.status_code == 200, resp.status_code
+"""
+
+
+def _cold_start(path: str):
+    cmd = [sys.executable, "-c", _COLD_START.format(path=path)]
+
+    def run():
+        proc = subprocess.run(cmd, cwd=_REPO_ROOT, capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stderr[-2000:]
+
+    return run
+
+
+@case("cold_start.healthz", group="startup", repeat=5)
+def _cold_start_healthz(ctx: Context):
+    return _cold_start("/healthz")
+
+
+@case("cold_start.first_api_request", group="startup", needs_db=True, repeat=5)
+def _cold_start_api(ctx: Context):
+    _client(ctx)  # schema and seed data
+    year, month = _first_month(ctx)
+    return _cold_start(
+        f"/api/summary?employee_id={ctx.workload.employees[0]}&month={_month_str(year, month)}"
+    )
@@ -0,0 +1,182 @@
+"""Timing, memory measurement and baseline comparison for benchmarks."""
+from __future__ import annotations
+
+import gc
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+# Relative slowdown (0.25 == 25%) tolerated before a case counts as a regression
+DEFAULT_THRESHOLD = 0.25
+# Absolute noise floor: medians below this difference are never regressions
+MIN_DELTA_MS = 0.05
+
+
+@dataclass
+class Case:
+    name: str
+    group: str
+    setup: Callable[["Context"], Callable[[], object]]
+    needs_db: bool = False
+    repeat: int = 7
+    threshold: Optional[float] = None
+
+
+@dataclass
+class Context:
+    """State shared by all cases in one run."""
+
+    workload: object
+    options: Dict[str, object] = field(default_factory=dict)
+    state: Dict[str, object] = field(default_factory=dict)
+
+
+CASES: Dict[str, Case] = {}
+
+
+def case(name: str, group: str = "function", needs_db: bool = False,
+         repeat: int = 7, threshold: float | None = None):
+    """Register a benchmark case.
+
+    The decorated function receives the run `Context` and returns the
+    zero-argument callable that is timed.
+    """
+
+    def decorator(setup):
+        CASES[name] = Case(name, group, setup, needs_db, repeat, threshold)
+        return setup
+
+    return decorator
+
+
+def _autorange(fn: Callable[[], object], min_time: float = 0.05) -> int:
+    """Return a loop count so that one repeat lasts at least `min_time`."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_time or number >= 1 << 20:
+            return number
+        number *= 2
+
+
+def measure(fn: Callable[[], object], repeat: int = 7) -> Dict[str, float]:
+    """Time `fn` and record its peak traced memory.
+
+    The garbage collector is disabled while timing so that collections
+    triggered by earlier cases do not leak into the numbers.
+    """
+    fn()  # warm caches and lazy imports
+    number = _autorange(fn)
+    samples: List[float] = []
+    gc_was_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number * 1000)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "stdev_ms": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "loops": number,
+        "repeat": repeat,
+        "peak_kib": peak / 1024,
+    }
+
+
+def run(cases: List[Case], ctx: Context) -> Dict[str, object]:
+    results = {}
+    for c in cases:
+        fn = c.setup(ctx)
+        stats = measure(fn, c.repeat)
+        stats["group"] = c.group
+        results[c.name] = stats
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "options": ctx.options,
+        "results": results,
+    }
+
+
+def save(report: Dict[str, object], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+
+
+def load(path: str) -> Dict[str, object]:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def compare(
+    current: Dict[str, object],
+    baseline: Dict[str, object],
+    threshold: float = DEFAULT_THRESHOLD,
+    memory_threshold: float | None = None,
+) -> List[str]:
+    """Return a description of every case that regressed against `baseline`.
+
+    Cases missing from either report are ignored. A per-case threshold set
+    with :func:`case` overrides the global `threshold`.
+    """
+    regressions: List[str] = []
+    base = baseline.get("results", {})
+    for name, stats in current.get("results", {}).items():
+        if name not in base:
+            continue
+        limit = threshold
+        if name in CASES and CASES[name].threshold is not None:
+            limit = CASES[name].threshold
+        old = base[name]["median_ms"]
+        new = stats["median_ms"]
+        if new - old > MIN_DELTA_MS and new > old * (1 + limit):
+            regressions.append(
+                f"{name}: {old:.3f}ms -> {new:.3f}ms (+{(new / old - 1) * 100:.0f}%)"
+            )
+        if memory_threshold is not None:
+            old_mem = base[name].get("peak_kib", 0.0)
+            new_mem = stats.get("peak_kib", 0.0)
+            if old_mem and new_mem > old_mem * (1 + memory_threshold):
+                regressions.append(
+                    f"{name}: peak {old_mem:.0f}KiB -> {new_mem:.0f}KiB"
+                )
+    return regressions
+
+
+def format_report(report: Dict[str, object], baseline: Dict[str, object] | None = None) -> str:
+    base = (baseline or {}).get("results", {})
+    lines = [f"{'case':40} {'median ms':>10} {'min ms':>10} {'peak KiB':>10} {'vs base':>8}"]
+    for name, stats in sorted(report["results"].items()):
+        delta = ""
+        if name in base and base[name]["median_ms"]:
+            delta = f"{(stats['median_ms'] / base[name]['median_ms'] - 1) * 100:+.0f}%"
+        lines.append(
+            f"{name:40} {stats['median_ms']:10.3f} {stats['min_ms']:10.3f} "
+            f"{stats['peak_kib']:10.0f} {delta:>8}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,6 @@
+"""Load generator for the shift-start traffic burst.
+
+Scenarios (JSON files, see ``scenarios/``) describe groups of virtual users
+and the gunicorn settings to compare; ``python -m benchmarks.loadtest``
+starts the app against a local Postgres and replays them.
+"""
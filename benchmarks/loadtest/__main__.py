@@ -0,0 +1,71 @@
+"""Command line entry point: ``python -m benchmarks.loadtest SCENARIO.json``."""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from contextlib import nullcontext
+
+from . import local
+from .runner import format_results, run_scenario
+from .scenario import load
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest", description=__doc__)
+    parser.add_argument("scenario", help="scenario JSON file")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--database-url",
+                        help="scratch Postgres to use instead of starting a local one "
+                             "(the seeded employees' events are reset)")
+    target.add_argument("--url", help="load an already running server instead of starting gunicorn")
+    parser.add_argument("-v", "--variant", action="append",
+                        help="only run the named variant (repeatable)")
+    parser.add_argument("--duration", type=float, help="override the scenario duration")
+    parser.add_argument("--save", metavar="PATH", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    # app.py configures INFO logging on import; per-request lines drown the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    scenario = load(args.scenario)
+    if args.duration is not None:
+        scenario.duration = args.duration
+    variants = [v for v in scenario.variants if not args.variant or v.name in args.variant]
+    if not variants:
+        parser.error("no variant selected")
+    if args.url and len(variants) > 1:
+        print("warning: --url ignores the variants' server settings", file=sys.stderr)
+        variants = variants[:1]
+
+    report = {"scenario": scenario.name, "duration_s": scenario.duration, "variants": {}}
+    failed = False
+    database = nullcontext(args.database_url) if args.database_url or args.url else local.local_postgres()
+    with database as database_url:
+        employees = [f"emp{i:03d}" for i in range(scenario.employees)]
+        history: list[str] = []
+        for variant in variants:
+            if database_url:
+                history = local.seed(database_url, scenario.employees, scenario.history_months, scenario.seed)
+            server = nullcontext(args.url) if args.url else local.gunicorn(variant.server, database_url)
+            with server as base_url:
+                results = asyncio.run(run_scenario(scenario, base_url, employees, history))
+            results["server"] = variant.server
+            report["variants"][variant.name] = results
+            print(format_results(variant.name, results))
+            print()
+            failed = failed or results["endpoints"]["total"]["requests"] == 0
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"saved {args.save}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Throwaway Postgres cluster and gunicorn server for load tests."""
+from __future__ import annotations
+
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Iterator, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _pg_tool(name: str) -> str:
+    """Locate a Postgres binary, preferring ``$PG_BIN``."""
+    bin_dir = os.getenv("PG_BIN")
+    path = os.path.join(bin_dir, name) if bin_dir else shutil.which(name)
+    if not path or not os.path.exists(path):
+        raise RuntimeError(f"{name} not found; put the Postgres binaries on PATH or set PG_BIN")
+    return path
+
+
+@contextmanager
+def local_postgres(dbname: str = "loadtest") -> Iterator[str]:
+    """Start a private Postgres cluster listening on a Unix socket only.
+
+    Yields a ``postgresql://`` URL; the cluster and its data are removed on
+    exit. Needs ``initdb`` and ``pg_ctl`` from a Postgres install.
+    """
+    workdir = tempfile.mkdtemp(prefix="loadtest-pg-")
+    data = os.path.join(workdir, "data")
+    log = os.path.join(workdir, "postgres.log")
+    subprocess.run(
+        [_pg_tool("initdb"), "-D", data, "-U", "postgres", "--auth=trust", "--no-sync"],
+        check=True, stdout=subprocess.DEVNULL,
+    )
+    options = f"-k {workdir} -c listen_addresses='' -c max_connections=200 -c fsync=off"
+    subprocess.run(
+        [_pg_tool("pg_ctl"), "-D", data, "-l", log, "-o", options, "-w", "start"],
+        check=True, stdout=subprocess.DEVNULL,
+    )
+    try:
+        import psycopg2
+
+        conn = psycopg2.connect(dbname="postgres", user="postgres", host=workdir)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f'CREATE DATABASE "{dbname}"')
+        conn.close()
+        yield f"postgresql://postgres@/{dbname}?host={workdir}"
+    finally:
+        subprocess.run(
+            [_pg_tool("pg_ctl"), "-D", data, "-m", "fast", "-w", "stop"],
+            stdout=subprocess.DEVNULL,
+        )
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def gunicorn(settings: Dict[str, object], database_url: str, startup_timeout: float = 60.0) -> Iterator[str]:
+    """Serve ``app:server`` with the given worker settings; yields the base URL."""
+    port = _free_port()
+    cmd = [
+        sys.executable, "-m", "gunicorn", "app:server",
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", str(settings["workers"]),
+        "--worker-class", str(settings["worker_class"]),
+        "--threads", str(settings["threads"]),
+        "--timeout", "120",
+    ]
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "ASGI_BRIDGE_MODE": str(settings["bridge_mode"]),
+        **{k: str(v) for k, v in dict(settings.get("env") or {}).items()},
+    }
+    log = tempfile.NamedTemporaryFile(prefix="loadtest-gunicorn-", suffix=".log", delete=False)
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"gunicorn exited early, see {log.name}")
+            try:
+                with urllib.request.urlopen(base_url + "/healthz", timeout=1) as resp:
+                    if resp.status == 200:
+                        break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"gunicorn did not become healthy, see {log.name}")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        log.close()
+
+
+def _month_list(count: int, today: date) -> List[str]:
+    """The `count` whole months before the one containing `today`, oldest first."""
+    months = []
+    year, month = today.year, today.month
+    for _ in range(count):
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+        months.append(f"{year:04d}-{month:02d}")
+    return months[::-1]
+
+
+def seed(database_url: str, employees: int, history_months: int, seed_value: int) -> List[str]:
+    """Reset the seeded employees to past months of synthetic attendance.
+
+    Creates the schema and every employee's ledger table up front so the
+    burst measures request handling rather than first-use DDL. Returns the
+    seeded months as ``YYYY-MM`` strings.
+    """
+    os.environ["DATABASE_URL"] = database_url
+    import app as app_module
+    from api.schema import create_schema
+    from benchmarks.workload import generate
+
+    create_schema()
+    months = _month_list(history_months, date.today())
+    names: List[str] = []
+    events = []
+    if months:
+        year, month = map(int, months[0].split("-"))
+        workload = generate(seed=seed_value, employees=employees, months=len(months), start=(year, month))
+        names = workload.employees
+        events = workload.events
+    else:
+        names = [f"emp{i:03d}" for i in range(employees)]
+    with app_module.db_connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM events WHERE employee_id = ANY(%s)", (names,))
+            cur.executemany(
+                "INSERT INTO events (employee_id, kind, timestamp, created_at, updated_at) "
+                "VALUES (%s, %s, %s, now(), now())",
+                [(e.employee_id, e.kind, e.timestamp) for e in events],
+            )
+        conn.commit()
+    for name in names:
+        app_module.ensure_employee_table(name)
+    return months
@@ -0,0 +1,123 @@
+"""Run a scenario's virtual users against a live server and collect latencies."""
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import time
+from typing import Dict, List
+
+import httpx
+
+from .scenario import Group, Scenario
+from .steps import STEPS, User
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted `samples`."""
+    if not samples:
+        return 0.0
+    rank = max(1, min(len(samples), math.ceil(q / 100 * len(samples))))
+    return samples[rank - 1]
+
+
+class Recorder:
+    """Latencies and failures per endpoint label."""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def add(self, label: str, seconds: float, error: str | None = None) -> None:
+        self.latencies.setdefault(label, []).append(seconds * 1000)
+        if error is not None:
+            by_kind = self.errors.setdefault(label, {})
+            by_kind[error] = by_kind.get(error, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, object]]:
+        out: Dict[str, Dict[str, object]] = {}
+        everything: List[float] = []
+        for label, samples in sorted(self.latencies.items()):
+            everything.extend(samples)
+            out[label] = self._stats(sorted(samples), sum(self.errors.get(label, {}).values()), elapsed)
+            out[label]["error_kinds"] = dict(self.errors.get(label, {}))
+        total_errors = sum(sum(e.values()) for e in self.errors.values())
+        out["total"] = self._stats(sorted(everything), total_errors, elapsed)
+        return out
+
+    @staticmethod
+    def _stats(samples: List[float], errors: int, elapsed: float) -> Dict[str, object]:
+        count = len(samples)
+        return {
+            "requests": count,
+            "errors": errors,
+            "error_rate": errors / count if count else 0.0,
+            "rps": count / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(samples, 50),
+            "p95_ms": percentile(samples, 95),
+            "p99_ms": percentile(samples, 99),
+            "max_ms": samples[-1] if samples else 0.0,
+        }
+
+
+async def _user(client: httpx.AsyncClient, group: Group, user: User, delay: float,
+                deadline: float, recorder: Recorder) -> None:
+    await asyncio.sleep(delay)
+    while time.monotonic() < deadline:
+        for name in group.steps:
+            req = STEPS[name](user)
+            start = time.perf_counter()
+            error = None
+            try:
+                resp = await client.request(req.method, req.url, params=req.params, json=req.json)
+                if resp.status_code not in req.expect:
+                    error = f"HTTP {resp.status_code}"
+            except httpx.HTTPError as exc:
+                error = type(exc).__name__
+            recorder.add(req.label, time.perf_counter() - start, error)
+        if not group.interval:
+            return
+        # +-20% jitter keeps pollers from marching in lockstep
+        await asyncio.sleep(group.interval * user.rng.uniform(0.8, 1.2))
+
+
+async def run_scenario(scenario: Scenario, base_url: str, employees: List[str],
+                       history: List[str], timeout: float = 30.0) -> Dict[str, object]:
+    """Replay `scenario` against `base_url` and return per-endpoint stats."""
+    rng = random.Random(scenario.seed)
+    recorder = Recorder()
+    total_users = sum(g.users for g in scenario.groups)
+    limits = httpx.Limits(max_connections=total_users, max_keepalive_connections=total_users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        start = time.monotonic()
+        deadline = start + scenario.duration
+        tasks = []
+        for group in scenario.groups:
+            for i in range(group.users):
+                user = User(
+                    employee=employees[i % len(employees)],
+                    employees=employees,
+                    history=history,
+                    rng=random.Random(rng.random()),
+                )
+                delay = group.arrival_window * i / group.users if group.users else 0.0
+                tasks.append(_user(client, group, user, delay, deadline, recorder))
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - start
+    return {"elapsed_s": elapsed, "users": total_users, "endpoints": recorder.summary(elapsed)}
+
+
+def format_results(name: str, results: Dict[str, object]) -> str:
+    lines = [
+        f"== {name}: {results['users']} users, {results['elapsed_s']:.1f}s",
+        f"{'endpoint':28} {'reqs':>7} {'req/s':>8} {'err %':>6} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}",
+    ]
+    for label, s in results["endpoints"].items():
+        lines.append(
+            f"{label:28} {s['requests']:7d} {s['rps']:8.1f} {s['error_rate'] * 100:6.1f} "
+            f"{s['p50_ms']:8.1f} {s['p95_ms']:8.1f} {s['p99_ms']:8.1f} {s['max_ms']:8.1f}"
+        )
+        for kind, count in s.get("error_kinds", {}).items():
+            lines.append(f"  {kind}: {count}")
+    return "\n".join(lines)
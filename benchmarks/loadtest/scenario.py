@@ -0,0 +1,81 @@
+"""Scenario files for the load generator."""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Dict, List
+
+# gunicorn settings used when a scenario or variant leaves them out
+DEFAULT_SERVER: Dict[str, object] = {
+    "workers": 1,
+    "worker_class": "sync",
+    "threads": 1,
+    "bridge_mode": "lock",
+    "env": {},
+}
+
+
+@dataclass
+class Group:
+    """Virtual users that run the same steps.
+
+    Users start spread evenly over `arrival_window` seconds. With an
+    `interval` they repeat their steps, pausing that long in between,
+    until the scenario ends; without one they run them once.
+    """
+
+    name: str
+    users: int
+    steps: List[str]
+    arrival_window: float = 0.0
+    interval: float = 0.0
+
+
+@dataclass
+class Variant:
+    name: str
+    server: Dict[str, object]
+
+
+@dataclass
+class Scenario:
+    name: str
+    duration: float
+    groups: List[Group]
+    variants: List[Variant]
+    description: str = ""
+    seed: int = 1234
+    # Seeded history: employee count and whole months before the current one
+    employees: int = 50
+    history_months: int = 2
+
+
+def parse(data: Dict[str, object]) -> Scenario:
+    """Build a :class:`Scenario` from decoded JSON, filling in defaults."""
+    from .steps import STEPS
+
+    groups = [Group(**g) for g in data["groups"]]
+    for g in groups:
+        unknown = [s for s in g.steps if s not in STEPS]
+        if unknown:
+            raise ValueError(f"group {g.name!r}: unknown steps {', '.join(unknown)}")
+    base = {**DEFAULT_SERVER, **data.get("server", {})}
+    variants = [
+        Variant(v.get("name", f"variant{i}"), {**base, **{k: x for k, x in v.items() if k != "name"}})
+        for i, v in enumerate(data.get("variants") or [{"name": "default"}])
+    ]
+    return Scenario(
+        name=data["name"],
+        duration=float(data.get("duration", 60)),
+        groups=groups,
+        variants=variants,
+        description=data.get("description", ""),
+        seed=int(data.get("seed", 1234)),
+        employees=int(data.get("employees", 50)),
+        history_months=int(data.get("history_months", 2)),
+    )
+
+
+def load(path: str) -> Scenario:
+    with open(path, encoding="utf-8") as fh:
+        return parse(json.load(fh))
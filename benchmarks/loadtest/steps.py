@@ -0,0 +1,103 @@
+"""Requests a virtual user can make, by step name."""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class User:
+    """One virtual user; `employee` is who they clock in as or look at."""
+
+    employee: str
+    employees: List[str]
+    history: List[str]
+    rng: random.Random
+
+
+@dataclass
+class Request:
+    label: str
+    method: str
+    url: str
+    params: Optional[Dict[str, str]] = None
+    json: Optional[Dict[str, object]] = None
+    expect: Tuple[int, ...] = (200,)
+
+
+STEPS: Dict[str, Callable[[User], Request]] = {}
+
+
+def step(name: str):
+    def decorator(fn: Callable[[User], Request]) -> Callable[[User], Request]:
+        STEPS[name] = fn
+        return fn
+
+    return decorator
+
+
+def _this_month() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m")
+
+
+def _attendance(action: str) -> Callable[[User], Request]:
+    def build(user: User) -> Request:
+        return Request("POST /attendance", "POST", "/attendance",
+                       json={"employee": user.employee, "action": action})
+
+    return build
+
+
+def _event(kind: str) -> Callable[[User], Request]:
+    def build(user: User) -> Request:
+        return Request("POST /api/events", "POST", "/api/events", json={
+            "employee_id": user.employee,
+            "kind": kind,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        })
+
+    return build
+
+
+for _action in ("clockin", "clockout", "startbreak", "endbreak"):
+    step(f"attendance_{_action}")(_attendance(_action))
+    step(f"event_{_action}")(_event(_action))
+
+
+@step("list_events")
+def _list_events(user: User) -> Request:
+    return Request("GET /api/events", "GET", "/api/events", params={"month": _this_month()})
+
+
+@step("summary")
+def _summary(user: User) -> Request:
+    return Request("GET /api/summary", "GET", "/api/summary", params={
+        "employee_id": user.rng.choice(user.employees), "month": _this_month(),
+    })
+
+
+@step("summary_history")
+def _summary_history(user: User) -> Request:
+    return Request("GET /api/summary", "GET", "/api/summary", params={
+        "employee_id": user.rng.choice(user.employees),
+        "month": user.rng.choice(user.history or [_this_month()]),
+    })
+
+
+@step("period_summary")
+def _period_summary(user: User) -> Request:
+    months = user.history or [_this_month()]
+    return Request("GET /api/summary/period", "GET", "/api/summary/period", params={
+        "employee_id": user.rng.choice(user.employees),
+        "start": months[0],
+        "end": months[-1],
+    })
+
+
+@step("employee_data")
+def _employee_data(user: User) -> Request:
+    return Request("GET /employee-data", "GET", "/employee-data", params={
+        "employee": user.rng.choice(user.employees), "month": _this_month(),
+    })
@@ -0,0 +1,123 @@
+"""Seeded synthetic attendance workload for the benchmark suite."""
+from __future__ import annotations
+
+import calendar
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Tuple
+
+
+@dataclass
+class SyntheticEvent:
+    employee_id: str
+    kind: str
+    timestamp: datetime
+    id: int = 0
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+
+
+@dataclass
+class Workload:
+    seed: int
+    events: List[SyntheticEvent]
+    months: List[Tuple[int, int]]
+    employees: List[str]
+
+    def for_employee(self, employee_id: str) -> List[SyntheticEvent]:
+        return [e for e in self.events if e.employee_id == employee_id]
+
+    def for_month(self, employee_id: str, year: int, month: int) -> List[SyntheticEvent]:
+        return [
+            e
+            for e in self.events
+            if e.employee_id == employee_id
+            and e.timestamp.year == year
+            and e.timestamp.month == month
+        ]
+
+
+def _months(start: Tuple[int, int], count: int) -> Iterator[Tuple[int, int]]:
+    year, month = start
+    for _ in range(count):
+        yield year, month
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+def _shift(rng: random.Random, day: datetime, overnight_rate: float) -> List[Tuple[str, datetime]]:
+    """Return the events of one shift starting on `day`."""
+    if rng.random() < overnight_rate:
+        start = day + timedelta(hours=rng.randint(18, 21), minutes=rng.randint(0, 59))
+    else:
+        start = day + timedelta(hours=rng.randint(7, 10), minutes=rng.randint(0, 59))
+    events = [("clockin", start)]
+    cur = start
+    for _ in range(rng.choice((0, 1, 1, 1, 2))):
+        cur += timedelta(hours=rng.uniform(1.5, 4))
+        events.append(("startbreak", cur))
+        cur += timedelta(minutes=rng.randint(10, 70))
+        events.append(("endbreak", cur))
+    cur += timedelta(hours=rng.uniform(1.5, 4.5))
+    events.append(("clockout", cur))
+    return events
+
+
+def generate(
+    seed: int = 1234,
+    employees: int = 25,
+    months: int = 3,
+    start: Tuple[int, int] = (2024, 1),
+    attendance_rate: float = 0.85,
+    overnight_rate: float = 0.05,
+    missing_clockout_rate: float = 0.03,
+) -> Workload:
+    """Build a deterministic workload for `employees` over `months`.
+
+    Shifts include breaks, occasional overnight shifts that cross midnight
+    and a share of days where the clock-out was never recorded.
+    """
+    rng = random.Random(seed)
+    names = [f"emp{i:03d}" for i in range(employees)]
+    month_list = list(_months(start, months))
+    events: List[SyntheticEvent] = []
+    for name in names:
+        last_end = datetime.min.replace(tzinfo=timezone.utc)
+        for year, month in month_list:
+            for d in range(1, calendar.monthrange(year, month)[1] + 1):
+                if rng.random() > attendance_rate:
+                    continue
+                day = datetime(year, month, d, tzinfo=timezone.utc)
+                shift = _shift(rng, day, overnight_rate)
+                if shift[0][1] < last_end + timedelta(hours=1):
+                    continue  # still on the previous overnight shift
+                last_end = shift[-1][1]
+                if rng.random() < missing_clockout_rate:
+                    shift = shift[:-1]
+                events.extend(SyntheticEvent(name, kind, ts) for kind, ts in shift)
+    events.sort(key=lambda e: e.timestamp)
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i, ev in enumerate(events, start=1):
+        ev.id = i
+        ev.created_at = now
+        ev.updated_at = now
+    return Workload(seed=seed, events=events, months=month_list, employees=names)
+
+
+def money_rows(workload: Workload, seed: int | None = None) -> Dict[str, List[Tuple[str, str, float]]]:
+    """Return (day, label, value) legacy ledger entries per employee."""
+    rng = random.Random(workload.seed if seed is None else seed)
+    rows: Dict[str, List[Tuple[str, str, float]]] = {}
+    for name in workload.employees:
+        entries = rows.setdefault(name, [])
+        for year, month in workload.months:
+            for d in range(1, calendar.monthrange(year, month)[1] + 1):
+                day = f"{year:04d}-{month:02d}-{d:02d}"
+                if rng.random() < 0.3:
+                    entries.append((day, "orders", round(rng.uniform(20, 400), 2)))
+                if rng.random() < 0.05:
+                    entries.append((day, "advance", float(rng.choice((50, 100, 200)))))
+            entries.append((f"{year:04d}-{month:02d}-15", "payout", float(rng.randint(2000, 4000))))
+    return rows
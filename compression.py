@@ -0,0 +1,307 @@
+"""Response compression for the WSGI app and the FastAPI app.
+
+Responses are compressed when the client accepts ``br`` or ``gzip`` (by
+``Accept-Encoding`` q-values, brotli preferred when the optional
+``brotli`` package is installed), the content type is text-like (JSON,
+HTML, CSS, JavaScript, SVG, ...) and the body is at least
+``COMPRESSION_MIN_SIZE`` bytes. Images, fonts and anything that already has
+a ``Content-Encoding`` pass through untouched, so the FastAPI layer and the
+WSGI layer never compress the same body twice.
+
+Streaming bodies are compressed chunk by chunk: the first
+``COMPRESSION_MIN_SIZE`` bytes are buffered to decide, after that every
+chunk is flushed through the compressor as it arrives.
+
+Settings come from the environment:
+
+- ``COMPRESSION_LEVEL`` (default 6) gzip level; ``0`` turns compression off
+- ``COMPRESSION_BROTLI_QUALITY`` (default 4)
+- ``COMPRESSION_MIN_SIZE`` (default 1024) bytes
+"""
+from __future__ import annotations
+
+import os
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+# Statuses that carry no body
+_NO_BODY = (204, 304)
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Encodings this process can produce, preferred first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: str, encodings: Iterable[str] | None = None) -> Optional[str]:
+    """Pick an encoding from an ``Accept-Encoding`` header, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in encodings or available_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type: str | None) -> bool:
+    return bool(content_type) and content_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+class Encoder:
+    """Incremental gzip or brotli compressor."""
+
+    def __init__(self, encoding: str, level: int = LEVEL, quality: int = BROTLI_QUALITY) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=quality)
+        else:
+            self._br = None
+            self._zlib = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress `data` and flush, so the client can decode it right away."""
+        if self._br is not None:
+            return self._br.process(data) + self._br.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self._br is not None:
+            return self._br.process(data) + self._br.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+def _choose(request_encoding: str, method: str, status: int,
+            headers: List[Tuple[str, str]], level: int) -> Tuple[Optional[str], bool]:
+    """Return (encoding or None, whether to add ``Vary: Accept-Encoding``)."""
+    lower = {k.lower(): v for k, v in headers}
+    if level <= 0 or status in _NO_BODY or method == "HEAD":
+        return None, False
+    if "content-encoding" in lower or not is_compressible(lower.get("content-type")):
+        return None, False
+    # Content-Range counts bytes of the uncompressed body
+    if status == 206 or "content-range" in lower:
+        return None, False
+    if "no-transform" in lower.get("cache-control", "").lower():
+        return None, False
+    vary = "accept-encoding" not in lower.get("vary", "").lower()
+    return negotiate(request_encoding), vary
+
+
+def _rewrite_headers(headers: List[Tuple[str, str]], encoding: Optional[str], vary: bool,
+                     length: Optional[int]) -> List[Tuple[str, str]]:
+    out = []
+    for k, v in headers:
+        name = k.lower()
+        if name == "content-length" and (encoding or length is not None):
+            continue
+        if name == "etag" and encoding and not v.startswith("W/"):
+            # the compressed body is a different representation
+            v = f"W/{v}"
+        if name == "vary" and vary:
+            v = f"{v}, Accept-Encoding"
+            vary = False
+        out.append((k, v))
+    if vary:
+        out.append(("Vary", "Accept-Encoding"))
+    if encoding:
+        out.append(("Content-Encoding", encoding))
+    if length is not None:
+        out.append(("Content-Length", str(length)))
+    return out
+
+
+def _has_length(headers: List[Tuple[str, str]]) -> bool:
+    return any(k.lower() == "content-length" for k, _ in headers)
+
+
+class CompressionMiddleware:
+    """Compress WSGI responses."""
+
+    def __init__(self, app: Callable, level: int = LEVEL, min_size: int = MIN_SIZE,
+                 quality: int = BROTLI_QUALITY) -> None:
+        self.app = app
+        self.level = level
+        self.min_size = min_size
+        self.quality = quality
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        accept = environ.get("HTTP_ACCEPT_ENCODING", "")
+        if self.level <= 0 or not accept:
+            return self.app(environ, start_response)
+
+        captured: list = []
+
+        def capture(status: str, headers: List[Tuple[str, str]], exc_info=None):
+            if exc_info is not None and captured:
+                raise exc_info[1].with_traceback(exc_info[2])
+            captured[:] = [status, headers]
+            return self._write_unsupported
+
+        body = self.app(environ, capture)
+        return self._respond(environ, start_response, captured, body)
+
+    @staticmethod
+    def _write_unsupported(data: bytes) -> None:
+        raise RuntimeError("CompressionMiddleware does not support write()")
+
+    def _respond(self, environ: dict, start_response: Callable, captured: list,
+                 body: Iterable[bytes]) -> Iterator[bytes]:
+        try:
+            chunks = iter(body)
+            head: List[bytes] = []
+            exhausted = False
+
+            def pull() -> bool:
+                nonlocal exhausted
+                try:
+                    head.append(next(chunks))
+                    return True
+                except StopIteration:
+                    exhausted = True
+                    return False
+
+            # the app may call start_response lazily, on its first chunk
+            while not captured and pull():
+                pass
+            status, headers = captured
+            encoding, vary = _choose(
+                environ.get("HTTP_ACCEPT_ENCODING", ""), environ.get("REQUEST_METHOD", "GET"),
+                int(status.split(" ", 1)[0]), headers, self.level,
+            )
+            if encoding is not None:
+                # a body with a Content-Length is read whole and compressed at
+                # once; a streamed one only until the threshold is reached
+                sized = _has_length(headers)
+                while (sized or sum(map(len, head)) < self.min_size) and pull():
+                    pass
+                if exhausted and sum(map(len, head)) < self.min_size:
+                    encoding = None
+            if encoding is None:
+                start_response(status, _rewrite_headers(headers, None, vary, None))
+                yield from head
+                yield from chunks
+                return
+
+            encoder = Encoder(encoding, self.level, self.quality)
+            if exhausted:
+                data = encoder.finish(b"".join(head))
+                start_response(status, _rewrite_headers(headers, encoding, vary, len(data)))
+                yield data
+                return
+            start_response(status, _rewrite_headers(headers, encoding, vary, None))
+            yield encoder.chunk(b"".join(head))
+            for chunk in chunks:
+                if chunk:
+                    yield encoder.chunk(chunk)
+            yield encoder.finish()
+        finally:
+            close = getattr(body, "close", None)
+            if close is not None:
+                close()
+
+
+class AsgiCompressionMiddleware:
+    """Compress ASGI (FastAPI) HTTP responses."""
+
+    def __init__(self, app: Callable, level: int = LEVEL, min_size: int = MIN_SIZE,
+                 quality: int = BROTLI_QUALITY) -> None:
+        self.app = app
+        self.level = level
+        self.min_size = min_size
+        self.quality = quality
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or self.level <= 0:
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for k, v in scope.get("headers", []):
+            if k.lower() == b"accept-encoding":
+                accept = v.decode("latin1")
+        if not accept:
+            await self.app(scope, receive, send)
+            return
+
+        start: dict | None = None
+        encoding: Optional[str] = None
+        vary = False
+        head: List[bytes] = []
+        size = 0
+        encoder: Encoder | None = None
+
+        async def send_start(enc: Optional[str], length: Optional[int]) -> None:
+            headers = [(k.decode("latin1"), v.decode("latin1")) for k, v in start["headers"]]
+            headers = _rewrite_headers(headers, enc, vary, length)
+            await send({
+                **start,
+                "headers": [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers],
+            })
+
+        async def _send(message: dict) -> None:
+            nonlocal start, encoding, vary, size, encoder
+            if message["type"] == "http.response.start":
+                start = message
+                headers = [(k.decode("latin1"), v.decode("latin1")) for k, v in message["headers"]]
+                encoding, vary = _choose(accept, scope["method"], message["status"], headers, self.level)
+                if encoding is None:
+                    await send_start(None, None)
+                return
+            if message["type"] != "http.response.body" or start is None or encoding is None:
+                await send(message)
+                return
+
+            data = message.get("body", b"")
+            more = message.get("more_body", False)
+            if encoder is None:
+                head.append(data)
+                size += len(data)
+                if not more:
+                    payload = b"".join(head)
+                    if size < self.min_size:
+                        await send_start(None, size)
+                        await send({"type": "http.response.body", "body": payload})
+                        return
+                    out = Encoder(encoding, self.level, self.quality).finish(payload)
+                    await send_start(encoding, len(out))
+                    await send({"type": "http.response.body", "body": out})
+                    return
+                if size < self.min_size:
+                    return
+                encoder = Encoder(encoding, self.level, self.quality)
+                await send_start(encoding, None)
+                data = b"".join(head)
+            if more:
+                await send({"type": "http.response.body", "body": encoder.chunk(data), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": encoder.finish(data)})
+
+        await self.app(scope, receive, _send)
@@ -1,20 +1,82 @@
+"""Storage backends for the legacy per-employee tables.
+
+The Flask ledger helpers in app.py (``record_time``, ``record_value`` and
+``/employee-data``) go through a :class:`LedgerBackend`:
+
+- :class:`PsycopgBackend` runs on the psycopg2 pools from :mod:`dbconn`
+  and is the default.
+- :class:`SqlAlchemyBackend` runs on any SQLAlchemy engine. Setting
+  ``LEDGER_DATABASE_URL`` (e.g. ``sqlite:///ledger.db``) keeps the ledger
+  in that database instead, so single-store deployments and local
+  development can use an embedded SQLite file.
+
+Backends remember which ledger tables exist, so a write only issues DDL the
+first time a process sees an employee. Tables dropped or created behind the
+process's back need :meth:`LedgerBackend.refresh`.
+
+``ensure_employee_table`` serves the older ``attendance_<name>`` tables on
+``engine`` (``DATABASE_URL``, SQLite by default).
+"""
+from __future__ import annotations
+
+import abc
+import datetime as dt
 import os
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Date
+import threading
+from contextlib import AbstractContextManager
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from psycopg2 import errors as pg_errors
+from psycopg2 import sql
+from sqlalchemy import (
+    Column, Date, DateTime, Integer, MetaData, String, Table, Text, create_engine, inspect,
+    select, update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+
+from dbconn import sync_url
+from ledger import table_name
+from telemetry import instrument_engine
 
 # Database URL from env or default to local SQLite file
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///attendance.db")
+DATABASE_URL = sync_url(os.getenv("DATABASE_URL", "sqlite:///attendance.db"))
 engine = create_engine(DATABASE_URL)
+instrument_engine(engine)
 metadata = MetaData()
+_metadata_lock = threading.Lock()
+
+# Embedded ledger store; unset keeps the ledger next to everything else
+LEDGER_DATABASE_URL = os.getenv("LEDGER_DATABASE_URL") or None
+
+# Columns of a ledger table besides its `day` key
+TIME_COLUMNS = ("clockin", "clockout", "break_start", "break_end", "extra_start", "extra_end")
+VALUE_COLUMNS = ("cash", "orders", "payout", "advance")
+
+# (day, cash, orders, payout, advance), the shape ledger.parse_row takes
+LedgerRow = Tuple[dt.date, Optional[str], Optional[str], Optional[str], Optional[str]]
+Combine = Callable[[Optional[str], object], object]
 
 
 def ensure_employee_table(name: str) -> Table:
-    """Return SQLAlchemy Table for `name`, creating it if missing."""
+    """Return SQLAlchemy Table for `name`, creating it if missing.
+
+    Tables are looked up once per process; call :func:`refresh_tables`
+    after creating or dropping them elsewhere.
+    """
     table_name = f"attendance_{name.lower()}"
-    # Reflect to load existing tables
-    metadata.reflect(bind=engine)
+    table = metadata.tables.get(table_name)
+    if table is not None:
+        return table
 
-    if table_name not in metadata.tables:
-        Table(
+    with _metadata_lock:
+        if table_name in metadata.tables:
+            return metadata.tables[table_name]
+        if inspect(engine).has_table(table_name):
+            # Reflect just this table, not the whole schema
+            return Table(table_name, metadata, autoload_with=engine)
+        table = Table(
             table_name,
             metadata,
             Column("id", Integer, primary_key=True),
@@ -30,5 +92,274 @@ def ensure_employee_table(name: str) -> Table:
             Column("advance", Integer, default=0),
             Column("orders", Integer, default=0),
         )
-        metadata.create_all(bind=engine, tables=[metadata.tables[table_name]])
-    return metadata.tables[table_name]
+        table.create(bind=engine, checkfirst=True)
+        return table
+
+
+def refresh_tables(name: str | None = None) -> None:
+    """Forget cached table definitions, all of them or just `name`'s."""
+    with _metadata_lock:
+        if name is None:
+            metadata.clear()
+        elif (table := metadata.tables.get(f"attendance_{name.lower()}")) is not None:
+            metadata.remove(table)
+
+
+# ---------------------------------------------------------------------------
+# Ledger backends
+# ---------------------------------------------------------------------------
+
+class LedgerBackend(abc.ABC):
+    """Reads and writes the ``employee_<name>`` ledger tables."""
+
+    name = "ledger"
+
+    @abc.abstractmethod
+    def ensure_table(self, employee: str) -> str:
+        """Create `employee`'s table if missing and return its name."""
+
+    @abc.abstractmethod
+    def update(self, employee: str, day: dt.date, column: str, value: object,
+               combine: Combine | None = None) -> object:
+        """Set `column` of the `day` row, inserting the row if needed.
+
+        With `combine`, the stored value becomes ``combine(previous, value)``,
+        read in the same transaction. Returns the value stored.
+        """
+
+    @abc.abstractmethod
+    def month(self, employee: str, start: dt.date, end: dt.date,
+              read_only: bool = True) -> List[LedgerRow]:
+        """Return the rows with ``start <= day < end`` ordered by day.
+
+        An employee without a table has no rows.
+        """
+
+    @abc.abstractmethod
+    def refresh(self, employee: str | None = None) -> None:
+        """Forget which tables exist, for every employee or just one."""
+
+
+def _check_column(column: str) -> None:
+    if column not in TIME_COLUMNS and column not in VALUE_COLUMNS:
+        raise ValueError(f"unknown ledger column {column!r}")
+
+
+class PsycopgBackend(LedgerBackend):
+    """Ledger on Postgres through psycopg2.
+
+    `connect(read_only)` returns a connection context manager that commits
+    on success, like ``app.db_connect``.
+    """
+
+    name = "postgres"
+
+    def __init__(self, connect: Callable[[bool], AbstractContextManager]) -> None:
+        self._connect = connect
+        self._known: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def ensure_table(self, employee: str) -> str:
+        tbl = table_name(employee)
+        if tbl in self._known:
+            return tbl
+        with self._connect(False) as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    sql.SQL(
+                        """
+                        CREATE TABLE IF NOT EXISTS {table} (
+                            day DATE PRIMARY KEY,
+                            clockin TIMESTAMPTZ,
+                            clockout TIMESTAMPTZ,
+                            break_start TIMESTAMPTZ,
+                            break_end TIMESTAMPTZ,
+                            extra_start TIMESTAMPTZ,
+                            extra_end TIMESTAMPTZ,
+                            cash TEXT,
+                            orders TEXT,
+                            payout TEXT,
+                            advance TEXT
+                        )
+                        """
+                    ).format(table=sql.Identifier(tbl))
+                )
+        with self._lock:
+            self._known.add(tbl)
+        return tbl
+
+    def update(self, employee, day, column, value, combine=None):
+        _check_column(column)
+        tbl = self.ensure_table(employee)
+        table, col = sql.Identifier(tbl), sql.Identifier(column)
+        with self._connect(False) as conn:
+            with conn.cursor() as cur:
+                if combine is not None:
+                    # FOR UPDATE locks nothing on a missing row, so insert it
+                    # first: the no-op upsert locks the row either way and
+                    # returns the value a concurrent writer committed
+                    cur.execute(
+                        sql.SQL(
+                            "INSERT INTO {table} (day) VALUES (%s) "
+                            "ON CONFLICT(day) DO UPDATE SET day=EXCLUDED.day RETURNING {col}"
+                        ).format(table=table, col=col),
+                        (day,),
+                    )
+                    value = combine(cur.fetchone()[0], value)
+                    cur.execute(
+                        sql.SQL("UPDATE {table} SET {col}=%s WHERE day=%s").format(table=table, col=col),
+                        (value, day),
+                    )
+                    return value
+                cur.execute(
+                    sql.SQL(
+                        "INSERT INTO {table} (day, {col}) VALUES (%s, %s) "
+                        "ON CONFLICT(day) DO UPDATE SET {col}=EXCLUDED.{col}"
+                    ).format(table=table, col=col),
+                    (day, value),
+                )
+        return value
+
+    def month(self, employee, start, end, read_only=True):
+        tbl = table_name(employee)
+        with self._connect(read_only) as conn:
+            with conn.cursor() as cur:
+                try:
+                    cur.execute(
+                        sql.SQL(
+                            "SELECT day, cash, orders, payout, advance FROM {table} "
+                            "WHERE day >= %s AND day < %s ORDER BY day"
+                        ).format(table=sql.Identifier(tbl)),
+                        (start, end),
+                    )
+                    return cur.fetchall()
+                except pg_errors.UndefinedTable:
+                    # the table is created on the employee's first write
+                    conn.rollback()
+                    return []
+
+    def refresh(self, employee=None):
+        with self._lock:
+            if employee is None:
+                self._known.clear()
+            else:
+                self._known.discard(table_name(employee))
+
+
+class SqlAlchemyBackend(LedgerBackend):
+    """Ledger on any SQLAlchemy engine; SQLite and Postgres upsert natively."""
+
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+        self.name = engine.dialect.name
+        self.metadata = MetaData()
+        self._tables: Dict[str, Table] = {}
+        self._lock = threading.Lock()
+
+    def _define(self, tbl: str) -> Table:
+        return Table(
+            tbl,
+            self.metadata,
+            Column("day", Date, primary_key=True),
+            *(Column(c, DateTime(timezone=True)) for c in TIME_COLUMNS),
+            *(Column(c, Text) for c in VALUE_COLUMNS),
+        )
+
+    def _table(self, employee: str, create: bool) -> Table | None:
+        tbl = table_name(employee)
+        table = self._tables.get(tbl)
+        if table is not None:
+            return table
+        with self._lock:
+            if tbl in self._tables:
+                return self._tables[tbl]
+            exists = inspect(self.engine).has_table(tbl)
+            if not exists and not create:
+                return None
+            table = self.metadata.tables.get(tbl)
+            if table is None:
+                table = self._define(tbl)
+            if not exists:
+                table.create(bind=self.engine, checkfirst=True)
+            self._tables[tbl] = table
+            return table
+
+    def ensure_table(self, employee):
+        return self._table(employee, create=True).name
+
+    def _upsert(self, conn, table: Table, day: dt.date, column: str, value: object) -> None:
+        dialect = self.engine.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = pg_insert if dialect == "postgresql" else sqlite_insert
+            stmt = insert(table).values(day=day, **{column: value})
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=["day"], set_={column: stmt.excluded[column]}
+            ))
+            return
+        result = conn.execute(update(table).where(table.c.day == day).values({column: value}))
+        if result.rowcount == 0:
+            conn.execute(table.insert().values(day=day, **{column: value}))
+
+    def _lock_row(self, conn, table: Table, day: dt.date, column: str) -> object:
+        """Insert the `day` row if missing, lock it and return `column`.
+
+        The row is written before it is read: that locks it on Postgres
+        (where FOR UPDATE would miss a row not inserted yet) and takes the
+        database write lock on SQLite, whose transactions start unlocked.
+        """
+        dialect = self.engine.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = pg_insert if dialect == "postgresql" else sqlite_insert
+            stmt = insert(table).values(day=day)
+            return conn.execute(stmt.on_conflict_do_update(
+                index_elements=["day"], set_={"day": stmt.excluded.day}
+            ).returning(table.c[column])).scalar()
+        if conn.execute(update(table).where(table.c.day == day).values(day=day)).rowcount == 0:
+            conn.execute(table.insert().values(day=day))
+        return conn.execute(select(table.c[column]).where(table.c.day == day)).scalar()
+
+    def update(self, employee, day, column, value, combine=None):
+        _check_column(column)
+        table = self._table(employee, create=True)
+        with self.engine.begin() as conn:
+            if combine is not None:
+                value = combine(self._lock_row(conn, table, day, column), value)
+                conn.execute(update(table).where(table.c.day == day).values({column: value}))
+            else:
+                self._upsert(conn, table, day, column, value)
+        return value
+
+    def month(self, employee, start, end, read_only=True):
+        table = self._table(employee, create=False)
+        if table is None:
+            return []
+        cols = [table.c.day, *(table.c[c] for c in VALUE_COLUMNS)]
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(*cols).where(table.c.day >= start, table.c.day < end).order_by(table.c.day)
+            ).all()
+        return [tuple(row) for row in rows]
+
+    def refresh(self, employee=None):
+        with self._lock:
+            if employee is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(table_name(employee), None)
+
+
+_embedded: SqlAlchemyBackend | None = None
+_embedded_lock = threading.Lock()
+
+
+def embedded_ledger() -> SqlAlchemyBackend | None:
+    """Return the ``LEDGER_DATABASE_URL`` backend, or None when unset."""
+    global _embedded
+    if LEDGER_DATABASE_URL is None:
+        return None
+    with _embedded_lock:
+        if _embedded is None:
+            ledger_engine = create_engine(sync_url(LEDGER_DATABASE_URL))
+            instrument_engine(ledger_engine)
+            _embedded = SqlAlchemyBackend(ledger_engine)
+        return _embedded
@@ -0,0 +1,288 @@
+"""Database connectivity shared by app.py (psycopg2) and api/models.py (asyncpg).
+
+Pool settings come from the environment:
+
+- ``DB_POOL_SIZE`` (default 5) connections kept open per pool and process
+- ``DB_MAX_OVERFLOW`` (default 10) extra connections opened under load
+- ``DB_POOL_TIMEOUT`` (default 30) seconds to wait for a free connection
+- ``DB_POOL_RECYCLE`` (default 1800) seconds after which a connection is
+  replaced; ``-1`` keeps connections forever
+- ``DB_POOL_PRE_PING`` (default 0) test pooled asyncpg connections before
+  each checkout, at the cost of a round trip
+- ``DATABASE_READ_URL`` (optional) a read replica; read-only endpoints use
+  it unless the request sends ``X-Read-Your-Writes: 1``
+- ``REPLICA_MAX_LAG_SEC`` (default 10) how far the replica may trail the
+  primary; replica reads of data written more recently are not cached
+- ``DB_POOLER_MODE`` (default 0) set to 1 behind a transaction-mode pooler
+  such as PgBouncer or Supabase's pooler on port 6543: asyncpg's
+  prepared-statement cache is disabled and the statements it still prepares
+  get unique names, since consecutive transactions may land on different
+  server connections
+
+Checkout waits, timeouts and pool occupancy are exported through
+:mod:`telemetry`.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import psycopg2
+import psycopg2.extensions
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import telemetry
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0") != "0"
+POOLER_MODE = os.getenv("DB_POOLER_MODE", "0") != "0"
+REPLICA_MAX_LAG_SEC = float(os.getenv("REPLICA_MAX_LAG_SEC", "10"))
+# Request header that sends a read to the primary
+READ_YOUR_WRITES_HEADER = "X-Read-Your-Writes"
+
+POOL_CHECKOUT_WAIT = telemetry.Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", ("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+POOL_TIMEOUTS = telemetry.Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT.", ("pool",)
+)
+# pool name -> callable returning (checked out, capacity)
+_pools: Dict[str, Callable[[], Tuple[int, int]]] = {}
+
+
+def _occupancy() -> Dict[Tuple[str, ...], float]:
+    values = {}
+    for name, probe in list(_pools.items()):
+        in_use, capacity = probe()
+        values[(name, "in_use")] = in_use
+        values[(name, "capacity")] = capacity
+    return values
+
+
+def _saturation() -> Dict[Tuple[str, ...], float]:
+    values = {}
+    for name, probe in list(_pools.items()):
+        in_use, capacity = probe()
+        values[(name,)] = in_use / capacity if capacity else 0.0
+    return values
+
+
+telemetry.Gauge(
+    "db_pool_connections", "Connections checked out, and the most the pool will open.",
+    ("pool", "state"), callback=_occupancy,
+)
+telemetry.Gauge(
+    "db_pool_saturation", "Share of the pool's capacity currently checked out.",
+    ("pool",), callback=_saturation,
+)
+
+
+def database_url() -> str:
+    url = os.getenv("DATABASE_URL") or os.getenv("SUPABASE_URL")
+    if not url:
+        raise RuntimeError("DATABASE_URL or SUPABASE_URL environment variable not set")
+    return url
+
+
+def read_database_url() -> str | None:
+    return os.getenv("DATABASE_READ_URL") or None
+
+
+def wants_primary(headers) -> bool:
+    """True when a request asked to read its own writes."""
+    return headers.get(READ_YOUR_WRITES_HEADER, "").lower() in ("1", "true", "yes")
+
+
+def async_url(url: str) -> str:
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def sync_url(url: str) -> str:
+    if url.startswith("postgresql+asyncpg://"):
+        return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+    return url
+
+
+# ---------------------------------------------------------------------------
+# asyncpg through SQLAlchemy
+# ---------------------------------------------------------------------------
+
+class _TimedAsyncPool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long each checkout waited."""
+
+    _telemetry_name = "asyncpg"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            POOL_TIMEOUTS.inc((self._telemetry_name,))
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.observe((self._telemetry_name,), time.perf_counter() - start)
+
+
+def _prepared_statement_name() -> str:
+    return f"__asyncpg_{uuid.uuid4()}__"
+
+
+def create_engine_async(url: str, name: str = "asyncpg") -> AsyncEngine:
+    """Create the API's async engine with the configured pool."""
+    connect_args = {}
+    if POOLER_MODE:
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": _prepared_statement_name,
+        }
+    pool_class = type("TimedAsyncPool", (_TimedAsyncPool,), {"_telemetry_name": name})
+    engine = create_async_engine(
+        async_url(url),
+        echo=False,
+        poolclass=pool_class,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+    # engine.dispose() swaps in a new pool, so look it up on every scrape
+    _pools[name] = lambda: (
+        engine.sync_engine.pool.checkedout(), POOL_SIZE + max(MAX_OVERFLOW, 0)
+    )
+    telemetry.instrument_engine(engine)
+    return engine
+
+
+# ---------------------------------------------------------------------------
+# psycopg2
+# ---------------------------------------------------------------------------
+
+class SyncPool:
+    """Thread-safe psycopg2 pool that waits for a free connection.
+
+    Up to ``size + max_overflow`` connections are open at once; idle ones
+    beyond ``size`` are closed when returned. Broken connections and ones
+    older than ``recycle`` seconds are replaced on checkout. A forked
+    process never reuses its parent's connections.
+    """
+
+    def __init__(self, dsn: str, name: str = "psycopg2", size: int = POOL_SIZE,
+                 max_overflow: int = MAX_OVERFLOW, timeout: float = POOL_TIMEOUT,
+                 recycle: int = POOL_RECYCLE) -> None:
+        self.dsn = dsn
+        self.name = name
+        self.size = size
+        self.capacity = size + max(max_overflow, 0)
+        self.timeout = timeout
+        self.recycle = recycle
+        self._reset()
+        _pools[name] = lambda: (self.in_use, self.capacity)
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        # idle connections with their creation time, most recently used last
+        self._idle: List[Tuple[psycopg2.extensions.connection, float]] = []
+        self._born: Dict[int, float] = {}
+        self.in_use = 0
+
+    def _connect(self) -> psycopg2.extensions.connection:
+        conn = psycopg2.connect(self.dsn, cursor_factory=telemetry.TimedCursor)
+        self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn: psycopg2.extensions.connection) -> None:
+        self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self) -> psycopg2.extensions.connection:
+        if self._pid != os.getpid():
+            self._reset()
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        POOL_CHECKOUT_WAIT.observe((self.name,), time.perf_counter() - start)
+        if not acquired:
+            POOL_TIMEOUTS.inc((self.name,))
+            raise psycopg2.OperationalError(
+                f"timed out after {self.timeout}s waiting for a {self.name} connection"
+            )
+        try:
+            conn = None
+            with self._lock:
+                while self._idle and conn is None:
+                    candidate, born = self._idle.pop()
+                    expired = self.recycle >= 0 and time.monotonic() - born > self.recycle
+                    if candidate.closed or expired:
+                        self._discard(candidate)
+                    else:
+                        conn = candidate
+            if conn is None:
+                conn = self._connect()
+            with self._lock:
+                self.in_use += 1
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn: psycopg2.extensions.connection, close: bool = False) -> None:
+        if self._pid != os.getpid():
+            return
+        try:
+            if not close and not conn.closed:
+                status = conn.info.transaction_status
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            with self._lock:
+                self.in_use -= 1
+                if close or conn.closed or len(self._idle) >= self.size:
+                    self._discard(conn)
+                else:
+                    self._idle.append((conn, self._born.get(id(conn), time.monotonic())))
+        except psycopg2.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[psycopg2.extensions.connection]:
+        """Check out a connection; commit on success, roll back on error."""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn, close=broken or conn.closed != 0)
+
+    def closeall(self) -> None:
+        with self._lock:
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._idle.clear()
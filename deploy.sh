@@ -30,6 +30,9 @@ SERVICE_ACCOUNT="attendance-run-sa@${PROJECT_ID}.iam.gserviceaccount.com"
 SUPABASE_URL="https://your-project.supabase.co"
 # Postgres connection string; can point to Supabase
 DATABASE_URL=""
+# Cloud Storage bucket mounted as EVENT_ARCHIVE_DIR (optional). Archived
+# months exist only there, so never point it at the container's disk.
+ARCHIVE_BUCKET=""
 # ══════════════════════════════════════════════════════════════════
 
 echo "🔧  Setting active project to  ${PROJECT_ID} ..."
@@ -55,6 +58,17 @@ gcloud builds submit --tag "${FULL_IMG}" .
 
 
 # ── Deploy to Cloud Run ──────────────────────────────────────────
+ENV_VARS="DATABASE_URL=${DATABASE_URL},SUPABASE_URL=${SUPABASE_URL}"
+ARCHIVE_FLAGS=()
+if [[ -n "$ARCHIVE_BUCKET" ]]; then
+  ENV_VARS="${ENV_VARS},EVENT_ARCHIVE_DIR=/mnt/event-archive"
+  ARCHIVE_FLAGS=(
+    --execution-environment gen2
+    --add-volume "name=event-archive,type=cloud-storage,bucket=${ARCHIVE_BUCKET}"
+    --add-volume-mount "volume=event-archive,mount-path=/mnt/event-archive"
+  )
+fi
+
 echo "🚀  Deploying Cloud Run service  ${APP_NAME}"
 gcloud run deploy "$APP_NAME" \
   --image "$FULL_IMG" \
@@ -62,7 +76,8 @@ gcloud run deploy "$APP_NAME" \
   --platform managed \
   --allow-unauthenticated \
   --service-account "$SERVICE_ACCOUNT" \
-  --set-env-vars "DATABASE_URL=${DATABASE_URL},SUPABASE_URL=${SUPABASE_URL}" \
+  --set-env-vars "$ENV_VARS" \
+  "${ARCHIVE_FLAGS[@]}" \
   --port 8080
 
 # ── Show service URL ─────────────────────────────────────────────
@@ -35,7 +35,6 @@ function computeMetrics(events, workHours = 8, graceMin = 15) {
   let inTime = null
   let breakStart = null
   let workedMs = 0
-  let extraMs = 0
 
   sorted.forEach(ev => {
     const t = new Date(ev.timestamp)
@@ -79,8 +78,13 @@ function computeMetrics(events, workHours = 8, graceMin = 15) {
 
   const online = status !== 'Clocked Out'
 
+  return { status, workedMs, extraMs: computeExtraMs(workedMs, workHours, graceMin), events: sorted, online }
+}
+
+function computeExtraMs(workedMs, workHours = 8, graceMin = 15) {
   const workMs = workHours * 3600000
   const graceMs = graceMin * 60 * 1000
+  let extraMs = 0
 
   if (workedMs >= workMs) {
     if (workedMs > workMs + graceMs) {
@@ -91,33 +95,26 @@ function computeMetrics(events, workHours = 8, graceMin = 15) {
       extraMs = workedMs - workMs / 2
     }
   }
-  extraMs = Math.round(extraMs / graceMs) * graceMs
+  return Math.round(extraMs / graceMs) * graceMs
+}
 
-  return { status, workedMs, extraMs, events: sorted, online }
+const stateLabels = {
+  off: ['Clocked Out', 'bg-coral/20 text-coral'],
+  break: ['On Break', 'bg-coral/20 text-coral'],
+  working: ['Clocked In', 'bg-emerald/20 text-emerald'],
 }
 
 function OverviewTab() {
   const settings = useSettings()
-  const [data, setData] = useState([])
+  const [board, setBoard] = useState(null)
   const [selected, setSelected] = useState(null)
+  const [timeline, setTimeline] = useState([])
 
   useEffect(() => {
     const fetchData = async () => {
-      const month = new Date().toISOString().slice(0, 7)
       try {
-        const res = await axios.get('/api/events', { params: { month } })
-        const today = new Date().toISOString().slice(0, 10)
-        const byEmp = {}
-        res.data.forEach(e => {
-          if (!e.timestamp.startsWith(today)) return
-          byEmp[e.employee_id] = byEmp[e.employee_id] || []
-          byEmp[e.employee_id].push(e)
-        })
-        const arr = Object.entries(byEmp).map(([id, ev]) => ({
-          id,
-          events: stripPreClockin(ev)
-        }))
-        setData(arr)
+        const res = await axios.get('/api/dashboard/now')
+        setBoard({ ...res.data, fetchedAt: Date.now() })
       } catch {
         /* ignore */
       }
@@ -127,34 +124,43 @@ function OverviewTab() {
     return () => clearInterval(id)
   }, [])
 
+  useEffect(() => {
+    if (!selected) return
+    setTimeline([])
+    axios
+      .get(`/api/status/${encodeURIComponent(selected)}`, { params: { timeline: true } })
+      .then(res => setTimeline(stripPreClockin(res.data.events || [])))
+      .catch(() => {})
+  }, [selected])
+
+  // worked time as of the poll, plus the time since for anyone still working
+  const workedMs = (emp) =>
+    emp.worked_seconds_today * 1000 + (emp.state === 'working' ? Date.now() - board.fetchedAt : 0)
+
   const stats = useMemo(() => {
-    let total = 0
-    let working = 0
-    let hoursMs = 0
-    let late = 0
+    const employees = board?.employees || []
+    const counts = board?.counts || {}
     const barLabels = []
     const barTimes = []
-    data.forEach((emp) => {
-      total += 1
-      const m = computeMetrics(emp.events, settings.WORK_DAY_HOURS, settings.GRACE_PERIOD_MIN)
-      if (m.online) working += 1
-      hoursMs += m.workedMs
-      const firstIn = emp.events.find(
-        (e) => e.kind === 'clockin' || e.kind === 'in'
-      )
-      if (firstIn) {
-        const d = new Date(firstIn.timestamp)
-        barLabels.push(emp.id)
+    let hoursMs = 0
+    employees.forEach((emp) => {
+      hoursMs += emp.worked_seconds_today * 1000
+      if (emp.first_in_at) {
+        const d = new Date(emp.first_in_at)
+        barLabels.push(emp.employee_id)
         barTimes.push(d.getHours() + d.getMinutes() / 60)
-        if (d.getHours() > 9 || (d.getHours() === 9 && d.getMinutes() > 15)) {
-          late += 1
-        }
-      } else {
-        late += 1
       }
     })
-    return { total, working, hoursMs, late, barLabels, barTimes }
-  }, [data])
+    return {
+      total: counts.employees || 0,
+      working: counts.working || 0,
+      online: (counts.working || 0) + (counts.on_break || 0),
+      missed: (counts.late || 0) + (counts.absent || 0),
+      hoursMs,
+      barLabels,
+      barTimes,
+    }
+  }, [board])
 
   const barData = {
     labels: stats.barLabels,
@@ -183,7 +189,7 @@ function OverviewTab() {
         <div className="card text-center">
           <div className="text-sm">Total Clocked In</div>
           <div className="text-2xl font-bold">
-            {stats.working} / {stats.total}
+            {stats.online} / {stats.total}
           </div>
         </div>
         <div className="card text-center">
@@ -194,11 +200,11 @@ function OverviewTab() {
         </div>
         <div className="card text-center">
           <div className="text-sm">Late/Missed Clock-In</div>
-          <div className="text-2xl font-bold">{stats.late}</div>
+          <div className="text-2xl font-bold">{stats.missed}</div>
         </div>
         <div className="card text-center">
-          <div className="text-sm">Employees</div>
-          <div className="text-2xl font-bold">{stats.total}</div>
+          <div className="text-sm">Open Shifts</div>
+          <div className="text-2xl font-bold">{board?.counts.open_shifts || 0}</div>
         </div>
       </div>
 
@@ -208,25 +214,28 @@ function OverviewTab() {
       </div>
 
       <div className="grid gap-4 sm:grid-cols-2 lg:grid-cols-3">
-        {data.map(emp => {
-          const m = computeMetrics(emp.events, settings.WORK_DAY_HOURS, settings.GRACE_PERIOD_MIN)
+        {(board?.employees || []).map(emp => {
+          const worked = workedMs(emp)
+          const [label, color] = stateLabels[emp.state] || stateLabels.off
           return (
-            <div key={emp.id} className="card flex items-center space-x-4">
+            <div key={emp.employee_id} className="card flex items-center space-x-4">
               <img
-                src={`https://api.dicebear.com/8.x/identicon/svg?seed=${emp.id}`}
+                src={`https://api.dicebear.com/8.x/identicon/svg?seed=${emp.employee_id}`}
                 alt="avatar"
                 className="w-12 h-12 rounded-full"
               />
               <div className="flex-1">
-                <div className="font-semibold">{emp.id}</div>
-                <div className="text-sm">Hours: {formatMs(m.workedMs)}</div>
-                <div className="text-sm">Extra: {formatMs(m.extraMs)}</div>
+                <div className="font-semibold">{emp.employee_id}</div>
+                <div className="text-sm">Hours: {formatMs(worked)}</div>
+                <div className="text-sm">Extra: {formatMs(computeExtraMs(worked, settings.WORK_DAY_HOURS, settings.GRACE_PERIOD_MIN))}</div>
+                {emp.late && <div className="text-sm text-coral">Late</div>}
+                {emp.open_shift && <div className="text-sm text-coral">Open shift</div>}
               </div>
               <div className="flex flex-col items-end space-y-2">
-                <span className={`badge ${m.online ? 'bg-emerald/20 text-emerald' : 'bg-coral/20 text-coral'}`}>{m.status}</span>
+                <span className={`badge ${color}`}>{label}</span>
                 <button
                   className="underline text-sm"
-                  onClick={() => setSelected(emp)}
+                  onClick={() => setSelected(emp.employee_id)}
                 >
                   View
                 </button>
@@ -238,8 +247,8 @@ function OverviewTab() {
       {selected && (
         <div className="fixed inset-0 bg-black/50 flex items-center justify-center" onClick={() => setSelected(null)}>
           <div className="bg-white dark:bg-slate-800 p-4 rounded space-y-2 max-h-[80vh] overflow-auto" onClick={e => e.stopPropagation()}>
-            <h3 className="font-semibold mb-2">{selected.id} - Today</h3>
-            {computeMetrics(selected.events, settings.WORK_DAY_HOURS, settings.GRACE_PERIOD_MIN).events.map((e, idx) => {
+            <h3 className="font-semibold mb-2">{selected} - Today</h3>
+            {timeline.map((e, idx) => {
               const a = actions.find(x => x.kind === e.kind)
               const t = new Date(e.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
               return <TimelineEntry key={idx} index={idx} icon={a?.icon} label={a?.label} time={t} />
@@ -12,6 +12,7 @@ export default function AttendancePad() {
   const [employee, setEmployee] = useState('')
   const [time, setTime] = useState(new Date())
   const [events, setEvents] = useState([])
+  const [current, setCurrent] = useState(null)
   const [bounce, setBounce] = useState('')
   const [use24h, setUse24h] = useState(true)
   const [mood, setMood] = useState('')
@@ -23,17 +24,23 @@ export default function AttendancePad() {
     setEmployee(params.get('employee') || params.get('driver') || '')
   }, [])
 
-  useEffect(() => {
+  // The state and today's events come from /api/status, which reads a row the
+  // server keeps current instead of replaying the month here. After a punch,
+  // read from the primary so the replica's lag does not hide it.
+  const loadStatus = (afterWrite = false) => {
     if (!employee) return
-    const month = new Date().toISOString().slice(0, 7)
+    const headers = afterWrite ? { 'X-Read-Your-Writes': '1' } : {}
     axios
-      .get('/api/events', { params: { employee_id: employee, month } })
+      .get(`/api/status/${encodeURIComponent(employee)}`, { params: { timeline: true }, headers })
       .then((res) => {
-        const today = new Date().toISOString().slice(0, 10)
-        const filtered = res.data.filter((e) => e.timestamp.startsWith(today))
-        setEvents(stripPreClockin(filtered))
+        setEvents(stripPreClockin(res.data.events))
+        setCurrent({ ...res.data, fetchedAt: Date.now() })
       })
       .catch(() => {})
+  }
+
+  useEffect(() => {
+    loadStatus()
   }, [employee])
 
   useEffect(() => {
@@ -88,6 +95,7 @@ export default function AttendancePad() {
       })
       .then((res) => {
         setEvents(stripPreClockin([...events, { id: res.data.id, kind: action, timestamp: ts }]))
+        loadStatus(true)
         toast('Saved!')
         setBounce(action)
         setTimeout(() => setBounce(''), 250)
@@ -108,21 +116,12 @@ export default function AttendancePad() {
 
   const timeline = stripPreClockin([...events].sort((a, b) => a.timestamp.localeCompare(b.timestamp)))
 
-  let status = 'Clocked Out'
-  let statusColor = 'bg-gray-500'
-  if (timeline.length) {
-    const last = timeline[timeline.length - 1]
-    if (last.kind === 'clockout') {
-      status = 'Clocked Out'
-      statusColor = 'bg-gray-500'
-    } else if (last.kind === 'startbreak') {
-      status = 'On Break'
-      statusColor = 'bg-yellow-500'
-    } else {
-      status = 'Clocked In'
-      statusColor = 'bg-green-600'
-    }
+  const statusLabels = {
+    off: ['Clocked Out', 'bg-gray-500'],
+    break: ['On Break', 'bg-yellow-500'],
+    working: ['Clocked In', 'bg-green-600'],
   }
+  const [status, statusColor] = statusLabels[current?.state] || statusLabels.off
 
   const summary = (() => {
     let inTime = null
@@ -148,10 +147,11 @@ export default function AttendancePad() {
     })
     if (lastBreak) breakMs += Date.now() - lastBreak
     if (lastExtra) extraMs += Date.now() - lastExtra
-    let workMs = 0
-    if (inTime && outTime) workMs = outTime - inTime - breakMs
+    // worked time is the server's, ticking on locally while clocked in
+    let workMs = current ? current.worked_seconds_today * 1000 : 0
+    if (current?.state === 'working') workMs += time.getTime() - current.fetchedAt
     const hoursWorked = workMs > 0 ? workMs / 3600000 : 0
-    const penaltyMs = workMs > 0 ? Math.max(0, settings.WORK_DAY_HOURS * 3600000 - workMs) : 0
+    const penaltyMs = inTime && outTime && workMs > 0 ? Math.max(0, settings.WORK_DAY_HOURS * 3600000 - workMs) : 0
     return {
       hoursWorked,
       breakMs,
@@ -35,12 +35,15 @@ export default function EditRecords() {
     }
   }
 
-  const fetchData = async () => {
+  // After a save, read from the primary so the change shows up even if the
+  // read replica has not caught up yet
+  const fetchData = async (afterWrite = false) => {
     if (!employee) return
+    const headers = afterWrite ? { 'X-Read-Your-Writes': '1' } : {}
     try {
       const [evRes, sumRes] = await Promise.all([
-        axios.get('/api/events', { params: { employee_id: employee, month: monthStr } }),
-        axios.get('/api/summary', { params: { employee_id: employee, month: monthStr } }),
+        axios.get('/api/events', { params: { employee_id: employee, month: monthStr }, headers }),
+        axios.get('/api/summary', { params: { employee_id: employee, month: monthStr }, headers }),
       ])
       const rows = {}
       evRes.data.forEach((e) => {
@@ -64,6 +67,20 @@ export default function EditRecords() {
     fetchData()
   }, [employee, monthStr])
 
+  // Apply creates/updates/deletes in one transaction; the response carries
+  // the new ids and the recomputed summary, so nothing needs refetching
+  const applyChanges = async ({ create = [], update = [], del = [] }) => {
+    const res = await axios.post('/api/events/bulk', {
+      employee_id: employee,
+      month: monthStr,
+      create,
+      update,
+      delete: del,
+    })
+    setSummary(res.data.summary)
+    return res.data
+  }
+
   const startEdit = (date, kind, row) => {
     const val = row[kind]
       ? new Date(row[kind].timestamp).toLocaleTimeString([], {
@@ -85,19 +102,16 @@ export default function EditRecords() {
     const row = entries[date] || {}
     try {
       if (id) {
-        await axios.patch(`/api/events/${id}`, { timestamp: ts })
+        await applyChanges({ update: [{ id, timestamp: ts }] })
         if (row[kind]) row[kind].timestamp = ts
       } else {
-        const res = await axios.post('/api/events', {
-          employee_id: employee,
-          kind,
-          timestamp: ts,
+        const { created } = await applyChanges({
+          create: [{ employee_id: employee, kind, timestamp: ts }],
         })
-        row[kind] = { id: res.data.id, employee_id: employee, kind, timestamp: ts }
+        row[kind] = { id: created[0], employee_id: employee, kind, timestamp: ts }
       }
       setEntries((prev) => ({ ...prev, [date]: { ...row } }))
       toast('Saved ✓')
-      fetchData()
     } catch {
       toast('Error', 'error')
     }
@@ -112,11 +126,10 @@ export default function EditRecords() {
     const { date, kind, id } = editing
     const row = entries[date] || {}
     try {
-      await axios.delete(`/api/events/${id}`)
+      await applyChanges({ del: [id] })
       delete row[kind]
       setEntries((prev) => ({ ...prev, [date]: { ...row } }))
       toast('Deleted ✓')
-      fetchData()
     } catch {
       toast('Error', 'error')
     }
@@ -151,14 +164,15 @@ export default function EditRecords() {
     if (!employee || !newEvent.date || !newEvent.time) return
     const ts = new Date(`${newEvent.date}T${newEvent.time}`).toISOString()
     try {
-      await axios.post('/api/events', {
-        employee_id: employee,
-        kind: newEvent.kind,
-        timestamp: ts,
+      const { created } = await applyChanges({
+        create: [{ employee_id: employee, kind: newEvent.kind, timestamp: ts }],
       })
+      const date = newEvent.date
+      const row = { ...(entries[date] || {}) }
+      row[newEvent.kind] = { id: created[0], employee_id: employee, kind: newEvent.kind, timestamp: ts }
+      setEntries((prev) => ({ ...prev, [date]: row }))
       toast('Added ✓')
       setNewEvent({ date: '', kind: kinds[0][0], time: '' })
-      fetchData()
     } catch {
       toast('Error', 'error')
     }
@@ -3,92 +3,112 @@ import axios from 'axios'
 import { formatHoursHM } from './utils'
 import useSettings from './useSettings'
 
+// Card state from attendance totals and parsed ledger entries
+function buildDetails(hoursPerDay, hours, extra, entries, workDayHours) {
+  const days = Object.values(hoursPerDay || {}).reduce((s, h) => s + h / workDayHours, 0)
+  let advTotal = 0
+  let advances = []
+  let ordersTotal = 0
+  let ordersCount = 0
+  let orders = []
+  ;(entries || []).forEach(rec => {
+    if (rec.advance) {
+      advTotal += rec.advance
+      advances.push({ date: rec.date, amount: rec.advance })
+    }
+    if (rec.orders_total) {
+      ordersTotal += rec.orders_total
+      ordersCount += rec.orders_count
+      ;(rec.orders_entries || []).forEach(o => orders.push({ ...o, date: rec.date }))
+    }
+  })
+  return {
+    dayRate: 0,
+    hourRate: 0,
+    discount: 0,
+    days,
+    hours: hours || 0,
+    extra: extra || 0,
+    advTotal,
+    advances,
+    ordersTotal,
+    ordersCount,
+    orders,
+    changed: false,
+  }
+}
+
 export default function PayoutSummary() {
   const settings = useSettings()
   const [month, setMonth] = useState(() => new Date().toISOString().slice(0, 7))
   const [search, setSearch] = useState('')
   const [employees, setEmployees] = useState([])
   const [data, setData] = useState({})
+  const [snapshot, setSnapshot] = useState(null)
 
-  // Fetch all employee events for the month then load summaries/extras
+  // Prefer the month's payroll snapshot (python -m api.payroll); otherwise
+  // fetch all employee events for the month then load summaries/extras
   useEffect(() => {
-    const load = async () => {
-      try {
-        const res = await axios.get('/api/events', { params: { month } })
-        const uniq = {}
-        res.data.forEach(e => {
-          uniq[e.employee_id] = true
-        })
-        const emps = Object.keys(uniq)
-        setEmployees(emps)
-
-        const detailPairs = await Promise.all(
-          emps.map(async emp => {
-            const [summaryRes, extraRes] = await Promise.all([
-              axios
-                .get('/api/summary', { params: { employee_id: emp, month } })
-                .then(r => r.data)
-                .catch(() => null),
-              axios
-                .get('/employee-data', { params: { employee: emp, month } })
-                .then(r => r.data)
-                .catch(() => []),
-            ])
+    const loadSnapshot = async () => {
+      const res = await axios.get('/api/payroll', { params: { month } })
+      const workDay = res.data.rules.WORK_DAY_HOURS || settings.WORK_DAY_HOURS
+      const pairs = res.data.employees.map(s => [
+        s.employee_id,
+        buildDetails(s.hours_per_day, s.total_hours, s.total_extra, s.entries, workDay),
+      ])
+      setSnapshot(res.data)
+      setEmployees(pairs.map(([emp]) => emp))
+      setData(Object.fromEntries(pairs))
+    }
 
-            let days = 0
-            let hours = 0
-            let extra = 0
-            if (summaryRes) {
-              hours = summaryRes.total_hours || 0
-              extra = summaryRes.total_extra || 0
-              days = Object.values(summaryRes.hours_per_day || {}).reduce(
-                (s, h) => s + h / settings.WORK_DAY_HOURS,
-                0
-              )
-            }
+    const loadLive = async () => {
+      const res = await axios.get('/api/events', { params: { month } })
+      const uniq = {}
+      res.data.forEach(e => {
+        uniq[e.employee_id] = true
+      })
+      const emps = Object.keys(uniq)
+      setSnapshot(null)
+      setEmployees(emps)
 
-            let advTotal = 0
-            let advances = []
-            let ordersTotal = 0
-            let ordersCount = 0
-            let orders = []
-            extraRes.forEach(rec => {
-              if (rec.advance) {
-                advTotal += rec.advance
-                advances.push({ date: rec.date, amount: rec.advance })
-              }
-              if (rec.orders_total) {
-                ordersTotal += rec.orders_total
-                ordersCount += rec.orders_count
-                ;(rec.orders_entries || []).forEach(o =>
-                  orders.push({ ...o, date: rec.date })
-                )
-              }
-            })
+      const detailPairs = await Promise.all(
+        emps.map(async emp => {
+          const [summaryRes, extraRes] = await Promise.all([
+            axios
+              .get('/api/summary', { params: { employee_id: emp, month } })
+              .then(r => r.data)
+              .catch(() => null),
+            axios
+              .get('/employee-data', { params: { employee: emp, month } })
+              .then(r => r.data)
+              .catch(() => []),
+          ])
+          return [
+            emp,
+            buildDetails(
+              summaryRes?.hours_per_day,
+              summaryRes?.total_hours,
+              summaryRes?.total_extra,
+              extraRes,
+              settings.WORK_DAY_HOURS
+            ),
+          ]
+        })
+      )
+      setData(Object.fromEntries(detailPairs))
+    }
 
-            return [
-              emp,
-              {
-                dayRate: 0,
-                hourRate: 0,
-                discount: 0,
-                days,
-                hours,
-                extra,
-                advTotal,
-                advances,
-                ordersTotal,
-                ordersCount,
-                orders,
-                changed: false,
-              },
-            ]
-          })
-        )
-        setData(Object.fromEntries(detailPairs))
+    const load = async () => {
+      try {
+        await loadSnapshot()
       } catch {
-        setEmployees([])
-        setData({})
+        // no snapshot for this month yet
+        try {
+          await loadLive()
+        } catch {
+          setEmployees([])
+          setData({})
+        }
       }
     }
     load()
@@ -144,6 +164,12 @@ export default function PayoutSummary() {
           value={search}
           onChange={e => setSearch(e.target.value)}
         />
+        {snapshot && (
+          <span className="text-sm opacity-75">
+            Payroll snapshot #{snapshot.run_id} •{' '}
+            {new Date(snapshot.created_at).toLocaleString()}
+          </span>
+        )}
       </div>
       <div className="grid gap-4 sm:grid-cols-2 lg:grid-cols-3">
         {filtered.map(emp => {
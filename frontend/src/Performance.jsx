@@ -29,6 +29,16 @@ export default function Performance() {
       .catch(() => {})
   }, [employee, start, end])
 
+  // Rankings across staff come from one server-side query over the rollups
+  const [team, setTeam] = useState(null)
+  useEffect(() => {
+    axios
+      .get('/api/analytics/team', { params: { start, end } })
+      .then((res) => setTeam(res.data))
+      .catch(() => setTeam(null))
+  }, [start, end])
+  const standing = team?.employees.find((e) => e.employee_id === employee)
+
   if (!data) return <div className="p-4">Loading...</div>
 
   const totalScore = Math.round(data.attendance_rate * 100)
@@ -122,6 +132,40 @@ export default function Performance() {
         ))}
       </div>
       <Line data={lineData} />
+      {team && team.employees.length > 0 && (
+        <div className="space-y-2">
+          {standing && (
+            <div className="font-semibold text-center">
+              Rank {standing.rank} of {team.team.employees} • Ahead of {standing.percentile}% of the team •
+              Team median {team.team.median_hours}h
+            </div>
+          )}
+          <table className="min-w-full text-sm">
+            <thead>
+              <tr>
+                <th className="p-1 text-left">#</th>
+                <th className="p-1 text-left">Employee</th>
+                <th className="p-1">Hours</th>
+                <th className="p-1">Attendance</th>
+                <th className="p-1">Avg extra</th>
+                <th className="p-1">Avg penalty</th>
+              </tr>
+            </thead>
+            <tbody>
+              {team.employees.slice(0, 10).map((e) => (
+                <tr key={e.employee_id} className={e.employee_id === employee ? 'font-bold' : ''}>
+                  <td className="p-1">{e.rank}</td>
+                  <td className="p-1">{e.employee_id}</td>
+                  <td className="p-1 text-center">{e.total_hours}</td>
+                  <td className="p-1 text-center">{Math.round(e.attendance_rate * 100)}%</td>
+                  <td className="p-1 text-center">{e.avg_extra_hours}</td>
+                  <td className="p-1 text-center">{e.avg_penalty_hours}</td>
+                </tr>
+              ))}
+            </tbody>
+          </table>
+        </div>
+      )}
     </motion.div>
   )
 }
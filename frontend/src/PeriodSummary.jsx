@@ -35,18 +35,19 @@ export default function PeriodSummary() {
     setActivePeriod(
       mths.reduce((acc, m, i) => ({ ...acc, [i]: m.monthStr === currentMonth ? currentIdx : 0 }), {})
     )
-    mths.forEach(async (m, idx) => {
-      try {
-        const [evRes, extraRes] = await Promise.all([
-          axios.get('/api/events', { params: { employee_id: employee, month: m.monthStr } }),
-          axios.get('/employee-data', { params: { employee, month: m.monthStr } })
-        ])
-        const periods = calcPeriods(evRes.data, m.monthStr, extraRes.data, settings.WORK_DAY_HOURS)
-        setMonths((prev) => prev.map((x, i) => (i === idx ? { ...x, periods } : x)))
-      } catch {
+    axios
+      .get('/api/summary/period', {
+        params: { employee_id: employee, start: mths[mths.length - 1].monthStr, end: mths[0].monthStr },
+      })
+      .then((res) => {
+        const byMonth = Object.fromEntries(res.data.months.map((x) => [x.month, x]))
+        setMonths((prev) =>
+          prev.map((x) => ({ ...x, periods: calcPeriods(byMonth[x.monthStr], x.monthStr, settings.WORK_DAY_HOURS) })),
+        )
+      })
+      .catch(() => {
         /* ignore */
-      }
-    })
+      })
   }, [employee])
 
   const saveAdvance = async () => {
@@ -215,42 +216,23 @@ export default function PeriodSummary() {
   )
 }
 
-function calcPeriods(events, monthStr, extras = [], workDayHours = 8) {
+function calcPeriods(summary, monthStr, workDayHours = 8) {
   const [year, month] = monthStr.split('-').map(Number)
   const daysInMonth = new Date(year, month, 0).getDate()
   const periods = [
     { title: '1 – 15', workedDays: 0, hours: 0, extraHours: 0, payout: 0, advance: 0, balance: 0, orders: 0, ordersTotal: 0, advanceEntries: [], orderEntries: [] },
     { title: `16 – ${daysInMonth}`, workedDays: 0, hours: 0, extraHours: 0, payout: 0, advance: 0, balance: 0, orders: 0, ordersTotal: 0, advanceEntries: [], orderEntries: [] },
   ]
-  const mapping = {
-    clockin: 'in',
-    in: 'in',
-    clockout: 'out',
-    out: 'out',
-    startbreak: 'breakStart',
-    endbreak: 'breakEnd',
-  }
-  const byDay = {}
-  events.forEach((e) => {
-    const day = new Date(e.timestamp).getUTCDate()
-    byDay[day] = byDay[day] || {}
-    const key = mapping[e.kind]
-    if (key && !byDay[day][key]) byDay[day][key] = new Date(e.timestamp)
-  })
-  Object.entries(byDay).forEach(([d, info]) => {
-    const idx = d <= 15 ? 0 : 1
-    if (info.in && info.out) {
-      let hrs = (info.out - info.in) / 3600000
-      if (info.breakStart && info.breakEnd) {
-        hrs -= (info.breakEnd - info.breakStart) / 3600000
-      }
-      if (hrs < 0) hrs = 0
-      periods[idx].hours += hrs
-      periods[idx].workedDays += hrs / workDayHours
-      if (hrs > workDayHours) periods[idx].extraHours += hrs - workDayHours
-    }
+  if (!summary) return periods
+  Object.entries(summary.hours_per_day).forEach(([d, hrs]) => {
+    if (!hrs) return
+    const p = periods[Number(d) <= 15 ? 0 : 1]
+    p.hours += hrs
+    p.workedDays += hrs / workDayHours
+    p.extraHours += summary.extra_per_day[d] || 0
   })
 
+  const extras = summary.entries || []
   extras.forEach((ex) => {
     const day = new Date(ex.date).getUTCDate()
     const idx = day <= 15 ? 0 : 1
@@ -1,11 +1,36 @@
 import { useEffect, useState } from 'react'
 import axios from 'axios'
 
+const LOG_PAGE = 50
+
 export default function SettingsLogs() {
   const [settings, setSettings] = useState({})
   const [users, setUsers] = useState([])
   const [newUser, setNewUser] = useState('')
   const [logs, setLogs] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
+  const [logFilter, setLogFilter] = useState({ action: '', employee_id: '' })
+
+  const logParams = (cursor) => {
+    const params = { limit: LOG_PAGE }
+    if (logFilter.action) params.action = logFilter.action
+    if (logFilter.employee_id) params.employee_id = logFilter.employee_id
+    if (cursor) params.cursor = cursor
+    return params
+  }
+
+  const fetchLogs = async () => {
+    const l = await axios.get('/api/admin/logs', { params: logParams() })
+    setLogs(l.data)
+    setNextCursor(l.headers['x-next-cursor'] || null)
+  }
+
+  const loadOlderLogs = async () => {
+    if (!nextCursor) return
+    const l = await axios.get('/api/admin/logs', { params: logParams(nextCursor) })
+    setLogs(prev => [...prev, ...l.data])
+    setNextCursor(l.headers['x-next-cursor'] || null)
+  }
 
   const fetchData = async () => {
     try {
@@ -13,8 +38,6 @@ export default function SettingsLogs() {
       setSettings(s.data)
       const u = await axios.get('/api/admin/users')
       setUsers(u.data)
-      const l = await axios.get('/api/admin/logs')
-      setLogs(l.data)
     } catch {
       /* ignore */
     }
@@ -22,10 +45,15 @@ export default function SettingsLogs() {
 
   useEffect(() => {
     fetchData()
-    const id = setInterval(fetchData, 30000)
-    return () => clearInterval(id)
   }, [])
 
+  // Only the newest page is polled; older pages are fetched on demand
+  useEffect(() => {
+    fetchLogs().catch(() => {})
+    const id = setInterval(() => fetchLogs().catch(() => {}), 30000)
+    return () => clearInterval(id)
+  }, [logFilter])
+
   const saveSetting = async (key, value) => {
     await axios.post('/api/admin/settings', { key, value })
     fetchData()
@@ -101,6 +129,20 @@ export default function SettingsLogs() {
 
       <div className="space-y-2">
         <h3 className="font-semibold">Admin Action Log</h3>
+        <div className="flex space-x-2">
+          <input
+            className="bg-white/10 p-1 rounded"
+            value={logFilter.action}
+            onChange={e => setLogFilter(f => ({ ...f, action: e.target.value }))}
+            placeholder="Action"
+          />
+          <input
+            className="bg-white/10 p-1 rounded"
+            value={logFilter.employee_id}
+            onChange={e => setLogFilter(f => ({ ...f, employee_id: e.target.value }))}
+            placeholder="Employee"
+          />
+        </div>
         <table className="min-w-full text-sm table-hover">
           <thead>
             <tr>
@@ -119,6 +161,11 @@ export default function SettingsLogs() {
             ))}
           </tbody>
         </table>
+        {nextCursor && (
+          <button className="px-2 py-1 bg-sapphire text-white rounded" onClick={loadOlderLogs}>
+            Load older
+          </button>
+        )}
       </div>
     </div>
   )
@@ -0,0 +1,30 @@
+"""gunicorn settings, read automatically from the working directory.
+
+Only startup hooks live here; bind address and worker settings stay on the
+command line (see the Dockerfile).
+"""
+import os
+import threading
+
+
+def on_starting(server):
+    """Create the schema once, in the master, before any worker starts."""
+    if os.getenv("AUTO_CREATE_SCHEMA", "1") == "0":
+        return
+    try:
+        from api.schema import create_schema
+
+        create_schema()
+    except Exception:  # noqa: BLE001
+        # Workers still start and serve /healthz; /api requests fail until
+        # the schema exists (run `python -m api.schema`).
+        server.log.exception("Schema creation failed")
+
+
+def post_worker_init(worker):
+    """Import the API in the background so the first /api request is warm."""
+    if os.getenv("API_WARM_UP", "1") == "0":
+        return
+    import app
+
+    threading.Thread(target=app.api_bridge.start, name="api-warm-up", daemon=True).start()
@@ -0,0 +1,62 @@
+"""Helpers for the legacy per-employee ledger tables (payout, advance, orders)."""
+from __future__ import annotations
+
+import datetime as dt
+from typing import Dict, Iterable
+
+
+def table_name(employee: str) -> str:
+    """Sanitize employee name for use as a table name."""
+    sanitized = "employee_" + "".join(
+        c.lower() if c.isalnum() else "_" for c in employee
+    )
+    return sanitized
+
+
+def parse_row(day: dt.date, cash, orders, payout, advance) -> Dict[str, object]:
+    """Turn one raw ledger row into the JSON shape served by /employee-data."""
+    orders_count = 0
+    orders_total = 0.0
+    orders_entries = []
+    if orders:
+        for part in str(orders).split(','):
+            if ':' in part:
+                try:
+                    oid, amt_str = part.split(':', 1)
+                    amt = float(amt_str)
+                    orders_total += amt
+                    orders_count += 1
+                    orders_entries.append({"id": oid, "amount": amt})
+                except Exception:
+                    pass
+    try:
+        payout_amt = float(payout) if payout is not None else 0.0
+    except Exception:
+        payout_amt = 0.0
+    try:
+        advance_amt = float(advance) if advance is not None else 0.0
+    except Exception:
+        advance_amt = 0.0
+    return {
+        "date": day.isoformat(),
+        "payout": payout_amt,
+        "advance": advance_amt,
+        "orders_count": orders_count,
+        "orders_total": orders_total,
+        "orders_entries": orders_entries,
+    }
+
+
+def totals(entries: Iterable[Dict[str, object]]) -> Dict[str, float]:
+    """Sum parsed ledger entries into payout/advance/order totals."""
+    out = {"payout": 0.0, "advance": 0.0, "orders_count": 0, "orders_total": 0.0}
+    for e in entries:
+        out["payout"] += e["payout"]
+        out["advance"] += e["advance"]
+        out["orders_count"] += e["orders_count"]
+        out["orders_total"] += e["orders_total"]
+    out["payout"] = round(out["payout"], 2)
+    out["advance"] = round(out["advance"], 2)
+    out["orders_total"] = round(out["orders_total"], 2)
+    out["balance"] = round(out["payout"] - out["advance"], 2)
+    return out
@@ -0,0 +1,434 @@
+"""On-demand profiling of single requests.
+
+A request to any route, Flask pages and ``/api`` alike, is profiled with
+cProfile when it carries ``X-Profile: <PROFILE_TOKEN>``; adding
+``X-Profile-Memory: 1`` also records a tracemalloc diff of the request.
+With ``PROFILE_SAMPLE_RATE=N`` every Nth request of a worker is profiled
+as well (CPU only), so slow pages can be caught without asking for it.
+
+Each profile is written to ``PROFILE_DIR`` as ``<id>.prof`` (a pstats
+dump, for ``python -m pstats`` or snakeviz), ``<id>.json`` (route,
+timings, database time, top functions) and, with memory tracing,
+``<id>.mem.txt``. The newest ``PROFILE_KEEP`` profiles are kept. The
+response carries the id in ``X-Profile-Id``, the time spent in each
+package's own code (``sqlalchemy``, ``asyncpg``, ``api``, ``json``, ...) in
+``X-Profile-Areas`` and the functions with the most own time in
+``X-Profile-Top``; the top ``PROFILE_TOP`` of both are logged.
+``/profiles`` in app.py serves the files to the same token.
+
+The profile covers the WSGI thread of the request. In the bridge's
+``thread`` mode the API runs on the loop thread, where :func:`wrap`
+profiles the request's task while it runs. Work handed to thread pools
+is not profiled.
+
+Settings come from the environment:
+
+- ``PROFILE_TOKEN`` (unset) admin token; unset disables on-demand profiles
+  and the ``/profiles`` routes
+- ``PROFILE_SAMPLE_RATE`` (default 0) profile 1 in N requests; 0 is off
+- ``PROFILE_DIR`` (default ``<tmp>/attendance-profiles``)
+- ``PROFILE_KEEP`` (default 100) profiles kept
+- ``PROFILE_TOP`` (default 15) functions in the logged summary
+"""
+from __future__ import annotations
+
+import contextvars
+import cProfile
+import hmac
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import re
+import secrets
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+TOKEN = os.getenv("PROFILE_TOKEN", "")
+SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "attendance-profiles")
+KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+TOP = int(os.getenv("PROFILE_TOP", "15"))
+# Functions listed in the X-Profile-Top header
+HEADER_TOP = 5
+# Allocation sites kept in the memory diff
+MEMORY_TOP = 30
+
+# Never sampled: probes, scrapes and the profile downloads themselves
+SKIP_PATHS = ("/healthz", "/metrics")
+SKIP_PREFIXES = ("/static/", "/assets/", "/profiles")
+PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+
+PROFILES = telemetry.Counter(
+    "profiles_captured_total", "Requests profiled, by what asked for it.", ("trigger",)
+)
+
+
+def authorized(headers) -> bool:
+    """True when `headers` (any mapping) carry the admin profiling token."""
+    supplied = headers.get("X-Profile", "")
+    return bool(TOKEN) and hmac.compare_digest(supplied.encode(), TOKEN.encode())
+
+
+class Session:
+    """The profilers and results of one request."""
+
+    __slots__ = ("id", "method", "path", "trigger", "profilers", "memory", "started", "_before")
+
+    def __init__(self, method: str, path: str, trigger: str, memory: bool) -> None:
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{secrets.token_hex(4)}"
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.profilers: List[cProfile.Profile] = [cProfile.Profile()]
+        self.memory = memory
+        self.started = time.perf_counter()
+        self._before: Optional[tracemalloc.Snapshot] = None
+
+    def start(self) -> None:
+        if self.memory:
+            self._before = _memory.begin()
+            self.memory = self._before is not None
+        self.profilers[0].enable()
+
+    def stop(self) -> None:
+        self.profilers[0].disable()
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.profilers[0])
+        for extra in self.profilers[1:]:
+            stats.add(extra)
+        return stats
+
+    def finish(self) -> Dict[str, object]:
+        """Write the profile files and return the summary."""
+        wall = time.perf_counter() - self.started
+        memory_diff = _memory.end(self._before) if self.memory else None
+        stats = self.stats()
+        request = telemetry.current()
+        summary = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": request.label if request is not None else self.path,
+            "trigger": self.trigger,
+            "created": time.time(),
+            "wall_seconds": wall,
+            "db_seconds": request.db_seconds if request is not None else None,
+            "db_statements": request.db_statements if request is not None else None,
+            "areas": area_times(stats),
+            "top": top_functions(stats, TOP),
+            "memory": memory_diff is not None,
+        }
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stats.dump_stats(os.path.join(PROFILE_DIR, f"{self.id}.prof"))
+        if memory_diff is not None:
+            with open(os.path.join(PROFILE_DIR, f"{self.id}.mem.txt"), "w") as fh:
+                fh.write(memory_diff)
+        # written last: its presence marks a complete profile
+        with open(os.path.join(PROFILE_DIR, f"{self.id}.json"), "w") as fh:
+            json.dump(summary, fh)
+        _prune()
+        return summary
+
+
+class _Memory:
+    """Process-wide tracemalloc, shared by one traced request at a time."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._started_here = False
+
+    def begin(self) -> Optional[tracemalloc.Snapshot]:
+        if not self._lock.acquire(blocking=False):
+            return None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_here = True
+        return tracemalloc.take_snapshot()
+
+    def end(self, before: tracemalloc.Snapshot) -> str:
+        try:
+            after = tracemalloc.take_snapshot()
+        finally:
+            if self._started_here:
+                tracemalloc.stop()
+                self._started_here = False
+            self._lock.release()
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+        diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+        return "\n".join(str(d) for d in diff[:MEMORY_TOP]) + "\n"
+
+
+_memory = _Memory()
+
+
+def _label(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+_STDLIB = os.path.dirname(os.__file__) + os.sep
+_BUILTIN_MODULE = re.compile(r"(?:of '|method )_?([A-Za-z0-9]+)")
+
+
+def area(func: Tuple[str, int, str]) -> str:
+    """Package or module a function belongs to: ``sqlalchemy``, ``api``, ``json``..."""
+    filename, _, name = func
+    if filename == "~":
+        # C functions: "<method 'send' of '_socket.socket' objects>"
+        match = _BUILTIN_MODULE.search(name)
+        return match.group(1) if match else "builtins"
+    if filename.startswith("<"):
+        # "<frozen posixpath>", "<string>"
+        return filename.strip("<>").split()[-1]
+    if "site-packages" + os.sep in filename:
+        rest = filename.split("site-packages" + os.sep, 1)[1]
+    elif filename.startswith(_ROOT):
+        rest = filename[len(_ROOT):]
+    elif filename.startswith(_STDLIB):
+        rest = filename[len(_STDLIB):]
+    else:
+        rest = os.path.basename(filename)
+    top = rest.split(os.sep, 1)[0]
+    return top[:-3] if top.endswith(".py") else top
+
+
+def top_functions(stats: pstats.Stats, n: int) -> List[Dict[str, object]]:
+    """The `n` functions with the most time spent in their own code."""
+    rows = sorted(stats.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:n]
+    return [
+        {"function": _label(func), "calls": nc, "own_seconds": tt, "cumulative_seconds": ct}
+        for func, (cc, nc, tt, ct, callers) in rows
+    ]
+
+
+def area_times(stats: pstats.Stats) -> Dict[str, float]:
+    """Own time per :func:`area`, largest first; answers "ORM or JSON?"."""
+    totals: Dict[str, float] = {}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        key = area(func)
+        totals[key] = totals.get(key, 0.0) + tt
+    return dict(sorted(totals.items(), key=lambda kv: kv[1], reverse=True))
+
+
+def text_report(profile_id: str, limit: int = 50) -> str:
+    """pstats' table of a stored profile, by cumulative time."""
+    out = io.StringIO()
+    stats = pstats.Stats(os.path.join(PROFILE_DIR, f"{profile_id}.prof"), stream=out)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+def list_profiles() -> List[Dict[str, object]]:
+    """Summaries of the stored profiles, newest first."""
+    found = []
+    for name in _files(".json"):
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as fh:
+                found.append(json.load(fh))
+        except (OSError, ValueError):
+            continue  # pruned or half-written by another worker
+    return sorted(found, key=lambda p: p["created"], reverse=True)
+
+
+def profile_path(profile_id: str, suffix: str = ".prof") -> Optional[str]:
+    """Path of a stored profile file, or None for unknown or malformed ids."""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + suffix)
+    return path if os.path.exists(path) else None
+
+
+def _files(suffix: str) -> List[str]:
+    try:
+        return [n for n in os.listdir(PROFILE_DIR) if n.endswith(suffix)]
+    except FileNotFoundError:
+        return []
+
+
+def _prune() -> None:
+    if KEEP <= 0:
+        return
+    # ids start with their UTC time, so name order is age order
+    for name in sorted(_files(".json"))[:-KEEP]:
+        profile_id = name[: -len(".json")]
+        for suffix in (".json", ".prof", ".mem.txt"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+_session: contextvars.ContextVar[Optional[Session]] = contextvars.ContextVar(
+    "profiling_session", default=None
+)
+
+
+def current() -> Optional[Session]:
+    """The profiling session of the active request, if it is profiled."""
+    return _session.get()
+
+
+@types.coroutine
+def _profiled(coro, profiler: cProfile.Profile):
+    # drive `coro` step by step, profiling only while it runs
+    it = coro.__await__()
+    value, error = None, None
+    while True:
+        profiler.enable()
+        try:
+            yielded = it.send(value) if error is None else it.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            profiler.disable()
+        try:
+            value, error = (yield yielded), None
+        except BaseException as exc:  # noqa: BLE001 - handed to the coroutine
+            value, error = None, exc
+
+
+def wrap(coro):
+    """Profile `coro` on another thread (the bridge loop) for this request."""
+    session = _session.get()
+    if session is None:
+        return coro
+    profiler = cProfile.Profile()
+    session.profilers.append(profiler)
+
+    async def run():
+        return await _profiled(coro, profiler)
+
+    return run()
+
+
+def _header(parts: Iterable[str]) -> str:
+    return "; ".join(parts).encode("ascii", "replace").decode()
+
+
+class ProfilingMiddleware:
+    """Profile requests that ask for it with the admin token, or are sampled."""
+
+    def __init__(self, app: Callable, sample_rate: int = SAMPLE_RATE) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self._counter = itertools.count(1)
+
+    def _trigger(self, environ: dict) -> Optional[str]:
+        if TOKEN and "HTTP_X_PROFILE" in environ:
+            if authorized({"X-Profile": environ["HTTP_X_PROFILE"]}):
+                return "header"
+            return None
+        if self.sample_rate <= 0:
+            return None
+        path = environ.get("SCRIPT_NAME", "") + environ.get("PATH_INFO", "")
+        if path in SKIP_PATHS or path.startswith(SKIP_PREFIXES):
+            return None
+        return "sample" if next(self._counter) % self.sample_rate == 0 else None
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        trigger = self._trigger(environ)
+        if trigger is None:
+            return self.app(environ, start_response)
+
+        session = Session(
+            environ.get("REQUEST_METHOD", "GET"),
+            environ.get("SCRIPT_NAME", "") + environ.get("PATH_INFO", ""),
+            trigger,
+            memory=trigger == "header" and environ.get("HTTP_X_PROFILE_MEMORY") == "1",
+        )
+        PROFILES.inc((trigger,))
+
+        def _start_response(status_line, headers, exc_info=None):
+            if trigger == "header":
+                # the headers show what ran before the response started (the
+                # stored profile is complete); reading the stats disables the
+                # profiler, so it is re-enabled below
+                stats = session.stats()
+                areas = list(area_times(stats).items())[:HEADER_TOP]
+                top = top_functions(stats, HEADER_TOP)
+                headers = list(headers) + [
+                    ("X-Profile-Id", session.id),
+                    ("X-Profile-Areas", _header(f"{a}={t * 1000:.1f}ms" for a, t in areas)),
+                    ("X-Profile-Top", _header(f"{t['function']} {t['own_seconds'] * 1000:.1f}ms" for t in top)),
+                ]
+                session.profilers[0].enable()
+            return start_response(status_line, headers, exc_info)
+
+        token = _session.set(session)
+        session.start()
+        try:
+            body = self.app(environ, _start_response)
+        except BaseException:
+            session.stop()
+            _session.reset(token)
+            self._finish(session)
+            raise
+        session.stop()
+        _session.reset(token)
+        return _ProfiledIterator(body, session, lambda: self._finish(session))
+
+    @staticmethod
+    def _finish(session: Session) -> None:
+        try:
+            summary = session.finish()
+        except Exception:  # noqa: BLE001 - never fail the request over its profile
+            logger.exception("could not store profile %s", session.id)
+            return
+        areas = ", ".join(f"{a} {t * 1000:.1f}" for a, t in list(summary["areas"].items())[:TOP])
+        lines = [
+            f"  {t['own_seconds'] * 1000:9.1f} ms own {t['cumulative_seconds'] * 1000:9.1f} ms cum "
+            f"{t['calls']:7d}x {t['function']}"
+            for t in summary["top"]
+        ]
+        logger.info(
+            "profile %s of %s %s (%s): %.1f ms, db %.1f ms in %s statements; ms by area: %s\n%s",
+            session.id, session.method, summary["route"], session.trigger,
+            summary["wall_seconds"] * 1000, (summary["db_seconds"] or 0) * 1000,
+            summary["db_statements"], areas, "\n".join(lines),
+        )
+
+
+class _ProfiledIterator:
+    """Keep profiling while the body is sent; store the profile at the end."""
+
+    def __init__(self, body: Iterable[bytes], session: Session, on_done: Callable[[], None]) -> None:
+        self._body = body
+        self._session = session
+        self._on_done = on_done
+
+    def _done(self) -> None:
+        on_done, self._on_done = self._on_done, None
+        if on_done is not None:
+            on_done()
+
+    def __iter__(self) -> Iterator[bytes]:
+        token = _session.set(self._session)
+        self._session.profilers[0].enable()
+        try:
+            yield from self._body
+        finally:
+            self._session.profilers[0].disable()
+            _session.reset(token)
+            self._done()
+
+    def close(self) -> None:
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            self._done()
@@ -0,0 +1,510 @@
+"""Per-request latency, database and bridge instrumentation.
+
+Metrics live in process memory and are rendered in the Prometheus text
+exposition format by :func:`render` (served at ``/metrics`` by app.py).
+Each gunicorn worker keeps its own registry.
+
+A request scope (see :func:`request_scope`) collects the database time
+and statement count of everything executed while it is active, whether
+through the SQLAlchemy engines (:func:`instrument_engine`) or psycopg2
+connections created with ``cursor_factory=TimedCursor``.
+
+Statements slower than ``SLOW_QUERY_MS`` are logged with their parameters
+and the calling route, and requests that run more than
+``STATEMENT_BUDGET`` statements, or the same statement
+``STATEMENT_REPEAT_LIMIT`` times (the usual N+1 shape), are flagged when
+they finish.
+"""
+from __future__ import annotations
+
+import abc
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import psycopg2.extensions
+from psycopg2 import sql
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets for per-request statement counts
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Statements taking at least this long are logged (0 logs every statement,
+# a negative value disables the log)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Requests running more statements than this are flagged (0 disables)
+STATEMENT_BUDGET = int(os.getenv("STATEMENT_BUDGET", "25"))
+# Requests repeating one statement this many times are flagged (0 disables)
+STATEMENT_REPEAT_LIMIT = int(os.getenv("STATEMENT_REPEAT_LIMIT", "10"))
+# Logged statements and parameters are cut to this many characters
+LOG_TRUNCATE = 500
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _labels(self, values: Sequence[str], extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abc.abstractmethod
+    def samples(self) -> Iterable[str]:
+        """Yield the metric's sample lines in the text exposition format."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Sequence[str] = (), amount: float = 1.0) -> None:
+        key = tuple(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{self._labels(key)} {value}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 callback: Callable[[], Dict[Tuple[str, ...], float]] | None = None) -> None:
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set(self, labels: Sequence[str], value: float) -> None:
+        with self._lock:
+            self._values[tuple(labels)] = value
+
+    def samples(self) -> Iterable[str]:
+        values = dict(self._values)
+        if self._callback is not None:
+            values.update(self._callback())
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{self._labels(key)} {value}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, labels: Sequence[str], value: float) -> None:
+        key = tuple(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        for key, row in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, row):
+                labels = self._labels(key, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = self._labels(key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {row[-2]}"
+            yield f"{self.name}_sum{self._labels(key)} {row[-1]}"
+            yield f"{self.name}_count{self._labels(key)} {row[-2]}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY: List[_Metric] = []
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency.", ("route", "method", "status")
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Database time spent per request.", ("route",)
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "Statements executed per request.", ("route",),
+    buckets=COUNT_BUCKETS,
+)
+DB_STATEMENTS = Counter(
+    "db_statements_total", "Statements executed, by driver.", ("driver",)
+)
+DB_TIME = Counter(
+    "db_statement_seconds_total", "Time spent executing statements, by driver.", ("driver",)
+)
+SLOW_STATEMENTS = Counter(
+    "db_slow_statements_total", "Statements slower than SLOW_QUERY_MS, by driver.", ("driver",)
+)
+BUDGET_EXCEEDED = Counter(
+    "http_request_statement_budget_exceeded_total",
+    "Requests over the statement budget or repeating a statement.", ("route",),
+)
+BRIDGE_LOCK_WAIT = Histogram(
+    "asgi_bridge_lock_wait_seconds", "Time requests waited for the ASGI bridge lock."
+)
+STARTUP_PHASES = Gauge(
+    "startup_phase_seconds",
+    "Cold start of this process: app_import and first_response are seconds since "
+    "the process started, the other phases are durations.",
+    ("phase",),
+)
+
+
+def render() -> str:
+    """Return every registered metric in Prometheus text format."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ---------------------------------------------------------------------------
+# Startup
+# ---------------------------------------------------------------------------
+
+_first_response_seen = False
+
+
+def process_age() -> float:
+    """Seconds since this process started (forked workers count from the fork).
+
+    Falls back to the time since this module was imported where /proc is
+    not available.
+    """
+    try:
+        with open("/proc/self/stat") as fh:
+            # fields after "(comm)" start at field 3; starttime is field 22
+            start_ticks = int(fh.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as fh:
+            uptime = float(fh.read().split()[0])
+        return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError):
+        return time.perf_counter() - _IMPORTED_AT
+
+
+_IMPORTED_AT = time.perf_counter()
+
+
+def record_startup_phase(phase: str, seconds: float) -> None:
+    STARTUP_PHASES.set((phase,), seconds)
+    logger.info("startup: %s %.1f ms", phase, seconds * 1000)
+
+
+@contextmanager
+def startup_phase(phase: str) -> Iterator[None]:
+    """Time a block of one-off startup work as `phase`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_startup_phase(phase, time.perf_counter() - start)
+
+
+def _note_response() -> None:
+    global _first_response_seen
+    if not _first_response_seen:
+        _first_response_seen = True
+        record_startup_phase("first_response", process_age())
+
+
+# ---------------------------------------------------------------------------
+# Request scope
+# ---------------------------------------------------------------------------
+
+class RequestStats:
+    __slots__ = ("route", "path", "db_seconds", "db_statements", "statements")
+
+    def __init__(self) -> None:
+        self.route = UNMATCHED_ROUTE
+        self.path = ""
+        self.db_seconds = 0.0
+        self.db_statements = 0
+        # statement text -> executions, for spotting N+1 patterns
+        self.statements: Dict[str, int] = {}
+
+    @property
+    def label(self) -> str:
+        """Route template when known, otherwise the raw path."""
+        if self.route != UNMATCHED_ROUTE:
+            return self.route
+        return self.path or UNMATCHED_ROUTE
+
+    def problems(self) -> List[str]:
+        """Describe how this request breaks the statement budget, if it does."""
+        found = []
+        if STATEMENT_BUDGET and self.db_statements > STATEMENT_BUDGET:
+            found.append(f"{self.db_statements} statements (budget {STATEMENT_BUDGET})")
+        if STATEMENT_REPEAT_LIMIT:
+            for statement, count in self.statements.items():
+                if count >= STATEMENT_REPEAT_LIMIT:
+                    found.append(f"{count}x {_shorten(statement)}")
+        return found
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "telemetry_request", default=None
+)
+
+
+def current() -> Optional[RequestStats]:
+    """Return the stats of the active request, if any."""
+    return _current.get()
+
+
+@contextmanager
+def request_scope() -> Iterator[Tuple[RequestStats, bool]]:
+    """Enter a request scope, reusing the enclosing one when nested.
+
+    Yields ``(stats, owner)``; only the owner should record the request.
+    """
+    stats = _current.get()
+    if stats is not None:
+        yield stats, False
+        return
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        yield stats, True
+    finally:
+        _current.reset(token)
+
+
+def set_route(route: str) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.route = route
+
+
+def record_request(stats: RequestStats, method: str, status: int, seconds: float) -> None:
+    _note_response()
+    REQUEST_LATENCY.observe((stats.route, method, str(status)), seconds)
+    REQUEST_DB_TIME.observe((stats.route,), stats.db_seconds)
+    REQUEST_DB_STATEMENTS.observe((stats.route,), stats.db_statements)
+    problems = stats.problems()
+    if problems:
+        BUDGET_EXCEEDED.inc((stats.route,))
+        logger.warning(
+            "statement budget exceeded on %s %s: %s", method, stats.label, "; ".join(problems)
+        )
+
+
+def record_statement(driver: str, seconds: float, statement: str | None = None,
+                     parameters: object = None) -> None:
+    DB_STATEMENTS.inc((driver,))
+    DB_TIME.inc((driver,), seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.db_seconds += seconds
+        stats.db_statements += 1
+        if statement is not None:
+            stats.statements[statement] = stats.statements.get(statement, 0) + 1
+    if statement is not None and 0 <= SLOW_QUERY_MS <= seconds * 1000:
+        SLOW_STATEMENTS.inc((driver,))
+        logger.warning(
+            "slow query (%.1f ms, %s) on %s: %s params=%s",
+            seconds * 1000, driver, stats.label if stats is not None else "<no request>",
+            _shorten(statement), _shorten(repr(parameters)),
+        )
+
+
+def _shorten(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= LOG_TRUNCATE else text[:LOG_TRUNCATE] + "..."
+
+
+def observe_lock_wait(seconds: float) -> None:
+    BRIDGE_LOCK_WAIT.observe((), seconds)
+
+
+# ---------------------------------------------------------------------------
+# Database hooks
+# ---------------------------------------------------------------------------
+
+def instrument_engine(engine, driver: str | None = None) -> None:
+    """Time every statement run through a SQLAlchemy engine (sync or async)."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    driver = driver or sync_engine.dialect.driver
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("telemetry_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["telemetry_start"].pop()
+        record_statement(driver, time.perf_counter() - start, statement, parameters)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("telemetry_start") if context.connection else None
+        if starts:
+            record_statement(driver, time.perf_counter() - starts.pop(),
+                             context.statement, context.parameters)
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """psycopg2 cursor that reports statement timings to the request scope."""
+
+    def execute(self, query, vars=None):
+        if isinstance(query, sql.Composable):
+            query = query.as_string(self)
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_statement("psycopg2", time.perf_counter() - start, query, vars)
+
+    def executemany(self, query, vars_list):
+        if isinstance(query, sql.Composable):
+            query = query.as_string(self)
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_statement("psycopg2", time.perf_counter() - start, query, vars_list)
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+class WsgiMetricsMiddleware:
+    """Record latency and database usage for every WSGI request.
+
+    The route label is filled in by the framework that handles the request
+    (see :func:`set_route`); the timer stops once the body is fully sent.
+    """
+
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        with request_scope() as (stats, owner):
+            if not owner:
+                return self.app(environ, start_response)
+            stats.path = environ.get("SCRIPT_NAME", "") + environ.get("PATH_INFO", "")
+            start = time.perf_counter()
+            status = [500]
+
+            def _start_response(status_line, headers, exc_info=None):
+                status[0] = int(status_line.split(" ", 1)[0])
+                return start_response(status_line, headers, exc_info)
+
+            try:
+                body = self.app(environ, _start_response)
+            except Exception:
+                record_request(stats, environ.get("REQUEST_METHOD", "GET"), 500,
+                               time.perf_counter() - start)
+                raise
+            return _ClosingIterator(
+                body, stats, lambda: record_request(
+                    stats, environ.get("REQUEST_METHOD", "GET"), status[0],
+                    time.perf_counter() - start,
+                ),
+            )
+
+
+class _ClosingIterator:
+    """Iterate a WSGI body inside the request scope.
+
+    `on_done` runs once, when the body is exhausted or closed, whichever
+    comes first.
+    """
+
+    def __init__(self, body: Iterable[bytes], stats: RequestStats, on_done: Callable[[], None]) -> None:
+        self._body = body
+        self._stats = stats
+        self._on_done = on_done
+
+    def _done(self) -> None:
+        on_done, self._on_done = self._on_done, None
+        if on_done is not None:
+            on_done()
+
+    def __iter__(self) -> Iterator[bytes]:
+        token = _current.set(self._stats)
+        try:
+            yield from self._body
+        finally:
+            _current.reset(token)
+            self._done()
+
+    def close(self) -> None:
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            self._done()
+
+
+class AsgiMetricsMiddleware:
+    """Label requests with their FastAPI route template.
+
+    Inside a WSGI request (the /api bridge) it only sets the route on the
+    enclosing scope; when the app is served directly it records the
+    request itself.
+    """
+
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with request_scope() as (stats, owner):
+            if owner:
+                stats.path = scope.get("root_path", "") + scope["path"]
+            start = time.perf_counter()
+            status = [500]
+
+            async def _send(message):
+                if message["type"] == "http.response.start":
+                    status[0] = message["status"]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, _send)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    stats.route = scope.get("root_path", "") + route.path
+                if owner:
+                    record_request(stats, scope["method"], status[0], time.perf_counter() - start)
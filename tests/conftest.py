@@ -1,11 +1,14 @@
 import os
 import importlib
 import asyncio
+from contextlib import contextmanager
 import pytest
 import pytest_asyncio
 from testcontainers.postgres import PostgresContainer
 from httpx import AsyncClient
 
+import telemetry
+
 @pytest.fixture(scope="session")
 def event_loop():
     loop = asyncio.new_event_loop()
@@ -30,3 +33,22 @@ async def client():
         await init_models()
         async with AsyncClient(app=app, base_url="http://test") as ac:
             yield ac
+
+
+@pytest.fixture
+def max_queries():
+    """Fail the test when a block runs more than `limit` statements.
+
+        with max_queries(3):
+            await client.post("/events", json=...)
+    """
+    @contextmanager
+    def check(limit):
+        with telemetry.request_scope() as (stats, owner):
+            assert owner, "max_queries cannot be nested in another request scope"
+            yield stats
+        executed = "\n".join(f"  {n}x {' '.join(s.split())}" for s, n in stats.statements.items())
+        assert stats.db_statements <= limit, (
+            f"{stats.db_statements} statements executed, expected at most {limit}:\n{executed}"
+        )
+    return check
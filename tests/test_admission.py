@@ -0,0 +1,107 @@
+import threading
+import time
+
+import admission
+from admission import AdmissionMiddleware, Limiter
+
+
+def _environ(method, path):
+    return {"REQUEST_METHOD": method, "PATH_INFO": path, "SCRIPT_NAME": ""}
+
+
+def test_classify():
+    assert admission.classify(_environ("POST", "/attendance")) == "write"
+    assert admission.classify(_environ("DELETE", "/api/events/3")) == "write"
+    assert admission.classify(_environ("GET", "/api/events")) == "read"
+    assert admission.classify(_environ("GET", "/api/admin/logs")) == "admin"
+    assert admission.classify(_environ("GET", "/healthz")) is None
+    assert admission.classify(_environ("GET", "/static/app.js")) is None
+
+
+def test_queued_writes_go_before_earlier_reads():
+    limiter = Limiter(1)
+    assert limiter.acquire("read", 1) == (True, "")
+    order = []
+
+    def wait(cls):
+        assert limiter.acquire(cls, 2)[0]
+        order.append(cls)
+        limiter.release(cls)
+
+    threads = [threading.Thread(target=wait, args=(cls,)) for cls in ("admin", "read", "write")]
+    for t in threads:
+        t.start()
+        time.sleep(0.05)
+    assert limiter.snapshot()["read"] == (1, 1)
+    limiter.release("read")
+    for t in threads:
+        t.join()
+    assert order == ["write", "read", "admin"]
+
+
+def test_limits_queue_and_timeouts():
+    limiter = Limiter(2, {"admin": 1}, max_queue=0)
+    assert limiter.acquire("admin", 1)[0]
+    # admin is at its own limit even though a slot is free
+    assert limiter.acquire("admin", 1) == (False, "queue_full")
+    assert limiter.acquire("read", 1)[0]
+
+    limiter = Limiter(1, max_queue=4)
+    assert limiter.acquire("write", 1)[0]
+    start = time.monotonic()
+    assert limiter.acquire("read", 0.1) == (False, "timeout")
+    assert 0.1 <= time.monotonic() - start < 0.5
+    assert limiter.snapshot()["read"] == (0, 0)
+
+
+def test_queues_share_the_threads_left_over():
+    # one admitted, one waiting: every further request is turned away at
+    # once, whatever its class, instead of holding another thread
+    limiter = Limiter(1, max_queue=32, max_waiting=1)
+    assert limiter.acquire("write", 1)[0]
+    waiter = threading.Thread(target=limiter.acquire, args=("read", 0.5))
+    waiter.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    assert limiter.acquire("write", 1) == (False, "queue_full")
+    assert limiter.acquire("admin", 1) == (False, "queue_full")
+    assert time.monotonic() - start < 0.1
+    limiter.release("write")
+    waiter.join()
+    assert limiter.snapshot()["read"] == (1, 0)
+
+
+def test_middleware_sheds_with_retry_after_but_not_healthz():
+    gate = threading.Event()
+
+    def app(environ, start_response):
+        start_response("200 OK", [])
+        if environ["PATH_INFO"] == "/slow":
+            gate.wait(2)
+        return [b"ok"]
+
+    mw = AdmissionMiddleware(app, max_in_flight=1, max_wait={"read": 0.05})
+    responses = {}
+
+    def call(path, key):
+        def start_response(status, headers):
+            responses[key] = (status, dict(headers))
+        body = mw(_environ("GET", path), start_response)
+        b"".join(body)
+        getattr(body, "close", lambda: None)()
+
+    slow = threading.Thread(target=call, args=("/slow", "slow"))
+    slow.start()
+    time.sleep(0.05)
+    call("/api/events", "shed")
+    call("/healthz", "health")
+    gate.set()
+    slow.join()
+
+    assert responses["shed"][0].startswith("503")
+    assert responses["shed"][1]["Retry-After"] == "1"
+    assert responses["health"][0] == "200 OK"
+    assert responses["slow"][0] == "200 OK"
+    # the slot was released once the slow body was sent
+    assert mw.limiter.snapshot()["read"] == (0, 0)
+    assert 'admission_rejected_total{class="read",reason="timeout"}' in admission.telemetry.render()
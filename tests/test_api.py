@@ -1,6 +1,7 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 import pytest
+from sqlalchemy import text
 
 
 @pytest.mark.asyncio
@@ -190,3 +191,683 @@ async def test_admin_settings_affect_overtime(client):
     await client.post(
         "/admin/settings", json={"key": "GRACE_PERIOD_MIN", "value": "20"}
     )
+
+
+@pytest.mark.asyncio
+async def test_period_summary(client):
+    from sqlalchemy import text
+    from api.models import AsyncSessionLocal
+
+    shifts = [
+        (datetime(2024, 2, 5, 9, tzinfo=timezone.utc), datetime(2024, 2, 5, 17, tzinfo=timezone.utc)),
+        (datetime(2024, 3, 4, 9, tzinfo=timezone.utc), datetime(2024, 3, 4, 13, tzinfo=timezone.utc)),
+    ]
+    for ts_in, ts_out in shifts:
+        for kind, ts in (("clockin", ts_in), ("clockout", ts_out)):
+            await client.post(
+                "/events",
+                params={"employee_id": "frank", "kind": kind, "timestamp": ts.isoformat()},
+            )
+    async with AsyncSessionLocal() as session:
+        await session.execute(text(
+            "CREATE TABLE employee_frank (day DATE PRIMARY KEY, cash TEXT, orders TEXT, "
+            "payout TEXT, advance TEXT)"
+        ))
+        await session.execute(text(
+            "INSERT INTO employee_frank (day, orders, payout, advance) VALUES "
+            "('2024-02-10', 'A1:20,B2:30', '1000', '150'), ('2024-03-01', NULL, NULL, '50')"
+        ))
+        await session.commit()
+
+    resp = await client.get(
+        "/summary/period", params={"employee_id": "frank", "start": "2024-02", "end": "2024-03"}
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    feb, mar = data["months"]
+    assert feb["month"] == "2024-02"
+    assert feb["total_hours"] == 8.0
+    assert feb["orders_count"] == 2
+    assert feb["orders_total"] == 50.0
+    assert feb["balance"] == 850.0
+    assert mar["total_hours"] == 4.0
+    assert mar["advance"] == 50.0
+    assert data["totals"]["total_hours"] == 12.0
+    assert data["totals"]["present_days"] == 2
+    assert data["totals"]["payout"] == 1000.0
+    assert data["totals"]["advance"] == 200.0
+
+    # editing a closed month invalidates its cached summary
+    events = (await client.get("/events", params={"employee_id": "frank", "month": "2024-02"})).json()
+    clockout = next(e for e in events if e["kind"] == "clockout")
+    await client.patch(
+        f"/events/{clockout['id']}",
+        json={"timestamp": datetime(2024, 2, 5, 19, tzinfo=timezone.utc).isoformat()},
+    )
+    resp = await client.get(
+        "/summary/period", params={"employee_id": "frank", "start": "2024-02", "end": "2024-02"}
+    )
+    assert resp.json()["months"][0]["total_hours"] == 10.0
+
+    resp = await client.get(
+        "/summary/period", params={"employee_id": "frank", "start": "2024-03", "end": "2024-02"}
+    )
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_settings_changed_by_another_worker(client, monkeypatch):
+    from sqlalchemy import text
+    import api.main
+    from api.models import AsyncSessionLocal
+
+    monkeypatch.setattr(api.main, "SETTINGS_REFRESH_SEC", 60)
+    start = datetime(2024, 6, 3, 9, tzinfo=timezone.utc)
+    end = datetime(2024, 6, 3, 18, tzinfo=timezone.utc)
+    for kind, ts in (("clockin", start), ("clockout", end)):
+        await client.post(
+            "/events", params={"employee_id": "gina", "kind": kind, "timestamp": ts.isoformat()}
+        )
+    resp = await client.get("/summary", params={"employee_id": "gina", "month": "2024-06"})
+    assert resp.json()["extra_per_day"]["3"] == 0.67
+
+    # simulate a write made by a different worker: rows change, version bumps
+    async with AsyncSessionLocal() as session:
+        await session.execute(text(
+            "INSERT INTO settings (key, value) VALUES ('WORK_DAY_HOURS', '9') "
+            "ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value"
+        ))
+        await session.execute(text(
+            "UPDATE settings SET value = (value::int + 1)::text WHERE key = '_settings_version'"
+        ))
+        await session.commit()
+
+    # within the refresh interval the cached rules (and summary) are used
+    resp = await client.get("/summary", params={"employee_id": "gina", "month": "2024-06"})
+    assert resp.json()["extra_per_day"]["3"] == 0.67
+
+    monkeypatch.setattr(api.main, "SETTINGS_REFRESH_SEC", 0)
+    resp = await client.get("/summary", params={"employee_id": "gina", "month": "2024-06"})
+    assert resp.json()["extra_per_day"]["3"] == 0.0
+    assert api.main.WORK_DAY_HOURS == 9.0
+
+    resp = await client.get("/admin/settings")
+    assert "_settings_version" not in resp.json()
+    await client.post("/admin/settings", json={"key": "WORK_DAY_HOURS", "value": "8"})
+
+    # rule values every worker could not parse are rejected before any write
+    for value in ("eight", "nan", "inf", "-1", ""):
+        resp = await client.post("/admin/settings", json={"key": "GRACE_PERIOD_MIN", "value": value})
+        assert resp.status_code == 400
+    settings = (await client.get("/admin/settings")).json()
+    assert settings["WORK_DAY_HOURS"] == "8" and float(settings["GRACE_PERIOD_MIN"]) >= 0
+    resp = await client.get("/summary", params={"employee_id": "gina", "month": "2024-06"})
+    assert resp.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_event_writes_stay_within_query_budget(client, max_queries):
+    ts = datetime(2024, 3, 4, 9, 0, tzinfo=timezone.utc).isoformat()
+    with max_queries(3):
+        resp = await client.post(
+            "/events", json={"employee_id": "quinn", "kind": "in", "timestamp": ts}
+        )
+    event_id = resp.json()["id"]
+    with max_queries(4):
+        resp = await client.patch(f"/events/{event_id}", json={"kind": "out"})
+    assert resp.status_code == 200
+    with max_queries(2):
+        resp = await client.delete(f"/events/{event_id}")
+    assert resp.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_admin_logs_cursor_paging_and_filters(client):
+    for i in range(5):
+        resp = await client.post(
+            "/admin/logs", json={"action": "paging_test", "data": str(i), "employee_id": f"pager{i % 2}"}
+        )
+        assert resp.status_code == 200
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"action": "paging_test", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        resp = await client.get("/admin/logs", params=params)
+        assert resp.status_code == 200
+        seen.extend(l["data"] for l in resp.json())
+        cursor = resp.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert seen == ["4", "3", "2", "1", "0"]
+
+    resp = await client.get("/admin/logs", params={"action": "paging_test", "employee_id": "pager1"})
+    assert [l["data"] for l in resp.json()] == ["3", "1"]
+    resp = await client.get("/admin/logs", params={"action": "paging_test", "until": "2000-01-01"})
+    assert resp.json() == []
+
+
+@pytest.mark.asyncio
+async def test_audit_retention_archives_old_rows(client):
+    from datetime import timedelta
+
+    from api import audit
+    from api.models import AdminLog, AsyncSessionLocal
+
+    old = datetime.now(timezone.utc) - timedelta(days=400)
+    async with AsyncSessionLocal() as session:
+        session.add_all([AdminLog(action="retention_test", data=str(i), created_at=old) for i in range(3)])
+        session.add(AdminLog(action="retention_test", data="recent"))
+        await session.commit()
+        moved = await audit.prune(session, retention_days=365, batch_size=2)
+        assert moved >= 3
+        archived = await session.execute(
+            text("SELECT count(*) FROM admin_logs_archive WHERE action = 'retention_test'")
+        )
+        assert archived.scalar() == 3
+
+    resp = await client.get("/admin/logs", params={"action": "retention_test"})
+    assert [l["data"] for l in resp.json()] == ["recent"]
+
+
+@pytest.mark.asyncio
+async def test_read_endpoints_use_replica_session(client, monkeypatch):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from testcontainers.postgres import PostgresContainer
+
+    import api.main
+    import dbconn
+    from api.models import Base
+
+    with PostgresContainer("postgres:15") as replica:
+        engine = dbconn.create_engine_async(replica.get_connection_url(), name="test_replica")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        monkeypatch.setattr(
+            api.main, "ReadSessionLocal",
+            async_sessionmaker(engine, expire_on_commit=False, info={"replica": True}),
+        )
+        ts = "2024-05-02T08:00:00+00:00"
+        resp = await client.post(
+            "/events", json={"employee_id": "rita", "kind": "clockin", "timestamp": ts}
+        )
+        assert resp.status_code == 200
+        params = {"employee_id": "rita", "month": "2024-05"}
+        assert (await client.get("/events", params=params)).json() == []
+        resp = await client.get("/events", params=params, headers={"X-Read-Your-Writes": "1"})
+        assert [e["kind"] for e in resp.json()] == ["clockin"]
+        # the replica's stale summary of a month just written is not cached
+        resp = await client.get("/summary", params=params)
+        assert resp.json()["total_hours"] == 0
+        from api import summary_cache
+        assert summary_cache.get("attendance", "rita", "2024-05") is None
+        await engine.dispose()
+    dbconn._pools.pop("test_replica")
+
+
+@pytest.mark.asyncio
+async def test_closed_month_edits_reach_every_worker_cache(client):
+    from api import summary_cache
+    from api.models import AsyncSessionLocal
+
+    params = {"employee_id": "wendy", "month": "2023-09"}
+    for kind, hour in (("clockin", 8), ("clockout", 12)):
+        ts = f"2023-09-04T{hour:02d}:00:00+00:00"
+        await client.post("/events", json={"employee_id": "wendy", "kind": kind, "timestamp": ts})
+    assert (await client.get("/summary", params=params)).json()["total_hours"] == 4.0
+    assert summary_cache.get("attendance", "wendy", "2023-09") is not None
+
+    # another worker's edit: straight to the table, no in-process invalidate()
+    async with AsyncSessionLocal() as session:
+        await session.execute(text(
+            "UPDATE events SET timestamp = timestamp + interval '2 hours' "
+            "WHERE employee_id = 'wendy' AND kind = 'clockout'"
+        ))
+        await session.commit()
+        await summary_cache.refresh(session, force=True)
+    assert summary_cache.get("attendance", "wendy", "2023-09") is None
+    assert (await client.get("/summary", params=params)).json()["total_hours"] == 6.0
+    # the change is applied once, so the recomputed entry stays cached
+    async with AsyncSessionLocal() as session:
+        await summary_cache.refresh(session, force=True)
+    assert summary_cache.get("attendance", "wendy", "2023-09") is not None
+
+    # values computed before an invalidation are not stored over it
+    generation = summary_cache.generation()
+    summary_cache.invalidate("wendy", datetime(2023, 9, 1), "attendance")
+    summary_cache.put("attendance", "wendy", "2023-09", {"stale": True}, generation)
+    assert summary_cache.get("attendance", "wendy", "2023-09") is None
+
+
+@pytest.mark.asyncio
+async def test_payroll_run_snapshots_month(client):
+    import asyncio
+    import os
+    from datetime import date
+
+    import db
+    import dbconn
+    from api import payroll
+    from api.models import AsyncSessionLocal
+
+    for emp, day in (("payroll_a", 5), ("payroll_a", 6), ("payroll_b", 5)):
+        for kind, hour in (("clockin", 8), ("clockout", 17)):
+            ts = datetime(2023, 2, day, hour, tzinfo=timezone.utc).isoformat()
+            resp = await client.post("/events", json={"employee_id": emp, "kind": kind, "timestamp": ts})
+            assert resp.status_code == 200
+    pool = dbconn.SyncPool(dbconn.sync_url(os.environ["DATABASE_URL"]), name="test_payroll")
+    ledger = db.PsycopgBackend(lambda read_only: pool.connection())
+    ledger.update("payroll_a", date(2023, 2, 5), "advance", "40")
+    ledger.update("payroll_a", date(2023, 2, 28), "payout", "300")
+    pool.closeall()
+
+    employees = ["payroll_a", "payroll_b"]
+    first = await asyncio.to_thread(payroll.run_payroll, "2023-02", 2, employees)
+    second = await asyncio.to_thread(payroll.run_payroll, "2023-02", 1, employees)
+    assert second > first
+
+    resp = await client.get("/payroll", params={"month": "2023-02"})
+    body = resp.json()
+    assert body["run_id"] == second
+    a, b = body["employees"]
+    assert (a["employee_id"], a["total_hours"], a["present_days"]) == ("payroll_a", 18.0, 2)
+    assert (a["advance"], a["payout"], a["balance"]) == (40.0, 300.0, 260.0)
+    assert a["hours_per_day"]["5"] == 9.0 and a["entries"][0]["date"] == "2023-02-05"
+    assert (b["total_hours"], b["balance"]) == (9.0, 0.0)
+
+    resp = await client.get("/payroll", params={"month": "2023-02", "run_id": first})
+    assert resp.json()["employees"] == body["employees"]
+    assert (await client.get("/payroll", params={"month": "1999-01"})).status_code == 404
+
+    async with AsyncSessionLocal() as session:
+        with pytest.raises(Exception, match="immutable"):
+            await session.execute(text("UPDATE payroll_snapshots SET balance = 0"))
+
+
+@pytest.mark.asyncio
+async def test_archived_month_reads_from_file(client, tmp_path, monkeypatch):
+    import asyncio
+    import os
+
+    from api import archive, summary_cache
+    from api.models import AsyncSessionLocal
+
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    for emp, day in (("frozen_a", 2), ("frozen_a", 3), ("frozen_b", 2)):
+        for kind, hour in (("clockin", 8), ("clockout", 16)):
+            ts = datetime(2022, 11, day, hour, tzinfo=timezone.utc).isoformat()
+            resp = await client.post("/events", json={"employee_id": emp, "kind": kind, "timestamp": ts})
+            assert resp.status_code == 200
+    params = {"employee_id": "frozen_a", "month": "2022-11"}
+    events = (await client.get("/events", params=params)).json()
+    summary = (await client.get("/summary", params=params)).json()
+    period = {"employee_id": "frozen_a", "start": "2022-10", "end": "2022-12"}
+    totals = (await client.get("/summary/period", params=period)).json()["totals"]
+
+    database_url = os.environ["DATABASE_URL"]
+    # an unmounted volume is not silently replaced by a local directory
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "unmounted"))
+    with pytest.raises(RuntimeError, match="EVENT_ARCHIVE_DIR"):
+        await asyncio.to_thread(archive.freeze, "2022-11", database_url)
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+
+    def bad_file(path, rows):
+        raise RuntimeError("short write")
+
+    # a failure after the file is written keeps the rows and removes the file
+    with monkeypatch.context() as m:
+        m.setattr(archive, "_verify_file", bad_file)
+        with pytest.raises(RuntimeError, match="short write"):
+            await asyncio.to_thread(archive.freeze, "2022-11", database_url)
+    assert not archive.is_archived("2022-11")
+    assert (await client.get("/events", params=params)).json() == events
+
+    assert await asyncio.to_thread(archive.freeze, "2022-11", database_url) == 6
+    async with AsyncSessionLocal() as session:
+        remaining = await session.execute(
+            text("SELECT count(*) FROM events WHERE employee_id IN ('frozen_a', 'frozen_b')")
+        )
+        assert remaining.scalar() == 0
+        assert await session.scalar(text("SELECT to_regclass('events_2022_11')")) is None
+    summary_cache.clear()
+
+    assert (await client.get("/events", params=params)).json() == events
+    assert (await client.get("/summary", params=params)).json() == summary
+    assert (await client.get("/summary/period", params=period)).json()["totals"] == totals
+    everyone = (await client.get("/events", params={"employee_id": "frozen_a"})).json()
+    assert [e["id"] for e in everyone] == [e["id"] for e in events]
+
+    resp = await client.post(
+        "/events",
+        json={"employee_id": "frozen_a", "kind": "clockin", "timestamp": "2022-11-20T08:00:00+00:00"},
+    )
+    assert resp.status_code == 409
+    resp = await client.patch(f"/events/{events[0]['id']}", json={"kind": "out"})
+    assert resp.status_code == 404
+
+    assert await asyncio.to_thread(archive.thaw, "2022-11", database_url) == 6
+    assert not archive.is_archived("2022-11")
+    assert (await client.get("/events", params=params)).json() == events
+
+
+@pytest.mark.asyncio
+async def test_bulk_edit_is_atomic_and_returns_summary(client, max_queries):
+    from api.models import AsyncSessionLocal
+
+    def ev(kind, hour):
+        return {"employee_id": "bulky", "kind": kind, "timestamp": f"2023-03-06T{hour:02d}:00:00+00:00"}
+
+    resp = await client.post("/events/bulk", json={
+        "employee_id": "bulky", "month": "2023-03", "create": [ev("clockin", 8), ev("clockout", 12)],
+    })
+    assert resp.status_code == 200
+    first_in, first_out = resp.json()["created"]
+    assert resp.json()["summary"]["hours_per_day"]["6"] == 4.0
+
+    # one bad id rolls back the whole batch
+    resp = await client.post("/events/bulk", json={
+        "employee_id": "bulky", "month": "2023-03", "create": [ev("startbreak", 10)], "delete": [999999],
+    })
+    assert resp.status_code == 404
+    resp = await client.post("/events/bulk", json={
+        "employee_id": "bulky", "month": "2023-03", "update": [{"id": first_in}], "delete": [first_in],
+    })
+    assert resp.status_code == 422
+
+    # lock, update, delete, insert, audit and the summary read; no per-row round trips
+    with max_queries(7):
+        resp = await client.post("/events/bulk", json={
+            "employee_id": "bulky",
+            "month": "2023-03",
+            "create": [ev("startbreak", 10), ev("endbreak", 11), ev("clockout", 17)],
+            "update": [{"id": first_in, "timestamp": "2023-03-06T07:00:00+00:00"}],
+            "delete": [first_out],
+        })
+    assert resp.status_code == 200
+    body = resp.json()
+    assert (len(body["created"]), body["updated"], body["deleted"]) == (3, 1, 1)
+    assert body["summary"]["hours_per_day"]["6"] == 9.0
+    events = (await client.get("/events", params={"employee_id": "bulky", "month": "2023-03"})).json()
+    assert [e["kind"] for e in events] == ["clockin", "startbreak", "endbreak", "clockout"]
+
+    async with AsyncSessionLocal() as session:
+        logs = await session.execute(
+            text("SELECT data FROM admin_logs WHERE employee_id = 'bulky' AND action = 'bulk_edit_events'")
+        )
+        assert len(logs.all()) == 2
+
+
+@pytest.mark.asyncio
+async def test_team_analytics_from_rollups(client):
+    from api.models import AsyncSessionLocal
+
+    async def shift(emp, day, start, end):
+        for kind, hour in (("clockin", start), ("clockout", end)):
+            ts = datetime(2021, 5, day, hour, tzinfo=timezone.utc).isoformat()
+            resp = await client.post("/events", json={"employee_id": emp, "kind": kind, "timestamp": ts})
+            assert resp.status_code == 200
+
+    await shift("team_a", 3, 8, 18)
+    await shift("team_a", 4, 8, 12)
+    await shift("team_b", 3, 9, 17)
+    params = {"start": "2021-05-01", "end": "2021-06-01"}
+    body = (await client.get("/analytics/team", params=params)).json()
+    a, b = body["employees"]
+    assert (a["employee_id"], a["rank"], a["total_hours"], a["present_days"]) == ("team_a", 1, 14.0, 2)
+    assert (b["employee_id"], b["rank"], b["percentile"]) == ("team_b", 2, 50.0)
+    assert a["attendance_rate"] == 2 / 31 and body["team"]["median_hours"] == 11.0
+    summary = (await client.get("/summary", params={"employee_id": "team_a", "month": "2021-05"})).json()
+    assert (a["total_extra"], a["total_penalty"]) == (summary["total_extra"], summary["total_penalty"])
+
+    async with AsyncSessionLocal() as session:
+        marks = await session.execute(text("SELECT count(*) FROM attendance_rollups WHERE month = '2021-05'"))
+        assert marks.scalar() == 2
+
+    # a new event drops the month's mark, the next read recomputes it
+    await shift("team_b", 5, 6, 18)
+    body = (await client.get("/analytics/team", params={**params, "rank_by": "present_days"})).json()
+    assert [(e["employee_id"], e["total_hours"]) for e in body["employees"]] == [("team_a", 14.0), ("team_b", 20.0)]
+    assert (await client.get("/analytics/team", params={**params, "rank_by": "nope"})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_scheduled_job_runs_once_per_slot(client):
+    from api import scheduler
+    from api.models import AsyncSessionLocal
+
+    calls = []
+
+    async def work(sessions):
+        calls.append(1)
+        return "did work"
+
+    async def broken(sessions):
+        raise RuntimeError("boom")
+
+    slot = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(hours=1)
+    job = scheduler.Job("test_once", "0 * * * *", work)
+    failing = scheduler.Job("test_broken", "0 * * * *", broken)
+    assert await scheduler.run_job(job, slot, AsyncSessionLocal) == "ok"
+    assert await scheduler.run_job(job, slot, AsyncSessionLocal, instance="other") == "skipped"
+    assert calls == [1]
+    # while another process holds the job's lock, even a new slot is skipped
+    async with AsyncSessionLocal() as holder:
+        await holder.execute(text("SELECT pg_advisory_xact_lock(hashtext('scheduler_job:test_once'))"))
+        assert await scheduler.run_job(job, slot + timedelta(hours=1), AsyncSessionLocal) == "skipped"
+    assert await scheduler.run_job(failing, slot, AsyncSessionLocal) == "failed"
+
+    # the claim is committed before the job runs: other sessions see it running
+    # and another slot of the same job is skipped until it finishes
+    seen = []
+
+    async def watched(sessions):
+        async with sessions() as other:
+            seen.append(await other.scalar(text(
+                "SELECT status FROM job_runs WHERE job = 'test_watched' AND scheduled_for = :slot"
+            ), {"slot": slot}))
+        seen.append(await scheduler.run_job(job_watched, slot + timedelta(hours=1), sessions))
+
+    job_watched = scheduler.Job("test_watched", "0 * * * *", watched)
+    assert await scheduler.run_job(job_watched, slot, AsyncSessionLocal) == "ok"
+    assert seen == ["running", "skipped"]
+
+    # a run left behind by a process that died is recorded as failed
+    async with AsyncSessionLocal() as session:
+        await session.execute(text(
+            "INSERT INTO job_runs (job, scheduled_for, started_at, heartbeat_at, status, instance) "
+            "VALUES ('test_once', :slot, now() - interval '1 hour', now() - interval '1 hour', 'running', 'dead')"
+        ), {"slot": slot - timedelta(hours=1)})
+        await session.commit()
+    assert await scheduler.run_job(job, slot + timedelta(hours=1), AsyncSessionLocal) == "ok"
+    async with AsyncSessionLocal() as session:
+        status, detail = (await session.execute(text(
+            "SELECT status, detail FROM job_runs WHERE job = 'test_once' AND instance = 'dead'"
+        ))).one()
+    assert (status, detail) == ("failed", "abandoned: no heartbeat from dead")
+
+    async with AsyncSessionLocal() as session:
+        once, broke = await scheduler.job_status(session, [job, failing])
+    assert (once["last_run"]["status"], once["last_run"]["detail"], once["failures_7d"]) == ("ok", "did work", 1)
+    assert once["last_run"]["duration_seconds"] >= 0 and once["last_success_at"]
+    assert (broke["last_run"]["status"], broke["last_run"]["detail"]) == ("failed", "RuntimeError: boom")
+    assert (broke["failures_7d"], broke["last_success_at"]) == (1, None)
+
+    resp = await client.post("/admin/jobs/rollup/run")
+    assert resp.status_code == 200 and resp.json()["status"] == "ok"
+    listed = {j["name"]: j for j in (await client.get("/admin/jobs")).json()}
+    assert {"rollup", "retention", "payroll"} <= set(listed)
+    assert listed["rollup"]["last_run"]["status"] == "ok"
+    runs = (await client.get("/admin/jobs/rollup/runs")).json()
+    assert runs[0]["scheduled_for"] == resp.json()["scheduled_for"]
+    assert (await client.post("/admin/jobs/nope/run")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_auto_clockout_closes_open_shifts(client, monkeypatch):
+    from api import jobs, main
+    from api.models import AsyncSessionLocal
+
+    monkeypatch.setattr(jobs, "AUTO_CLOCKOUT_AFTER_HOURS", 12)
+    base = datetime(2020, 9, 7, 8, tzinfo=timezone.utc)
+    now = base + timedelta(hours=20)
+    for emp, kind, ts in (
+        ("forgot_out", "clockin", base),
+        ("forgot_out", "startbreak", base + timedelta(hours=3)),
+        ("clocked_out", "clockin", base),
+        ("clocked_out", "clockout", base + timedelta(hours=6)),
+        ("still_working", "clockin", now - timedelta(hours=2)),
+    ):
+        resp = await client.post("/events", json={"employee_id": emp, "kind": kind, "timestamp": ts.isoformat()})
+        assert resp.status_code == 200
+
+    assert await jobs.auto_clockout(AsyncSessionLocal, now=now) == "closed 1 shifts"
+    assert await jobs.auto_clockout(AsyncSessionLocal, now=now) is None
+    events = (await client.get("/events", params={"employee_id": "forgot_out", "month": "2020-09"})).json()
+    assert events[-1]["kind"] == "clockout"
+    closed_at = datetime.fromisoformat(events[-1]["timestamp"])
+    assert closed_at == base + timedelta(hours=main.WORK_DAY_HOURS)
+    for emp in ("clocked_out", "still_working"):
+        listed = (await client.get("/events", params={"employee_id": emp, "month": "2020-09"})).json()
+        assert len(listed) == 2 - (emp == "still_working")
+    logs = (await client.get("/admin/logs", params={"action": "auto_clockout"})).json()
+    assert [log["employee_id"] for log in logs] == ["forgot_out"]
+
+
+@pytest.mark.asyncio
+async def test_events_partitioned_by_month(client):
+    from api import main, partitions
+    from api.days import month_bounds
+    from api.models import AsyncSessionLocal
+
+    for day, hour in ((3, 8), (3, 17), (20, 9)):
+        ts = datetime(2019, 4, day, hour, tzinfo=timezone.utc).isoformat()
+        resp = await client.post("/events", json={"employee_id": "part_a", "kind": "clockin", "timestamp": ts})
+        assert resp.status_code == 200
+    async with AsyncSessionLocal() as session:
+        # no partition yet: the rows wait in the default partition
+        assert "2019-04" in await partitions.stray_months(session)
+        assert await partitions.ensure(session, ["2019-03", "2019-04"]) == ["2019-03", "2019-04"]
+        assert await partitions.ensure(session, ["2019-04"]) == []
+        assert "2019-04" not in await partitions.stray_months(session)
+        assert await session.scalar(text("SELECT count(*) FROM events_2019_04")) == 3
+
+        start, end = month_bounds(2019, 4)
+        for stmt in (main._event_rows_stmt("part_a", start, end), main._list_events_stmt("part_a", "2019-04")):
+            assert await partitions.scanned_partitions(session, stmt) == ["events_2019_04"]
+        spanning = main._event_rows_stmt("part_a", month_bounds(2019, 3)[0], end)
+        assert await partitions.scanned_partitions(session, spanning) == ["events_2019_03", "events_2019_04"]
+
+    events = (await client.get("/events", params={"employee_id": "part_a", "month": "2019-04"})).json()
+    assert len(events) == 3
+    # moving an event to another month moves its row to that partition
+    resp = await client.patch(f"/events/{events[0]['id']}", json={"timestamp": "2019-03-30T08:00:00+00:00"})
+    assert resp.status_code == 200
+    async with AsyncSessionLocal() as session:
+        assert await session.scalar(text("SELECT count(*) FROM events_2019_03")) == 1
+
+
+@pytest.mark.asyncio
+async def test_status_follows_every_event_write(client, max_queries):
+    from api import status
+    from api.models import AsyncSessionLocal
+
+    base = datetime(2018, 6, 5, 8, tzinfo=timezone.utc)
+    ids = {}
+    for kind, hours in (("clockin", 0), ("startbreak", 4), ("endbreak", 4.5), ("clockout", 9)):
+        ts = (base + timedelta(hours=hours)).isoformat()
+        resp = await client.post("/events", json={"employee_id": "status_a", "kind": kind, "timestamp": ts})
+        ids[kind] = resp.json()["id"]
+
+    async def read(hours):
+        async with AsyncSessionLocal() as session:
+            return await status.read(session, "status_a", base + timedelta(hours=hours))
+
+    current = await read(10)
+    assert (current["state"], current["last_kind"]) == ("off", "clockout")
+    assert current["seconds_in_state"] == 3600
+    assert current["worked_seconds_today"] == (4 + 4.5) * 3600
+    # an edit in the past replays the day
+    await client.patch(f"/events/{ids['endbreak']}", json={"timestamp": (base + timedelta(hours=5)).isoformat()})
+    assert (await read(10))["worked_seconds_today"] == 8 * 3600
+    await client.delete(f"/events/{ids['clockout']}")
+    current = await read(10)
+    assert current["state"] == "working"
+    assert current["since"] == (base + timedelta(hours=5)).isoformat()
+    assert current["worked_seconds_today"] == 9 * 3600
+    # the next day only counts the open segment from midnight
+    assert (await read(26))["worked_seconds_today"] == 10 * 3600
+
+    with max_queries(1):
+        resp = await client.get("/status/status_a")
+    assert resp.json()["state"] == "working"
+    resp = await client.get("/status/nobody")
+    assert resp.json()["state"] == "off" and resp.json()["since"] is None
+    now = datetime.now(timezone.utc).isoformat()
+    await client.post("/events", json={"employee_id": "status_b", "kind": "startbreak", "timestamp": now})
+    resp = await client.get("/status/status_b", params={"timeline": True})
+    assert resp.json()["state"] == "off"
+    assert [e["kind"] for e in resp.json()["events"]] == ["startbreak"]
+
+
+@pytest.mark.asyncio
+async def test_dashboard_board_tracks_writes(client, max_queries):
+    from api import dashboard
+    from api.models import AsyncSessionLocal
+
+    day = datetime(2019, 3, 5, tzinfo=timezone.utc)
+    writes = (
+        ("dash_early", "clockin", 8),
+        ("dash_late", "clockin", 9.5),
+        ("dash_late", "startbreak", 12),
+        ("dash_gone", "clockin", 8),
+        ("dash_gone", "clockout", 10),
+        ("dash_open", "clockin", -4),
+        ("dash_idle", "clockin", -30),
+        ("dash_idle", "clockout", -22),
+    )
+    for employee, kind, hours in writes:
+        ts = (day + timedelta(hours=hours)).isoformat()
+        await client.post("/events", json={"employee_id": employee, "kind": kind, "timestamp": ts})
+
+    board = dashboard.Board()
+
+    def snapshot():
+        data = board.snapshot(day + timedelta(hours=13))
+        return {e["employee_id"]: e for e in data["employees"] if e["employee_id"].startswith("dash_")}
+
+    async with AsyncSessionLocal() as session:
+        await board.sync(session)
+    employees = snapshot()
+    assert {k: v["state"] for k, v in employees.items()} == {
+        "dash_early": "working", "dash_late": "break", "dash_gone": "off",
+        "dash_open": "working", "dash_idle": "off",
+    }
+    assert [k for k, v in employees.items() if v["late"]] == ["dash_late"]
+    assert [k for k, v in employees.items() if v["open_shift"]] == ["dash_open"]
+    assert employees["dash_gone"]["first_in_at"] == (day + timedelta(hours=8)).isoformat()
+    assert employees["dash_idle"]["first_in_at"] is None
+    assert employees["dash_early"]["worked_seconds_today"] == 5 * 3600
+
+    resp = await client.get("/events", params={"employee_id": "dash_gone"})
+    for event in resp.json():
+        await client.delete(f"/events/{event['id']}")
+    await client.post("/events", json={
+        "employee_id": "dash_late", "kind": "endbreak", "timestamp": (day + timedelta(hours=12.5)).isoformat(),
+    })
+    async with AsyncSessionLocal() as session:
+        # within DASHBOARD_REFRESH_SEC the board is served as is
+        await board.sync(session)
+        assert "dash_gone" in snapshot()
+        with max_queries(1):
+            await board.sync(session, force=True)
+    employees = snapshot()
+    assert "dash_gone" not in employees
+    assert employees["dash_late"]["state"] == "working"
+
+    with max_queries(1):
+        resp = await client.get("/dashboard/now")
+    data = resp.json()
+    assert data["counts"]["employees"] == len(data["employees"])
+    assert set(data["counts"]) >= {"working", "on_break", "clocked_out", "absent", "late", "open_shifts"}
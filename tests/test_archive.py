@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+from api import archive
+
+
+def _ts(day, hour, minute=0):
+    return datetime(2024, 1, day, hour, minute, tzinfo=timezone.utc)
+
+
+def test_write_and_read_month(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    created = _ts(2, 9)
+    rows = [
+        (3, "bob", _ts(2, 17), "clockout", created, None),
+        (1, "bob", _ts(2, 8), "clockin", created, None),
+        (2, "amy", _ts(2, 8, 30), "clockin", created, created + timedelta(hours=1)),
+        (4, "amy", _ts(2, 16, 30), "clockout", None, None),
+    ]
+    archive.write_file(archive.path_for("2024-01"), "2024-01", rows)
+
+    arc = archive.open_month("2024-01")
+    assert archive.open_month("2024-01") is arc
+    assert archive.open_month("2024-02") is None
+    assert archive.archived_months() == ["2024-01"]
+    assert (arc.rows, arc.employees, arc.kinds) == (4, ["amy", "bob"], ["clockin", "clockout"])
+    bob = arc.series("bob")
+    assert list(bob) == [(_ts(2, 8).timestamp(), "clockin"), (_ts(2, 17).timestamp(), "clockout")]
+    assert list(bob.between(start=_ts(2, 12).timestamp())) == [(_ts(2, 17).timestamp(), "clockout")]
+    assert len(arc.series("carol")) == 0
+
+    events = list(arc.event_dicts())
+    assert [e["id"] for e in events] == [1, 2, 4, 3]
+    assert events[1] == {
+        "id": 2,
+        "employee_id": "amy",
+        "kind": "clockin",
+        "timestamp": _ts(2, 8, 30).isoformat(),
+        "created_at": created.isoformat(),
+        "updated_at": (created + timedelta(hours=1)).isoformat(),
+    }
+    assert events[2]["created_at"] is None
+    assert [e["id"] for e in arc.event_dicts("amy")] == [2, 4]
+
+
+def test_split_range_merges_live_months(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    archive.write_file(archive.path_for("2024-02"), "2024-02", [])
+    start = datetime(2024, 1, 15, tzinfo=timezone.utc)
+    end = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+    pieces = archive.split_range(start, end)
+    assert [(lo.date().isoformat(), hi.date().isoformat(), arc is not None) for lo, hi, arc in pieces] == [
+        ("2024-01-15", "2024-02-01", False),
+        ("2024-02-01", "2024-03-01", True),
+        ("2024-03-01", "2024-05-01", False),
+    ]
+    assert archive.is_archived("2024-02")
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", None)
+    assert archive.split_range(start, end) == [(start, end, None)]
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+import telemetry
+from asgi_to_wsgi import AsgiToWsgi
+
+
+async def _slow_app(scope, receive, send):
+    await asyncio.sleep(0.2)
+    stats = telemetry.current()
+    body = (stats.route if stats is not None else "none").encode()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _call(bridge, results):
+    with telemetry.request_scope() as (stats, _):
+        stats.route = threading.current_thread().name
+        out = bridge({"REQUEST_METHOD": "GET", "PATH_INFO": "/"}, lambda status, headers: None)
+        results.append((stats.route, b"".join(out).decode()))
+
+
+def test_thread_mode_overlaps_requests_and_keeps_request_scope():
+    bridge = AsgiToWsgi(_slow_app, mode="thread")
+    results = []
+    threads = [threading.Thread(target=_call, args=(bridge, results), name=f"t{i}") for i in range(4)]
+    loop_time = bridge.loop.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # four 0.2s requests finished together rather than one after another
+    assert bridge.loop.time() - loop_time < 0.6
+    assert sorted(results) == [(f"t{i}", f"t{i}") for i in range(4)]
+
+
+def test_app_is_imported_on_first_request_and_retried_after_failure(monkeypatch):
+    import sys
+    import types
+
+    bridge = AsgiToWsgi("lazy_bridge_target:app")
+    statuses = []
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": "/"}
+    body = bridge(environ, lambda status, headers: statuses.append(status))
+    assert statuses == ["503 Service Unavailable"] and b"starting" in b"".join(body)
+
+    module = types.ModuleType("lazy_bridge_target")
+    module.app = _slow_app
+    monkeypatch.setitem(sys.modules, "lazy_bridge_target", module)
+    body = bridge(environ, lambda status, headers: statuses.append(status))
+    assert statuses[-1] == "200 OK" and b"".join(body) == b"none"
+    assert bridge.app is _slow_app
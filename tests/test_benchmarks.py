@@ -0,0 +1,64 @@
+from benchmarks.harness import compare
+from benchmarks.workload import generate
+
+
+def _report(**medians):
+    return {"results": {k: {"median_ms": v, "peak_kib": 10.0} for k, v in medians.items()}}
+
+
+def test_workload_is_deterministic():
+    a = generate(seed=7, employees=3, months=2)
+    b = generate(seed=7, employees=3, months=2)
+    assert [(e.employee_id, e.kind, e.timestamp) for e in a.events] == [
+        (e.employee_id, e.kind, e.timestamp) for e in b.events
+    ]
+    kinds = {e.kind for e in a.events}
+    assert {"clockin", "clockout", "startbreak", "endbreak"} <= kinds
+
+
+def test_workload_has_overnight_and_missing_clockouts():
+    w = generate(seed=3, employees=10, months=3, overnight_rate=0.2, missing_clockout_rate=0.1)
+    overnight = 0
+    missing = 0
+    for emp in w.employees:
+        open_in = None
+        for ev in w.for_employee(emp):
+            if ev.kind == "clockin":
+                if open_in is not None:
+                    missing += 1
+                open_in = ev
+            elif ev.kind == "clockout":
+                if open_in.timestamp.date() != ev.timestamp.date():
+                    overnight += 1
+                open_in = None
+    assert overnight > 0
+    assert missing > 0
+
+
+def test_compare_flags_regressions_over_threshold():
+    baseline = _report(fast=1.0, slow=10.0, gone=1.0)
+    current = _report(fast=1.1, slow=14.0, new=3.0)
+    regressions = compare(current, baseline, threshold=0.25)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("slow:")
+    assert compare(current, baseline, threshold=0.5) == []
+
+
+def test_loadtest_scenarios_parse_and_percentiles():
+    import glob
+    import os
+
+    from benchmarks.loadtest.runner import percentile
+    from benchmarks.loadtest.scenario import load
+
+    paths = glob.glob(os.path.join(os.path.dirname(__file__), "..", "benchmarks", "loadtest", "scenarios", "*.json"))
+    assert paths
+    for path in paths:
+        scenario = load(path)
+        assert scenario.groups and scenario.variants
+        for variant in scenario.variants:
+            assert variant.server["bridge_mode"] in ("lock", "thread")
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile(samples, 50) == 50.0
+    assert percentile(samples, 99) == 99.0
+    assert percentile([], 95) == 0.0
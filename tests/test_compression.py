@@ -0,0 +1,130 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import pytest
+
+import compression
+from compression import AsgiCompressionMiddleware, CompressionMiddleware
+
+ROWS = json.dumps([{"employee_id": "emp1", "kind": "clockin", "id": i} for i in range(200)]).encode()
+
+
+def test_negotiate():
+    assert compression.negotiate("gzip, deflate", ("br", "gzip")) == "gzip"
+    assert compression.negotiate("gzip;q=0.5, br", ("br", "gzip")) == "br"
+    assert compression.negotiate("br;q=0, *", ("br", "gzip")) == "gzip"
+    assert compression.negotiate("identity", ("br", "gzip")) is None
+    assert compression.negotiate("", ("gzip",)) is None
+
+
+def _call(app, accept="gzip", method="GET"):
+    captured = {}
+
+    def start_response(status, headers):
+        captured["status"], captured["headers"] = status, dict(headers)
+
+    environ = {"REQUEST_METHOD": method, "PATH_INFO": "/", "HTTP_ACCEPT_ENCODING": accept}
+    chunks = list(CompressionMiddleware(app, min_size=100)(environ, start_response))
+    return captured["headers"], chunks
+
+
+def _wsgi(chunks, content_type="application/json", extra=()):
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", content_type), *extra])
+        return iter(chunks)
+    return app
+
+
+def test_wsgi_compresses_json_above_threshold():
+    headers, chunks = _call(_wsgi([ROWS], extra=[("Content-Length", str(len(ROWS)))]))
+    body = b"".join(chunks)
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Vary"] == "Accept-Encoding"
+    assert headers["Content-Length"] == str(len(body))
+    assert gzip.decompress(body) == ROWS
+    assert len(body) < len(ROWS) / 5
+
+
+def test_wsgi_skips_small_binary_and_encoded_bodies():
+    headers, chunks = _call(_wsgi([b"{}"]))
+    assert "Content-Encoding" not in headers and chunks == [b"{}"]
+    headers, _ = _call(_wsgi([ROWS], content_type="image/png"))
+    assert "Content-Encoding" not in headers and "Vary" not in headers
+    headers, chunks = _call(_wsgi([b"already"], extra=[("Content-Encoding", "br")]))
+    assert headers["Content-Encoding"] == "br" and chunks == [b"already"]
+    headers, _ = _call(_wsgi([ROWS]), accept="identity")
+    assert "Content-Encoding" not in headers
+
+
+def test_wsgi_streams_chunk_by_chunk():
+    parts = [ROWS[i:i + 500] for i in range(0, len(ROWS), 500)]
+    headers, chunks = _call(_wsgi(parts))
+    assert headers["Content-Encoding"] == "gzip" and "Content-Length" not in headers
+    assert len(chunks) == len(parts) + 1
+    # every chunk is flushed, so a client can decode what it has so far
+    decoder = zlib.decompressobj(31)
+    assert ROWS.startswith(decoder.decompress(chunks[0]))
+    assert decoder.decompress(b"".join(chunks[1:])) + decoder.flush() == ROWS[len(parts[0]):]
+
+
+def _asgi_call(chunks, accept="gzip, br", status=200, extra=()):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"), *extra]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", accept.encode())]}
+    asyncio.run(AsgiCompressionMiddleware(app, min_size=100)(scope, None, send))
+    return dict((k.decode(), v.decode()) for k, v in sent[0]["headers"]), [m["body"] for m in sent[1:]]
+
+
+def test_asgi_compresses_whole_and_streamed_bodies():
+    headers, bodies = _asgi_call([ROWS])
+    assert headers["content-encoding"] == "gzip" or compression.brotli is not None
+    if headers["content-encoding"] == "gzip":
+        assert gzip.decompress(bodies[0]) == ROWS
+    assert headers["content-length"] == str(len(bodies[0]))
+
+    headers, bodies = _asgi_call([ROWS[:50], ROWS[50:2000], ROWS[2000:]], accept="gzip")
+    assert headers["content-encoding"] == "gzip" and "content-length" not in headers
+    assert len(bodies) == 2 and gzip.decompress(b"".join(bodies)) == ROWS
+
+    headers, bodies = _asgi_call([b"{}"])
+    assert "content-encoding" not in headers and bodies == [b"{}"]
+
+
+def test_partial_responses_are_not_compressed():
+    part = ROWS[:4000]
+    content_range = f"bytes 0-3999/{len(ROWS)}"
+
+    def app(environ, start_response):
+        start_response("206 Partial Content", [
+            ("Content-Type", "application/javascript"), ("Content-Range", content_range),
+            ("Content-Length", str(len(part))),
+        ])
+        return [part]
+
+    headers, chunks = _call(app)
+    assert "Content-Encoding" not in headers and b"".join(chunks) == part
+    assert headers["Content-Length"] == str(len(part))
+    # Content-Range on another status, e.g. 416, counts raw bytes too
+    headers, _ = _call(_wsgi([ROWS], extra=[("Content-Range", f"bytes */{len(ROWS)}")]))
+    assert "Content-Encoding" not in headers
+
+    headers, bodies = _asgi_call([part], status=206, extra=[(b"content-range", content_range.encode())])
+    assert "content-encoding" not in headers and bodies == [part]
+
+
+def test_brotli_when_installed():
+    brotli = pytest.importorskip("brotli")
+    headers, bodies = _asgi_call([ROWS], accept="br")
+    assert headers["content-encoding"] == "br"
+    assert brotli.decompress(bodies[0]) == ROWS
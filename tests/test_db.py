@@ -0,0 +1,108 @@
+import datetime as dt
+import threading
+import time
+
+import pytest
+from sqlalchemy import MetaData, create_engine, text
+from testcontainers.postgres import PostgresContainer
+
+import db
+import dbconn
+
+
+def _add(previous, value):
+    return str(float(previous or 0) + float(value))
+
+
+def _exercise(store, max_queries):
+    day = dt.date(2024, 3, 4)
+    assert store.month("dave", dt.date(2024, 3, 1), dt.date(2024, 4, 1)) == []
+    store.update("dave", day, "advance", "10", _add)
+    store.update("dave", day, "orders", "A1:20")
+    # the table is known now, so writes run no catalog queries or DDL
+    with max_queries(2):
+        assert store.update("dave", day, "advance", "5", _add) == "15.0"
+    store.update("dave", day, "clockin", dt.datetime(2024, 3, 4, 8, tzinfo=dt.timezone.utc))
+    rows = store.month("dave", dt.date(2024, 3, 1), dt.date(2024, 4, 1))
+    assert [tuple(r) for r in rows] == [(day, None, "A1:20", None, "15.0")]
+
+
+def _slow_add(previous, value):
+    # both writers are inside their transactions by now
+    time.sleep(0.2)
+    return _add(previous, value)
+
+
+def _concurrent_combines(store, employee="conc"):
+    store.ensure_table(employee)
+    for day in (dt.date(2024, 5, 1), dt.date(2024, 5, 1)):  # new row, then existing
+        threads = [
+            threading.Thread(target=store.update, args=(employee, day, "advance", "1", _slow_add))
+            for _ in range(2)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    rows = store.month(employee, dt.date(2024, 5, 1), dt.date(2024, 6, 1))
+    assert rows[0][4] == "4.0"
+
+
+def test_sqlite_backend(tmp_path, max_queries):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ledger.db'}")
+    store = db.SqlAlchemyBackend(engine)
+    _exercise(store, max_queries)
+    _concurrent_combines(store)
+
+    with engine.begin() as conn:
+        conn.execute(text('DROP TABLE "employee_dave"'))
+    store.refresh("dave")
+    assert store.month("dave", dt.date(2024, 3, 1), dt.date(2024, 4, 1)) == []
+
+
+def test_backends_agree_on_postgres(max_queries):
+    with PostgresContainer("postgres:15") as pg:
+        url = pg.get_connection_url()
+        _exercise(db.SqlAlchemyBackend(create_engine(url)), max_queries)
+        _concurrent_combines(db.SqlAlchemyBackend(create_engine(url)))
+
+        pool = dbconn.SyncPool(url, name="test_ledger")
+        store = db.PsycopgBackend(lambda read_only: pool.connection())
+        assert store.month("dave", dt.date(2024, 3, 1), dt.date(2024, 4, 1))[0][4] == "15.0"
+        _concurrent_combines(store, "conc_pg")
+        store.update("erin", dt.date(2024, 3, 5), "payout", "30")
+        with max_queries(1):
+            store.ensure_table("erin")
+            store.update("erin", dt.date(2024, 3, 5), "payout", "40")
+        pool.closeall()
+        dbconn._pools.pop("test_ledger")
+
+
+def test_backends_implement_the_whole_interface():
+    with pytest.raises(TypeError):
+        db.LedgerBackend()
+
+    class Partial(db.LedgerBackend):
+        def ensure_table(self, employee):
+            return employee
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_ensure_employee_table_reflects_one_table(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'attendance.db'}")
+    monkeypatch.setattr(db, "engine", engine)
+    monkeypatch.setattr(db, "metadata", MetaData())
+    with engine.begin() as conn:
+        for i in range(5):
+            conn.execute(text(f"CREATE TABLE attendance_other{i} (id INTEGER PRIMARY KEY)"))
+
+    table = db.ensure_employee_table("Frank")
+    assert table.name == "attendance_frank"
+    assert db.ensure_employee_table("frank") is table
+    assert list(db.metadata.tables) == ["attendance_frank"]
+
+    db.refresh_tables("frank")
+    assert db.ensure_employee_table("other0").c.keys() == ["id"]
+    assert "attendance_frank" not in db.metadata.tables
@@ -0,0 +1,54 @@
+import asyncio
+
+import psycopg2
+import pytest
+from sqlalchemy import text
+from testcontainers.postgres import PostgresContainer
+
+import dbconn
+import telemetry
+
+
+def test_sync_pool_reuses_waits_and_times_out():
+    with PostgresContainer("postgres:15") as pg:
+        pool = dbconn.SyncPool(pg.get_connection_url(), name="test_pool", size=1,
+                               max_overflow=0, timeout=0.1)
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            with pytest.raises(psycopg2.OperationalError):
+                pool.getconn()
+            assert 'db_pool_saturation{pool="test_pool"} 1.0' in telemetry.render()
+        with pool.connection() as again:
+            assert again is conn
+        with pytest.raises(ZeroDivisionError):
+            with pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("CREATE TEMP TABLE t (x int)")
+                1 / 0
+        # the failed block was rolled back before the connection was reused
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('pg_temp.t')")
+                assert cur.fetchone() == (None,)
+        pool.closeall()
+    body = telemetry.render()
+    assert 'db_pool_checkout_timeouts_total{pool="test_pool"} 1.0' in body
+    dbconn._pools.pop("test_pool")
+
+
+def test_pooler_mode_engine_runs_statements(monkeypatch):
+    monkeypatch.setattr(dbconn, "POOLER_MODE", True)
+    with PostgresContainer("postgres:15") as pg:
+        engine = dbconn.create_engine_async(pg.get_connection_url(), name="test_pooler")
+
+        async def run():
+            try:
+                async with engine.connect() as conn:
+                    for i in range(3):
+                        assert (await conn.execute(text("SELECT CAST(:i AS integer)"), {"i": i})).scalar() == i
+            finally:
+                await engine.dispose()
+
+        asyncio.new_event_loop().run_until_complete(run())
+    dbconn._pools.pop("test_pooler")
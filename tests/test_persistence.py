@@ -28,3 +28,66 @@ async def test_advance_and_orders_accumulate():
             assert rec["advance"] == 15.0
             assert rec["orders_count"] == 2
             assert rec["orders_total"] == 50.0
+
+
+@pytest.mark.asyncio
+async def test_ledger_writes_stay_within_query_budget(max_queries):
+    with PostgresContainer("postgres:15") as pg:
+        os.environ["DATABASE_URL"] = pg.get_connection_url()
+        import app
+        importlib.reload(app)
+        from app import server
+
+        with server.test_client() as c:
+            with max_queries(4):
+                resp = c.post("/attendance", json={"employee": "bob", "action": "clockin"})
+            assert resp.get_json()["ok"]
+            with max_queries(7):
+                resp = c.post("/advance", json={"employee": "bob", "amount": 10, "date": "2024-01-02"})
+            assert resp.status_code == 200
+            with max_queries(1):
+                resp = c.get("/employee-data", query_string={"employee": "bob", "month": "2024-01"})
+            assert resp.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_unless_read_your_writes(monkeypatch):
+    with PostgresContainer("postgres:15") as primary, PostgresContainer("postgres:15") as replica:
+        monkeypatch.setenv("DATABASE_URL", primary.get_connection_url())
+        monkeypatch.setenv("DATABASE_READ_URL", replica.get_connection_url())
+        import app
+        importlib.reload(app)
+        from app import server
+
+        with server.test_client() as c:
+            resp = c.post("/advance", json={"employee": "carol", "amount": 7, "date": "2024-02-03"})
+            assert resp.status_code == 200
+            query = {"employee": "carol", "month": "2024-02"}
+            # the stand-in replica never receives the write
+            assert c.get("/employee-data", query_string=query).get_json() == []
+            resp = c.get("/employee-data", query_string=query, headers={"X-Read-Your-Writes": "1"})
+            assert resp.get_json()[0]["advance"] == 7.0
+
+
+@pytest.mark.asyncio
+async def test_ledger_in_embedded_sqlite(monkeypatch, tmp_path):
+    import db
+
+    monkeypatch.setattr(db, "LEDGER_DATABASE_URL", f"sqlite:///{tmp_path / 'ledger.db'}")
+    monkeypatch.setattr(db, "_embedded", None)
+    with PostgresContainer("postgres:15") as pg:
+        os.environ["DATABASE_URL"] = pg.get_connection_url()
+        import app
+        importlib.reload(app)
+        from app import server
+
+        with server.test_client() as c:
+            for amount in (10, 5):
+                resp = c.post("/advance", json={"employee": "gina", "amount": amount, "date": "2024-01-02"})
+                assert resp.status_code == 200
+            resp = c.get("/employee-data", query_string={"employee": "gina", "month": "2024-01"})
+            assert resp.get_json()[0]["advance"] == 15.0
+        with app.db_connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('employee_gina')")
+                assert cur.fetchone() == (None,)
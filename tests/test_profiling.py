@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import profiling
+from asgi_to_wsgi import AsgiToWsgi
+from profiling import ProfilingMiddleware
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "TOKEN", "s3cret")
+    return tmp_path
+
+
+def _slow_summary():
+    total = 0
+    for i in range(200000):
+        total += i * i
+    return total
+
+
+def _app(environ, start_response):
+    _slow_summary()
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+def _call(app, headers=None, path="/page"):
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": path, "SCRIPT_NAME": ""}
+    for name, value in (headers or {}).items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    seen = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        seen.update(response_headers)
+
+    body = b"".join(app(environ, start_response))
+    return body, seen
+
+
+def test_token_header_profiles_one_request(profile_dir):
+    app = ProfilingMiddleware(_app)
+    assert _call(app)[1] == {"Content-Type": "text/plain"}
+    assert _call(app, {"X-Profile": "wrong"})[1].get("X-Profile-Id") is None
+    assert os.listdir(profile_dir) == []
+
+    body, headers = _call(app, {"X-Profile": "s3cret", "X-Profile-Memory": "1"})
+    assert body == b"ok"
+    profile_id = headers["X-Profile-Id"]
+    assert "_slow_summary" in headers["X-Profile-Top"]
+    assert headers["X-Profile-Areas"].startswith("tests=")
+    assert sorted(os.listdir(profile_dir)) == [
+        f"{profile_id}.json", f"{profile_id}.mem.txt", f"{profile_id}.prof",
+    ]
+    summary = json.loads((profile_dir / f"{profile_id}.json").read_text())
+    assert summary["path"] == "/page" and summary["trigger"] == "header" and summary["memory"]
+    assert any("_slow_summary" in t["function"] for t in summary["top"])
+    assert next(iter(summary["areas"])) == "tests"
+    assert "_slow_summary" in profiling.text_report(profile_id)
+    assert profiling.profile_path(profile_id) is not None
+    assert profiling.profile_path("../../etc/passwd") is None
+
+
+def test_sampling_and_retention(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, "KEEP", 2)
+    app = ProfilingMiddleware(_app, sample_rate=3)
+    for _ in range(9):
+        _, headers = _call(app)
+        # sampled profiles are not announced to the client
+        assert "X-Profile-Id" not in headers
+        _call(app, path="/healthz")
+    profiles = profiling.list_profiles()
+    assert len(profiles) == 2
+    assert {p["trigger"] for p in profiles} == {"sample"}
+    assert len(os.listdir(profile_dir)) == 4
+
+
+async def _asgi_app(scope, receive, send):
+    await asyncio.sleep(0)
+    _slow_summary()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"api"})
+
+
+@pytest.mark.parametrize("mode", ["lock", "thread"])
+def test_bridge_work_is_profiled_in_both_modes(mode, profile_dir):
+    app = ProfilingMiddleware(AsgiToWsgi(_asgi_app, mode=mode))
+    body, headers = _call(app, {"X-Profile": "s3cret"})
+    assert body == b"api"
+    summary = json.loads((profile_dir / f"{headers['X-Profile-Id']}.json").read_text())
+    assert any("_slow_summary" in t["function"] for t in summary["top"])
@@ -54,3 +54,37 @@ def test_performance(client):
 def test_employee_data_missing_params(client):
     resp = client.get("/employee-data")
     assert resp.status_code == 400
+
+
+def test_metrics_endpoint(client):
+    client.get("/healthz")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/plain"
+    body = resp.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{route="/healthz",method="GET",status="200"}' in body
+    assert "# TYPE asgi_bridge_lock_wait_seconds histogram" in body
+
+
+def test_profiles_need_the_token(client, tmp_path, monkeypatch):
+    import profiling
+
+    assert client.get("/profiles").status_code == 404
+    monkeypatch.setattr(profiling, "TOKEN", "s3cret")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    assert client.get("/profiles").status_code == 403
+
+    headers = {"X-Profile": "s3cret"}
+    resp = client.get("/healthz", headers=headers)
+    profile_id = resp.headers["X-Profile-Id"]
+    # the profile is stored once the body has been sent
+    assert resp.data == b"OK"
+    resp.close()
+    listed = client.get("/profiles", headers=headers).get_json()
+    assert [p["id"] for p in listed] == [profile_id]
+    assert listed[0]["route"] == "/healthz"
+    resp = client.get(f"/profiles/{profile_id}", headers=headers)
+    assert resp.mimetype == "application/octet-stream" and resp.data
+    resp = client.get(f"/profiles/{profile_id}", query_string={"format": "text"}, headers=headers)
+    assert b"cumulative" in resp.data
+    assert client.get(f"/profiles/{profile_id}", query_string={"format": "memory"}, headers=headers).status_code == 404
@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from api.scheduler import Cron
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_cron_next_after():
+    every_15 = Cron("*/15 * * * *", timezone.utc)
+    assert every_15.next_after(_utc(2024, 1, 1, 10, 7, 30)) == _utc(2024, 1, 1, 10, 15)
+    # strictly after: a slot that is due now is not returned again
+    assert every_15.next_after(_utc(2024, 1, 1, 10, 15)) == _utc(2024, 1, 1, 10, 30)
+    assert Cron("0 4 1 * *", timezone.utc).next_after(_utc(2024, 1, 1, 5)) == _utc(2024, 2, 1, 4)
+    assert Cron("30 9-17/4 * * 1-5", timezone.utc).next_after(_utc(2024, 1, 5, 18)) == _utc(2024, 1, 8, 9, 30)
+    assert Cron("0 0 29 2 *", timezone.utc).next_after(_utc(2024, 3, 1)) == _utc(2028, 2, 29)
+    # day of month and day of week both restricted: either matches (the 1st or a Sunday)
+    assert Cron("0 0 1 * 7", timezone.utc).next_after(_utc(2024, 1, 2)) == _utc(2024, 1, 7)
+
+
+def test_cron_uses_local_time():
+    paris = Cron("30 3 * * *", ZoneInfo("Europe/Paris"))
+    assert paris.next_after(_utc(2024, 1, 1)) == _utc(2024, 1, 1, 2, 30)
+    assert paris.next_after(_utc(2024, 7, 1)) == _utc(2024, 7, 1, 1, 30)
+
+
+@pytest.mark.parametrize("expr", ["* * * *", "60 * * * *", "*/0 * * * *", "5-1 * * * *", "0 0 31 2 *"])
+def test_cron_rejects_bad_expressions(expr):
+    with pytest.raises(ValueError):
+        Cron(expr).next_after(_utc(2024, 1, 1))
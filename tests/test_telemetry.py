@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+import telemetry
+
+
+def test_engine_statements_are_attributed_to_the_request():
+    engine = create_engine("sqlite://")
+    telemetry.instrument_engine(engine)
+    with telemetry.request_scope() as (stats, owner):
+        assert owner
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        with telemetry.request_scope() as (inner, inner_owner):
+            assert inner is stats and not inner_owner
+    assert stats.db_statements == 2
+    assert stats.db_seconds > 0
+    assert telemetry.current() is None
+
+
+def test_render_histogram_buckets_are_cumulative():
+    hist = telemetry.Histogram("test_latency_seconds", "Test.", ("route",), buckets=(0.1, 1.0))
+    try:
+        hist.observe(("/x",), 0.05)
+        hist.observe(("/x",), 0.5)
+        body = telemetry.render()
+    finally:
+        telemetry.REGISTRY.remove(hist)
+    assert 'test_latency_seconds_bucket{route="/x",le="0.1"} 1.0' in body
+    assert 'test_latency_seconds_bucket{route="/x",le="1.0"} 2.0' in body
+    assert 'test_latency_seconds_bucket{route="/x",le="+Inf"} 2.0' in body
+    assert 'test_latency_seconds_count{route="/x"} 2.0' in body
+
+
+def test_metrics_must_render_samples():
+    class Silent(telemetry._Metric):
+        kind = "gauge"
+
+    registered = len(telemetry.REGISTRY)
+    with pytest.raises(TypeError):
+        Silent("test_silent", "Test.")
+    assert len(telemetry.REGISTRY) == registered
+
+
+def test_slow_statements_and_repeats_are_logged(monkeypatch, caplog):
+    engine = create_engine("sqlite://")
+    telemetry.instrument_engine(engine)
+    monkeypatch.setattr(telemetry, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(telemetry, "STATEMENT_REPEAT_LIMIT", 3)
+    with caplog.at_level("WARNING", logger="telemetry"):
+        with telemetry.request_scope() as (stats, _):
+            stats.route = "/things/{id}"
+            with engine.connect() as conn:
+                for i in range(3):
+                    conn.execute(text("SELECT :i"), {"i": i})
+            telemetry.record_request(stats, "GET", 200, 0.01)
+    slow = [r.getMessage() for r in caplog.records if r.getMessage().startswith("slow query")]
+    assert len(slow) == 3
+    assert "/things/{id}" in slow[0] and "SELECT ?" in slow[0] and "(0,)" in slow[0]
+    budget = [r.getMessage() for r in caplog.records if "budget" in r.getMessage()]
+    assert budget == ["statement budget exceeded on GET /things/{id}: 3x SELECT ?"]